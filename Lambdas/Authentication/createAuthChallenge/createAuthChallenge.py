@@ -1,33 +1,27 @@
 import os
 import json
-import boto3
-import logging
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+from fresa_common import clients, deadline, log, metrics, tracing, verification_codes
 
-# Initialize DynamoDB lazily to avoid issues during testing
-_dynamodb = None
-_table = None
+logger = log.get_logger(__name__)
 
 
-def get_dynamodb_resource():
-    """Get DynamoDB resource with lazy initialization"""
-    global _dynamodb
-    if _dynamodb is None:
-        _dynamodb = boto3.resource("dynamodb")
-    return _dynamodb
+# Sized to Cognito's trigger budget (see fresa_common.clients)
+def get_dynamodb_client():
+    """Get DynamoDB client sized to the current deadline"""
+    return clients.get_client("dynamodb", max_attempts=2, max_timeout_s=2)
 
 
-def get_table():
-    """Get DynamoDB table with lazy initialization"""
-    global _table
-    if _table is None:
-        dynamodb = get_dynamodb_resource()
-        _table = dynamodb.Table(os.environ["DYNAMODB_TABLE_NAME"])
-    return _table
+def get_verification_codes():
+    return verification_codes.VerificationCodeRepository(
+        get_dynamodb_client(), os.environ["DYNAMODB_TABLE_NAME"]
+    )
 
 
+@metrics.instrument_handler
+@tracing.trace_handler
+@log.inject_request_context
+@deadline.with_deadline(budget_ms=deadline.COGNITO_TRIGGER_BUDGET_MS)
 def lambda_handler(event, context):
     try:
         # Validate trigger source
@@ -42,9 +36,8 @@ def lambda_handler(event, context):
             raise ValueError("Email not found in user attributes")
 
         # Retrieve code from DynamoDB
-        table = get_table()
-        item = table.get_item(Key={"email": email}).get("Item", {})
-        code = item.get("code", "")
+        item = get_verification_codes().get(email, verification_codes.CHALLENGE)
+        code = item.code if item is not None else None
 
         if not code:
             raise ValueError(f"No code found for {email}")
@@ -60,7 +53,7 @@ def lambda_handler(event, context):
         return event
 
     except Exception as e:
-        logger.error(f"Error: {str(e)}")
+        logger.error("Error: %s", e)
         return {
             "response": {
                 "publicChallengeParameters": {},
@@ -10,6 +10,18 @@ import os
 
 # Add the function directory to the path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add the shared layer (deployed under /opt/python) to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "..",
+        "..",
+        "Layers",
+        "common",
+        "python",
+    ),
+)
 
 # Import the function module
 import createAuthChallenge
@@ -1,3 +1,8 @@
+from fresa_common import metrics, tracing
+
+
+@metrics.instrument_handler
+@tracing.trace_handler
 def lambda_handler(event, context):
     try:
         # Validate event structure
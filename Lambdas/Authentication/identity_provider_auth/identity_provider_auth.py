@@ -1,34 +1,49 @@
 import json
-import boto3
 import os
 import urllib3
-import logging
 import secrets
 import string
 from botocore.exceptions import ClientError
 
-# Configure logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-# Initialize AWS services lazily to avoid issues during testing
-_cognito = None
+from fresa_common import (
+    clients,
+    deadline,
+    log,
+    metrics,
+    middleware,
+    responses,
+    tracing,
+    user_cache,
+    validation,
+)
+
+logger = log.get_logger(__name__)
+
+# Initialize the HTTP pool lazily to avoid issues during testing
 _http = None
 
+# Upper bound for a provider token check; capped by the time left
+HTTP_TIMEOUT_S = 5
+
+RESPONSE_HEADERS = responses.cors_headers("OPTIONS,POST")
+
+# Checked before the provider is asked about the token
+SOCIAL_SIGN_IN_REQUEST = validation.Schema(
+    path={"provider": validation.one_of("google", "facebook")},
+    body={"accessToken": validation.string(aliases=("idToken",), max_length=8192)},
+)
+
 
 def get_cognito_client():
-    """Get Cognito client with lazy initialization"""
-    global _cognito
-    if _cognito is None:
-        _cognito = boto3.client("cognito-idp")
-    return _cognito
+    """Get Cognito client sized to the time left in the invocation"""
+    return clients.get_client("cognito-idp")
 
 
 def get_http_pool():
     """Get HTTP pool with lazy initialization"""
     global _http
     if _http is None:
-        _http = urllib3.PoolManager()
+        _http = tracing.instrument_http(metrics.instrument_http(urllib3.PoolManager()))
     return _http
 
 
@@ -47,7 +62,7 @@ def verify_google_token(id_token_string):
     try:
         url = f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token_string}"
         http = get_http_pool()
-        response = http.request("GET", url)
+        response = http.request("GET", url, timeout=deadline.timeout_s(HTTP_TIMEOUT_S))
         if response.status != 200:
             return {"success": False, "error": "Invalid Google token"}
         token_info = json.loads(response.data.decode("utf-8"))
@@ -66,7 +81,7 @@ def verify_google_token(id_token_string):
             "picture": token_info.get("picture", ""),
         }
     except Exception as e:
-        logger.error(f"Google verification failed: {str(e)}")
+        logger.error("Google verification failed: %s", e)
         return {"success": False, "error": f"Google verification failed: {str(e)}"}
 
 
@@ -76,7 +91,7 @@ def verify_facebook_token(access_token):
     try:
         url = f"https://graph.facebook.com/me?fields=id,email,first_name,last_name,picture&access_token={access_token}"
         http = get_http_pool()
-        response = http.request("GET", url)
+        response = http.request("GET", url, timeout=deadline.timeout_s(HTTP_TIMEOUT_S))
         if response.status != 200:
             return {"success": False, "error": "Invalid Facebook token"}
         user_data = json.loads(response.data.decode("utf-8"))
@@ -92,7 +107,7 @@ def verify_facebook_token(access_token):
             "picture": user_data.get("picture", {}).get("data", {}).get("url", ""),
         }
     except Exception as e:
-        logger.error(f"Facebook verification failed: {str(e)}")
+        logger.error("Facebook verification failed: %s", e)
         return {"success": False, "error": f"Facebook verification failed: {str(e)}"}
 
 
@@ -129,7 +144,7 @@ def generate_random_password(length=16):
 
 def authenticate_social_user_with_cognito(email):
     """Authenticate social user by setting a temporary password and authenticating"""
-    logger.info(f"Authenticating existing social user: {email}")
+    logger.info("Authenticating existing social user: %s", email)
     try:
         # Generate a temporary password for authentication
         temp_password = generate_random_password()
@@ -149,137 +164,92 @@ def authenticate_social_user_with_cognito(email):
             ClientId=get_client_id(),
             AuthFlow="ADMIN_NO_SRP_AUTH",
             AuthParameters={"USERNAME": email, "PASSWORD": temp_password},
+            ClientMetadata=tracing.client_metadata(),
         )
 
-        logger.info(f"Successfully authenticated social user: {email}")
+        logger.info("Successfully authenticated social user: %s", email)
         return {"success": True, "tokens": auth_response["AuthenticationResult"]}
 
     except ClientError as e:
-        logger.error(f"Authentication failed for {email}: {str(e)}")
+        logger.error("Authentication failed for %s: %s", email, e)
         return {"success": False, "error": f"Authentication failed: {str(e)}"}
 
 
+@middleware.api_handler(schema=SOCIAL_SIGN_IN_REQUEST, headers=RESPONSE_HEADERS)
 def lambda_handler(event, context):
-    headers = {
-        "Content-Type": "application/json",
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Headers": "Content-Type",
-        "Access-Control-Allow-Methods": "OPTIONS,POST",
-    }
-
-    try:
-        provider = event.get("pathParameters", {}).get("provider", "").lower()
-        if provider not in ["google", "facebook"]:
-            return {
-                "statusCode": 400,
-                "headers": headers,
-                "body": json.dumps({"error": "Invalid provider."}),
-            }
-
-        body = json.loads(event["body"])
-        token = body.get("accessToken") or body.get("idToken")
-        if not token:
-            return {
-                "statusCode": 400,
-                "headers": headers,
-                "body": json.dumps({"error": "Missing access/id token."}),
-            }
-
-        user_info = {}
-        if provider == "google":
-            user_info = verify_google_token(token)
-        elif provider == "facebook":
-            user_info = verify_facebook_token(token)
-
-        if not user_info.get("success"):
-            return {
-                "statusCode": 401,
-                "headers": headers,
-                "body": json.dumps(
-                    {"error": user_info.get("error", "Token verification failed.")}
-                ),
-            }
+    request = validation.current()
+    provider = request.path["provider"]
+    token = request.body["accessToken"]
+
+    user_info = {}
+    if provider == "google":
+        user_info = verify_google_token(token)
+    elif provider == "facebook":
+        user_info = verify_facebook_token(token)
+
+    if not user_info.get("success"):
+        return responses.error(
+            401, user_info.get("error", "Token verification failed."), RESPONSE_HEADERS
+        )
 
-        email = user_info["email"]
-        if not email:
-            return {
-                "statusCode": 400,
-                "headers": headers,
-                "body": json.dumps({"error": "Email not provided by social provider."}),
-            }
+    email = user_info["email"]
+    if not email:
+        return responses.error(
+            400, "Email not provided by social provider.", RESPONSE_HEADERS
+        )
 
-        # Check if the user exists in Cognito
-        try:
-            cognito = get_cognito_client()
-            user_details = cognito.admin_get_user(
-                UserPoolId=get_user_pool_id(), Username=email
-            )
-            logger.info(f"User {email} found in Cognito. Authenticating...")
-
-            # User exists, so authenticate and return tokens
-            auth_result = authenticate_social_user_with_cognito(email)
-            if not auth_result.get("success"):
-                return {
-                    "statusCode": 500,
-                    "headers": headers,
-                    "body": json.dumps({"error": auth_result.get("error")}),
-                }
-
-            # Build user info from Cognito attributes
-            user_attributes = {
-                attr["Name"]: attr["Value"] for attr in user_details["UserAttributes"]
-            }
+    # Check if the user exists in Cognito (cached per container); other
+    # Cognito errors are answered by the middleware
+    user_details = user_cache.get_user(get_cognito_client(), get_user_pool_id(), email)
+    if user_details is None:
+        logger.info(
+            "User %s not found. Signaling client to proceed with creation.",
+            email,
+        )
+        # User does not exist, return a 404 with user details for the next step
+        return responses.respond(
+            404,
+            {
+                "success": False,
+                "message": "User not found. Proceed to create user.",
+                "userInfo": {
+                    "email": email,
+                    "firstName": user_info.get("first_name"),
+                    "lastName": user_info.get("last_name"),
+                    "picture": user_info.get("picture"),
+                    "provider": provider,
+                },
+            },
+            RESPONSE_HEADERS,
+        )
+    logger.info("User %s found in Cognito. Authenticating...", email)
 
-            return {
-                "statusCode": 200,
-                "headers": headers,
-                "body": json.dumps(
-                    {
-                        "success": True,
-                        "isNewUser": False,
-                        "tokens": auth_result["tokens"],
-                        "userInfo": {
-                            "email": email,
-                            "firstName": user_attributes.get("given_name", ""),
-                            "lastName": user_attributes.get("family_name", ""),
-                            "name": f"{user_attributes.get('given_name', '')} {user_attributes.get('family_name', '')}".strip(),
-                            "picture": user_attributes.get("picture", ""),
-                            "provider": provider,
-                        },
-                    }
-                ),
-            }
+    # User exists, so authenticate and return tokens
+    auth_result = authenticate_social_user_with_cognito(email)
+    if not auth_result.get("success"):
+        return responses.error(500, auth_result.get("error"), RESPONSE_HEADERS)
 
-        except ClientError as e:
-            if e.response["Error"]["Code"] == "UserNotFoundException":
-                logger.info(
-                    f"User {email} not found. Signaling client to proceed with creation."
-                )
-                # User does not exist, return a 404 with user details for the next step
-                return {
-                    "statusCode": 404,
-                    "headers": headers,
-                    "body": json.dumps(
-                        {
-                            "success": False,
-                            "message": "User not found. Proceed to create user.",
-                            "userInfo": {
-                                "email": email,
-                                "firstName": user_info.get("first_name"),
-                                "lastName": user_info.get("last_name"),
-                                "picture": user_info.get("picture"),
-                                "provider": provider,
-                            },
-                        }
-                    ),
-                }
-            else:
-                raise e  # Re-raise other Cognito errors
+    # Build user info from Cognito attributes
+    user_attributes = {
+        attr["Name"]: attr["Value"] for attr in user_details["UserAttributes"]
+    }
+    first_name = user_attributes.get("given_name", "")
+    last_name = user_attributes.get("family_name", "")
 
-    except Exception as e:
-        logger.error(f"An unexpected error occurred: {str(e)}")
-        return {
-            "statusCode": 500,
-            "headers": headers,
-            "body": json.dumps({"error": f"Internal server error: {str(e)}"}),
-        }
+    return responses.respond(
+        200,
+        {
+            "success": True,
+            "isNewUser": False,
+            "tokens": auth_result["tokens"],
+            "userInfo": {
+                "email": email,
+                "firstName": first_name,
+                "lastName": last_name,
+                "name": f"{first_name} {last_name}".strip(),
+                "picture": user_attributes.get("picture", ""),
+                "provider": provider,
+            },
+        },
+        RESPONSE_HEADERS,
+    )
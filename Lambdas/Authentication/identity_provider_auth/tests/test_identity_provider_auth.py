@@ -10,9 +10,22 @@ import os
 
 # Add the function directory to the path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add the shared layer (deployed under /opt/python) to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "..",
+        "..",
+        "Layers",
+        "common",
+        "python",
+    ),
+)
 
 # Import the function module
 import identity_provider_auth
+from fresa_common import user_cache
 
 
 class TestIdentityproviderauth(unittest.TestCase):
@@ -20,6 +33,8 @@ class TestIdentityproviderauth(unittest.TestCase):
 
     def setUp(self):
         """Set up test fixtures"""
+        # Drop Cognito users cached by earlier tests' mocks
+        user_cache.cache().clear()
         # API Gateway event structure for identity_provider_auth
         self.test_event = {
             "httpMethod": "POST",
@@ -1,32 +1,37 @@
 # Test comment for branch verification - fixed directory structure
 import json
-import boto3
 import os
 import random
 import time
-from datetime import datetime, timedelta, timezone
-
-# Initialize AWS clients lazily to avoid issues during testing
-_dynamodb_client = None
-_ses_client = None
-
-
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from fresa_common import (
+    clients,
+    deadline,
+    idempotency,
+    log,
+    metrics,
+    middleware,
+    responses,
+    send_limits,
+    ses_quota,
+    validation,
+    verification_codes,
+)
+
+logger = log.get_logger(__name__)
+
+
+# Clients are sized to the time left in the invocation (see fresa_common.clients)
 def get_dynamodb_client():
-    """Get DynamoDB client with lazy initialization"""
-    global _dynamodb_client
-    if _dynamodb_client is None:
-        aws_region = os.environ.get("AWS_REGION", "us-east-1")
-        _dynamodb_client = boto3.client("dynamodb", region_name=aws_region)
-    return _dynamodb_client
+    """Get DynamoDB client sized to the current deadline"""
+    return clients.get_client("dynamodb")
 
 
 def get_ses_client():
-    """Get SES client with lazy initialization"""
-    global _ses_client
-    if _ses_client is None:
-        aws_region = os.environ.get("AWS_REGION", "us-east-1")
-        _ses_client = boto3.client("ses", region_name=aws_region)
-    return _ses_client
+    """Get SES client sized to the current deadline"""
+    return clients.get_client("ses")
 
 
 # Lazy loading of environment variables to avoid KeyError during testing
@@ -42,7 +47,54 @@ def get_ses_verification_template_name():
     return os.environ.get("SES_VERIFICATION_TEMPLATE_NAME")
 
 
-CODE_EXPIRATION_MINUTES = 10
+def get_verification_codes():
+    return verification_codes.VerificationCodeRepository(
+        get_dynamodb_client(), get_dynamodb_table_name()
+    )
+
+
+def get_send_limiter():
+    # Per-IP and global counters share the VerificationCodes table
+    return send_limits.SendLimiter(get_dynamodb_client(), get_dynamodb_table_name())
+
+
+def get_idempotency_store():
+    # Retried requests are recognised through records in the same table
+    return idempotency.IdempotencyStore(
+        get_dynamodb_client(), get_dynamodb_table_name()
+    )
+
+
+def get_send_rate_governor():
+    # Every sender's per-second SES slots are counted in the same table
+    return ses_quota.SendRateGovernor(
+        get_dynamodb_client(), get_dynamodb_table_name(), get_ses_client()
+    )
+
+
+def get_send_code_queue_url():
+    return os.environ.get("SEND_CODE_QUEUE_URL")
+
+
+# Checked before any limit is read, so a request without an address costs no
+# AWS call
+SEND_CODE_REQUEST = validation.Schema(query={"email": validation.email()})
+# The body of a queued request (see parse_send_request)
+QUEUED_SEND_CODE_REQUEST = validation.Schema(
+    body={
+        "email": validation.email(),
+        "sourceIp": validation.string(required=False, max_length=64),
+    }
+)
+
+# Time needed to store the code and send it; without it the request fails
+# before the code counts against the user's rate limit
+SEND_BUDGET_MS = 1000
+
+# Queued (SQS) batches: writes and sends run on this many threads, each send
+# in the SES send slot reserved for it (see fresa_common.ses_quota)
+BATCH_WORKERS = 8
+
 
 # Cooldown configurations
 RATE_LIMIT_CONFIG = {
@@ -72,42 +124,41 @@ def validate_environment():
         )
 
 
-def handle_rate_limiting(email):
-    """Implement rate limiting logic with cooldown periods"""
-    current_time = int(datetime.now(timezone.utc).timestamp())
-
+def load_rate_limit_state(email):
+    """Read the request history the rate limit decisions are based on"""
+    codes = get_verification_codes()
     try:
-        dynamodb_client = get_dynamodb_client()
-        response = dynamodb_client.get_item(
-            TableName=get_dynamodb_table_name(),
-            Key={"email": {"S": email}},
-            ProjectionExpression="requestHistory, lastRequestTime, postBurstCodeSent",
-        )
-    except dynamodb_client.exceptions.ClientError as e:
-        print(f"DynamoDB Get Error: {str(e)}")
+        return codes.get(email, verification_codes.RATE_LIMIT)
+    except codes.client.exceptions.ClientError as e:
+        logger.error("DynamoDB Get Error: %s", e)
         raise
 
-    request_history = []
-    last_request_time = None
-    post_burst_code_sent = False
 
-    if "Item" in response:
-        # Get all requests within the reset threshold
-        request_history = [
-            int(item["N"])
-            for item in response["Item"].get("requestHistory", {}).get("L", [])
-            if current_time - int(item["N"]) < RATE_LIMIT_CONFIG["RESET_THRESHOLD"]
-        ]
+def recent_requests_of(item, current_time):
+    """Request times within the reset threshold"""
+    if item is None:
+        return []
+    return [
+        request_time
+        for request_time in item.request_history or []
+        if current_time - request_time < RATE_LIMIT_CONFIG["RESET_THRESHOLD"]
+    ]
 
-        # Get the last request time
-        if "lastRequestTime" in response["Item"]:
-            last_request_time = int(response["Item"]["lastRequestTime"]["N"])
 
-        # Check if we've already sent a code after the burst period
-        if "postBurstCodeSent" in response["Item"]:
-            post_burst_code_sent = response["Item"]["postBurstCodeSent"].get(
-                "BOOL", False
-            )
+# Passed when the caller has not read the item yet; None means no item
+NOT_LOADED = object()
+
+
+def handle_rate_limiting(email, item=NOT_LOADED):
+    """Implement rate limiting logic with cooldown periods"""
+    current_time = int(datetime.now(timezone.utc).timestamp())
+    if item is NOT_LOADED:
+        item = load_rate_limit_state(email)
+
+    # Get all requests within the reset threshold
+    request_history = recent_requests_of(item, current_time)
+    # Check if we've already sent a code after the burst period
+    post_burst_code_sent = bool(item and item.post_burst_code_sent)
 
     # Sort request history to ensure chronological order
     request_history.sort()
@@ -131,15 +182,14 @@ def handle_rate_limiting(email):
             remaining_burst_time = (
                 RATE_LIMIT_CONFIG["INITIAL_BURST_WINDOW"] - time_since_first_in_burst
             )
-            return {
-                "statusCode": 429,
-                "body": json.dumps(
-                    {
-                        "success": False,
-                        "message": f"Rate limit exceeded. Please try again in {remaining_burst_time} seconds",
-                    }
-                ),
-            }
+            metrics.set_property("rateLimitDecision", "burst_window")
+            return responses.respond(
+                429,
+                {
+                    "success": False,
+                    "message": f"Rate limit exceeded. Please try again in {remaining_burst_time} seconds",
+                },
+            )
         else:
             # Burst window has passed - now we need to check if we've already sent a post-burst code
             if not post_burst_code_sent:
@@ -152,63 +202,86 @@ def handle_rate_limiting(email):
                     remaining_cooldown = (
                         RATE_LIMIT_CONFIG["SUBSEQUENT_COOLDOWN"] - time_since_last
                     )
-                    return {
-                        "statusCode": 429,
-                        "body": json.dumps(
-                            {
-                                "success": False,
-                                "message": f"Too many requests. Please try again in {remaining_cooldown} seconds",
-                            }
-                        ),
-                    }
+                    metrics.set_property("rateLimitDecision", "cooldown")
+                    return responses.respond(
+                        429,
+                        {
+                            "success": False,
+                            "message": f"Too many requests. Please try again in {remaining_cooldown} seconds",
+                        },
+                    )
 
     return None
 
 
-def update_dynamo_record(email, code, is_post_burst_code=False):
-    """Update DynamoDB with new verification code and request history"""
-    current_time = datetime.now(timezone.utc)
-    expiration_time = current_time + timedelta(minutes=CODE_EXPIRATION_MINUTES)
-
-    # Base update expression
-    update_expression = """
-        SET #code = :code,
-            #ttl = :ttl,
-            createdAt = :createdAt,
-            lastRequestTime = :lastRequestTime,
-            requestHistory = list_append(if_not_exists(requestHistory, :emptyList), :newRequest)
-    """
+def send_limit_response(tier, retry_after):
+    """429 for a per-IP or global send limit"""
+    metrics.set_property("rateLimitDecision", f"{tier}_limit")
+    return responses.respond(
+        429,
+        {
+            "success": False,
+            "message": f"Too many requests. Please try again in {retry_after} seconds",
+        },
+    )
 
-    expression_attribute_names = {"#code": "code", "#ttl": "ttl"}
 
-    expression_attribute_values = {
-        ":code": {"S": code},
-        ":ttl": {"N": str(int(expiration_time.timestamp()))},
-        ":createdAt": {"S": current_time.isoformat()},
-        ":lastRequestTime": {"N": str(int(current_time.timestamp()))},
-        ":newRequest": {"L": [{"N": str(int(current_time.timestamp()))}]},
-        ":emptyList": {"L": []},
-    }
+def defer_send(email, source_ip):
+    """Queue a send the SES send rate has no room for right now
+
+    recieveEmail picks it up from the queue again and applies every limit
+    then. Without a queue the caller is asked to retry.
+    """
+    queue_url = get_send_code_queue_url()
+    if queue_url:
+        try:
+            clients.get_client("sqs").send_message(
+                QueueUrl=queue_url,
+                MessageBody=json.dumps({"email": email, "sourceIp": source_ip}),
+            )
+            metrics.set_property("rateLimitDecision", "deferred")
+            return responses.respond(
+                202,
+                {
+                    "success": True,
+                    "message": f"Verification code will be sent to {email} shortly",
+                },
+            )
+        except Exception as e:
+            logger.error("Could not queue the send: %s", e, email=email)
+    return responses.respond(
+        503,
+        {"success": False, "message": "Service busy, please try again."},
+        extra_headers={"Retry-After": "1"},
+    )
 
-    # If this is a post-burst code, mark it as sent
-    if is_post_burst_code:
-        update_expression += ", postBurstCodeSent = :postBurstCodeSent"
-        expression_attribute_values[":postBurstCodeSent"] = {"BOOL": True}
 
+def update_dynamo_record(email, code, is_post_burst_code=False):
+    """Update DynamoDB with new verification code and request history"""
+    current_time = int(datetime.now(timezone.utc).timestamp())
+    codes = get_verification_codes()
     try:
-        dynamodb_client = get_dynamodb_client()
-        dynamodb_client.update_item(
-            TableName=get_dynamodb_table_name(),
-            Key={"email": {"S": email}},
-            UpdateExpression=update_expression,
-            ExpressionAttributeNames=expression_attribute_names,
-            ExpressionAttributeValues=expression_attribute_values,
+        # Keep the item until its request history no longer affects the limit
+        codes.issue(
+            email,
+            code,
+            now=current_time,
+            post_burst=is_post_burst_code,
+            retain_s=RATE_LIMIT_CONFIG["RESET_THRESHOLD"],
         )
-    except dynamodb_client.exceptions.ClientError as e:
-        print(f"DynamoDB Update Error: {str(e)}")
+    except codes.client.exceptions.ClientError as e:
+        logger.error("DynamoDB Update Error: %s", e)
         raise
 
 
+def verification_template_data(code):
+    """Data for the verification template's placeholders"""
+    return {
+        "verificationCode": code,
+        "expirationMinutes": verification_codes.code_expiration_minutes(),
+    }
+
+
 def send_verification_email(email, code):
     """Send templated email using predefined SES template"""
     try:
@@ -217,44 +290,30 @@ def send_verification_email(email, code):
             Source=get_ses_from_email_address(),
             Destination={"ToAddresses": [email]},
             Template=get_ses_verification_template_name(),
-            TemplateData=json.dumps(
-                {"verificationCode": code, "expirationMinutes": CODE_EXPIRATION_MINUTES}
-            ),
+            TemplateData=json.dumps(verification_template_data(code)),
         )
     except ses_client.exceptions.ClientError as e:
-        print(f"SES Send Error: {str(e)}")
+        logger.error("SES Send Error: %s", e)
         raise
 
 
-def determine_if_post_burst_code(email):
+def determine_if_post_burst_code(email, item=None):
     """Determine if this code is being sent after the burst period"""
     current_time = int(datetime.now(timezone.utc).timestamp())
 
-    try:
-        dynamodb_client = get_dynamodb_client()
-        response = dynamodb_client.get_item(
-            TableName=get_dynamodb_table_name(),
-            Key={"email": {"S": email}},
-            ProjectionExpression="requestHistory, postBurstCodeSent",
-        )
-    except dynamodb_client.exceptions.ClientError as e:
-        print(f"DynamoDB Get Error in determine_if_post_burst_code: {str(e)}")
-        return False
-
-    if "Item" not in response:
-        return False
+    if item is None:
+        try:
+            item = load_rate_limit_state(email)
+        except Exception:
+            return False
+        if item is None:
+            return False
 
     # Get request history within reset threshold
-    request_history = [
-        int(item["N"])
-        for item in response["Item"].get("requestHistory", {}).get("L", [])
-        if current_time - int(item["N"]) < RATE_LIMIT_CONFIG["RESET_THRESHOLD"]
-    ]
+    request_history = recent_requests_of(item, current_time)
 
     # Check if we've already marked post-burst code as sent
-    post_burst_code_sent = (
-        response["Item"].get("postBurstCodeSent", {}).get("BOOL", False)
-    )
+    post_burst_code_sent = bool(item.post_burst_code_sent)
 
     # If we have reached the burst count, burst window has passed, and we haven't sent post-burst code yet
     if (
@@ -271,47 +330,239 @@ def determine_if_post_burst_code(email):
     return False
 
 
-def lambda_handler(event, context):
+# Queued send-code requests (SQS batches)
+
+
+def parse_send_request(record):
+    """(email, source IP key) from an SQS record, or None if malformed
+
+    The body is {"email": ..., "sourceIp": ...}; sourceIp is the original
+    caller's address, when the producer forwards it.
+    """
     try:
+        body = QUEUED_SEND_CODE_REQUEST.validate(record).body
+    except validation.ValidationError:
+        return None
+    return body["email"], send_limits.normalize_ip(body.get("sourceIp"))
+
+
+def issue_codes(sends):
+    """Store a new code per email in parallel; returns {email: code} stored"""
+
+    def issue(send):
+        email, is_post_burst_code = send
+        code = generate_verification_code()
+        update_dynamo_record(email, code, is_post_burst_code)
+        return code
+
+    stored = {}
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+        futures = {pool.submit(issue, send): send[0] for send in sends}
+        for future, email in futures.items():
+            try:
+                stored[email] = future.result()
+            except Exception as e:
+                logger.error("Could not store code: %s", e, email=email)
+    return stored
+
+
+def reserve_sends(emails):
+    """Reserve an SES send slot per email; returns {email: send time}
+
+    Emails without a slot in the time left are left out, to be deferred.
+    """
+    governor = get_send_rate_governor()
+    send_at = {}
+    not_before = None
+    for email in emails:
+        try:
+            not_before = governor.reserve(
+                max_wait_s=ses_quota.wait_budget_s(SEND_BUDGET_MS),
+                not_before=not_before,
+            )
+        except ses_quota.SendRateExceeded:
+            break
+        send_at[email] = not_before
+    return send_at
+
+
+def send_codes(codes, send_at):
+    """Send each stored code in its reserved slot; returns emails sent"""
+    sent = set()
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+        futures = {}
+        for email in sorted(codes, key=send_at.get):
+            delay_s = send_at[email] - time.time()
+            if delay_s > 0:
+                time.sleep(delay_s)
+            futures[pool.submit(send_verification_email, email, codes[email])] = email
+        for future, email in futures.items():
+            try:
+                future.result()
+                sent.add(email)
+            except Exception as e:
+                logger.error("Could not send code: %s", e, email=email)
+    return sent
+
+
+def handle_send_batch(records):
+    """Send codes for a batch of queued requests
+
+    Records for the same email share one code. Requests refused by the
+    per-email or per-IP limit are dropped like a 429 would be; requests over
+    the global limit, or that failed, are returned as batchItemFailures so
+    SQS delivers them again later.
+    """
+    current_time = int(datetime.now(timezone.utc).timestamp())
+    requests = {}
+    for record in records:
+        parsed = parse_send_request(record)
+        if parsed is None:
+            # Retrying cannot fix the message; let it go
+            logger.warning(
+                "Dropping malformed request", messageId=record.get("messageId")
+            )
+            continue
+        email, ip = parsed
+        group = requests.setdefault(email, {"ip": ip, "messageIds": []})
+        group["messageIds"].append(record["messageId"])
+
+    limiter = get_send_limiter()
+    items, ip_usage, global_usage = limiter.read_batch(
+        list(requests),
+        [group["ip"] for group in requests.values()],
+        verification_codes.RATE_LIMIT,
+        current_time,
+    )
+
+    sends = []
+    deferred = []
+    ip_counts = {}
+    rate_limited = 0
+    for email, group in requests.items():
+        ip = group["ip"]
+        state = items[email]
+        tier = limiter.exceeded(
+            send_limits.Usage(
+                ip_usage.get(ip, 0) + ip_counts.get(ip, 0), global_usage + len(sends)
+            )
+        )
+        if tier == "global":
+            deferred.append(email)
+        elif tier or handle_rate_limiting(email, state):
+            rate_limited += 1
+            logger.info("Rate limited", email=email, sourceIp=ip)
+        else:
+            sends.append(
+                (email, determine_if_post_burst_code(email, state) if state else False)
+            )
+            ip_counts[ip] = ip_counts.get(ip, 0) + 1
+
+    if sends and not deadline.has_time_for(SEND_BUDGET_MS):
+        logger.warning("Deferring sends, deadline near", count=len(sends))
+        deferred.extend(email for email, _ in sends)
+        sends = []
+
+    if sends:
+        # Codes are only issued for sends that got an SES slot; the rest come
+        # back later instead of counting against the user's rate limit
+        send_at = reserve_sends([email for email, _ in sends])
+        if len(send_at) < len(sends):
+            logger.warning(
+                "Deferring sends, SES send rate reached",
+                count=len(sends) - len(send_at),
+            )
+        deferred.extend(email for email, _ in sends if email not in send_at)
+        sends = [send for send in sends if send[0] in send_at]
+        ip_counts = {}
+        for email, _ in sends:
+            ip = requests[email]["ip"]
+            ip_counts[ip] = ip_counts.get(ip, 0) + 1
+
+    sent = set()
+    if sends:
+        # Counted before sending, so failed sends still count against abuse
+        for ip, count in ip_counts.items():
+            limiter.record(ip, current_time, count=count)
+        sent = send_codes(issue_codes(sends), send_at)
+
+    failed = deferred + [email for email, _ in sends if email not in sent]
+    metrics.put_metric("BatchSize", len(records))
+    metrics.put_metric("RateLimited", rate_limited)
+    metrics.put_metric("CodesSent", len(sent))
+    metrics.put_metric(
+        "BatchItemFailures", sum(len(requests[email]["messageIds"]) for email in failed)
+    )
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_id}
+            for email in failed
+            for message_id in requests[email]["messageIds"]
+        ]
+    }
+
+
+@middleware.api_handler(
+    schema=SEND_CODE_REQUEST, idempotency_store=get_idempotency_store
+)
+def lambda_handler(event, context):
+    if "Records" in event:
+        # Queued requests: failures are reported per record, not as a status
         validate_environment()
-        email = (event.get("queryStringParameters") or {}).get("email")
-
-        if not email:
-            return {
-                "statusCode": 400,
-                "body": json.dumps(
-                    {"success": False, "message": "Email parameter is required"}
-                ),
-            }
-
-        # Convert email to lowercase for consistent processing
-        email = email.lower().strip()
-
-        rate_limit_response = handle_rate_limiting(email)
-        if rate_limit_response:
-            return rate_limit_response
-
-        # Determine if this is a post-burst code
-        is_post_burst_code = determine_if_post_burst_code(email)
-
-        verification_code = generate_verification_code()
-        update_dynamo_record(email, verification_code, is_post_burst_code)
-        send_verification_email(email, verification_code)
-
-        return {
-            "statusCode": 200,
-            "body": json.dumps(
-                {"success": True, "message": f"Verification code sent to {email}"}
-            ),
-        }
-    except Exception as e:
-        print(f"Critical Error: {str(e)}")
-        return {
-            "statusCode": 500,
-            "body": json.dumps(
-                {
-                    "success": False,
-                    "message": "Internal server error. Please try again later.",
-                }
-            ),
-        }
+        return handle_send_batch(event["Records"])
+
+    validate_environment()
+    # Lowercased and stripped by the schema
+    email = validation.current().query["email"]
+
+    # One read serves the per-email, per-IP and global limits and the
+    # post-burst decision
+    current_time = int(datetime.now(timezone.utc).timestamp())
+    limiter = get_send_limiter()
+    source_ip = send_limits.source_ip(event)
+    rate_limit_state, usage = limiter.read(
+        email, source_ip, verification_codes.RATE_LIMIT, current_time
+    )
+    rate_limit_response = handle_rate_limiting(email, rate_limit_state)
+    if not rate_limit_response:
+        tier = limiter.exceeded(usage)
+        if tier:
+            rate_limit_response = send_limit_response(
+                tier, limiter.retry_after(tier, current_time)
+            )
+    metrics.put_metric("RateLimited", 1 if rate_limit_response else 0)
+    if rate_limit_response:
+        logger.info("Rate limited", email=email, sourceIp=source_ip)
+        return rate_limit_response
+
+    # Determine if this is a post-burst code
+    is_post_burst_code = rate_limit_state is not None and (
+        determine_if_post_burst_code(email, rate_limit_state)
+    )
+    metrics.set_property(
+        "rateLimitDecision", "post_burst" if is_post_burst_code else "allowed"
+    )
+    metrics.put_metric("PostBurstCode", 1 if is_post_burst_code else 0)
+
+    if deadline.current() is not None:
+        deadline.current().check("storing and sending the code", SEND_BUDGET_MS)
+
+    # Wait for an SES send slot, or hand the request to the queue while
+    # nothing has been stored or counted for it yet
+    try:
+        get_send_rate_governor().acquire(
+            max_wait_s=ses_quota.wait_budget_s(SEND_BUDGET_MS, ses_quota.max_wait_s())
+        )
+    except ses_quota.SendRateExceeded as e:
+        logger.warning("Deferring send: %s", e, email=email)
+        return defer_send(email, source_ip)
+
+    # Counted before sending, so failed sends still count against abuse
+    limiter.record(source_ip, current_time)
+    verification_code = generate_verification_code()
+    update_dynamo_record(email, verification_code, is_post_burst_code)
+    send_verification_email(email, verification_code)
+
+    return responses.respond(
+        200, {"success": True, "message": f"Verification code sent to {email}"}
+    )
@@ -11,9 +11,23 @@ from unittest.mock import patch, MagicMock
 
 # Add the function directory to the path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add the shared layer (deployed under /opt/python) to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "..",
+        "..",
+        "Layers",
+        "common",
+        "python",
+    ),
+)
 
 # Import the function module
 import recieveEmail
+from botocore.exceptions import ClientError
+from fresa_common import idempotency, ses_quota
 
 
 class TestRecieveemail(unittest.TestCase):
@@ -21,6 +35,9 @@ class TestRecieveemail(unittest.TestCase):
 
     def setUp(self):
         """Set up test fixtures"""
+        # Forget responses completed by earlier tests
+        idempotency.clear_cache()
+        ses_quota.reset()
         # Set required environment variables for testing
         os.environ["DYNAMODB_TABLE_NAME"] = "test-verification-codes"
         os.environ["SES_FROM_EMAIL_ADDRESS"] = "test@example.com"
@@ -49,8 +66,8 @@ class TestRecieveemail(unittest.TestCase):
         # Mock DynamoDB client
         mock_dynamodb = MagicMock()
         mock_dynamodb_client.return_value = mock_dynamodb
-        mock_dynamodb.get_item.return_value = {
-            "Item": {}
+        mock_dynamodb.batch_get_item.return_value = {
+            "Responses": {}
         }  # No existing rate limit data
 
         # Mock SES client
@@ -62,11 +79,175 @@ class TestRecieveemail(unittest.TestCase):
         self.assertEqual(result["statusCode"], 200)
         self.assertIn("message", json.loads(result["body"]))
 
-        # Verify that DynamoDB update_item was called
-        mock_dynamodb.update_item.assert_called_once()
+        # Verify that the code was stored and the send counted
+        written = [
+            call.kwargs["Key"]["email"]["S"]
+            for call in mock_dynamodb.update_item.call_args_list
+        ]
+        self.assertIn("test@example.com", written)
+        self.assertTrue(any(key.startswith("limit#global#") for key in written))
         # Verify that SES send_templated_email was called
         mock_ses.send_templated_email.assert_called_once()
 
+    @patch("recieveEmail.get_dynamodb_client")
+    @patch("recieveEmail.get_ses_client")
+    def test_recieveEmail_ip_limited(self, mock_ses_client, mock_dynamodb_client):
+        """Test a source IP over its hourly limit is refused before sending"""
+        mock_dynamodb = MagicMock()
+        mock_dynamodb_client.return_value = mock_dynamodb
+
+        def batch_get_item(RequestItems):
+            keys = RequestItems["test-verification-codes"]["Keys"]
+            counters = [
+                {"email": key["email"], "count": {"N": "20"}}
+                for key in keys
+                if key["email"]["S"].startswith("limit#ip#203.0.113.7#")
+            ]
+            return {"Responses": {"test-verification-codes": counters}}
+
+        mock_dynamodb.batch_get_item.side_effect = batch_get_item
+        mock_ses = MagicMock()
+        mock_ses_client.return_value = mock_ses
+
+        event = dict(
+            self.test_event, requestContext={"identity": {"sourceIp": "203.0.113.7"}}
+        )
+        result = recieveEmail.lambda_handler(event, self.test_context)
+
+        self.assertEqual(result["statusCode"], 429)
+        mock_dynamodb.batch_get_item.assert_called_once()
+        mock_dynamodb.update_item.assert_not_called()
+        mock_ses.send_templated_email.assert_not_called()
+
+    @patch("recieveEmail.get_dynamodb_client")
+    @patch("recieveEmail.get_ses_client")
+    def test_recieveEmail_retry_replayed(self, mock_ses_client, mock_dynamodb_client):
+        """Test a retried request gets the first response without a second email"""
+        mock_dynamodb = MagicMock()
+        mock_dynamodb_client.return_value = mock_dynamodb
+        mock_dynamodb.batch_get_item.return_value = {"Responses": {}}
+        mock_ses = MagicMock()
+        mock_ses_client.return_value = mock_ses
+
+        event = dict(self.test_event, headers={"Idempotency-Key": "retry-1"})
+        first = recieveEmail.lambda_handler(event, self.test_context)
+        retry = recieveEmail.lambda_handler(event, self.test_context)
+
+        self.assertEqual(retry["statusCode"], 200)
+        self.assertEqual(retry["body"], first["body"])
+        self.assertEqual(retry["headers"]["Idempotent-Replayed"], "true")
+        mock_ses.send_templated_email.assert_called_once()
+        # The claim and the completed response
+        self.assertEqual(mock_dynamodb.put_item.call_count, 2)
+
+    @patch.dict(
+        os.environ,
+        {"SES_MAX_WAIT_MS": "0", "SEND_CODE_QUEUE_URL": "https://sqs/send-codes"},
+    )
+    @patch("recieveEmail.clients.get_client")
+    @patch("recieveEmail.get_dynamodb_client")
+    @patch("recieveEmail.get_ses_client")
+    def test_recieveEmail_send_rate_deferred(
+        self, mock_ses_client, mock_dynamodb_client, mock_get_client
+    ):
+        """Test a send with no SES slot left is queued before anything is stored"""
+        mock_dynamodb = MagicMock()
+        mock_dynamodb_client.return_value = mock_dynamodb
+        mock_dynamodb.batch_get_item.return_value = {"Responses": {}}
+        mock_dynamodb.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"
+        )
+        mock_ses = MagicMock()
+        mock_ses.get_send_quota.return_value = {
+            "MaxSendRate": 14.0,
+            "Max24HourSend": 50000.0,
+            "SentLast24Hours": 100.0,
+        }
+        mock_ses_client.return_value = mock_ses
+        mock_sqs = MagicMock()
+        mock_get_client.return_value = mock_sqs
+
+        result = recieveEmail.lambda_handler(self.test_event, self.test_context)
+
+        self.assertEqual(result["statusCode"], 202)
+        queued = mock_sqs.send_message.call_args.kwargs
+        self.assertEqual(queued["QueueUrl"], "https://sqs/send-codes")
+        self.assertEqual(json.loads(queued["MessageBody"])["email"], "test@example.com")
+        # Only the slot was asked for: no code stored, nothing counted or sent
+        written = [
+            call.kwargs["Key"]["email"]["S"]
+            for call in mock_dynamodb.update_item.call_args_list
+        ]
+        self.assertEqual(len(written), 1)
+        self.assertTrue(written[0].startswith("limit#ses#"))
+        mock_ses.send_templated_email.assert_not_called()
+
+    @patch.dict(os.environ, {"SES_MAX_SEND_RATE": "1000"})
+    @patch("recieveEmail.get_dynamodb_client")
+    @patch("recieveEmail.get_ses_client")
+    def test_recieveEmail_sqs_batch(self, mock_ses_client, mock_dynamodb_client):
+        """Test a queued batch shares codes per email and reports failed records"""
+        mock_dynamodb = MagicMock()
+        mock_dynamodb_client.return_value = mock_dynamodb
+        mock_dynamodb.batch_get_item.return_value = {"Responses": {}}
+        mock_ses = MagicMock()
+        mock_ses_client.return_value = mock_ses
+
+        def send_templated_email(Destination, **kwargs):
+            if Destination["ToAddresses"] == ["b@example.com"]:
+                raise Exception("SES unavailable")
+            return {"MessageId": "sent"}
+
+        mock_ses.send_templated_email.side_effect = send_templated_email
+
+        def record(message_id, body):
+            return {"messageId": message_id, "body": body, "eventSource": "aws:sqs"}
+
+        event = {
+            "Records": [
+                record("m1", json.dumps({"email": "A@example.com"})),
+                record("m2", json.dumps({"email": "a@example.com"})),
+                record("m3", json.dumps({"email": "b@example.com"})),
+                record("m4", "not json"),
+            ]
+        }
+        result = recieveEmail.lambda_handler(event, self.test_context)
+
+        self.assertEqual(result, {"batchItemFailures": [{"itemIdentifier": "m3"}]})
+        mock_dynamodb.batch_get_item.assert_called_once()
+        self.assertEqual(mock_ses.send_templated_email.call_count, 2)
+
+    @patch("recieveEmail.get_dynamodb_client")
+    @patch("recieveEmail.get_ses_client")
+    def test_recieveEmail_sqs_global_limit(self, mock_ses_client, mock_dynamodb_client):
+        """Test requests over the global limit go back to the queue"""
+        mock_dynamodb = MagicMock()
+        mock_dynamodb_client.return_value = mock_dynamodb
+
+        def batch_get_item(RequestItems):
+            keys = RequestItems["test-verification-codes"]["Keys"]
+            counters = [
+                {"email": key["email"], "count": {"N": "1000"}}
+                for key in keys
+                if key["email"]["S"].startswith("limit#global#")
+            ]
+            return {"Responses": {"test-verification-codes": counters}}
+
+        mock_dynamodb.batch_get_item.side_effect = batch_get_item
+        mock_ses = MagicMock()
+        mock_ses_client.return_value = mock_ses
+
+        event = {
+            "Records": [
+                {"messageId": "m1", "body": json.dumps({"email": "a@example.com"})}
+            ]
+        }
+        result = recieveEmail.lambda_handler(event, self.test_context)
+
+        self.assertEqual(result, {"batchItemFailures": [{"itemIdentifier": "m1"}]})
+        mock_dynamodb.update_item.assert_not_called()
+        mock_ses.send_templated_email.assert_not_called()
+
     def test_recieveEmail_invalid_event(self):
         """Test recieveEmail with invalid event"""
         invalid_event = {}
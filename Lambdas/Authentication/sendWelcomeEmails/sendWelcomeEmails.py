@@ -0,0 +1,214 @@
+import json
+import os
+import time
+
+from fresa_common import (
+    clients,
+    deadline,
+    log,
+    metrics,
+    ses_quota,
+    tracing,
+    welcome_emails,
+)
+
+logger = log.get_logger(__name__)
+
+# SES accepts at most 50 destinations per SendBulkTemplatedEmail
+BULK_DESTINATIONS = 50
+# Time needed for one bulk call; later chunks go back to the queue without it
+SEND_BUDGET_MS = 1000
+# Welcome emails fill each second's SES send slot only this far, leaving the
+# rest to verification codes (see fresa_common.ses_quota)
+DEFAULT_WELCOME_EMAIL_RATE_SHARE = 0.5
+
+# Per-destination statuses worth another attempt; anything else (a rejected
+# or invalid address, for instance) would fail again
+RETRYABLE_STATUSES = {
+    "AccountThrottled",
+    "AccountDailyQuotaExceeded",
+    "TransientFailure",
+    "Failed",
+}
+
+# Fills in whatever a message's template data lacks
+DEFAULT_TEMPLATE_DATA = {
+    "name": "Usuario",
+    "greeting": "Bienvenido",
+    "excitement_message": "Estamos emocionados de tenerte con nosotros",
+    "design_description": "diseñado",
+}
+
+
+# Clients are sized to the time left in the invocation (see fresa_common.clients)
+def get_ses_client():
+    """Get SES client sized to the current deadline"""
+    return clients.get_client("ses")
+
+
+def get_dynamodb_client():
+    """Get DynamoDB client sized to the current deadline"""
+    return clients.get_client("dynamodb")
+
+
+def get_dynamodb_table_name():
+    return os.environ.get("DYNAMODB_TABLE_NAME")
+
+
+def get_send_rate_governor():
+    # SES send slots are shared with recieveEmail through the codes table
+    return ses_quota.SendRateGovernor(
+        get_dynamodb_client(), get_dynamodb_table_name(), get_ses_client()
+    )
+
+
+def get_sender_email():
+    return os.environ.get("SENDER_EMAIL", "admin@fresa.live")
+
+
+def get_welcome_email_rate_share():
+    return float(
+        os.environ.get("WELCOME_EMAIL_RATE_SHARE", DEFAULT_WELCOME_EMAIL_RATE_SHARE)
+    )
+
+
+def parse_welcome_message(record):
+    """(email, template data) from an SQS record, or None if malformed"""
+    try:
+        body = json.loads(record.get("body") or "")
+    except ValueError:
+        return None
+    if not isinstance(body, dict) or not isinstance(body.get("email"), str):
+        return None
+    template_data = body.get("templateData")
+    return body["email"], template_data if isinstance(template_data, dict) else {}
+
+
+def replacement_template_data(template_data):
+    """A destination's complete template data
+
+    Every placeholder gets a value, so a message missing one (social sign-ups
+    carry only name and greeting) still renders instead of failing in SES.
+    """
+    return dict(DEFAULT_TEMPLATE_DATA, **template_data)
+
+
+def send_bulk(messages):
+    """Send one chunk of (message id, email, template data)
+
+    Returns (emails sent, message ids to retry).
+    """
+    response = get_ses_client().send_bulk_templated_email(
+        Source=get_sender_email(),
+        Template=welcome_emails.TEMPLATE_NAME,
+        DefaultTemplateData=json.dumps(DEFAULT_TEMPLATE_DATA),
+        Destinations=[
+            {
+                "Destination": {"ToAddresses": [email]},
+                "ReplacementTemplateData": json.dumps(
+                    replacement_template_data(template_data)
+                ),
+            }
+            for _, email, template_data in messages
+        ],
+    )
+
+    sent = 0
+    retry = []
+    # Statuses come back in the order of the destinations
+    for (message_id, email, _), status in zip(messages, response["Status"]):
+        if status["Status"] == "Success":
+            sent += 1
+            continue
+        if status["Status"] in RETRYABLE_STATUSES:
+            retry.append(message_id)
+            logger.warning(
+                "Welcome email will be retried", email=email, status=status["Status"]
+            )
+        else:
+            metrics.increment_metric("WelcomeEmailsRejected")
+            logger.error(
+                "Welcome email rejected: %s",
+                status.get("Error"),
+                email=email,
+                status=status["Status"],
+            )
+    return sent, retry
+
+
+def reserve_chunk(governor, destinations, share, not_before):
+    """The time to send a chunk at, or None to leave it for a later batch"""
+    if not deadline.has_time_for(SEND_BUDGET_MS):
+        return None
+    try:
+        return governor.reserve(
+            destinations,
+            max_wait_s=ses_quota.wait_budget_s(SEND_BUDGET_MS),
+            share=share,
+            not_before=not_before,
+        )
+    except ses_quota.SendRateExceeded:
+        return None
+
+
+@metrics.instrument_handler
+@tracing.trace_handler
+@log.inject_request_context
+@deadline.with_deadline()
+def lambda_handler(event, context):
+    """Send queued welcome emails in bulk, reporting failed records to SQS"""
+    messages = []
+    seen = set()
+    for record in event.get("Records") or []:
+        parsed = parse_welcome_message(record)
+        if parsed is None:
+            # Retrying cannot fix the message; let it go
+            logger.warning(
+                "Dropping malformed message", messageId=record.get("messageId")
+            )
+            continue
+        email, template_data = parsed
+        if email.lower() in seen:
+            continue  # Queued twice (an SQS redelivery, a retried signup)
+        seen.add(email.lower())
+        messages.append((record["messageId"], email, template_data))
+
+    # Each chunk's destinations are sent in one second's send slot
+    governor = get_send_rate_governor()
+    share = get_welcome_email_rate_share()
+    chunk_size = min(BULK_DESTINATIONS, governor.slot_capacity(share))
+    chunks = [
+        messages[start : start + chunk_size]
+        for start in range(0, len(messages), chunk_size)
+    ]
+    failures = []
+    sent = 0
+    send_at = None
+    for index, chunk in enumerate(chunks):
+        send_at = reserve_chunk(governor, len(chunk), share, send_at)
+        if send_at is None:
+            logger.warning("Deferring welcome emails, no send slot in time")
+            failures.extend(
+                message_id for later in chunks[index:] for message_id, _, _ in later
+            )
+            break
+        delay_s = send_at - time.time()
+        if delay_s > 0:
+            time.sleep(delay_s)
+
+        try:
+            chunk_sent, retry = send_bulk(chunk)
+        except Exception as e:
+            # Throttling, a timeout or a dead template: the whole chunk again
+            logger.error("Bulk send failed: %s", e, destinations=len(chunk))
+            chunk_sent, retry = 0, [message_id for message_id, _, _ in chunk]
+        failures.extend(retry)
+        sent += chunk_sent
+
+    metrics.put_metric("BatchSize", len(event.get("Records") or []))
+    metrics.put_metric("WelcomeEmailsSent", sent)
+    metrics.put_metric("BatchItemFailures", len(failures))
+    logger.info("Welcome emails sent", sent=sent, failed=len(failures))
+    return {
+        "batchItemFailures": [{"itemIdentifier": message_id} for message_id in failures]
+    }
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Unit tests for sendWelcomeEmails Lambda function
+"""
+
+import unittest
+import json
+import sys
+import os
+from unittest.mock import patch, MagicMock
+
+# Add the function directory to the path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add the shared layer (deployed under /opt/python) to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "..",
+        "..",
+        "Layers",
+        "common",
+        "python",
+    ),
+)
+
+# Import the function module
+import sendWelcomeEmails
+from fresa_common import ses_quota
+
+
+def record(message_id, email, name="Ana"):
+    return {
+        "messageId": message_id,
+        "body": json.dumps({"email": email, "templateData": {"name": name}}),
+    }
+
+
+def statuses(*names):
+    return {"Status": [{"Status": name} for name in names]}
+
+
+class TestSendwelcomeemails(unittest.TestCase):
+    """Test cases for sendWelcomeEmails function"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        # Send slots are counted in the container without a table
+        ses_quota.reset()
+        os.environ.pop("DYNAMODB_TABLE_NAME", None)
+        os.environ["SENDER_EMAIL"] = "test@example.com"
+        # Enough for full bulk chunks (50 destinations at half the rate)
+        os.environ["SES_MAX_SEND_RATE"] = "100"
+        os.environ["AWS_REGION"] = "us-east-1"
+
+        self.test_context = {
+            "function_name": "sendWelcomeEmails",
+            "aws_request_id": "test-request-id",
+        }
+
+    def tearDown(self):
+        os.environ.pop("SES_MAX_SEND_RATE", None)
+
+    @patch("sendWelcomeEmails.get_ses_client")
+    def test_sendWelcomeEmails_statuses(self, mock_ses_client):
+        """Test transient failures are retried and rejected addresses dropped"""
+        mock_ses = MagicMock()
+        mock_ses.send_bulk_templated_email.return_value = statuses(
+            "Success", "AccountThrottled", "MessageRejected"
+        )
+        mock_ses_client.return_value = mock_ses
+
+        event = {
+            "Records": [
+                record("m1", "a@example.com"),
+                record("m2", "b@example.com"),
+                record("m3", "c@example.com"),
+                record("m4", "A@example.com"),
+                {"messageId": "m5", "body": "not json"},
+            ]
+        }
+        result = sendWelcomeEmails.lambda_handler(event, self.test_context)
+
+        self.assertEqual(result, {"batchItemFailures": [{"itemIdentifier": "m2"}]})
+        call = mock_ses.send_bulk_templated_email.call_args.kwargs
+        self.assertEqual(call["Template"], "fresa-welcome-template")
+        self.assertEqual(len(call["Destinations"]), 3)
+        # Defaults fill in the placeholders the message has no value for
+        data = json.loads(call["Destinations"][0]["ReplacementTemplateData"])
+        self.assertEqual(data["name"], "Ana")
+        self.assertEqual(data["greeting"], "Bienvenido")
+
+    @patch("sendWelcomeEmails.get_ses_client")
+    def test_sendWelcomeEmails_chunks(self, mock_ses_client):
+        """Test batches are split at SES' bulk destination limit"""
+        mock_ses = MagicMock()
+        mock_ses.send_bulk_templated_email.side_effect = lambda **kwargs: statuses(
+            *["Success"] * len(kwargs["Destinations"])
+        )
+        mock_ses_client.return_value = mock_ses
+
+        event = {
+            "Records": [record(f"m{i}", f"user{i}@example.com") for i in range(75)]
+        }
+        result = sendWelcomeEmails.lambda_handler(event, self.test_context)
+
+        self.assertEqual(result, {"batchItemFailures": []})
+        sizes = [
+            len(call.kwargs["Destinations"])
+            for call in mock_ses.send_bulk_templated_email.call_args_list
+        ]
+        self.assertEqual(sizes, [50, 25])
+
+    @patch("sendWelcomeEmails.get_ses_client")
+    def test_sendWelcomeEmails_send_rate(self, mock_ses_client):
+        """Test chunks fit the send slot and what has no slot is deferred"""
+        os.environ["SES_MAX_SEND_RATE"] = "4"
+        mock_ses = MagicMock()
+        mock_ses.send_bulk_templated_email.side_effect = lambda **kwargs: statuses(
+            *["Success"] * len(kwargs["Destinations"])
+        )
+        mock_ses_client.return_value = mock_ses
+
+        event = {"Records": [record(f"m{i}", f"user{i}@example.com") for i in range(6)]}
+        with patch.dict(os.environ, {"SES_MAX_WAIT_MS": "0"}), patch(
+            "time.time", return_value=1000.0
+        ):
+            result = sendWelcomeEmails.lambda_handler(event, self.test_context)
+
+        # Two destinations per second at half of 4/s; no wait allowed
+        sizes = [
+            len(call.kwargs["Destinations"])
+            for call in mock_ses.send_bulk_templated_email.call_args_list
+        ]
+        self.assertEqual(sizes, [2])
+        self.assertEqual(
+            [failure["itemIdentifier"] for failure in result["batchItemFailures"]],
+            ["m2", "m3", "m4", "m5"],
+        )
+
+    @patch("sendWelcomeEmails.get_ses_client")
+    def test_sendWelcomeEmails_call_failed(self, mock_ses_client):
+        """Test a failed bulk call sends its whole chunk back to the queue"""
+        mock_ses = MagicMock()
+        mock_ses.send_bulk_templated_email.side_effect = Exception("Throttling")
+        mock_ses_client.return_value = mock_ses
+
+        event = {
+            "Records": [record("m1", "a@example.com"), record("m2", "b@example.com")]
+        }
+        result = sendWelcomeEmails.lambda_handler(event, self.test_context)
+
+        self.assertEqual(
+            result,
+            {"batchItemFailures": [{"itemIdentifier": "m1"}, {"itemIdentifier": "m2"}]},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
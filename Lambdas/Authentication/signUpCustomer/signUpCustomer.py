@@ -1,21 +1,54 @@
-import json
-import boto3
 import secrets
 import string
 import os
-import time
 from botocore.exceptions import ClientError
 
-# Initialize DynamoDB resource lazily to avoid issues during testing
-_dynamodb = None
+from fresa_common import (
+    clients,
+    idempotency,
+    log,
+    middleware,
+    responses,
+    tracing,
+    validation,
+    verification_codes,
+    welcome_emails,
+)
+from fresa_common.deadline import DeadlineExceeded
 
+logger = log.get_logger(__name__)
 
-def get_dynamodb_resource():
-    """Get DynamoDB resource with lazy initialization"""
-    global _dynamodb
-    if _dynamodb is None:
-        _dynamodb = boto3.resource("dynamodb")
-    return _dynamodb
+
+# Clients are sized to the time left in the invocation (see fresa_common.clients)
+def get_dynamodb_client():
+    """Get DynamoDB client sized to the current deadline"""
+    return clients.get_client("dynamodb")
+
+
+def get_cognito_client():
+    return clients.get_client("cognito-idp")
+
+
+def get_idempotency_store():
+    # Retried sign-ups are recognised through records in the codes table
+    return idempotency.IdempotencyStore(
+        get_dynamodb_client(), os.environ.get("DYNAMODB_TABLE_NAME")
+    )
+
+
+# Checked before the code is looked up, so a malformed request costs no read
+SIGN_UP_REQUEST = validation.Schema(
+    body={
+        "email": validation.email(),
+        "code": validation.string(
+            max_length=16, pattern=r"^\d+$", reason="must be digits"
+        ),
+        "firstName": validation.string(),
+        "lastName": validation.string(),
+        "dateOfBirth": validation.date(),
+        "gender": validation.string(max_length=32),
+    }
+)
 
 
 # Generate a secure random password
@@ -55,60 +88,46 @@ def validate_verification_code(email, user_code):
     try:
         table_name = os.environ.get("DYNAMODB_TABLE_NAME")
         if not table_name:
-            print("DYNAMODB_TABLE_NAME environment variable not set")
+            logger.error("DYNAMODB_TABLE_NAME environment variable not set")
             return False, "Configuration error"
 
-        dynamodb = get_dynamodb_resource()
-        table = dynamodb.Table(table_name)
-        code_expiration_minutes = int(os.environ.get("CODE_EXPIRATION_MINUTES", "10"))
-
-        # Get stored code and lastRequestTime from DynamoDB
-        response = table.get_item(Key={"email": email.lower()})
-
-        if "Item" not in response:
-            print(f"No DynamoDB record found for email: {email}")
-            return False, "Code not found or expired"
-
-        item = response["Item"]
+        codes = verification_codes.VerificationCodeRepository(
+            get_dynamodb_client(), table_name
+        )
+        item = codes.get(email.lower(), verification_codes.VALIDATION)
 
-        # Validate required fields exist
-        if "code" not in item or "lastRequestTime" not in item:
-            print(f"Missing fields in DynamoDB record for {email}")
+        if item is None or item.code is None:
+            logger.info("No DynamoDB record found", email=email)
             return False, "Code not found or expired"
 
-        stored_code = item["code"]
-        last_request_time = item["lastRequestTime"]
-
-        # Handle different number types (int/float/string)
-        try:
-            last_request_time = int(float(last_request_time))
-        except (TypeError, ValueError):
-            print(f"Invalid timestamp format for {email}: {last_request_time}")
-            return False, "Invalid timestamp format"
-
         # Check expiration FIRST (security best practice)
-        current_time = int(time.time())
-        expiration_time = last_request_time + (code_expiration_minutes * 60)
-
-        if current_time > expiration_time:
-            print(
-                f"Code expired for {email}. Current: {current_time}, Expiration: {expiration_time}"
-            )
+        if item.is_expired():
+            logger.info("Code expired", email=email, expirationTime=item.expiry_time())
             return False, "Code has expired"
 
+        if item.attempts_exhausted():
+            logger.info("Too many incorrect codes", email=email)
+            return False, "Too many incorrect codes, request a new one"
+
         # Validate code after passing expiration check
-        if user_code != stored_code:
-            print(f"Invalid code provided for {email}")
+        if not item.matches(user_code):
+            logger.info("Invalid code provided", email=email)
+            try:
+                codes.record_failed_attempt(email.lower())
+            except ClientError as e:
+                logger.warning("Could not record failed attempt: %s", e)
             return False, "Invalid verification code"
 
-        print(f"Code validation successful for {email}")
+        logger.debug("Code validation successful", email=email)
         return True, "Code is valid"
 
+    except DeadlineExceeded:
+        raise
     except ClientError as e:
-        print(f"DynamoDB error for {email}: {str(e)}")
+        logger.error("DynamoDB error: %s", e, email=email)
         return False, "Database error occurred"
     except Exception as e:
-        print(f"Unexpected error validating code for {email}: {str(e)}")
+        logger.exception("Unexpected error validating code: %s", e, email=email)
         return False, "Validation error occurred"
 
 
@@ -133,264 +152,137 @@ def get_gendered_template_data(name, gender):
 
 
 def send_welcome_email(email, first_name, gender):
-    """Send welcome email using SES template"""
-    try:
-        # Initialize SES client
-        ses_client = boto3.client(
-            "ses", region_name=os.environ.get("AWS_REGION", "us-east-1")
-        )
-
-        # Get sender email from environment variable
-        sender_email = os.environ.get("SENDER_EMAIL", "admin@fresa.live")
-
-        # Get gendered template data
-        template_data = get_gendered_template_data(first_name, gender)
-
-        print(f"Sending welcome email to {email} with template data: {template_data}")
-
-        # Send templated email
-        response = ses_client.send_templated_email(
-            Source=sender_email,
-            Destination={"ToAddresses": [email]},
-            Template="fresa-welcome-template",
-            TemplateData=json.dumps(template_data),
-        )
-
-        print(
-            f"Welcome email sent successfully to {email}. MessageId: {response['MessageId']}"
-        )
-        return True
-
-    except ClientError as e:
-        print(f"Failed to send welcome email to {email}: {str(e)}")
-        return False
-    except Exception as e:
-        print(f"Unexpected error sending welcome email to {email}: {str(e)}")
-        return False
+    """Queue the welcome email; sendWelcomeEmails sends it"""
+    template_data = get_gendered_template_data(first_name, gender)
+    logger.debug("Queueing welcome email", email=email, templateData=template_data)
+    return welcome_emails.enqueue(email, template_data)
 
 
+@middleware.api_handler(schema=SIGN_UP_REQUEST, idempotency_store=get_idempotency_store)
 def lambda_handler(event, context):
     # Get configuration from environment variables
     USER_POOL_ID = os.environ.get("COGNITO_USER_POOL_ID")
     CLIENT_ID = os.environ.get("COGNITO_CLIENT_ID")
 
     if not USER_POOL_ID or not CLIENT_ID:
-        return {
-            "statusCode": 500,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type",
-                "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
-            },
-            "body": json.dumps(
-                {
-                    "error": "Missing required environment variables: COGNITO_USER_POOL_ID and/or COGNITO_CLIENT_ID"
-                }
-            ),
-        }
+        return responses.error(
+            500,
+            "Missing required environment variables: COGNITO_USER_POOL_ID and/or COGNITO_CLIENT_ID",
+        )
+
+    body = validation.current().body
+    email = body["email"]
+    code = body["code"]
+
+    # FIRST: Validate verification code against DynamoDB
+    code_valid, validation_message = validate_verification_code(email, code)
+
+    if not code_valid:
+        return responses.error(
+            400,
+            validation_message,
+            message="Please check your verification code or request a new one.",
+        )
+
+    # Only proceed with user creation if code is valid
+    first_name = body["firstName"]
+    last_name = body["lastName"]
+    date_of_birth = body["dateOfBirth"]
+    gender = body["gender"]
+    user_newly_created = False
+    cognito = get_cognito_client()
 
+    # Create user in Cognito User Pool
     try:
-        # Parse the request body
-        body = json.loads(event["body"])
-        email = body["email"].lower()
-        code = body["code"]
-
-        # FIRST: Validate verification code against DynamoDB
-        code_valid, validation_message = validate_verification_code(email, code)
-
-        if not code_valid:
-            return {
-                "statusCode": 400,
-                "headers": {
-                    "Content-Type": "application/json",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "Content-Type",
-                    "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
-                },
-                "body": json.dumps(
-                    {
-                        "error": validation_message,
-                        "message": "Please check your verification code or request a new one.",
-                    }
-                ),
-            }
-
-        # Only proceed with user creation if code is valid
-        first_name = body["firstName"]
-        last_name = body["lastName"]
-        date_of_birth = body["dateOfBirth"]
-        gender = body["gender"]
-        user_newly_created = False
-        cognito = boto3.client("cognito-idp")
-
-        # Create user in Cognito User Pool
-        try:
-            create_response = cognito.admin_create_user(
-                UserPoolId=USER_POOL_ID,
-                Username=email,
-                UserAttributes=[
-                    {"Name": "email", "Value": email},
-                    {"Name": "given_name", "Value": first_name},
-                    {"Name": "family_name", "Value": last_name},
-                    {"Name": "birthdate", "Value": date_of_birth},
-                    {"Name": "gender", "Value": gender},
-                    {"Name": "email_verified", "Value": "true"},
-                ],
-                MessageAction="SUPPRESS",  # Don't send welcome email
-                TemporaryPassword=generate_random_password(12),
-            )
+        cognito.admin_create_user(
+            UserPoolId=USER_POOL_ID,
+            Username=email,
+            UserAttributes=[
+                {"Name": "email", "Value": email},
+                {"Name": "given_name", "Value": first_name},
+                {"Name": "family_name", "Value": last_name},
+                {"Name": "birthdate", "Value": date_of_birth},
+                {"Name": "gender", "Value": gender},
+                {"Name": "email_verified", "Value": "true"},
+            ],
+            MessageAction="SUPPRESS",  # Don't send welcome email
+            TemporaryPassword=generate_random_password(12),
+        )
 
-            # Set permanent password with generated random password
-            cognito.admin_set_user_password(
-                UserPoolId=USER_POOL_ID,
-                Username=email,
-                Password=generate_random_password(),
-                Permanent=True,
-            )
+        # Set permanent password with generated random password
+        cognito.admin_set_user_password(
+            UserPoolId=USER_POOL_ID,
+            Username=email,
+            Password=generate_random_password(),
+            Permanent=True,
+        )
 
-            print(f"User {email} created successfully")
-            user_newly_created = True
-
-        except ClientError as e:
-            if e.response["Error"]["Code"] == "UsernameExistsException":
-                print(f"User {email} already exists, proceeding with authentication")
-            else:
-                return {
-                    "statusCode": 400,
-                    "headers": {
-                        "Content-Type": "application/json",
-                        "Access-Control-Allow-Origin": "*",
-                        "Access-Control-Allow-Headers": "Content-Type",
-                        "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
-                    },
-                    "body": json.dumps({"error": f"Failed to create user: {str(e)}"}),
-                }
-
-        # Now proceed with custom auth flow
-        try:
-            # Initiate custom auth flow
-            auth_response = cognito.initiate_auth(
-                ClientId=CLIENT_ID,
-                AuthFlow="CUSTOM_AUTH",
-                AuthParameters={"USERNAME": email},
-            )
+        logger.info("User created", email=email)
+        user_newly_created = True
 
-            # Respond to custom challenge with the provided code
-            challenge_response = cognito.respond_to_auth_challenge(
-                ClientId=CLIENT_ID,
-                ChallengeName="CUSTOM_CHALLENGE",
-                Session=auth_response["Session"],
-                ChallengeResponses={"USERNAME": email, "ANSWER": code},
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "UsernameExistsException":
+            logger.info(
+                "User already exists, proceeding with authentication", email=email
             )
+        else:
+            return responses.error(400, f"Failed to create user: {str(e)}")
 
-            # Extract tokens from successful authentication
-            auth_result = challenge_response["AuthenticationResult"]
-
-            # Send welcome email only if user was newly created
-            email_sent = False
-            if user_newly_created:
-                email_sent = send_welcome_email(email, first_name, gender)
-
-            return {
-                "statusCode": 200,
-                "headers": {
-                    "Content-Type": "application/json",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "Content-Type",
-                    "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
-                },
-                "body": json.dumps(
-                    {
-                        "message": "Authentication successful",
-                        "tokens": {
-                            "AccessToken": auth_result["AccessToken"],
-                            "IdToken": auth_result["IdToken"],
-                            "RefreshToken": auth_result["RefreshToken"],
-                            "TokenType": auth_result["TokenType"],
-                            "ExpiresIn": auth_result["ExpiresIn"],
-                        },
-                        "userInfo": {
-                            "email": email,
-                            "firstName": first_name,
-                            "lastName": last_name,
-                            "dateOfBirth": date_of_birth,
-                            "gender": gender,
-                        },
-                        "welcomeEmailSent": email_sent,
-                    }
-                ),
-            }
-
-        except ClientError as auth_error:
-            error_code = auth_error.response["Error"]["Code"]
-            error_msg = str(auth_error)
-
-            if error_code == "NotAuthorizedException":
-                return {
-                    "statusCode": 401,
-                    "headers": {
-                        "Content-Type": "application/json",
-                        "Access-Control-Allow-Origin": "*",
-                        "Access-Control-Allow-Headers": "Content-Type",
-                        "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
-                    },
-                    "body": json.dumps(
-                        {
-                            "error": "Authentication failed: Invalid credentials",
-                            "code": error_code,
-                        }
-                    ),
-                }
-            else:
-                return {
-                    "statusCode": 400,
-                    "headers": {
-                        "Content-Type": "application/json",
-                        "Access-Control-Allow-Origin": "*",
-                        "Access-Control-Allow-Headers": "Content-Type",
-                        "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
-                    },
-                    "body": json.dumps(
-                        {
-                            "error": f"Authentication failed: {error_msg}",
-                            "code": error_code,
-                        }
-                    ),
-                }
-
-    except KeyError as e:
-        return {
-            "statusCode": 400,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type",
-                "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
-            },
-            "body": json.dumps({"error": f"Missing required field: {str(e)}"}),
-        }
+    # Now proceed with custom auth flow
+    try:
+        # Initiate custom auth flow
+        auth_response = cognito.initiate_auth(
+            ClientId=CLIENT_ID,
+            AuthFlow="CUSTOM_AUTH",
+            AuthParameters={"USERNAME": email},
+            ClientMetadata=tracing.client_metadata(),
+        )
 
-    except json.JSONDecodeError:
-        return {
-            "statusCode": 400,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type",
-                "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
-            },
-            "body": json.dumps({"error": "Invalid JSON in request body"}),
-        }
+        # Respond to custom challenge with the provided code
+        challenge_response = cognito.respond_to_auth_challenge(
+            ClientId=CLIENT_ID,
+            ChallengeName="CUSTOM_CHALLENGE",
+            Session=auth_response["Session"],
+            ChallengeResponses={"USERNAME": email, "ANSWER": code},
+            ClientMetadata=tracing.client_metadata(),
+        )
+    except ClientError as auth_error:
+        error_code = auth_error.response["Error"]["Code"]
+        if error_code == "NotAuthorizedException":
+            return responses.error(
+                401, "Authentication failed: Invalid credentials", code=error_code
+            )
+        return responses.error(
+            400, f"Authentication failed: {str(auth_error)}", code=error_code
+        )
 
-    except Exception as e:
-        return {
-            "statusCode": 500,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type",
-                "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
+    # Extract tokens from successful authentication
+    auth_result = challenge_response["AuthenticationResult"]
+
+    # Queue the welcome email only if the user was newly created; it is sent
+    # off the request path, so the tokens do not wait on SES
+    email_sent = False
+    if user_newly_created:
+        email_sent = send_welcome_email(email, first_name, gender)
+
+    return responses.respond(
+        200,
+        {
+            "message": "Authentication successful",
+            "tokens": {
+                "AccessToken": auth_result["AccessToken"],
+                "IdToken": auth_result["IdToken"],
+                "RefreshToken": auth_result["RefreshToken"],
+                "TokenType": auth_result["TokenType"],
+                "ExpiresIn": auth_result["ExpiresIn"],
             },
-            "body": json.dumps({"error": f"Internal server error: {str(e)}"}),
-        }
+            "userInfo": {
+                "email": email,
+                "firstName": first_name,
+                "lastName": last_name,
+                "dateOfBirth": date_of_birth,
+                "gender": gender,
+            },
+            "welcomeEmailSent": email_sent,
+        },
+    )
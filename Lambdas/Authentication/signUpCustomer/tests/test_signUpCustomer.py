@@ -12,9 +12,22 @@ from unittest.mock import patch, MagicMock
 
 # Add the function directory to the path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add the shared layer (deployed under /opt/python) to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "..",
+        "..",
+        "Layers",
+        "common",
+        "python",
+    ),
+)
 
 # Import the function module
 import signUpCustomer
+from fresa_common import idempotency
 
 
 class TestSignupcustomer(unittest.TestCase):
@@ -22,6 +35,8 @@ class TestSignupcustomer(unittest.TestCase):
 
     def setUp(self):
         """Set up test fixtures"""
+        # Forget responses completed by earlier tests
+        idempotency.clear_cache()
         # Set required environment variables for testing
         os.environ["COGNITO_USER_POOL_ID"] = "us-east-1_test123"
         os.environ["COGNITO_CLIENT_ID"] = "test_client_id"
@@ -52,26 +67,28 @@ class TestSignupcustomer(unittest.TestCase):
             "log_stream_name": "test-log-stream",
         }
 
-    @patch("signUpCustomer.get_dynamodb_resource")
-    @patch("boto3.client")
-    def test_signUpCustomer_success(self, mock_boto3_client, mock_dynamodb_resource):
+    @patch("signUpCustomer.get_dynamodb_client")
+    @patch("signUpCustomer.welcome_emails.enqueue")
+    @patch("signUpCustomer.get_cognito_client")
+    def test_signUpCustomer_success(
+        self, mock_get_cognito, mock_enqueue, mock_dynamodb_client
+    ):
         """Test successful signUpCustomer execution"""
         # Mock DynamoDB
         mock_dynamodb = MagicMock()
-        mock_dynamodb_resource.return_value = mock_dynamodb
-        mock_table = MagicMock()
-        mock_dynamodb.Table.return_value = mock_table
+        mock_dynamodb_client.return_value = mock_dynamodb
         current_time = int(time.time())
-        mock_table.get_item.return_value = {
-            "Item": {"code": "123456", "lastRequestTime": current_time}
+        mock_dynamodb.get_item.return_value = {
+            "Item": {
+                "code": {"S": "123456"},
+                "lastRequestTime": {"N": str(current_time)},
+            }
         }
 
-        # Mock SES client
-        mock_ses = MagicMock()
+        # The welcome email is queued, not sent
+        mock_enqueue.return_value = True
         mock_cognito = MagicMock()
-        mock_boto3_client.side_effect = lambda service, **kwargs: (
-            mock_ses if service == "ses" else mock_cognito
-        )
+        mock_get_cognito.return_value = mock_cognito
 
         # Mock Cognito authentication responses
         mock_cognito.initiate_auth.return_value = {"Session": "test-session-id"}
@@ -89,6 +106,8 @@ class TestSignupcustomer(unittest.TestCase):
 
         self.assertEqual(result["statusCode"], 200)
         self.assertIn("message", json.loads(result["body"]))
+        self.assertTrue(json.loads(result["body"])["welcomeEmailSent"])
+        mock_enqueue.assert_called_once()
 
     def test_signUpCustomer_invalid_event(self):
         """Test signUpCustomer with invalid event"""
@@ -99,6 +118,28 @@ class TestSignupcustomer(unittest.TestCase):
             result["statusCode"], 400
         )  # Should return 400 for invalid event
 
+    @patch("signUpCustomer.get_cognito_client")
+    @patch("signUpCustomer.get_dynamodb_client")
+    def test_signUpCustomer_invalid_request_makes_no_aws_call(
+        self, mock_dynamodb_client, mock_get_cognito
+    ):
+        """Test a malformed body is rejected before the code is looked up"""
+        body = json.loads(self.test_event["body"])
+        body["dateOfBirth"] = "01/01/1990"
+        del body["lastName"]
+        event = dict(self.test_event, body=json.dumps(body))
+
+        result = signUpCustomer.lambda_handler(event, self.test_context)
+
+        self.assertEqual(result["statusCode"], 400)
+        self.assertEqual(
+            json.loads(result["body"])["fields"],
+            {"lastName": "required", "dateOfBirth": "must be a date as YYYY-MM-DD"},
+        )
+        self.assertIn("Access-Control-Allow-Origin", result["headers"])
+        mock_dynamodb_client.assert_not_called()
+        mock_get_cognito.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()
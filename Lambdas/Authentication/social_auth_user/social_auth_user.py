@@ -1,41 +1,52 @@
 import json
-import boto3
 import os
 import secrets
 import string
-import logging
 import urllib3
 from botocore.exceptions import ClientError
 
-# Configure logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-# Initialize AWS services lazily to avoid issues during testing
-_cognito_client = None
-_ses_client = None
-
-
+from fresa_common import (
+    clients,
+    deadline,
+    log,
+    metrics,
+    middleware,
+    responses,
+    tracing,
+    user_cache,
+    validation,
+    welcome_emails,
+)
+
+logger = log.get_logger(__name__)
+
+# Upper bound for a provider token check; capped by the time left
+HTTP_TIMEOUT_S = 5
+
+RESPONSE_HEADERS = responses.cors_headers("OPTIONS,POST")
+
+# Checked before the provider is asked about the token
+SOCIAL_SIGN_UP_REQUEST = validation.Schema(
+    path={"provider": validation.one_of("google", "facebook")},
+    body={
+        "accessToken": validation.string(aliases=("idToken",), max_length=8192),
+        "gender": validation.string(max_length=32),
+        "birthdate": validation.date(aliases=("dateOfBirth",)),
+        # Override the names in the token when given
+        "firstName": validation.string(required=False),
+        "lastName": validation.string(required=False),
+    },
+)
+
+
+# Clients are sized to the time left in the invocation (see fresa_common.clients)
 def get_cognito_client():
-    """Get Cognito client with lazy initialization"""
-    global _cognito_client
-    if _cognito_client is None:
-        aws_region = os.environ.get("AWS_REGION", "us-east-1")
-        _cognito_client = boto3.client("cognito-idp", region_name=aws_region)
-    return _cognito_client
-
-
-def get_ses_client():
-    """Get SES client with lazy initialization"""
-    global _ses_client
-    if _ses_client is None:
-        aws_region = os.environ.get("AWS_REGION", "us-east-1")
-        _ses_client = boto3.client("ses", region_name=aws_region)
-    return _ses_client
+    """Get Cognito client sized to the current deadline"""
+    return clients.get_client("cognito-idp")
 
 
 # Initialize urllib3
-http = urllib3.PoolManager()
+http = tracing.instrument_http(metrics.instrument_http(urllib3.PoolManager()))
 
 
 # Environment variables with lazy loading
@@ -49,15 +60,12 @@ def get_user_pool_id():
     return os.environ.get("COGNITO_USER_POOL_ID")
 
 
-SENDER_EMAIL = os.environ.get("SENDER_EMAIL", "admin@fresa.live")
-
-
 def verify_google_token(id_token_string):
     """Verify Google ID token and extract user information"""
     logger.info("Starting Google token verification")
     try:
         url = f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token_string}"
-        response = http.request("GET", url)
+        response = http.request("GET", url, timeout=deadline.timeout_s(HTTP_TIMEOUT_S))
         if response.status != 200:
             return {"success": False, "error": "Invalid Google token"}
         token_info = json.loads(response.data.decode("utf-8"))
@@ -76,7 +84,7 @@ def verify_google_token(id_token_string):
             "picture": token_info.get("picture", ""),
         }
     except Exception as e:
-        logger.error(f"Google verification failed: {str(e)}")
+        logger.error("Google verification failed: %s", e)
         return {"success": False, "error": f"Google verification failed: {str(e)}"}
 
 
@@ -85,7 +93,7 @@ def verify_facebook_token(access_token):
     logger.info("Starting Facebook token verification")
     try:
         url = f"https://graph.facebook.com/me?fields=id,email,first_name,last_name,picture&access_token={access_token}"
-        response = http.request("GET", url)
+        response = http.request("GET", url, timeout=deadline.timeout_s(HTTP_TIMEOUT_S))
         if response.status != 200:
             return {"success": False, "error": "Invalid Facebook token"}
         user_data = json.loads(response.data.decode("utf-8"))
@@ -101,7 +109,7 @@ def verify_facebook_token(access_token):
             "picture": user_data.get("picture", {}).get("data", {}).get("url", ""),
         }
     except Exception as e:
-        logger.error(f"Facebook verification failed: {str(e)}")
+        logger.error("Facebook verification failed: %s", e)
         return {"success": False, "error": f"Facebook verification failed: {str(e)}"}
 
 
@@ -136,233 +144,157 @@ def generate_random_password(length=16):
     return "".join(password_chars)
 
 
-def send_welcome_email(email, first_name, gender=None):
-    """Send welcome email using SES template"""
-    logger.info(f"Sending welcome email to: {email}")
-    try:
-        template_data = {"name": first_name or "Usuario"}
-        # Optional: Customize email based on gender
-        if gender and gender.lower() == "female":
-            template_data["greeting"] = "Bienvenida"
-        else:
-            template_data["greeting"] = "Bienvenido"
-
-        get_ses_client().send_templated_email(
-            Source=SENDER_EMAIL,
-            Destination={"ToAddresses": [email]},
-            Template="fresa-welcome-template",  # Make sure this template exists in SES
-            TemplateData=json.dumps(template_data),
-        )
-        logger.info(f"Successfully sent welcome email to: {email}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to send welcome email to {email}: {str(e)}")
-        return False
-
+def welcome_template_data(first_name, gender=None):
+    """Data for the welcome template; sendWelcomeEmails fills in the rest"""
+    template_data = {"name": first_name or "Usuario"}
+    # Optional: Customize email based on gender
+    if gender and gender.lower() == "female":
+        template_data["greeting"] = "Bienvenida"
+    else:
+        template_data["greeting"] = "Bienvenido"
+    return template_data
 
-def lambda_handler(event, context):
-    headers = {
-        "Content-Type": "application/json",
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Headers": "Content-Type",
-        "Access-Control-Allow-Methods": "OPTIONS,POST",
-    }
 
-    try:
-        # Get provider from path parameters
-        provider = event.get("pathParameters", {}).get("provider", "").lower()
-        if provider not in ["google", "facebook"]:
-            return {
-                "statusCode": 400,
-                "headers": headers,
-                "body": json.dumps({"error": "Invalid provider."}),
-            }
-
-        body = json.loads(event["body"])
-
-        # Get token from request
-        token = body.get("accessToken") or body.get("idToken")
-        if not token:
-            return {
-                "statusCode": 400,
-                "headers": headers,
-                "body": json.dumps({"error": "Missing access/id token."}),
-            }
-
-        # Get additional profile data from request
-        gender = body.get("gender")
-        birthdate = body.get("birthdate") or body.get(
-            "dateOfBirth"
-        )  # Support both field names
+def send_welcome_email(email, first_name, gender=None):
+    """Queue the welcome email; sendWelcomeEmails sends it"""
+    return welcome_emails.enqueue(email, welcome_template_data(first_name, gender))
 
-        # Optional override names (if provided, use these instead of token data)
-        override_first_name = body.get("firstName")
-        override_last_name = body.get("lastName")
 
-        if not all([gender, birthdate]):
-            return {
-                "statusCode": 400,
-                "headers": headers,
-                "body": json.dumps(
-                    {"error": "Missing required fields: gender, birthdate/dateOfBirth."}
-                ),
-            }
+@middleware.api_handler(schema=SOCIAL_SIGN_UP_REQUEST, headers=RESPONSE_HEADERS)
+def lambda_handler(event, context):
+    request = validation.current()
+    provider = request.path["provider"]
+    token = request.body["accessToken"]
+    gender = request.body["gender"]
+    birthdate = request.body["birthdate"]
+
+    # Optional override names (if provided, use these instead of token data)
+    override_first_name = request.body.get("firstName")
+    override_last_name = request.body.get("lastName")
+
+    # 1. Verify the social provider token and extract user info
+    user_info = {}
+    if provider == "google":
+        user_info = verify_google_token(token)
+    elif provider == "facebook":
+        user_info = verify_facebook_token(token)
+
+    if not user_info.get("success"):
+        return responses.error(
+            401, user_info.get("error", "Token verification failed."), RESPONSE_HEADERS
+        )
 
-        # 1. Verify the social provider token and extract user info
-        user_info = {}
-        if provider == "google":
-            user_info = verify_google_token(token)
-        elif provider == "facebook":
-            user_info = verify_facebook_token(token)
+    # Extract user data from token
+    email = user_info["email"]
+    first_name = override_first_name or user_info.get("first_name", "")
+    last_name = override_last_name or user_info.get("last_name", "")
+    picture_url = user_info.get("picture", "")
 
-        if not user_info.get("success"):
-            return {
-                "statusCode": 401,
-                "headers": headers,
-                "body": json.dumps(
-                    {"error": user_info.get("error", "Token verification failed.")}
-                ),
-            }
+    if not email:
+        return responses.error(
+            400, "Email not provided by social provider.", RESPONSE_HEADERS
+        )
 
-        # Extract user data from token
-        email = user_info["email"]
-        first_name = override_first_name or user_info.get("first_name", "")
-        last_name = override_last_name or user_info.get("last_name", "")
-        picture_url = user_info.get("picture", "")
+    # 2. Double-check that user doesn't exist (safety check, cached per container)
+    try:
+        user_exists = user_cache.user_exists(
+            get_cognito_client(), get_user_pool_id(), email
+        )
+    except ClientError as e:
+        # Some other error occurred
+        logger.error("Error checking user existence: %s", e)
+        return responses.error(500, "Error checking user", RESPONSE_HEADERS)
+    if user_exists:
+        # User exists - this shouldn't happen in normal flow
+        logger.warning(
+            "User %s already exists but Lambda 2 was called. This indicates a race condition.",
+            email,
+        )
+        return responses.error(409, "User already exists.", RESPONSE_HEADERS)
+    # User doesn't exist - proceed with creation
+
+    # 3. Create the user in Cognito
+    logger.info("Creating new Cognito user: %s", email)
+    temp_password = generate_random_password()
+
+    user_attributes = [
+        {"Name": "email", "Value": email},
+        {"Name": "email_verified", "Value": "true"},
+        {"Name": "given_name", "Value": first_name},
+        {"Name": "family_name", "Value": last_name},
+        {"Name": "birthdate", "Value": birthdate},
+        {"Name": "gender", "Value": gender},
+    ]
+    if picture_url:
+        user_attributes.append({"Name": "picture", "Value": picture_url})
 
-        if not email:
-            return {
-                "statusCode": 400,
-                "headers": headers,
-                "body": json.dumps({"error": "Email not provided by social provider."}),
-            }
+    try:
+        get_cognito_client().admin_create_user(
+            UserPoolId=get_user_pool_id(),
+            Username=email,
+            UserAttributes=user_attributes,
+            TemporaryPassword=temp_password,
+            MessageAction="SUPPRESS",  # Suppress the default welcome email
+        )
+        # This container cached "not found" a moment ago
+        user_cache.invalidate(get_user_pool_id(), email)
+
+        # Set the password to permanent
+        get_cognito_client().admin_set_user_password(
+            UserPoolId=get_user_pool_id(),
+            Username=email,
+            Password=temp_password,
+            Permanent=True,
+        )
+        logger.info("Successfully created Cognito user: %s", email)
 
-        # 2. Double-check that user doesn't exist (safety check)
-        try:
-            get_cognito_client().admin_get_user(
-                UserPoolId=get_user_pool_id(), Username=email
-            )
-            # If we get here, user exists - this shouldn't happen in normal flow
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "UsernameExistsException":
+            user_cache.invalidate(get_user_pool_id(), email)
+            # Race condition - user was created between our check and creation
             logger.warning(
-                f"User {email} already exists but Lambda 2 was called. This indicates a race condition."
-            )
-            return {
-                "statusCode": 409,
-                "headers": headers,
-                "body": json.dumps({"error": "User already exists."}),
-            }
-        except ClientError as e:
-            if e.response["Error"]["Code"] != "UserNotFoundException":
-                # Some other error occurred
-                logger.error(f"Error checking user existence: {str(e)}")
-                return {
-                    "statusCode": 500,
-                    "headers": headers,
-                    "body": json.dumps({"error": f"Error checking user: {str(e)}"}),
-                }
-            # User doesn't exist - proceed with creation
-
-        # 3. Create the user in Cognito
-        logger.info(f"Creating new Cognito user: {email}")
-        temp_password = generate_random_password()
-
-        user_attributes = [
-            {"Name": "email", "Value": email},
-            {"Name": "email_verified", "Value": "true"},
-            {"Name": "given_name", "Value": first_name},
-            {"Name": "family_name", "Value": last_name},
-            {"Name": "birthdate", "Value": birthdate},
-            {"Name": "gender", "Value": gender},
-        ]
-        if picture_url:
-            user_attributes.append({"Name": "picture", "Value": picture_url})
-
-        try:
-            get_cognito_client().admin_create_user(
-                UserPoolId=get_user_pool_id(),
-                Username=email,
-                UserAttributes=user_attributes,
-                TemporaryPassword=temp_password,
-                MessageAction="SUPPRESS",  # Suppress the default welcome email
-            )
-
-            # Set the password to permanent
-            get_cognito_client().admin_set_user_password(
-                UserPoolId=get_user_pool_id(),
-                Username=email,
-                Password=temp_password,
-                Permanent=True,
+                "User %s was created by another process. Attempting to authenticate instead.",
+                email,
             )
-            logger.info(f"Successfully created Cognito user: {email}")
-
-        except ClientError as e:
-            if e.response["Error"]["Code"] == "UsernameExistsException":
-                # Race condition - user was created between our check and creation
-                logger.warning(
-                    f"User {email} was created by another process. Attempting to authenticate instead."
-                )
-            else:
-                logger.error(f"Error creating Cognito user: {str(e)}")
-                return {
-                    "statusCode": 500,
-                    "headers": headers,
-                    "body": json.dumps({"error": f"Could not create user: {str(e)}"}),
-                }
-
-        # 4. Authenticate the newly created user
-        logger.info(f"Authenticating new user: {email}")
-        try:
-            auth_response = get_cognito_client().admin_initiate_auth(
-                UserPoolId=get_user_pool_id(),
-                ClientId=get_client_id(),
-                AuthFlow="ADMIN_NO_SRP_AUTH",
-                AuthParameters={"USERNAME": email, "PASSWORD": temp_password},
-            )
-        except ClientError as e:
-            logger.error(f"Authentication failed for new user {email}: {str(e)}")
-            return {
-                "statusCode": 500,
-                "headers": headers,
-                "body": json.dumps(
-                    {"error": f"User created but authentication failed: {str(e)}"}
-                ),
-            }
+        else:
+            logger.error("Error creating Cognito user: %s", e)
+            return responses.error(500, "Could not create user", RESPONSE_HEADERS)
 
-        # 5. Send the custom welcome email (asynchronously)
-        send_welcome_email(email, first_name, gender)
+    # 4. Authenticate the newly created user
+    logger.info("Authenticating new user: %s", email)
+    try:
+        auth_response = get_cognito_client().admin_initiate_auth(
+            UserPoolId=get_user_pool_id(),
+            ClientId=get_client_id(),
+            AuthFlow="ADMIN_NO_SRP_AUTH",
+            AuthParameters={"USERNAME": email, "PASSWORD": temp_password},
+            ClientMetadata=tracing.client_metadata(),
+        )
+    except ClientError as e:
+        logger.error("Authentication failed for new user %s: %s", email, e)
+        return responses.error(
+            500, "User created but authentication failed", RESPONSE_HEADERS
+        )
 
-        # 6. Return the tokens and user info
-        return {
-            "statusCode": 201,  # 201 Created
-            "headers": headers,
-            "body": json.dumps(
-                {
-                    "success": True,
-                    "isNewUser": True,
-                    "tokens": auth_response["AuthenticationResult"],
-                    "userInfo": {
-                        "email": email,
-                        "firstName": first_name,
-                        "lastName": last_name,
-                        "name": f"{first_name} {last_name}",
-                        "picture": picture_url,
-                        "provider": provider,
-                    },
-                    "welcomeEmailSent": True,
-                }
-            ),
-        }
+    # 5. Queue the custom welcome email; it is sent off the request path
+    welcome_email_queued = send_welcome_email(email, first_name, gender)
 
-    except json.JSONDecodeError:
-        return {
-            "statusCode": 400,
-            "headers": headers,
-            "body": json.dumps({"error": "Invalid JSON in request body."}),
-        }
-    except Exception as e:
-        logger.error(f"An unexpected error occurred: {str(e)}")
-        return {
-            "statusCode": 500,
-            "headers": headers,
-            "body": json.dumps({"error": f"Internal server error: {str(e)}"}),
-        }
+    # 6. Return the tokens and user info
+    return responses.respond(
+        201,  # 201 Created
+        {
+            "success": True,
+            "isNewUser": True,
+            "tokens": auth_response["AuthenticationResult"],
+            "userInfo": {
+                "email": email,
+                "firstName": first_name,
+                "lastName": last_name,
+                "name": f"{first_name} {last_name}",
+                "picture": picture_url,
+                "provider": provider,
+            },
+            "welcomeEmailSent": welcome_email_queued,
+        },
+        RESPONSE_HEADERS,
+    )
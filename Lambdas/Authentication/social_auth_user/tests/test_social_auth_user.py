@@ -11,9 +11,22 @@ from unittest.mock import patch, MagicMock
 
 # Add the function directory to the path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add the shared layer (deployed under /opt/python) to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "..",
+        "..",
+        "Layers",
+        "common",
+        "python",
+    ),
+)
 
 # Import the function module
 import social_auth_user
+from fresa_common import user_cache
 
 
 class TestSocialauthuser(unittest.TestCase):
@@ -21,6 +34,8 @@ class TestSocialauthuser(unittest.TestCase):
 
     def setUp(self):
         """Set up test fixtures"""
+        # Drop Cognito users cached by earlier tests' mocks
+        user_cache.cache().clear()
         # Set required environment variables for testing
         os.environ["COGNITO_USER_POOL_ID"] = "us-east-1_test123"
         os.environ["COGNITO_CLIENT_ID"] = "test_client_id"
@@ -50,10 +65,10 @@ class TestSocialauthuser(unittest.TestCase):
         }
 
     @patch("social_auth_user.get_cognito_client")
-    @patch("social_auth_user.get_ses_client")
+    @patch("social_auth_user.welcome_emails.enqueue")
     @patch("social_auth_user.verify_google_token")
     def test_social_auth_user_success(
-        self, mock_verify_token, mock_ses_client, mock_cognito_client
+        self, mock_verify_token, mock_enqueue, mock_cognito_client
     ):
         """Test successful social_auth_user execution"""
         # Mock Google token verification
@@ -89,14 +104,16 @@ class TestSocialauthuser(unittest.TestCase):
             }
         }
 
-        # Mock SES client
-        mock_ses = MagicMock()
-        mock_ses_client.return_value = mock_ses
+        # The welcome email is queued, not sent
+        mock_enqueue.return_value = True
 
         result = social_auth_user.lambda_handler(self.test_event, self.test_context)
 
         self.assertEqual(result["statusCode"], 201)
         self.assertIn("success", json.loads(result["body"]))
+        mock_enqueue.assert_called_once_with(
+            "test@example.com", {"name": "Test", "greeting": "Bienvenido"}
+        )
 
     def test_social_auth_user_invalid_event(self):
         """Test social_auth_user with invalid event"""
@@ -12,9 +12,22 @@ from unittest.mock import patch, MagicMock
 
 # Add the function directory to the path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add the shared layer (deployed under /opt/python) to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "..",
+        "..",
+        "Layers",
+        "common",
+        "python",
+    ),
+)
 
 # Import the function module
 import verifyAuthChallenge
+from fresa_common import user_cache
 
 
 class TestVerifyauthchallenge(unittest.TestCase):
@@ -22,6 +35,8 @@ class TestVerifyauthchallenge(unittest.TestCase):
 
     def setUp(self):
         """Set up test fixtures"""
+        # Drop Cognito users cached by earlier tests' mocks
+        user_cache.cache().clear()
         # Set required environment variables for testing
         os.environ["COGNITO_USER_POOL_ID"] = "us-east-1_test123"
         os.environ["COGNITO_CLIENT_ID"] = "test_client_id"
@@ -45,9 +60,9 @@ class TestVerifyauthchallenge(unittest.TestCase):
         }
 
     @patch("verifyAuthChallenge.get_cognito_client")
-    @patch("verifyAuthChallenge.get_dynamodb_resource")
+    @patch("verifyAuthChallenge.get_dynamodb_client")
     def test_verifyAuthChallenge_success(
-        self, mock_dynamodb_resource, mock_cognito_client
+        self, mock_dynamodb_client, mock_cognito_client
     ):
         """Test successful verifyAuthChallenge execution"""
         # Mock Cognito client
@@ -67,12 +82,13 @@ class TestVerifyauthchallenge(unittest.TestCase):
 
         # Mock DynamoDB
         mock_dynamodb = MagicMock()
-        mock_dynamodb_resource.return_value = mock_dynamodb
-        mock_table = MagicMock()
-        mock_dynamodb.Table.return_value = mock_table
+        mock_dynamodb_client.return_value = mock_dynamodb
         current_time = int(time.time())
-        mock_table.get_item.return_value = {
-            "Item": {"code": "123456", "lastRequestTime": current_time}
+        mock_dynamodb.get_item.return_value = {
+            "Item": {
+                "code": {"S": "123456"},
+                "lastRequestTime": {"N": str(current_time)},
+            }
         }
 
         result = verifyAuthChallenge.lambda_handler(self.test_event, self.test_context)
@@ -80,14 +96,35 @@ class TestVerifyauthchallenge(unittest.TestCase):
         self.assertEqual(result["statusCode"], 200)
         self.assertIn("access_token", json.loads(result["body"]))
 
-    def test_verifyAuthChallenge_invalid_event(self):
-        """Test verifyAuthChallenge with invalid event"""
-        invalid_event = {}
-        result = verifyAuthChallenge.lambda_handler(invalid_event, self.test_context)
+    @patch("verifyAuthChallenge.get_cognito_client")
+    @patch("verifyAuthChallenge.get_dynamodb_client")
+    def test_verifyAuthChallenge_invalid_event(
+        self, mock_dynamodb_client, mock_cognito_client
+    ):
+        """Test verifyAuthChallenge rejects invalid requests before any AWS call"""
+        result = verifyAuthChallenge.lambda_handler({}, self.test_context)
+        self.assertEqual(result["statusCode"], 400)
 
+        invalid_code = {"body": json.dumps({"email": "test@example.com", "code": "1a"})}
+        result = verifyAuthChallenge.lambda_handler(invalid_code, self.test_context)
+
+        self.assertEqual(result["statusCode"], 400)
         self.assertEqual(
-            result["statusCode"], 500
-        )  # Should return 500 for invalid event
+            json.loads(result["body"])["fields"], {"code": "must be digits"}
+        )
+        mock_cognito_client.assert_not_called()
+        mock_dynamodb_client.assert_not_called()
+
+    @patch("verifyAuthChallenge.get_cognito_client")
+    def test_verifyAuthChallenge_unexpected_error_not_leaked(self, mock_cognito_client):
+        """Test an unexpected error is a generic 500 with the CORS headers"""
+        mock_cognito_client.side_effect = RuntimeError("arn:aws:secret-detail")
+
+        result = verifyAuthChallenge.lambda_handler(self.test_event, self.test_context)
+
+        self.assertEqual(result["statusCode"], 500)
+        self.assertNotIn("secret-detail", result["body"])
+        self.assertEqual(result["headers"]["Access-Control-Allow-Origin"], "*")
 
 
 if __name__ == "__main__":
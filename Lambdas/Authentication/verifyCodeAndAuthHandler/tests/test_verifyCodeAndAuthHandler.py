@@ -6,18 +6,33 @@ from unittest.mock import Mock, patch, MagicMock
 
 # Add the parent directory to the path to import the Lambda function
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add the shared layer (deployed under /opt/python) to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "..",
+        "..",
+        "Layers",
+        "common",
+        "python",
+    ),
+)
 
 from verifyCodeAndAuthHandler import (
     lambda_handler,
     check_user_exists_in_cognito,
     validate_code_in_dynamodb,
 )
+from fresa_common import user_cache
 
 
 class TestVerifyCodeAndAuthHandler(unittest.TestCase):
 
     def setUp(self):
         """Set up test fixtures"""
+        # Drop Cognito users cached by earlier tests' mocks
+        user_cache.cache().clear()
         self.valid_event = {
             "body": json.dumps({"email": "test@example.com", "code": "123456"})
         }
@@ -48,7 +63,8 @@ class TestVerifyCodeAndAuthHandler(unittest.TestCase):
 
         self.assertEqual(response["statusCode"], 400)
         body = json.loads(response["body"])
-        self.assertEqual(body["error"], "Missing email or code")
+        self.assertEqual(body["error"], "Missing required field: email")
+        self.assertEqual(body["fields"], {"email": "required"})
 
     def test_missing_code(self):
         """Test missing code in request"""
@@ -58,7 +74,7 @@ class TestVerifyCodeAndAuthHandler(unittest.TestCase):
 
         self.assertEqual(response["statusCode"], 400)
         body = json.loads(response["body"])
-        self.assertEqual(body["error"], "Missing email or code")
+        self.assertEqual(body["error"], "Missing required field: code")
 
     def test_invalid_json(self):
         """Test invalid JSON in request body"""
@@ -164,6 +180,28 @@ class TestVerifyCodeAndAuthHandler(unittest.TestCase):
         self.assertEqual(result["error"], "Invalid code")
         self.assertEqual(result["status_code"], 401)
 
+    @patch("verifyCodeAndAuthHandler.get_dynamodb_client")
+    def test_validate_code_too_many_attempts(self, mock_get_dynamodb):
+        """Test even the right code is refused after too many wrong ones"""
+        import time
+
+        mock_dynamodb = Mock()
+        mock_get_dynamodb.return_value = mock_dynamodb
+
+        mock_dynamodb.get_item.return_value = {
+            "Item": {
+                "code": {"S": "123456"},
+                "lastRequestTime": {"N": str(int(time.time()) - 60)},
+                "attempts": {"N": "5"},
+            }
+        }
+
+        result = validate_code_in_dynamodb("test@example.com", "123456")
+
+        self.assertFalse(result["valid"])
+        self.assertEqual(result["status_code"], 429)
+        mock_dynamodb.update_item.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()
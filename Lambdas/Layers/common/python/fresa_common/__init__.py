@@ -0,0 +1,7 @@
+"""
+Fresa Common Layer
+Shared runtime code for the Authentication Lambda functions
+
+Deployed as a Lambda layer (python/ is added to sys.path under /opt/python)
+and bundled into zip deployments by scripts/deploy_with_aliases.py.
+"""
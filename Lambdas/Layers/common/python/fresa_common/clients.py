@@ -0,0 +1,123 @@
+"""
+Deadline-Sized AWS Clients
+boto3 clients and resources whose timeouts and retry counts fit the time the
+current invocation has left (see fresa_common.deadline)
+
+Usage in a handler module:
+
+    from fresa_common import clients
+
+    def get_dynamodb_client():
+        return clients.get_client("dynamodb")
+
+The per-attempt timeout is the time left divided by the attempts, rounded
+down to one of TIMEOUT_TIERS_S, and attempts are dropped while each would
+get less than the smallest tier. Clients are cached per (service, region,
+attempts, timeout), so warm invocations reuse a handful of clients instead
+of building one per call. Without a deadline (tests, scripts) the client
+gets max_attempts attempts of max_timeout_s.
+
+Cognito calls are also paced against the account's per-category quotas
+(see fresa_common.cognito_quota), and SES Throttling errors are counted
+(see fresa_common.ses_quota).
+"""
+
+import os
+
+import boto3
+from botocore.config import Config
+
+from fresa_common import cognito_quota, deadline, ses_quota
+
+TIMEOUT_TIERS_S = (0.5, 1, 2, 3, 5)
+CONNECT_TIMEOUT_S = 2
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_MAX_TIMEOUT_S = 5
+
+_clients = {}
+_resources = {}
+
+
+def plan_attempts(
+    remaining_ms, max_attempts=DEFAULT_MAX_ATTEMPTS, max_timeout_s=DEFAULT_MAX_TIMEOUT_S
+):
+    """(attempts, per-attempt timeout in seconds) fitting the time left"""
+    if remaining_ms is None:
+        return max_attempts, max_timeout_s
+
+    budget_s = max(remaining_ms, 0) / 1000
+    attempts = max_attempts
+    while attempts > 1 and budget_s / attempts < TIMEOUT_TIERS_S[0]:
+        attempts -= 1
+
+    per_attempt_s = min(max_timeout_s, budget_s / attempts)
+    fitting = [tier for tier in TIMEOUT_TIERS_S if tier <= per_attempt_s]
+    return attempts, fitting[-1] if fitting else TIMEOUT_TIERS_S[0]
+
+
+def _config(attempts, timeout):
+    return Config(
+        connect_timeout=min(timeout, CONNECT_TIMEOUT_S),
+        read_timeout=timeout,
+        retries={"total_max_attempts": attempts, "mode": "standard"},
+    )
+
+
+def _register_hooks(events):
+    # First, so an attempt that cannot fit is refused before anything else runs
+    events.register_first("before-send.*.*", deadline.before_send)
+    events.register_first("needs-retry.*.*", deadline.needs_retry)
+    cognito_quota.register(events)
+    ses_quota.register(events)
+
+
+def _plan(region_name, max_attempts, max_timeout_s):
+    region = region_name or os.environ.get("AWS_REGION", "us-east-1")
+    attempts, timeout = plan_attempts(
+        deadline.remaining_ms(), max_attempts, max_timeout_s
+    )
+    return region, attempts, timeout
+
+
+def get_client(
+    service_name,
+    region_name=None,
+    max_attempts=DEFAULT_MAX_ATTEMPTS,
+    max_timeout_s=DEFAULT_MAX_TIMEOUT_S,
+):
+    """A boto3 client sized to the current deadline"""
+    region, attempts, timeout = _plan(region_name, max_attempts, max_timeout_s)
+    key = (service_name, region, attempts, timeout)
+    client = _clients.get(key)
+    if client is None:
+        client = boto3.client(
+            service_name, region_name=region, config=_config(attempts, timeout)
+        )
+        _register_hooks(client.meta.events)
+        _clients[key] = client
+    return client
+
+
+def get_resource(
+    service_name,
+    region_name=None,
+    max_attempts=DEFAULT_MAX_ATTEMPTS,
+    max_timeout_s=DEFAULT_MAX_TIMEOUT_S,
+):
+    """A boto3 resource sized to the current deadline"""
+    region, attempts, timeout = _plan(region_name, max_attempts, max_timeout_s)
+    key = (service_name, region, attempts, timeout)
+    resource = _resources.get(key)
+    if resource is None:
+        resource = boto3.resource(
+            service_name, region_name=region, config=_config(attempts, timeout)
+        )
+        _register_hooks(resource.meta.client.meta.events)
+        _resources[key] = resource
+    return resource
+
+
+def clear_cache():
+    """Drop cached clients (tests, or after changing credentials)"""
+    _clients.clear()
+    _resources.clear()
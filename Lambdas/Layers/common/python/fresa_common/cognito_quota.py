@@ -0,0 +1,243 @@
+"""
+Cognito Quotas
+Client-side pacing of Cognito calls against the per-category request quotas
+
+Cognito limits requests per second per account and category
+(UserAuthentication, UserCreation, UserRead, UserUpdate, ...), and a burst
+over a category's quota fails with TooManyRequestsException. Each category
+gets a token bucket in the container, so a burst is spread out in the
+container instead of being sent as fast as it arrives.
+
+Clients from fresa_common.clients register the hooks, so nothing changes in
+the handlers:
+
+    def get_cognito_client():
+        return clients.get_client("cognito-idp")
+
+Every attempt, retries included, takes a token from its operation's bucket
+first, waiting for one if the bucket is empty. The wait is capped at
+MAX_WAIT_S and by the invocation's deadline; after that the attempt is sent
+anyway and Cognito decides. Operations without a category are not paced.
+
+A throttled attempt halves its category's rate, which then climbs back to
+the configured rate over RECOVERY_S. The retry itself is botocore's
+standard mode (truncated exponential backoff with full jitter), paced
+through the same bucket. Because every container backs off when the
+account quota is hit, containers converge on sharing it without talking to
+each other.
+
+Per category, each invocation's EMF line gets Cognito<Category>Wait
+(milliseconds spent waiting for tokens), Cognito<Category>Throttled
+(TooManyRequestsException responses) and Cognito<Category>Saturation (how
+much of the bucket was in use at the last call, in percent).
+
+- COGNITO_QUOTA_SHARE: fraction of each account quota one container may use (default 1)
+- COGNITO_QUOTA_<CATEGORY>: requests per second for one category, e.g.
+  COGNITO_QUOTA_USER_READ=60, overriding DEFAULT_QUOTAS
+
+A rate of 0 (from either setting) turns pacing off for the category; a
+negative rate is a configuration error.
+"""
+
+import os
+import re
+import threading
+import time
+
+from fresa_common import deadline, metrics
+
+# Default account quotas in requests per second
+DEFAULT_QUOTAS = {
+    "UserAuthentication": 120,
+    "UserCreation": 50,
+    "UserAccountRecovery": 30,
+    "UserRead": 120,
+    "UserUpdate": 25,
+    "UserList": 30,
+    "UserToken": 120,
+}
+
+OPERATION_CATEGORIES = {
+    "InitiateAuth": "UserAuthentication",
+    "AdminInitiateAuth": "UserAuthentication",
+    "RespondToAuthChallenge": "UserAuthentication",
+    "AdminRespondToAuthChallenge": "UserAuthentication",
+    "SignUp": "UserCreation",
+    "ConfirmSignUp": "UserCreation",
+    "AdminCreateUser": "UserCreation",
+    "AdminConfirmSignUp": "UserCreation",
+    "ForgotPassword": "UserAccountRecovery",
+    "ConfirmForgotPassword": "UserAccountRecovery",
+    "GetUser": "UserRead",
+    "AdminGetUser": "UserRead",
+    "AdminSetUserPassword": "UserUpdate",
+    "AdminUpdateUserAttributes": "UserUpdate",
+    "UpdateUserAttributes": "UserUpdate",
+    "ChangePassword": "UserUpdate",
+    "AdminDeleteUser": "UserUpdate",
+    "AdminDisableUser": "UserUpdate",
+    "AdminEnableUser": "UserUpdate",
+    "ListUsers": "UserList",
+    "GlobalSignOut": "UserToken",
+    "AdminUserGlobalSignOut": "UserToken",
+    "RevokeToken": "UserToken",
+}
+
+THROTTLING_ERROR = "TooManyRequestsException"
+MAX_WAIT_S = 1.0
+RECOVERY_S = 30
+# Throttling never slows a category below this fraction of its rate
+MIN_RATE_SHARE = 0.05
+
+
+def category(operation):
+    """The quota category of a Cognito operation name, or None"""
+    return OPERATION_CATEGORIES.get(operation)
+
+
+def _env_name(category_name):
+    return "COGNITO_QUOTA_" + re.sub(r"(?<!^)(?=[A-Z])", "_", category_name).upper()
+
+
+def quota_config():
+    """Requests per second per category for this container; 0 is not paced"""
+    share = float(os.environ.get("COGNITO_QUOTA_SHARE", 1))
+    if share < 0:
+        raise ValueError(f"COGNITO_QUOTA_SHARE must not be negative: {share}")
+    config = {}
+    for name, rate in DEFAULT_QUOTAS.items():
+        config[name] = float(os.environ.get(_env_name(name), rate * share))
+        if config[name] < 0:
+            raise ValueError(f"{_env_name(name)} must not be negative: {config[name]}")
+    return config
+
+
+class TokenBucket:
+    """Token bucket whose rate halves on throttling and recovers over time"""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError(f"A token bucket needs a positive rate, not {rate}")
+        self.base_rate = rate
+        self.rate = rate
+        # One second's worth of calls by default
+        self.burst = burst if burst is not None else max(rate, 1)
+        self.tokens = self.burst
+        self.clock = clock
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = max(now - self.updated, 0)
+        self.updated = now
+        self.rate = min(
+            self.base_rate, self.rate + self.base_rate * elapsed / RECOVERY_S
+        )
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+
+    def reserve(self):
+        """Take a token; returns the seconds to wait before using it"""
+        with self._lock:
+            self._refill(self.clock())
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            # Tokens owed by earlier reservations are paid off first
+            return -self.tokens / self.rate
+
+    def throttled(self):
+        """Halve the rate after Cognito refused a call"""
+        with self._lock:
+            self._refill(self.clock())
+            self.rate = max(self.rate / 2, self.base_rate * MIN_RATE_SHARE)
+
+    def saturation(self):
+        """Share of the burst in use (or owed), 0 to 1 or more"""
+        with self._lock:
+            self._refill(self.clock())
+            return 1 - self.tokens / self.burst
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket(category_name):
+    """The container's bucket for a category, created on first use
+
+    None for a category configured with a rate of 0 (not paced).
+    """
+    with _buckets_lock:
+        if category_name not in _buckets:
+            rate = quota_config()[category_name]
+            _buckets[category_name] = TokenBucket(rate) if rate else None
+        return _buckets[category_name]
+
+
+def reset():
+    """Drop every bucket (tests, or after changing the configuration)"""
+    with _buckets_lock:
+        _buckets.clear()
+
+
+def _max_wait_s():
+    remaining_ms = deadline.remaining_ms()
+    if remaining_ms is None:
+        return MAX_WAIT_S
+    # Leave the attempt itself enough time to run
+    return max(min(MAX_WAIT_S, (remaining_ms - deadline.MIN_CALL_MS) / 1000), 0)
+
+
+def acquire(category_name):
+    """Wait for a token in the category's bucket; returns seconds waited"""
+    paced = bucket(category_name)
+    if paced is None:
+        return 0.0
+    wait_s = min(paced.reserve(), _max_wait_s())
+    if wait_s > 0:
+        time.sleep(wait_s)
+        metrics.increment_metric(
+            f"Cognito{category_name}Wait", wait_s * 1000, "Milliseconds"
+        )
+    metrics.put_metric(
+        f"Cognito{category_name}Saturation",
+        round(max(paced.saturation(), 0) * 100, 1),
+        "Percent",
+    )
+    return wait_s
+
+
+# botocore hooks, registered by fresa_common.clients
+
+
+def _operation(event_name):
+    return event_name.rsplit(".", 1)[-1]
+
+
+def before_send(event_name, **kwargs):
+    # Runs before every attempt, retries included
+    category_name = category(_operation(event_name))
+    if category_name is not None:
+        acquire(category_name)
+
+
+def needs_retry(event_name, response=None, **kwargs):
+    # Only observes; botocore's retry handler decides whether to retry
+    if response is None:
+        return None
+    _, parsed = response
+    if parsed.get("Error", {}).get("Code") != THROTTLING_ERROR:
+        return None
+    category_name = category(_operation(event_name))
+    if category_name is not None:
+        paced = bucket(category_name)
+        if paced is not None:
+            paced.throttled()
+        metrics.increment_metric(f"Cognito{category_name}Throttled")
+    return None
+
+
+def register(events):
+    """Pace the Cognito calls of a client's event system"""
+    events.register("before-send.cognito-identity-provider.*", before_send)
+    events.register("needs-retry.cognito-identity-provider.*", needs_retry)
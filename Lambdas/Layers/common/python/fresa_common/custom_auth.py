@@ -0,0 +1,84 @@
+"""
+Custom Auth
+Signs a user in through Cognito's CUSTOM_AUTH flow once their email code
+has been checked, and answers with their tokens
+
+Usage in a handler module:
+
+    from fresa_common import custom_auth
+
+    @middleware.api_handler(schema=VERIFY_CODE_REQUEST)
+    def lambda_handler(event, context):
+        ...  # user exists and the code is valid
+        return custom_auth.authenticate(
+            get_cognito_client(), get_client_id(), email, code
+        )
+
+The flow is InitiateAuth followed by RespondToAuthChallenge with the code as
+the answer, which runs the define/create/verify auth challenge triggers.
+Cognito errors become the responses in AUTH_ERRORS (401 for anything not
+listed); their text is logged, never returned. The refresh token is passed
+on only when Cognito issues one.
+"""
+
+from botocore.exceptions import ClientError
+
+from fresa_common import log, responses, tracing
+
+logger = log.get_logger(__name__)
+
+# Cognito errors from the custom auth flow: (status, message)
+AUTH_ERRORS = {
+    "NotAuthorizedException": (401, "Invalid code or authentication failed"),
+    "CodeMismatchException": (401, "Invalid verification code"),
+    "ExpiredCodeException": (401, "Verification code has expired"),
+    "InvalidLambdaResponseException": (
+        500,
+        "Authentication service configuration error",
+    ),
+}
+DEFAULT_AUTH_ERROR = (401, "Authentication failed")
+
+
+def tokens(auth_result):
+    """The response body for Cognito's AuthenticationResult"""
+    body = {
+        "access_token": auth_result["AccessToken"],
+        "id_token": auth_result["IdToken"],
+        "token_type": auth_result.get("TokenType", "Bearer"),
+        "expires_in": auth_result.get("ExpiresIn"),
+    }
+    # May not be present in the custom auth flow
+    if "RefreshToken" in auth_result:
+        body["refresh_token"] = auth_result["RefreshToken"]
+    return body
+
+
+def authenticate(cognito, client_id, email, code, headers=responses.DEFAULT_HEADERS):
+    """Run the custom auth flow for email; a 200 with tokens or an error"""
+    try:
+        auth_response = cognito.initiate_auth(
+            ClientId=client_id,
+            AuthFlow="CUSTOM_AUTH",
+            AuthParameters={"USERNAME": email},
+            ClientMetadata=tracing.client_metadata(),
+        )
+        logger.debug("Auth initiated", hasSession="Session" in auth_response)
+
+        challenge_response = cognito.respond_to_auth_challenge(
+            ClientId=client_id,
+            ChallengeName="CUSTOM_CHALLENGE",
+            Session=auth_response["Session"],
+            ChallengeResponses={"USERNAME": email, "ANSWER": code},
+            ClientMetadata=tracing.client_metadata(),
+        )
+    except ClientError as e:
+        error_code = e.response["Error"].get("Code")
+        logger.warning("Cognito auth failed: %s", e, errorCode=error_code)
+        status_code, message = AUTH_ERRORS.get(error_code, DEFAULT_AUTH_ERROR)
+        return responses.error(status_code, message, headers)
+
+    logger.info("Authentication successful", email=email)
+    return responses.respond(
+        200, tokens(challenge_response["AuthenticationResult"]), headers
+    )
@@ -0,0 +1,136 @@
+"""
+Invocation Deadlines
+Tracks how much of the invocation is left so downstream calls can be sized
+to it, optional work can be skipped, and a slow dependency produces a fast,
+clean error instead of a billed Lambda timeout.
+
+Usage in a handler module:
+
+    from fresa_common import deadline
+
+    @deadline.with_deadline()
+    def lambda_handler(event, context):
+        ...
+        if deadline.has_time_for(WELCOME_EMAIL_BUDGET_MS):
+            send_welcome_email(...)
+
+The deadline is context.get_remaining_time_in_millis() minus a reserve kept
+back to build and return the response. Cognito triggers pass
+budget_ms=COGNITO_TRIGGER_BUDGET_MS, because Cognito gives up on a trigger
+after about 5 seconds whatever the function timeout is.
+
+Clients from fresa_common.clients are sized from the current deadline and
+check it before every attempt: a call that cannot fit raises
+DeadlineExceeded, and no retry is started once the time is gone.
+"""
+
+import functools
+import time
+
+DEFAULT_RESERVE_MS = 500
+COGNITO_TRIGGER_BUDGET_MS = 5000
+# Shortest attempt worth starting; anything less would only time out
+MIN_CALL_MS = 300
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of starting work the invocation has no time left for"""
+
+
+class Deadline:
+    """Point in time by which the handler's downstream work must be done"""
+
+    def __init__(self, remaining_ms, reserve_ms=DEFAULT_RESERVE_MS):
+        self.budget_ms = max(remaining_ms - reserve_ms, 0)
+        self.expires_at = time.monotonic() + self.budget_ms / 1000
+
+    @classmethod
+    def from_context(cls, context, budget_ms=None, reserve_ms=DEFAULT_RESERVE_MS):
+        """Build a deadline from a Lambda context, or None if it has no clock"""
+        remaining_ms = None
+        get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+        if callable(get_remaining):
+            remaining_ms = get_remaining()
+            # Test doubles (Mock contexts) return something that is not a number
+            if not isinstance(remaining_ms, (int, float)):
+                remaining_ms = None
+        if budget_ms is not None:
+            remaining_ms = (
+                budget_ms if remaining_ms is None else min(remaining_ms, budget_ms)
+            )
+        if remaining_ms is None:
+            return None
+        return cls(remaining_ms, reserve_ms)
+
+    def remaining_ms(self):
+        return max((self.expires_at - time.monotonic()) * 1000, 0.0)
+
+    def has_time_for(self, needed_ms):
+        return self.remaining_ms() >= needed_ms
+
+    def check(self, what="downstream call", needed_ms=MIN_CALL_MS):
+        """Raise DeadlineExceeded unless needed_ms are still left"""
+        remaining = self.remaining_ms()
+        if remaining < needed_ms:
+            raise DeadlineExceeded(
+                f"{remaining:.0f} ms left, not enough for {what} ({needed_ms} ms)"
+            )
+
+
+_current = None
+
+
+def current():
+    """The deadline of the invocation in progress, or None"""
+    return _current
+
+
+def remaining_ms():
+    """Milliseconds left in the current invocation, or None without a deadline"""
+    return _current.remaining_ms() if _current is not None else None
+
+
+def has_time_for(needed_ms):
+    """True if needed_ms are left; always True without a deadline"""
+    return _current is None or _current.has_time_for(needed_ms)
+
+
+def timeout_s(max_s):
+    """A per-request timeout in seconds capped by the time left"""
+    if _current is None:
+        return max_s
+    return max(min(max_s, _current.remaining_ms() / 1000), MIN_CALL_MS / 1000)
+
+
+def with_deadline(budget_ms=None, reserve_ms=DEFAULT_RESERVE_MS):
+    """Set the current deadline from the Lambda context for each invocation"""
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global _current
+            _current = Deadline.from_context(context, budget_ms, reserve_ms)
+            try:
+                return handler(event, context)
+            finally:
+                _current = None
+
+        return wrapper
+
+    return decorator
+
+
+# botocore hooks, registered by fresa_common.clients
+
+
+def before_send(request, **kwargs):
+    # Runs before every attempt, retries included
+    if _current is not None:
+        _current.check(f"{request.method} {request.url.split('?')[0]}")
+
+
+def needs_retry(attempts, **kwargs):
+    # False stops botocore from retrying; None defers to the retry handler
+    if _current is not None and not _current.has_time_for(MIN_CALL_MS):
+        return False
+    return None
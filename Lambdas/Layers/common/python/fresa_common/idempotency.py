@@ -0,0 +1,401 @@
+"""
+Idempotency
+Makes a retried API request return the first attempt's response instead of
+running the handler again
+
+Usage in a handler module:
+
+    from fresa_common import idempotency
+
+    def get_idempotency_store():
+        return idempotency.IdempotencyStore(
+            get_dynamodb_client(), get_dynamodb_table_name()
+        )
+
+    @metrics.instrument_handler
+    @tracing.trace_handler
+    @log.inject_request_context
+    @deadline.with_deadline()
+    @idempotency.idempotent(get_idempotency_store)
+    def lambda_handler(event, context):
+        ...
+
+A request is identified by its Idempotency-Key header or, without one, by
+a hash of its body and query string. The first request claims the key with
+a conditional put of an IN_PROGRESS record; when the handler returns a 2xx
+response it is stored as COMPLETED, and any other result releases the key
+so a retry runs again. A duplicate then:
+
+- gets the stored response, marked with an Idempotent-Replayed header
+- waits briefly (within the deadline) while the first is still running,
+  and gets a 409 if it is still running after that
+- gets a 422 if it reuses an Idempotency-Key with a different request
+
+Records live in the VerificationCodes table under "idempotency#<function>#"
+keys, like the send limit counters, and expire through its TTL. Requests
+keyed by a hash are only deduplicated for a short window, so a user who
+asks for another code on purpose still gets one. Completed records are
+also kept in the container, so a retry that lands on the same container
+costs no read.
+
+Stored responses are only returned for the exact same request, which
+could have obtained them anyway. A response carrying anything log.redact()
+would hide (signUpCustomer's tokens) is never written to the table: its
+record only marks the request as done, and a retry that misses the
+container's copy gets a 409 instead of running the request twice. If the
+store fails, the request runs without idempotency. Queued events (SQS
+batches, with "Records") are not API requests and pass through.
+
+- IDEMPOTENCY_DISABLED: set to "true" to turn the decorator off
+- IDEMPOTENCY_TTL_SECONDS: how long a response is kept for an Idempotency-Key (default 3600)
+- IDEMPOTENCY_HASH_WINDOW_SECONDS: the same for requests without a key (default 30)
+- IDEMPOTENCY_WAIT_MS: how long a duplicate waits for the first request (default 2000)
+"""
+
+import copy
+import functools
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from fresa_common import deadline, log, metrics, responses
+from fresa_common.deadline import DeadlineExceeded
+
+logger = log.get_logger(__name__)
+
+HEADER = "idempotency-key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+KEY_PREFIX = "idempotency#"
+
+IN_PROGRESS = "IN_PROGRESS"
+COMPLETED = "COMPLETED"
+
+DEFAULT_TTL_SECONDS = 60 * 60
+DEFAULT_HASH_WINDOW_SECONDS = 30
+DEFAULT_WAIT_MS = 2000
+# How long an IN_PROGRESS claim holds without a deadline (scripts, tests)
+DEFAULT_LEASE_SECONDS = 30
+POLL_INTERVAL_S = 0.1
+MAX_CLAIM_ATTEMPTS = 3
+CACHE_MAX_ENTRIES = 256
+
+
+def is_disabled():
+    return os.environ.get("IDEMPOTENCY_DISABLED", "").lower() == "true"
+
+
+def _setting(name, default):
+    return float(os.environ.get(name, default))
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def request_key(scope, event):
+    """(record key, request fingerprint, seconds to keep) or None
+
+    None means the request carries nothing to recognise a retry by.
+    """
+    headers = {
+        name.lower(): value
+        for name, value in ((event or {}).get("headers") or {}).items()
+    }
+    explicit = headers.get(HEADER)
+    body = (event or {}).get("body")
+    query = (event or {}).get("queryStringParameters")
+    if not explicit and body is None and not query:
+        return None
+
+    fingerprint = _sha256(json.dumps({"body": body, "query": query}, sort_keys=True))
+    if explicit:
+        ttl_s = _setting("IDEMPOTENCY_TTL_SECONDS", DEFAULT_TTL_SECONDS)
+        key = f"{KEY_PREFIX}{scope}#{_sha256(explicit)}"
+    else:
+        ttl_s = _setting("IDEMPOTENCY_HASH_WINDOW_SECONDS", DEFAULT_HASH_WINDOW_SECONDS)
+        key = f"{KEY_PREFIX}{scope}#{fingerprint}"
+    return key, fingerprint, ttl_s
+
+
+class IdempotencyRecord:
+    """One idempotency record, decoded from its DynamoDB item"""
+
+    __slots__ = ("status", "fingerprint", "response", "expires_at")
+
+    def __init__(self, status, fingerprint, response=None, expires_at=0):
+        self.status = status
+        self.fingerprint = fingerprint
+        self.response = response
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        return f"IdempotencyRecord(status={self.status}, expires_at={self.expires_at})"
+
+
+def decode(item):
+    response = item.get("response", {}).get("S")
+    return IdempotencyRecord(
+        item.get("status", {}).get("S"),
+        item.get("fingerprint", {}).get("S"),
+        json.loads(response) if response else None,
+        float(item.get("expiresAt", {}).get("N", 0)),
+    )
+
+
+class IdempotencyStore:
+    """Idempotency records in a table keyed by "email" (VerificationCodes)"""
+
+    def __init__(self, client, table_name):
+        self.client = client
+        self.table_name = table_name
+
+    def claim(self, key, fingerprint, lease_until, now=None):
+        """Claim key for this request; returns the existing record if taken"""
+        now = time.time() if now is None else now
+        for _ in range(MAX_CLAIM_ATTEMPTS):
+            try:
+                self.client.put_item(
+                    TableName=self.table_name,
+                    Item={
+                        "email": {"S": key},
+                        "status": {"S": IN_PROGRESS},
+                        "fingerprint": {"S": fingerprint},
+                        "expiresAt": {"N": str(lease_until)},
+                        "ttl": {"N": str(int(lease_until) + 1)},
+                    },
+                    # An expired record (a crashed claim, an old response) is free
+                    ConditionExpression="attribute_not_exists(#key) OR #expiresAt < :now",
+                    ExpressionAttributeNames={
+                        "#key": "email",
+                        "#expiresAt": "expiresAt",
+                    },
+                    ExpressionAttributeValues={":now": {"N": str(now)}},
+                )
+                return None
+            except ClientError as e:
+                if e.response["Error"].get("Code") != "ConditionalCheckFailedException":
+                    raise
+            existing = self.get(key, now)
+            if existing is not None:
+                return existing
+            # Released or expired between the put and the read; try again
+            now = time.time()
+        return IdempotencyRecord(IN_PROGRESS, fingerprint, expires_at=lease_until)
+
+    def get(self, key, now=None):
+        """The unexpired record for key, or None"""
+        now = time.time() if now is None else now
+        response = self.client.get_item(
+            TableName=self.table_name,
+            Key={"email": {"S": key}},
+            ConsistentRead=True,
+        )
+        item = response.get("Item")
+        if not item:
+            return None
+        record = decode(item)
+        return record if record.expires_at > now else None
+
+    def complete(self, key, fingerprint, response, expires_at):
+        """Mark key done; response=None keeps the response out of the table"""
+        item = {
+            "email": {"S": key},
+            "status": {"S": COMPLETED},
+            "fingerprint": {"S": fingerprint},
+            "expiresAt": {"N": str(expires_at)},
+            "ttl": {"N": str(int(expires_at) + 1)},
+        }
+        if response is not None:
+            item["response"] = {"S": json.dumps(response)}
+        self.client.put_item(TableName=self.table_name, Item=item)
+
+    def release(self, key):
+        self.client.delete_item(TableName=self.table_name, Key={"email": {"S": key}})
+
+
+class _CompletedCache:
+    """Completed records seen by this container, least recently used first"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key, now):
+        record = self._entries.get(key)
+        if record is None:
+            return None
+        if record.expires_at <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return record
+
+    def put(self, key, record):
+        self._entries[key] = record
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+_completed = _CompletedCache()
+
+
+def clear_cache():
+    """Forget completed records kept in the container (tests)"""
+    _completed.clear()
+
+
+def _lease_until(now):
+    remaining_ms = deadline.remaining_ms()
+    if remaining_ms is None:
+        return now + DEFAULT_LEASE_SECONDS
+    return now + remaining_ms / 1000
+
+
+def _wait_until(now):
+    wait_s = _setting("IDEMPOTENCY_WAIT_MS", DEFAULT_WAIT_MS) / 1000
+    remaining_ms = deadline.remaining_ms()
+    if remaining_ms is not None:
+        wait_s = min(wait_s, (remaining_ms - deadline.MIN_CALL_MS) / 1000)
+    return now + wait_s
+
+
+def _claim_or_wait(store, key, fingerprint):
+    """None once claimed, else the record of the request that holds the key"""
+    now = time.time()
+    lease_until = _lease_until(now)
+    wait_until = _wait_until(now)
+    existing = store.claim(key, fingerprint, lease_until, now)
+    while (
+        existing is not None
+        and existing.status == IN_PROGRESS
+        and existing.fingerprint == fingerprint
+        and time.time() + POLL_INTERVAL_S <= wait_until
+    ):
+        time.sleep(POLL_INTERVAL_S)
+        existing = store.get(key)
+        if existing is None:
+            # The first request failed and released the key; run this one
+            existing = store.claim(key, fingerprint, lease_until)
+    return existing
+
+
+def _storable(response):
+    return (
+        isinstance(response, dict)
+        and isinstance(response.get("statusCode"), int)
+        and 200 <= response["statusCode"] < 300
+    )
+
+
+def _persistable(response):
+    """Whether response holds nothing log.redact() would hide"""
+    body = response.get("body")
+    try:
+        body = json.loads(body) if body else body
+    except ValueError:
+        pass
+    headers = response.get("headers") or {}
+    return log.redact(body) == body and log.redact(headers) == headers
+
+
+def _respond_to_duplicate(record, fingerprint, headers):
+    if record.fingerprint != fingerprint:
+        metrics.set_property("idempotency", "key_reused")
+        return responses.error(
+            422, "Idempotency-Key was already used for a different request", headers
+        )
+    if record.status != COMPLETED:
+        metrics.set_property("idempotency", "in_progress")
+        return responses.error(
+            409, "The same request is still in progress", headers, retry_after=1
+        )
+    if record.response is None:
+        # Done elsewhere, and its response was not kept (it held tokens)
+        metrics.set_property("idempotency", "completed")
+        return responses.error(409, "The same request already succeeded", headers)
+
+    metrics.set_property("idempotency", "replayed")
+    metrics.put_metric("IdempotentReplay", 1)
+    response = copy.deepcopy(record.response)
+    response["headers"] = dict(
+        response.get("headers") or {}, **{REPLAYED_HEADER: "true"}
+    )
+    return response
+
+
+def idempotent(get_store, headers=None):
+    """Run a handler at most once per request key
+
+    get_store returns the IdempotencyStore to use; headers are added to the
+    409 and 422 responses (CORS headers, for instance).
+    """
+
+    def decorator(handler):
+        scope = handler.__module__
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if is_disabled() or (isinstance(event, dict) and "Records" in event):
+                return handler(event, context)
+            request = request_key(scope, event)
+            if request is None:
+                return handler(event, context)
+            key, fingerprint, ttl_s = request
+
+            cached = _completed.get(key, time.time())
+            if cached is not None:
+                return _respond_to_duplicate(cached, fingerprint, headers)
+
+            store = get_store()
+            if not store.table_name:
+                return handler(event, context)
+            try:
+                existing = _claim_or_wait(store, key, fingerprint)
+            except (ClientError, BotoCoreError, DeadlineExceeded) as e:
+                logger.warning("Idempotency store unavailable, running anyway: %s", e)
+                return handler(event, context)
+            if existing is not None:
+                if existing.status == COMPLETED:
+                    _completed.put(key, existing)
+                return _respond_to_duplicate(existing, fingerprint, headers)
+
+            metrics.put_metric("IdempotentReplay", 0)
+            try:
+                response = handler(event, context)
+            except Exception:
+                _release(store, key)
+                raise
+
+            if not _storable(response):
+                _release(store, key)
+                return response
+            record = IdempotencyRecord(
+                COMPLETED, fingerprint, response, time.time() + ttl_s
+            )
+            try:
+                stored = response if _persistable(response) else None
+                store.complete(key, fingerprint, stored, record.expires_at)
+                _completed.put(key, record)
+            except (ClientError, BotoCoreError, DeadlineExceeded) as e:
+                logger.warning("Could not store idempotent response: %s", e)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _release(store, key):
+    try:
+        store.release(key)
+    except (ClientError, BotoCoreError, DeadlineExceeded) as e:
+        # The claim still expires with the invocation's deadline
+        logger.warning("Could not release idempotency key: %s", e)
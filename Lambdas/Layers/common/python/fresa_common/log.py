@@ -0,0 +1,249 @@
+"""
+Structured Logging
+Leveled JSON logger for the Lambda handlers
+
+Usage in a handler module:
+
+    from fresa_common import log
+
+    logger = log.get_logger(__name__)
+
+    @log.inject_request_context
+    def lambda_handler(event, context):
+        logger.debug("Parsed request body: %s", body)
+        logger.info("Code validated", email=email)
+
+Each event is one JSON line with timestamp, level, logger, message, the
+request id and any keyword fields. The message is only %-formatted when the
+level is enabled, so debug calls cost a level check on the hot path.
+
+Configuration (read at the start of every request):
+  LOG_LEVEL               DEBUG, INFO (default), WARNING or ERROR
+  LOG_DEBUG_SAMPLE_RATE   fraction of requests logged at DEBUG regardless
+                          of LOG_LEVEL, e.g. 0.01
+
+Lines are buffered for the duration of a request and written with a single
+stdout write when the handler returns. ERROR lines, and a buffer that reaches
+BUFFER_LIMIT lines, flush immediately so nothing important is lost if the
+invocation times out.
+
+Tokens, sessions, passwords and verification codes are redacted from fields,
+and anything that looks like a JWT is redacted from messages.
+"""
+
+import functools
+import json
+import os
+import random
+import re
+import sys
+import time
+import traceback
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+BUFFER_LIMIT = 50
+REDACTED = "[REDACTED]"
+
+# Field names (lowercased) whose values are never logged
+SENSITIVE_KEYS = {
+    "code",
+    "answer",
+    "session",
+    "password",
+    "authorization",
+    "secret",
+    "client_secret",
+}
+SENSITIVE_SUFFIXES = ("token", "password", "secret")
+
+JWT_PATTERN = re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*")
+
+_level = INFO
+_effective_level = INFO
+_sample_rate = 0.0
+_request = {}
+_buffer = []
+_buffering = False
+
+
+# Reused so each line does not construct a new encoder
+_encoder = json.JSONEncoder(default=str, separators=(",", ":"), check_circular=False)
+_timestamp_second = None
+_timestamp_prefix = ""
+
+
+def configure():
+    """Re-read LOG_LEVEL and LOG_DEBUG_SAMPLE_RATE from the environment"""
+    global _level, _effective_level, _sample_rate
+    _level = LEVELS.get(os.environ.get("LOG_LEVEL", "INFO").upper(), INFO)
+    _effective_level = _level
+    try:
+        _sample_rate = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0"))
+    except ValueError:
+        _sample_rate = 0.0
+
+
+configure()
+
+
+def is_sensitive(key):
+    key = str(key).lower()
+    return key in SENSITIVE_KEYS or key.endswith(SENSITIVE_SUFFIXES)
+
+
+def redact(value):
+    """Copy of value with sensitive fields and JWTs replaced"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if is_sensitive(key) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return JWT_PATTERN.sub(REDACTED, value)
+    return value
+
+
+def _timestamp():
+    """ISO 8601 UTC timestamp with milliseconds; formats once per second"""
+    global _timestamp_second, _timestamp_prefix
+    now = time.time()
+    second = int(now)
+    if second != _timestamp_second:
+        _timestamp_second = second
+        _timestamp_prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+    return "%s.%03dZ" % (_timestamp_prefix, (now - second) * 1000)
+
+
+def _write(lines):
+    sys.stdout.write("".join(lines))
+
+
+def flush():
+    """Write all buffered lines with a single stdout write"""
+    if _buffer:
+        lines = _buffer[:]
+        del _buffer[:]
+        _write(lines)
+
+
+class Logger:
+    """Named logger writing JSON lines through the module buffer"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def is_enabled_for(self, level):
+        return level >= _effective_level
+
+    def log(self, level, message, *args, exc_info=False, **fields):
+        if level < _effective_level:
+            return
+
+        # Only interpolated arguments can carry a token into the message
+        if args:
+            try:
+                message = message % args
+            except (TypeError, ValueError):
+                message = " ".join([str(message)] + [str(arg) for arg in args])
+            message = JWT_PATTERN.sub(REDACTED, message)
+
+        record = {
+            "timestamp": _timestamp(),
+            "level": LEVEL_NAMES[level],
+            "logger": self.name,
+            "message": message,
+        }
+        record.update(_request.get("fields", {}))
+        if fields:
+            record.update(redact(fields))
+        if exc_info:
+            record["exception"] = traceback.format_exc()
+
+        _buffer.append(_encoder.encode(record) + "\n")
+        if not _buffering or level >= ERROR or len(_buffer) >= BUFFER_LIMIT:
+            flush()
+
+    def debug(self, message, *args, **fields):
+        if DEBUG >= _effective_level:
+            self.log(DEBUG, message, *args, **fields)
+
+    def info(self, message, *args, **fields):
+        self.log(INFO, message, *args, **fields)
+
+    def warning(self, message, *args, **fields):
+        self.log(WARNING, message, *args, **fields)
+
+    def error(self, message, *args, **fields):
+        self.log(ERROR, message, *args, **fields)
+
+    def exception(self, message, *args, **fields):
+        """Log at ERROR with the current exception's traceback"""
+        self.log(ERROR, message, *args, exc_info=True, **fields)
+
+
+_loggers = {}
+
+
+def get_logger(name):
+    if name not in _loggers:
+        _loggers[name] = Logger(name)
+    return _loggers[name]
+
+
+def _context_value(context, name):
+    """Read a Lambda context attribute; the local harness may pass a dict"""
+    if isinstance(context, dict):
+        return context.get(name)
+    return getattr(context, name, None)
+
+
+def start_request(context):
+    """Begin buffering and decide whether this request is debug-sampled"""
+    global _buffering, _effective_level
+    configure()
+    _request.clear()
+    _request["fields"] = {"requestId": _context_value(context, "aws_request_id")}
+    if _sample_rate > 0 and random.random() < _sample_rate:
+        _effective_level = DEBUG
+        _request["fields"]["debugSampled"] = True
+    _buffering = True
+
+
+def end_request():
+    """Flush the request's lines and go back to unbuffered writes"""
+    global _buffering, _effective_level
+    _buffering = False
+    _effective_level = _level
+    _request.clear()
+    flush()
+
+
+def append_keys(**fields):
+    """Add fields to every line logged for the rest of the request"""
+    _request.setdefault("fields", {}).update(redact(fields))
+
+
+def inject_request_context(handler):
+    """Scope logging to each invocation of a Lambda handler"""
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        start_request(context)
+        try:
+            return handler(event, context)
+        except Exception:
+            get_logger(handler.__module__).exception("Unhandled exception")
+            raise
+        finally:
+            end_request()
+
+    return wrapper
@@ -0,0 +1,323 @@
+"""
+Invocation Metrics
+Times every downstream AWS and HTTP call and emits one CloudWatch Embedded
+Metric Format (EMF) line per invocation
+
+Usage in a handler module:
+
+    from fresa_common import metrics
+
+    @metrics.instrument_handler
+    def lambda_handler(event, context):
+        ...
+        metrics.put_metric("RateLimited", 1)
+
+Applying the decorator registers before-call/after-call hooks on the default
+boto3 session, so every client the handler creates afterwards (the handlers
+create theirs lazily) is timed. Outbound urllib3 pools are timed by wrapping
+them with instrument_http().
+
+CloudWatch extracts the metrics from the log line itself, so nothing is sent
+with PutMetricData on the hot path. Set METRICS_DISABLED=true to turn the
+hooks and the EMF line off.
+"""
+
+import functools
+import json
+import os
+import sys
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_NAMESPACE = "Fresa/Authentication"
+
+# botocore service ids mapped to the metric name prefix
+SERVICE_NAMES = {
+    "cognito-identity-provider": "Cognito",
+    "dynamodb": "DynamoDB",
+    "ses": "SES",
+    "sqs": "SQS",
+}
+
+_START_KEY = "fresa_metrics_start"
+
+
+def _process_start_time():
+    """Wall-clock time the current process started (Linux), else now"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime), counted after the parenthesised command name
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        started_after_boot = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return time.time() - uptime + started_after_boot
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+_PROCESS_STARTED = _process_start_time()
+_cold_start = True
+_init_ms = None
+_current = None
+_hooked_session = None
+
+
+def is_disabled():
+    return os.environ.get("METRICS_DISABLED", "").lower() == "true"
+
+
+class InvocationMetrics:
+    """Downstream calls, custom metrics and properties for one invocation"""
+
+    def __init__(self, function_name, request_id, cold_start, init_ms):
+        self.function_name = function_name
+        self.request_id = request_id
+        self.cold_start = cold_start
+        self.init_ms = init_ms
+        self.started = time.perf_counter()
+        self.calls = []
+        self.metrics = {}
+        self.properties = {}
+
+    def record_call(self, service, operation, duration_ms, error=None):
+        self.calls.append(
+            {
+                "service": service,
+                "operation": operation,
+                "ms": round(duration_ms, 2),
+                "error": error,
+            }
+        )
+
+    def put_metric(self, name, value, unit="Count"):
+        self.metrics[name] = (value, unit)
+
+    def increment_metric(self, name, value=1, unit="Count"):
+        current, _ = self.metrics.get(name, (0, unit))
+        self.metrics[name] = (current + value, unit)
+
+    def set_property(self, key, value):
+        self.properties[key] = value
+
+    def to_emf(self, status_code=None, namespace=None):
+        """Build the EMF document for this invocation"""
+        values = {
+            "Duration": ((time.perf_counter() - self.started) * 1000, "Milliseconds"),
+            "ColdStart": (1 if self.cold_start else 0, "Count"),
+        }
+        if self.cold_start and self.init_ms is not None:
+            values["InitDuration"] = (self.init_ms, "Milliseconds")
+
+        for call in self.calls:
+            service = call["service"]
+            latency, _ = values.get(f"{service}Latency", (0.0, None))
+            count, _ = values.get(f"{service}Calls", (0, None))
+            errors, _ = values.get(f"{service}Errors", (0, None))
+            values[f"{service}Latency"] = (latency + call["ms"], "Milliseconds")
+            values[f"{service}Calls"] = (count + 1, "Count")
+            values[f"{service}Errors"] = (errors + (1 if call["error"] else 0), "Count")
+
+        if status_code is not None:
+            values["Status4xx"] = (1 if 400 <= status_code < 500 else 0, "Count")
+            values["Status5xx"] = (1 if status_code >= 500 else 0, "Count")
+
+        values.update(self.metrics)
+
+        document = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": namespace
+                        or os.environ.get("METRICS_NAMESPACE", DEFAULT_NAMESPACE),
+                        "Dimensions": [["FunctionName"]],
+                        "Metrics": [
+                            {"Name": name, "Unit": unit}
+                            for name, (_, unit) in values.items()
+                        ],
+                    }
+                ],
+            },
+            "FunctionName": self.function_name,
+            "requestId": self.request_id,
+            "coldStart": self.cold_start,
+            "statusCode": status_code,
+            "downstreamCalls": self.calls,
+        }
+        document.update(self.properties)
+        for name, (value, _) in values.items():
+            document[name] = round(value, 2) if isinstance(value, float) else value
+        return document
+
+
+def current():
+    """The invocation being measured, or None outside an instrumented handler"""
+    return _current
+
+
+def put_metric(name, value, unit="Count"):
+    """Add a custom metric to the current invocation's EMF line"""
+    if _current is not None:
+        _current.put_metric(name, value, unit)
+
+
+def increment_metric(name, value=1, unit="Count"):
+    """Add value to a custom metric counted across the current invocation"""
+    if _current is not None:
+        _current.increment_metric(name, value, unit)
+
+
+def set_property(key, value):
+    """Add a searchable (non-metric) field to the current EMF line"""
+    if _current is not None:
+        _current.set_property(key, value)
+
+
+def record_call(service, operation, duration_ms, error=None):
+    """Record a downstream call made outside botocore and urllib3"""
+    if _current is not None:
+        _current.record_call(service, operation, duration_ms, error)
+
+
+# botocore hooks
+
+
+def _service_name(model):
+    service_id = model.service_model.service_id.hyphenize()
+    return SERVICE_NAMES.get(service_id, service_id)
+
+
+def _before_call(model, context, **kwargs):
+    context[_START_KEY] = time.perf_counter()
+
+
+def _after_call(model, context, http_response, parsed, **kwargs):
+    started = context.pop(_START_KEY, None)
+    if started is None:
+        return
+    error = None
+    if http_response.status_code >= 300:
+        error = parsed.get("Error", {}).get("Code", str(http_response.status_code))
+    record_call(
+        _service_name(model),
+        model.name,
+        (time.perf_counter() - started) * 1000,
+        error,
+    )
+
+
+def _after_call_error(event_name, context, exception, **kwargs):
+    # Connection failures and timeouts once retries are exhausted
+    started = context.pop(_START_KEY, None)
+    if started is None:
+        return
+    _, service_id, operation = event_name.split(".", 2)
+    record_call(
+        SERVICE_NAMES.get(service_id, service_id),
+        operation,
+        (time.perf_counter() - started) * 1000,
+        type(exception).__name__,
+    )
+
+
+def install():
+    """Register the timing hooks on the default boto3 session"""
+    global _hooked_session
+    import boto3
+
+    if boto3.DEFAULT_SESSION is None:
+        boto3.setup_default_session()
+    if _hooked_session is boto3.DEFAULT_SESSION:
+        return
+
+    _hooked_session = boto3.DEFAULT_SESSION
+    # First, so the timer starts even when a stub answers the call
+    _hooked_session.events.register_first("before-call.*.*", _before_call)
+    _hooked_session.events.register("after-call", _after_call)
+    _hooked_session.events.register("after-call-error", _after_call_error)
+
+
+def instrument_http(pool):
+    """Time every request made through a urllib3 PoolManager"""
+
+    def urlopen(method, url, *args, **kwargs):
+        started = time.perf_counter()
+        error = None
+        try:
+            # Resolved per call so class-level wrappers installed later still apply
+            response = type(pool).urlopen(pool, method, url, *args, **kwargs)
+            if response.status >= 400:
+                error = str(response.status)
+            return response
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            record_call(
+                "HTTP",
+                urlsplit(url).hostname or "unknown",
+                (time.perf_counter() - started) * 1000,
+                error,
+            )
+
+    pool.urlopen = urlopen
+    return pool
+
+
+# Handler decorator
+
+
+def _context_value(context, name, default=None):
+    """Read a Lambda context attribute; the local harness may pass a dict"""
+    if isinstance(context, dict):
+        return context.get(name, default)
+    return getattr(context, name, default)
+
+
+def emit(document):
+    """Write one EMF line to stdout, where CloudWatch Logs picks it up"""
+    sys.stdout.write(json.dumps(document, default=str) + "\n")
+
+
+def instrument_handler(handler):
+    """Measure each invocation of a Lambda handler and emit its EMF line"""
+    global _init_ms
+
+    if is_disabled():
+        return handler
+
+    install()
+    if _init_ms is None:
+        _init_ms = (time.time() - _PROCESS_STARTED) * 1000
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _current, _cold_start
+
+        function_name = _context_value(context, "function_name") or os.environ.get(
+            "AWS_LAMBDA_FUNCTION_NAME", handler.__module__
+        )
+        invocation = InvocationMetrics(
+            function_name,
+            _context_value(context, "aws_request_id"),
+            _cold_start,
+            _init_ms,
+        )
+        _current = invocation
+        _cold_start = False
+
+        status_code = None
+        try:
+            result = handler(event, context)
+            if isinstance(result, dict) and isinstance(result.get("statusCode"), int):
+                status_code = result["statusCode"]
+            return result
+        except Exception:
+            status_code = 500
+            raise
+        finally:
+            _current = None
+            emit(invocation.to_emf(status_code))
+
+    return wrapper
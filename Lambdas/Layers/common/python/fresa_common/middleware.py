@@ -0,0 +1,161 @@
+"""
+Middleware
+Wraps an API handler in the shared decorators, in the one order that works,
+and turns the exceptions it raises into responses
+
+Usage in a handler module:
+
+    from fresa_common import middleware, responses
+
+    @middleware.api_handler(
+        schema=SIGN_UP_REQUEST,
+        idempotency_store=get_idempotency_store,
+        errors={ProviderError: middleware.Error(401, "Token verification failed")},
+    )
+    def lambda_handler(event, context):
+        body = validation.current().body
+        ...
+        return responses.respond(200, {...})
+
+which stands for:
+
+    @metrics.instrument_handler
+    @tracing.trace_handler
+    @log.inject_request_context
+    @deadline.with_deadline()
+    (exceptions mapped to responses here)
+    @validation.validated(schema, headers=headers)
+    @idempotency.idempotent(idempotency_store, headers=headers)
+    def lambda_handler(event, context):
+
+schema and idempotency_store are optional. Every response gets headers
+(the default JSON + CORS set) unless it brings its own, so 400s from
+validation, 409/422s from idempotency and the handler's answers match.
+
+An exception that escapes the handler becomes a response: HttpError carries
+its own status and message, types listed in errors (over DEFAULT_ERRORS,
+matched along the exception's MRO) get theirs, and anything else is logged
+and answered with a 500 that does not repeat the exception's text. Mapped
+errors count in the HandlerErrors metric with an "error" property naming
+the exception. HttpError is meant for helpers deep in a call; handlers
+simply return responses.error(). Queued events (SQS batches, with
+"Records") pass through untouched, exceptions included, so SQS still
+retries them.
+"""
+
+import functools
+
+from fresa_common import (
+    deadline,
+    idempotency,
+    log,
+    metrics,
+    responses,
+    tracing,
+    validation,
+)
+from fresa_common.deadline import DeadlineExceeded
+
+logger = log.get_logger(__name__)
+
+
+class Error:
+    """How an exception type is answered"""
+
+    __slots__ = ("status_code", "message", "retry_after")
+
+    def __init__(self, status_code, message, retry_after=None):
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+
+
+class HttpError(Exception):
+    """Raised by a handler to answer with an error response"""
+
+    def __init__(self, status_code, message, retry_after=None, **fields):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+        self.fields = fields
+
+
+DEFAULT_ERRORS = {
+    DeadlineExceeded: Error(503, "Service busy, please try again", retry_after=1),
+}
+INTERNAL_ERROR = Error(500, "Internal server error")
+
+
+def _lookup(errors, exception):
+    for cls in type(exception).__mro__:
+        mapping = errors.get(cls)
+        if mapping is not None:
+            return mapping
+    return None
+
+
+def map_errors(headers=responses.DEFAULT_HEADERS, errors=None):
+    """Answer exceptions with responses and give every response headers"""
+    errors = {**DEFAULT_ERRORS, **(errors or {})}
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if isinstance(event, dict) and "Records" in event:
+                return handler(event, context)
+            try:
+                response = handler(event, context)
+            except Exception as e:
+                metrics.increment_metric("HandlerErrors")
+                metrics.set_property("error", type(e).__name__)
+                if isinstance(e, HttpError):
+                    return responses.error(
+                        e.status_code, e.message, headers, e.retry_after, **e.fields
+                    )
+                mapping = _lookup(errors, e)
+                if mapping is None:
+                    logger.exception("Unhandled error: %s", e)
+                    mapping = INTERNAL_ERROR
+                else:
+                    logger.warning("%s: %s", type(e).__name__, e)
+                return responses.error(
+                    mapping.status_code, mapping.message, headers, mapping.retry_after
+                )
+            if (
+                headers is not None
+                and isinstance(response, dict)
+                and "statusCode" in response
+                and "headers" not in response
+            ):
+                response["headers"] = dict(headers)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def api_handler(
+    schema=None,
+    idempotency_store=None,
+    headers=responses.DEFAULT_HEADERS,
+    errors=None,
+):
+    """The shared decorators of an API Gateway handler, see the module doc"""
+
+    def decorator(handler):
+        wrapped = handler
+        if idempotency_store is not None:
+            wrapped = idempotency.idempotent(idempotency_store, headers=headers)(
+                wrapped
+            )
+        if schema is not None:
+            wrapped = validation.validated(schema, headers=headers)(wrapped)
+        wrapped = map_errors(headers, errors)(wrapped)
+        wrapped = deadline.with_deadline()(wrapped)
+        wrapped = log.inject_request_context(wrapped)
+        wrapped = tracing.trace_handler(wrapped)
+        return metrics.instrument_handler(wrapped)
+
+    return decorator
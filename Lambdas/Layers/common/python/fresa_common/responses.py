@@ -0,0 +1,94 @@
+"""
+Responses
+Builds API Gateway responses: the same headers and error body everywhere,
+built once per module instead of per return statement
+
+Usage in a handler module:
+
+    from fresa_common import responses
+
+    return responses.respond(200, {"message": "Authentication successful"})
+    return responses.error(401, "Invalid code")
+    return responses.error(503, "Service busy", retry_after=1)
+
+Header sets are built at import and are read-only (cors_headers() caches
+one per list of allowed methods); each response gets its own copy, since
+the runtime serializes a dict and fresa_common.idempotency adds to the
+headers of a replay. Every error body is {"error": <message>} plus any
+extra fields given.
+
+Bodies are serialized with orjson when it can be imported (it is not part
+of the layer by default), else with a precompiled json encoder; both write
+compact JSON. RESPONSE_JSON_BACKEND=json forces the standard library; it
+is read at import (configure() re-reads it), not on every response.
+"""
+
+import json
+import os
+from functools import lru_cache
+from types import MappingProxyType
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_METHODS = "OPTIONS,POST,GET"
+
+# Compact; response bodies are plain dicts built by the handler, never cyclic
+_encoder = json.JSONEncoder(separators=(",", ":"), check_circular=False)
+_use_orjson = False
+
+
+def configure():
+    """Re-read RESPONSE_JSON_BACKEND from the environment"""
+    global _use_orjson
+    _use_orjson = (
+        orjson is not None and os.environ.get("RESPONSE_JSON_BACKEND") != "json"
+    )
+
+
+configure()
+
+
+def dumps(body):
+    """A response body as JSON text"""
+    if _use_orjson:
+        return orjson.dumps(body).decode("utf-8")
+    return _encoder.encode(body)
+
+
+@lru_cache(maxsize=None)
+def cors_headers(methods=DEFAULT_METHODS):
+    """The read-only JSON + CORS header set for an endpoint's methods"""
+    return MappingProxyType(
+        {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type,Idempotency-Key",
+            "Access-Control-Allow-Methods": methods,
+        }
+    )
+
+
+DEFAULT_HEADERS = cors_headers()
+
+
+def respond(status_code, body, headers=DEFAULT_HEADERS, extra_headers=None):
+    """A response with body as JSON; headers=None sends no headers"""
+    response = {"statusCode": status_code, "body": dumps(body)}
+    if headers is not None or extra_headers:
+        response_headers = dict(headers or ())
+        if extra_headers:
+            response_headers.update(extra_headers)
+        response["headers"] = response_headers
+    return response
+
+
+def error(status_code, message, headers=DEFAULT_HEADERS, retry_after=None, **fields):
+    """An error response: {"error": message, **fields}"""
+    body = {"error": message}
+    if fields:
+        body.update(fields)
+    extra = {"Retry-After": str(retry_after)} if retry_after is not None else None
+    return respond(status_code, body, headers, extra)
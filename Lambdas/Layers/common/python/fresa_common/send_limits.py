@@ -0,0 +1,262 @@
+"""
+Send Limits
+Per-IP and global caps on verification emails, in front of SES
+
+recieveEmail's own rate limit is per email address, so one client cycling
+through addresses is not limited at all. These limits cover that (per
+source IP) and the overall send rate (global, per minute), protecting the
+SES sending quota and DynamoDB capacity from abuse bursts.
+
+Usage in a handler module:
+
+    from fresa_common import send_limits
+
+    limiter = send_limits.SendLimiter(get_dynamodb_client(), table_name)
+    ip = send_limits.source_ip(event)
+    item, usage = limiter.read(email, ip, verification_codes.RATE_LIMIT)
+    tier = limiter.exceeded(usage)
+    if tier:
+        ...  # 429, retry in limiter.retry_after(tier) seconds
+    limiter.record(ip)
+
+Counters live in the VerificationCodes table next to the codes, under keys
+no email address can have ("limit#ip#<ip>#<window>" and
+"limit#global#<window>#<shard>"). read() therefore fetches the email's
+item and every counter in one BatchGetItem (read_batch() does the same
+for a batch of queued requests), and the table's TTL removes old windows.
+Sends are counted with atomic ADDs; the global count is spread over
+GLOBAL_SHARDS keys, each send adding to a random one, so a burst does
+not land on one hot partition. Reading sums the shards.
+
+Windows slide: a count is the current window's plus the previous
+window's, weighted by how much of the previous one still overlaps.
+Limits are checked on read and counted afterwards, so concurrent requests
+can overshoot a limit by the number in flight.
+
+IPv6 clients are limited per /64, the block a single subscriber is
+usually given.
+"""
+
+import ipaddress
+import os
+import random
+import time
+
+from fresa_common import verification_codes
+
+DEFAULT_SEND_LIMITS = {
+    "PER_IP_PER_HOUR": 20,
+    # SES' default production send rate is 14/s
+    "GLOBAL_PER_MINUTE": 600,
+    "GLOBAL_SHARDS": 8,
+}
+
+# Window length in seconds per tier
+WINDOWS = {"ip": 60 * 60, "global": 60}
+
+MAX_READ_ATTEMPTS = 3
+# BatchGetItem's limit per request
+BATCH_GET_KEYS = 100
+
+
+def send_limits_config():
+    """Limits with environment overrides; 0 turns a tier off"""
+    return {
+        "PER_IP_PER_HOUR": int(
+            os.environ.get(
+                "SEND_LIMIT_PER_IP_PER_HOUR", DEFAULT_SEND_LIMITS["PER_IP_PER_HOUR"]
+            )
+        ),
+        "GLOBAL_PER_MINUTE": int(
+            os.environ.get(
+                "SEND_LIMIT_GLOBAL_PER_MINUTE",
+                DEFAULT_SEND_LIMITS["GLOBAL_PER_MINUTE"],
+            )
+        ),
+        "GLOBAL_SHARDS": int(
+            os.environ.get(
+                "SEND_LIMIT_GLOBAL_SHARDS", DEFAULT_SEND_LIMITS["GLOBAL_SHARDS"]
+            )
+        ),
+    }
+
+
+def source_ip(event):
+    """The caller's address as a counter key (an IPv6 /64), or None"""
+    request_context = (event or {}).get("requestContext") or {}
+    # REST APIs put it under identity, HTTP APIs under http
+    address = (request_context.get("identity") or {}).get("sourceIp") or (
+        request_context.get("http") or {}
+    ).get("sourceIp")
+    return normalize_ip(address)
+
+
+def normalize_ip(address):
+    """An address as a counter key (IPv6 as its /64), or None if invalid
+
+    A key is its own key, so requests forwarded with one keep it.
+    """
+    if not address:
+        return None
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        try:
+            return str(ipaddress.ip_network(address, strict=False))
+        except ValueError:
+            return None
+    if ip.version == 6:
+        return str(ipaddress.ip_network(f"{ip}/64", strict=False))
+    return str(ip)
+
+
+class Usage:
+    """Sliding-window send counts seen by one read"""
+
+    __slots__ = ("ip", "global_")
+
+    def __init__(self, ip=0.0, global_=0.0):
+        self.ip = ip
+        self.global_ = global_
+
+    def __repr__(self):
+        return f"Usage(ip={self.ip:.1f}, global={self.global_:.1f})"
+
+
+def _window(tier, now):
+    """(current window start, weight of the previous window)"""
+    length = WINDOWS[tier]
+    start = now - now % length
+    return start, 1 - (now - start) / length
+
+
+class SendLimiter:
+    """Reads and counts per-IP and global sends in the VerificationCodes table"""
+
+    def __init__(self, client, table_name, limits=None):
+        self.client = client
+        self.table_name = table_name
+        self.limits = limits or send_limits_config()
+
+    def _counter_keys(self, ip, now, include_global=True):
+        """{counter key: (tier, ip, weight)} for the windows a read needs"""
+        keys = {}
+        if ip and self.limits["PER_IP_PER_HOUR"]:
+            start, previous = _window("ip", now)
+            keys[f"limit#ip#{ip}#{start}"] = ("ip", ip, 1.0)
+            keys[f"limit#ip#{ip}#{start - WINDOWS['ip']}"] = ("ip", ip, previous)
+        if include_global and self.limits["GLOBAL_PER_MINUTE"]:
+            start, previous = _window("global", now)
+            for shard in range(self.limits["GLOBAL_SHARDS"]):
+                keys[f"limit#global#{start}#{shard}"] = ("global", None, 1.0)
+                keys[f"limit#global#{start - WINDOWS['global']}#{shard}"] = (
+                    "global",
+                    None,
+                    previous,
+                )
+        return keys
+
+    def _batch_get(self, keys, attributes):
+        """{key: item} for the keys that exist, BATCH_GET_KEYS per request"""
+        expression, names = verification_codes.projection(
+            tuple(dict.fromkeys(("email", "count") + tuple(attributes)))
+        )
+        items = {}
+        for start in range(0, len(keys), BATCH_GET_KEYS):
+            request = {
+                self.table_name: {
+                    "Keys": [
+                        {"email": {"S": key}}
+                        for key in keys[start : start + BATCH_GET_KEYS]
+                    ],
+                    "ProjectionExpression": expression,
+                    "ExpressionAttributeNames": names,
+                }
+            }
+            for attempt in range(MAX_READ_ATTEMPTS):
+                response = self.client.batch_get_item(RequestItems=request)
+                for item in response.get("Responses", {}).get(self.table_name, []):
+                    items[item["email"]["S"]] = item
+                request = response.get("UnprocessedKeys") or {}
+                if not request:
+                    break
+                time.sleep(0.05 * 2**attempt)
+            else:
+                raise RuntimeError("DynamoDB left send limit keys unprocessed")
+        return items
+
+    def read(self, email, ip, attributes=verification_codes.ALL, now=None):
+        """(email's VerificationCode or None, Usage) from one BatchGetItem"""
+        items, ip_usage, global_usage = self.read_batch([email], [ip], attributes, now)
+        return items[email], Usage(ip_usage.get(ip, 0.0), global_usage)
+
+    def read_batch(self, emails, ips, attributes=verification_codes.ALL, now=None):
+        """Rate limit state for a batch of requests
+
+        Returns ({email: VerificationCode or None}, {ip: usage}, global
+        usage), reading each key once.
+        """
+        now = int(time.time()) if now is None else int(now)
+        counters = self._counter_keys(None, now)
+        for ip in dict.fromkeys(ips):
+            counters.update(self._counter_keys(ip, now, include_global=False))
+        emails = list(dict.fromkeys(emails))
+        items = self._batch_get(emails + list(counters), attributes)
+
+        ip_usage = {}
+        global_usage = 0.0
+        for key, (tier, ip, weight) in counters.items():
+            item = items.get(key)
+            if item:
+                count = int(item["count"]["N"]) * weight
+                if tier == "ip":
+                    ip_usage[ip] = ip_usage.get(ip, 0.0) + count
+                else:
+                    global_usage += count
+
+        decoded = {
+            email: (verification_codes.decode(items[email]) if email in items else None)
+            for email in emails
+        }
+        return decoded, ip_usage, global_usage
+
+    def exceeded(self, usage):
+        """The tier ("ip" or "global") whose limit is reached, or None"""
+        per_ip = self.limits["PER_IP_PER_HOUR"]
+        if per_ip and usage.ip >= per_ip:
+            return "ip"
+        global_limit = self.limits["GLOBAL_PER_MINUTE"]
+        if global_limit and usage.global_ >= global_limit:
+            return "global"
+        return None
+
+    def retry_after(self, tier, now=None):
+        """Seconds until the tier's next window starts"""
+        now = int(time.time()) if now is None else int(now)
+        return WINDOWS[tier] - now % WINDOWS[tier]
+
+    def record(self, ip, now=None, count=1):
+        """Count sends against ip and the global budget"""
+        now = int(time.time()) if now is None else int(now)
+        if ip and self.limits["PER_IP_PER_HOUR"]:
+            start, _ = _window("ip", now)
+            self._add(f"limit#ip#{ip}#{start}", start + 2 * WINDOWS["ip"], count)
+        if self.limits["GLOBAL_PER_MINUTE"]:
+            start, _ = _window("global", now)
+            shard = random.randrange(self.limits["GLOBAL_SHARDS"])
+            self._add(
+                f"limit#global#{start}#{shard}", start + 2 * WINDOWS["global"], count
+            )
+
+    def _add(self, key, ttl, count):
+        # Kept until the window stops counting as the previous one
+        self.client.update_item(
+            TableName=self.table_name,
+            Key={"email": {"S": key}},
+            UpdateExpression="ADD #count :count SET #ttl = :ttl",
+            ExpressionAttributeNames={"#count": "count", "#ttl": "ttl"},
+            ExpressionAttributeValues={
+                ":count": {"N": str(count)},
+                ":ttl": {"N": str(ttl)},
+            },
+        )
@@ -0,0 +1,282 @@
+"""
+SES Quota
+Shapes email sends to the account's SES MaxSendRate instead of letting SES
+throttle them
+
+SES refuses sends over the account's maximum send rate with a Throttling
+error, and every container sending at once reaches it easily. The governor
+hands out the rate as per-second slots shared by all containers:
+
+    from fresa_common import ses_quota
+
+    def get_send_rate_governor():
+        return ses_quota.SendRateGovernor(
+            get_dynamodb_client(), get_dynamodb_table_name(), get_ses_client()
+        )
+
+    try:
+        get_send_rate_governor().acquire(
+            max_wait_s=ses_quota.wait_budget_s(1000, ses_quota.max_wait_s())
+        )
+    except ses_quota.SendRateExceeded:
+        ...  # queue the send for later, or answer 503
+    ses_client.send_templated_email(...)
+
+The rate comes from GetSendQuota, read on the container's first send and
+cached for QUOTA_REFRESH_S. Each second's sends are counted in the
+VerificationCodes table under "limit#ses#<second>" with a conditional ADD,
+so a slot never hands out more than the rate; a full slot moves the send
+to the next second, waiting for it. A send that cannot get a slot within
+its wait raises SendRateExceeded; callers then defer it (to SQS) rather
+than fail it. Batches reserve every send first (reserve()) and sleep until
+each slot.
+
+A share below 1 fills slots only up to that fraction, keeping the rest for
+senders with a full share (welcome emails leave room for verification
+codes). If the table cannot be reached, sends are paced per container.
+
+Each invocation's EMF line gets SesSendWait (milliseconds waited for a
+slot), SesSendDeferred (sends that got none), SesSendRateUtilization (the
+last slot's use, in percent of the rate), SesDailyQuotaUtilization (the
+last 24 hours' sends in percent of Max24HourSend) and SesThrottled
+(Throttling errors SES still returned).
+
+- SES_MAX_SEND_RATE: sends per second to use instead of asking SES
+- SES_SEND_RATE_SHARE: fraction of the rate the governor hands out (default 1)
+- SES_MAX_WAIT_MS: longest an API request waits for a slot (default 2000)
+"""
+
+import math
+import os
+import threading
+import time
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from fresa_common import deadline, log, metrics
+from fresa_common.deadline import DeadlineExceeded
+
+logger = log.get_logger(__name__)
+
+KEY_PREFIX = "limit#ses#"
+# SES' default production rate, used until (or if) GetSendQuota answers
+DEFAULT_MAX_SEND_RATE = 14
+DEFAULT_MAX_WAIT_MS = 2000
+QUOTA_REFRESH_S = 5 * 60
+# After a failed GetSendQuota the default is used this long
+QUOTA_RETRY_S = 60
+# Slots are kept a minute after their second, then the table's TTL drops them
+SLOT_TTL_S = 60
+THROTTLING_ERROR = "Throttling"
+
+
+class SendRateExceeded(Exception):
+    """Raised when no second within the allowed wait has room for a send"""
+
+
+class SendQuota:
+    """The account's quota as last read from SES"""
+
+    __slots__ = ("max_send_rate", "max_24_hour_send", "sent_last_24_hours")
+
+    def __init__(self, max_send_rate, max_24_hour_send=None, sent_last_24_hours=None):
+        self.max_send_rate = max_send_rate
+        self.max_24_hour_send = max_24_hour_send
+        self.sent_last_24_hours = sent_last_24_hours
+
+    def daily_utilization(self):
+        """Share of the 24 hour quota used, or None if unknown"""
+        if not self.max_24_hour_send or self.sent_last_24_hours is None:
+            return None
+        return self.sent_last_24_hours / self.max_24_hour_send
+
+
+_quota = None
+_quota_expires_at = 0.0
+_quota_lock = threading.Lock()
+
+
+def send_quota(ses_client):
+    """The account's send quota, read from SES once per QUOTA_REFRESH_S"""
+    global _quota, _quota_expires_at
+    override = os.environ.get("SES_MAX_SEND_RATE")
+    if override:
+        return SendQuota(float(override))
+    with _quota_lock:
+        now = time.monotonic()
+        if _quota is not None and now < _quota_expires_at:
+            return _quota
+        try:
+            response = ses_client.get_send_quota()
+            _quota = SendQuota(
+                float(response["MaxSendRate"]),
+                float(response["Max24HourSend"]),
+                float(response["SentLast24Hours"]),
+            )
+            _quota_expires_at = now + QUOTA_REFRESH_S
+        except (ClientError, BotoCoreError, DeadlineExceeded, KeyError) as e:
+            logger.warning("Could not read the SES send quota: %s", e)
+            _quota = _quota or SendQuota(DEFAULT_MAX_SEND_RATE)
+            _quota_expires_at = now + QUOTA_RETRY_S
+        return _quota
+
+
+def max_wait_s():
+    return float(os.environ.get("SES_MAX_WAIT_MS", DEFAULT_MAX_WAIT_MS)) / 1000
+
+
+def wait_budget_s(keep_ms, cap_s=None):
+    """Seconds a send may wait for a slot and still have keep_ms left
+
+    cap_s bounds the wait too. Without a deadline (scripts, tests) the wait
+    is cap_s, or max_wait_s().
+    """
+    remaining_ms = deadline.remaining_ms()
+    if remaining_ms is None:
+        return max_wait_s() if cap_s is None else cap_s
+    budget_s = (remaining_ms - keep_ms) / 1000
+    if cap_s is not None:
+        budget_s = min(budget_s, cap_s)
+    return max(budget_s, 0)
+
+
+class _LocalSlots:
+    """Per-second send counts in the container, used without the table"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def take(self, slot, count, room):
+        with self._lock:
+            for old in [old for old in self._counts if old < slot - SLOT_TTL_S]:
+                del self._counts[old]
+            used = self._counts.get(slot, 0) + count
+            if used > room:
+                return None
+            self._counts[slot] = used
+            return used
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+_local_slots = _LocalSlots()
+
+
+def reset():
+    """Forget the cached quota and local slots (tests)"""
+    global _quota, _quota_expires_at
+    with _quota_lock:
+        _quota = None
+        _quota_expires_at = 0.0
+    _local_slots.clear()
+
+
+class SendRateGovernor:
+    """Per-second SES send slots shared through a table keyed by "email" """
+
+    def __init__(self, client, table_name, ses_client, clock=None):
+        self.client = client
+        self.table_name = table_name
+        self.ses_client = ses_client
+        # Epoch seconds, so every container numbers the slots alike
+        self.clock = clock or time.time
+
+    def rate(self):
+        """Sends per second the governor hands out"""
+        share = float(os.environ.get("SES_SEND_RATE_SHARE", 1))
+        return send_quota(self.ses_client).max_send_rate * share
+
+    def slot_capacity(self, share=1.0):
+        """Sends one second's slot takes at this share (at least one)"""
+        return max(math.floor(self.rate() * share), 1)
+
+    def reserve(self, count=1, max_wait_s=0.0, share=1.0, not_before=None):
+        """Reserve count sends; returns the epoch time to send them at
+
+        not_before skips seconds an earlier reservation already found full.
+        Raises SendRateExceeded if no second within max_wait_s has room.
+        """
+        room = self.slot_capacity(share)
+        if count > room:
+            raise ValueError(f"{count} sends do not fit in one second ({room})")
+        now = self.clock()
+        first = int(max(now, not_before or 0))
+        for slot in range(first, int(now + max_wait_s) + 1):
+            used = self._take(slot, count, room)
+            if used is not None:
+                metrics.put_metric(
+                    "SesSendRateUtilization",
+                    round(used / self.slot_capacity() * 100, 1),
+                    "Percent",
+                )
+                return max(float(slot), now)
+        metrics.increment_metric("SesSendDeferred", count)
+        raise SendRateExceeded(
+            f"No SES send slot for {count} within {max_wait_s:.1f} s"
+        )
+
+    def acquire(self, count=1, max_wait_s=0.0, share=1.0):
+        """Reserve count sends and wait for their slot; returns seconds waited"""
+        wait_s = max(self.reserve(count, max_wait_s, share) - self.clock(), 0)
+        if wait_s > 0:
+            time.sleep(wait_s)
+            metrics.increment_metric("SesSendWait", wait_s * 1000, "Milliseconds")
+        daily = send_quota(self.ses_client).daily_utilization()
+        if daily is not None:
+            metrics.put_metric(
+                "SesDailyQuotaUtilization", round(daily * 100, 1), "Percent"
+            )
+        return wait_s
+
+    def _take(self, slot, count, room):
+        """The slot's count after taking count sends, or None if it is full"""
+        if self.table_name:
+            try:
+                return self._take_remote(slot, count, room)
+            except (ClientError, BotoCoreError, DeadlineExceeded) as e:
+                if (
+                    isinstance(e, ClientError)
+                    and e.response["Error"].get("Code")
+                    == "ConditionalCheckFailedException"
+                ):
+                    return None
+                logger.warning("Send slots unavailable, pacing in the container: %s", e)
+        return _local_slots.take(slot, count, room)
+
+    def _take_remote(self, slot, count, room):
+        response = self.client.update_item(
+            TableName=self.table_name,
+            Key={"email": {"S": f"{KEY_PREFIX}{slot}"}},
+            UpdateExpression="ADD #count :count SET #ttl = :ttl",
+            ConditionExpression="attribute_not_exists(#count) OR #count <= :left",
+            ExpressionAttributeNames={"#count": "count", "#ttl": "ttl"},
+            ExpressionAttributeValues={
+                ":count": {"N": str(count)},
+                ":left": {"N": str(room - count)},
+                ":ttl": {"N": str(slot + SLOT_TTL_S)},
+            },
+            ReturnValues="UPDATED_NEW",
+        )
+        used = response.get("Attributes", {}).get("count", {}).get("N")
+        return int(used) if used is not None else count
+
+
+# botocore hook, registered by fresa_common.clients
+
+
+def needs_retry(event_name, response=None, **kwargs):
+    # Only observes; botocore's retry handler decides whether to retry
+    if response is None:
+        return None
+    _, parsed = response
+    if parsed.get("Error", {}).get("Code") == THROTTLING_ERROR:
+        metrics.increment_metric("SesThrottled")
+    return None
+
+
+def register(events):
+    """Count the Throttling errors of a client's SES calls"""
+    events.register("needs-retry.ses.*", needs_retry)
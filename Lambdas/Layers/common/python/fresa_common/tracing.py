@@ -0,0 +1,498 @@
+"""
+Distributed Tracing
+Spans for each handler invocation and every downstream call, propagated
+through the Cognito trigger chain so a whole login shows up as one trace
+
+Usage in a handler module:
+
+    from fresa_common import tracing
+
+    @tracing.trace_handler
+    def lambda_handler(event, context):
+        cognito.respond_to_auth_challenge(
+            ...,
+            ClientMetadata=tracing.client_metadata(),
+        )
+
+The handler's span continues the trace it was given. In order, the parent
+comes from:
+  1. event["request"]["clientMetadata"]["traceparent"] (Cognito triggers,
+     passed along by the API handlers through ClientMetadata)
+  2. a traceparent or X-Amzn-Trace-Id request header (API Gateway)
+  3. _X_AMZN_TRACE_ID (Lambda active tracing)
+Otherwise a new trace is started. Trace ids are X-Ray compatible (the first
+8 hex digits are the epoch seconds) and propagate in the W3C traceparent
+format, so OpenTelemetry tooling reads them as well.
+
+Every botocore call made after the decorator is applied gets a child span,
+as does every request through a pool wrapped with instrument_http().
+
+Spans are exported in one batch when the handler returns. TRACE_EXPORTER
+selects the exporter:
+  xray   UDP segment documents to the X-Ray daemon (AWS_XRAY_DAEMON_ADDRESS);
+         the default when that variable is set, as it is with active tracing
+  file   JSON lines appended to TRACE_FILE (default /tmp/fresa-traces.jsonl);
+         read them with scripts/trace_viewer.py
+  none   discard (the default elsewhere)
+Other exporters can be added with register_exporter().
+"""
+
+import contextlib
+import functools
+import json
+import os
+import random
+import socket
+import time
+from urllib.parse import urlsplit
+
+TRACEPARENT_KEY = "traceparent"
+XRAY_HEADER = "x-amzn-trace-id"
+DEFAULT_TRACE_FILE = "/tmp/fresa-traces.jsonl"
+
+_SPAN_KEY = "fresa_trace_span"
+
+
+def _new_span_id():
+    return "%016x" % random.getrandbits(64)
+
+
+def _new_trace_id():
+    # X-Ray requires the first 32 bits to be the start time in epoch seconds
+    return "%08x%024x" % (int(time.time()), random.getrandbits(96))
+
+
+class SpanContext:
+    """The part of a span that crosses process boundaries"""
+
+    def __init__(self, trace_id, span_id, sampled=True):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    @property
+    def xray_trace_id(self):
+        return f"1-{self.trace_id[:8]}-{self.trace_id[8:]}"
+
+    def to_traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @classmethod
+    def from_traceparent(cls, value):
+        """Parse a W3C traceparent; None if malformed"""
+        parts = str(value).strip().split("-")
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        try:
+            sampled = bool(int(parts[3], 16) & 1)
+        except ValueError:
+            return None
+        return cls(parts[1].lower(), parts[2].lower(), sampled)
+
+    @classmethod
+    def from_xray_header(cls, value):
+        """Parse Root=1-...;Parent=...;Sampled=1; None without a parent"""
+        fields = dict(
+            part.strip().split("=", 1) for part in str(value).split(";") if "=" in part
+        )
+        root = fields.get("Root", "").split("-")
+        parent = fields.get("Parent")
+        if len(root) != 3 or not parent:
+            return None
+        return cls(root[1] + root[2], parent, fields.get("Sampled", "1") != "0")
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    def __init__(
+        self, name, trace_id, parent_id=None, kind="internal", parent_source=None
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_span_id()
+        self.parent_id = parent_id
+        self.kind = kind
+        # Where the parent came from: None (same process), "remote" or "lambda"
+        self.parent_source = parent_source
+        self.start_time = time.time()
+        self.end_time = None
+        self.attributes = {}
+        self.error = None
+        self.fault = False
+
+    @property
+    def context(self):
+        return SpanContext(self.trace_id, self.span_id)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, error, fault=False):
+        """Mark the span failed; fault=True for server-side (5xx) failures"""
+        self.error = str(error)
+        self.fault = self.fault or fault
+
+    def finish(self):
+        if self.end_time is None:
+            self.end_time = time.time()
+
+    def to_dict(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentId": self.parent_id,
+            "parentSource": self.parent_source,
+            "name": self.name,
+            "kind": self.kind,
+            "startTime": self.start_time,
+            "endTime": self.end_time,
+            "durationMs": (
+                round((self.end_time - self.start_time) * 1000, 3)
+                if self.end_time
+                else None
+            ),
+            "attributes": self.attributes,
+            "error": self.error,
+            "fault": self.fault,
+        }
+
+
+# Exporters
+
+
+class NoopExporter:
+    def export(self, spans):
+        pass
+
+
+class FileExporter:
+    """Appends one JSON line per span, for offline use"""
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("TRACE_FILE", DEFAULT_TRACE_FILE)
+
+    def export(self, spans):
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(span.to_dict()) + "\n" for span in spans))
+
+
+class XRayExporter:
+    """Sends segment documents to the X-Ray daemon over UDP"""
+
+    HEADER = b'{"format": "json", "version": 1}\n'
+
+    def __init__(self, address=None):
+        address = address or os.environ.get("AWS_XRAY_DAEMON_ADDRESS", "127.0.0.1:2000")
+        # The daemon address is "host:port" or "tcp:host:port udp:host:port"
+        for part in address.split():
+            if part.startswith("udp:"):
+                address = part[len("udp:") :]
+        host, port = address.rsplit(":", 1)
+        self.address = (host, int(port))
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    @staticmethod
+    def to_document(span):
+        trace_id = f"1-{span.trace_id[:8]}-{span.trace_id[8:]}"
+        document = {
+            "name": span.name,
+            "id": span.span_id,
+            "trace_id": trace_id,
+            "start_time": span.start_time,
+            "end_time": span.end_time,
+        }
+        # Spans under a parent in this process, or under Lambda's own
+        # segment, are subsegments; a span continuing another function's
+        # span is a segment of its own with that parent
+        if span.parent_id:
+            document["parent_id"] = span.parent_id
+        if span.parent_id and span.parent_source != "remote":
+            document["type"] = "subsegment"
+        if span.kind == "client":
+            is_aws = "aws.operation" in span.attributes
+            document["namespace"] = "aws" if is_aws else "remote"
+            if is_aws:
+                document["aws"] = {
+                    "operation": span.attributes["aws.operation"],
+                    "region": span.attributes.get("aws.region"),
+                }
+        if "http.status_code" in span.attributes:
+            document["http"] = {
+                "response": {"status": span.attributes["http.status_code"]}
+            }
+        if span.error:
+            document["fault" if span.fault else "error"] = True
+        other = {
+            key: value
+            for key, value in span.attributes.items()
+            if not key.startswith(("aws.", "http."))
+        }
+        if other:
+            document["annotations"] = {
+                key: value
+                for key, value in other.items()
+                if isinstance(value, (str, int, float, bool))
+            }
+        return document
+
+    def export(self, spans):
+        for span in spans:
+            payload = self.HEADER + json.dumps(self.to_document(span)).encode()
+            try:
+                self.socket.sendto(payload, self.address)
+            except OSError:
+                # Tracing must never fail the request
+                pass
+
+
+EXPORTERS = {"none": NoopExporter, "file": FileExporter, "xray": XRayExporter}
+
+
+def register_exporter(name, factory):
+    """Make an exporter selectable with TRACE_EXPORTER=name"""
+    EXPORTERS[name] = factory
+
+
+_exporter = None
+_exporter_name = None
+
+
+def get_exporter():
+    global _exporter, _exporter_name
+    default = "xray" if os.environ.get("AWS_XRAY_DAEMON_ADDRESS") else "none"
+    name = os.environ.get("TRACE_EXPORTER", default).lower()
+    if name != _exporter_name:
+        _exporter = EXPORTERS.get(name, NoopExporter)()
+        _exporter_name = name
+    return _exporter
+
+
+# Active trace state for the invocation in progress
+
+_stack = []
+_finished = []
+_sampled = True
+_hooked_session = None
+
+
+def current_span():
+    return _stack[-1] if _stack else None
+
+
+def start_span(name, kind="internal", parent=None, parent_source=None):
+    """Start a span under parent (a SpanContext) or the current span"""
+    if parent is not None:
+        span = Span(name, parent.trace_id, parent.span_id, kind, parent_source)
+    elif _stack:
+        span = Span(name, _stack[-1].trace_id, _stack[-1].span_id, kind)
+    else:
+        span = Span(name, _new_trace_id(), None, kind)
+    _stack.append(span)
+    return span
+
+
+def end_span(span):
+    span.finish()
+    if span in _stack:
+        _stack.remove(span)
+    _finished.append(span)
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time a block of handler code as a child of the current span"""
+    current = start_span(name)
+    current.attributes.update(attributes)
+    try:
+        yield current
+    except Exception as e:
+        current.record_error(e, fault=True)
+        raise
+    finally:
+        end_span(current)
+
+
+def client_metadata(metadata=None):
+    """ClientMetadata for Cognito calls, carrying the current trace"""
+    metadata = dict(metadata or {})
+    current = current_span()
+    if current is not None:
+        context = current.context
+        context.sampled = _sampled
+        metadata[TRACEPARENT_KEY] = context.to_traceparent()
+    return metadata
+
+
+def _header(headers, name):
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def extract_parent(event):
+    """(SpanContext, source) the invocation should continue, or (None, None)"""
+    if isinstance(event, dict):
+        request = event.get("request")
+        if isinstance(request, dict):
+            metadata = request.get("clientMetadata") or {}
+            parent = SpanContext.from_traceparent(metadata.get(TRACEPARENT_KEY, ""))
+            if parent is not None:
+                return parent, "remote"
+
+        headers = event.get("headers")
+        if isinstance(headers, dict):
+            parent = SpanContext.from_traceparent(
+                _header(headers, TRACEPARENT_KEY) or ""
+            )
+            if parent is None and _header(headers, XRAY_HEADER):
+                parent = SpanContext.from_xray_header(_header(headers, XRAY_HEADER))
+            if parent is not None:
+                return parent, "remote"
+
+    if os.environ.get("_X_AMZN_TRACE_ID"):
+        parent = SpanContext.from_xray_header(os.environ["_X_AMZN_TRACE_ID"])
+        if parent is not None:
+            return parent, "lambda"
+    return None, None
+
+
+# botocore hooks
+
+
+def _before_call(model, context, **kwargs):
+    if not _stack:
+        return
+    service = model.service_model.service_id.hyphenize()
+    current = start_span(f"{service}.{model.name}", kind="client")
+    current.set_attribute("aws.service", service)
+    current.set_attribute("aws.operation", model.name)
+    current.set_attribute("aws.region", context.get("client_region"))
+    context[_SPAN_KEY] = current
+
+
+def _after_call(context, http_response, parsed, **kwargs):
+    current = context.pop(_SPAN_KEY, None)
+    if current is None:
+        return
+    current.set_attribute("http.status_code", http_response.status_code)
+    if http_response.status_code >= 300:
+        current.record_error(
+            parsed.get("Error", {}).get("Code", http_response.status_code),
+            fault=http_response.status_code >= 500,
+        )
+    end_span(current)
+
+
+def _after_call_error(context, exception, **kwargs):
+    current = context.pop(_SPAN_KEY, None)
+    if current is None:
+        return
+    current.record_error(type(exception).__name__, fault=True)
+    end_span(current)
+
+
+def install():
+    """Register the span hooks on the default boto3 session"""
+    global _hooked_session
+    import boto3
+
+    if boto3.DEFAULT_SESSION is None:
+        boto3.setup_default_session()
+    if _hooked_session is boto3.DEFAULT_SESSION:
+        return
+
+    _hooked_session = boto3.DEFAULT_SESSION
+    _hooked_session.events.register_first("before-call.*.*", _before_call)
+    _hooked_session.events.register("after-call", _after_call)
+    _hooked_session.events.register("after-call-error", _after_call_error)
+
+
+def instrument_http(pool):
+    """Create a client span for every request made through a urllib3 pool"""
+    inner = pool.urlopen
+
+    def urlopen(method, url, *args, **kwargs):
+        if not _stack:
+            return inner(method, url, *args, **kwargs)
+        host = urlsplit(url).hostname or "unknown"
+        current = start_span(host, kind="client")
+        current.set_attribute("http.method", method)
+        current.set_attribute("http.host", host)
+        try:
+            response = inner(method, url, *args, **kwargs)
+            current.set_attribute("http.status_code", response.status)
+            if response.status >= 400:
+                current.record_error(response.status, fault=response.status >= 500)
+            return response
+        except Exception as e:
+            current.record_error(type(e).__name__, fault=True)
+            raise
+        finally:
+            end_span(current)
+
+    pool.urlopen = urlopen
+    return pool
+
+
+# Handler decorator
+
+
+def _context_value(context, name):
+    """Read a Lambda context attribute; the local harness may pass a dict"""
+    if isinstance(context, dict):
+        return context.get(name)
+    return getattr(context, name, None)
+
+
+def flush():
+    """Export the finished spans of a sampled trace"""
+    spans = _finished[:]
+    del _finished[:]
+    if spans and _sampled:
+        try:
+            get_exporter().export(spans)
+        except Exception:
+            pass
+
+
+def trace_handler(handler):
+    """Run each invocation of a Lambda handler inside a span"""
+    install()
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _sampled
+        parent, source = extract_parent(event)
+        _sampled = parent.sampled if parent is not None else True
+        del _stack[:]
+
+        function_name = _context_value(context, "function_name") or os.environ.get(
+            "AWS_LAMBDA_FUNCTION_NAME", handler.__module__
+        )
+        root = start_span(
+            function_name, kind="server", parent=parent, parent_source=source
+        )
+        root.set_attribute("requestId", _context_value(context, "aws_request_id"))
+        if isinstance(event, dict) and event.get("triggerSource"):
+            root.set_attribute("triggerSource", event["triggerSource"])
+        try:
+            result = handler(event, context)
+            if isinstance(result, dict) and isinstance(result.get("statusCode"), int):
+                root.set_attribute("http.status_code", result["statusCode"])
+                if result["statusCode"] >= 400:
+                    root.record_error(
+                        result["statusCode"], fault=result["statusCode"] >= 500
+                    )
+            return result
+        except Exception as e:
+            root.record_error(type(e).__name__, fault=True)
+            raise
+        finally:
+            # Spans left open by an exception end with the handler
+            for open_span in reversed(_stack[:]):
+                end_span(open_span)
+            flush()
+
+    return wrapper
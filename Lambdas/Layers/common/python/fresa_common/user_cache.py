@@ -0,0 +1,135 @@
+"""
+User Cache
+In-container cache of Cognito AdminGetUser results
+
+AdminGetUser has a low per-account request quota, and every login asks it
+whether the user exists. A warm container remembers the answer for a
+short while, so Cognito read traffic grows with unique users rather than
+with requests.
+
+Usage in a handler module:
+
+    from fresa_common import user_cache
+
+    user = user_cache.get_user(get_cognito_client(), user_pool_id, email)
+    if user is None:
+        ...  # not found
+    ...
+    cognito.admin_create_user(...)
+    user_cache.invalidate(user_pool_id, email)
+
+"Exists" and "not found" are kept for separate TTLs. Not found is kept
+briefly, because a user who was just told to sign up is usually created
+moments later by another container, which cannot invalidate this one's
+entry. Other Cognito errors are never cached. The least recently used
+entry is dropped once the cache is full.
+
+Every lookup counts a UserCacheHits or UserCacheMisses metric.
+
+- USER_CACHE_FOUND_TTL_SECONDS: how long a found user is kept (default 60)
+- USER_CACHE_NOT_FOUND_TTL_SECONDS: how long "not found" is kept (default 5)
+- USER_CACHE_MAX_ENTRIES: entries per container (default 1000)
+"""
+
+import os
+import time
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+from fresa_common import metrics
+
+DEFAULT_FOUND_TTL_SECONDS = 60
+DEFAULT_NOT_FOUND_TTL_SECONDS = 5
+DEFAULT_MAX_ENTRIES = 1000
+
+
+class UserCache:
+    """LRU cache of AdminGetUser responses; None records "not found" """
+
+    def __init__(
+        self,
+        found_ttl_s=DEFAULT_FOUND_TTL_SECONDS,
+        not_found_ttl_s=DEFAULT_NOT_FOUND_TTL_SECONDS,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        clock=time.monotonic,
+    ):
+        self.found_ttl_s = found_ttl_s
+        self.not_found_ttl_s = not_found_ttl_s
+        self.max_entries = max_entries
+        self.clock = clock
+        # (user pool id, username) -> (expires at, response or None)
+        self._entries = OrderedDict()
+
+    def get_user(self, client, user_pool_id, username):
+        """AdminGetUser's response for username, or None if there is none"""
+        key = (user_pool_id, username)
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(key)
+            metrics.increment_metric("UserCacheHits")
+            return entry[1]
+
+        metrics.increment_metric("UserCacheMisses")
+        try:
+            user = client.admin_get_user(UserPoolId=user_pool_id, Username=username)
+            user.pop("ResponseMetadata", None)
+            ttl_s = self.found_ttl_s
+        except ClientError as e:
+            if e.response["Error"].get("Code") != "UserNotFoundException":
+                raise
+            user = None
+            ttl_s = self.not_found_ttl_s
+
+        if ttl_s > 0:
+            self._entries[key] = (now + ttl_s, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_pool_id, username):
+        """Forget username, e.g. after this container created it"""
+        self._entries.pop((user_pool_id, username), None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def _from_environment():
+    return UserCache(
+        found_ttl_s=float(
+            os.environ.get("USER_CACHE_FOUND_TTL_SECONDS", DEFAULT_FOUND_TTL_SECONDS)
+        ),
+        not_found_ttl_s=float(
+            os.environ.get(
+                "USER_CACHE_NOT_FOUND_TTL_SECONDS", DEFAULT_NOT_FOUND_TTL_SECONDS
+            )
+        ),
+        max_entries=int(os.environ.get("USER_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+    )
+
+
+_cache = None
+
+
+def cache():
+    """The container's cache, configured from the environment on first use"""
+    global _cache
+    if _cache is None:
+        _cache = _from_environment()
+    return _cache
+
+
+def get_user(client, user_pool_id, username):
+    """AdminGetUser through the container's cache; None if not found"""
+    return cache().get_user(client, user_pool_id, username)
+
+
+def user_exists(client, user_pool_id, username):
+    return get_user(client, user_pool_id, username) is not None
+
+
+def invalidate(user_pool_id, username):
+    cache().invalidate(user_pool_id, username)
@@ -0,0 +1,294 @@
+"""
+Request Validation
+Rejects malformed API requests before the handler makes any AWS call
+
+Each endpoint declares what it accepts once, at module load:
+
+    from fresa_common import validation
+
+    SIGN_UP_REQUEST = validation.Schema(
+        body={
+            "email": validation.email(),
+            "code": validation.string(max_length=16),
+            "dateOfBirth": validation.date(),
+            "picture": validation.string(required=False),
+        }
+    )
+
+    @metrics.instrument_handler
+    @tracing.trace_handler
+    @log.inject_request_context
+    @deadline.with_deadline()
+    @validation.validated(SIGN_UP_REQUEST, headers=RESPONSE_HEADERS)
+    @idempotency.idempotent(get_idempotency_store, headers=RESPONSE_HEADERS)
+    def lambda_handler(event, context):
+        request = validation.current()
+        email = request.body["email"]
+
+A Schema compiles its fields into plain checks when it is built, so a
+request costs a JSON parse and a few comparisons. validated() runs them
+before the handler (and before idempotency, which writes to DynamoDB); an
+invalid request gets a 400 without any AWS call, always with the same body:
+
+    {"error": "Missing required field: email",
+     "fields": {"email": "required"}}
+
+"fields" holds one entry per invalid field, "error" describes the first.
+Valid requests reach the handler through validation.current(): body, query
+and path hold the declared fields only, normalized (emails lowercased,
+strings stripped, an alias stored under the field's name), and optional
+fields that were not sent are absent.
+
+Queued events (SQS batches, with "Records") are not API requests and pass
+through unchecked; Schema.validate() can check a record's body instead.
+Each rejected request adds one to the InvalidRequests metric.
+"""
+
+import functools
+import json
+import re
+from datetime import date as _date
+
+from fresa_common import log, metrics, responses
+
+logger = log.get_logger(__name__)
+
+# Loose on purpose: Cognito and SES have the last word on addresses
+EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+EMAIL_MAX_LENGTH = 254
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+# Longest string field accepted when a field sets no max_length
+DEFAULT_MAX_LENGTH = 2048
+
+REQUIRED = "required"
+
+
+class ValidationError(Exception):
+    """Raised by Schema.validate() for a request that does not match it"""
+
+    def __init__(self, fields, message=None):
+        self.fields = fields
+        self.message = message or _describe(*next(iter(fields.items())))
+        super().__init__(self.message)
+
+    def body(self):
+        return {"error": self.message, "fields": self.fields}
+
+
+class _Invalid(Exception):
+    pass
+
+
+def _describe(name, reason):
+    if reason == REQUIRED:
+        return f"Missing required field: {name}"
+    return f"Invalid {name}: {reason}"
+
+
+class Field:
+    """One declared field; see string(), email(), date() and one_of()"""
+
+    __slots__ = ("check", "required", "aliases")
+
+    def __init__(self, check, required=True, aliases=()):
+        self.check = check
+        self.required = required
+        self.aliases = tuple(aliases)
+
+
+def string(
+    required=True,
+    aliases=(),
+    min_length=1,
+    max_length=DEFAULT_MAX_LENGTH,
+    pattern=None,
+    lower=False,
+    reason="has an invalid format",
+):
+    """A string, stripped (and lowercased if lower) before it is checked
+
+    reason is what a value that does not match pattern is told.
+    """
+    matcher = re.compile(pattern).match if pattern else None
+
+    def check(value):
+        if not isinstance(value, str):
+            raise _Invalid("must be a string")
+        value = value.strip()
+        if lower:
+            value = value.lower()
+        if not value:
+            raise _Invalid(REQUIRED)
+        if len(value) < min_length:
+            raise _Invalid(f"shorter than {min_length} characters")
+        if len(value) > max_length:
+            raise _Invalid(f"longer than {max_length} characters")
+        if matcher is not None and not matcher(value):
+            raise _Invalid(reason)
+        return value
+
+    return Field(check, required, aliases)
+
+
+def email(required=True, aliases=()):
+    """An email address, lowercased"""
+    return string(
+        required,
+        aliases,
+        max_length=EMAIL_MAX_LENGTH,
+        pattern=EMAIL_PATTERN,
+        lower=True,
+        reason="must be an email address",
+    )
+
+
+def date(required=True, aliases=()):
+    """A calendar date as YYYY-MM-DD (Cognito's birthdate format)"""
+    reason = "must be a date as YYYY-MM-DD"
+    check = string(required, aliases, pattern=DATE_PATTERN, reason=reason).check
+
+    def check_date(value):
+        value = check(value)
+        try:
+            _date.fromisoformat(value)
+        except ValueError:
+            raise _Invalid(reason)
+        return value
+
+    return Field(check_date, required, aliases)
+
+
+def one_of(*choices, required=True, aliases=(), lower=True):
+    """A string among choices (compared lowercased unless lower=False)"""
+    allowed = frozenset(choices)
+    check = string(required, aliases, lower=lower).check
+    reason = f"must be one of {', '.join(choices)}"
+
+    def check_choice(value):
+        value = check(value)
+        if value not in allowed:
+            raise _Invalid(reason)
+        return value
+
+    return Field(check_choice, required, aliases)
+
+
+class Request:
+    """The validated fields of a request"""
+
+    __slots__ = ("body", "query", "path")
+
+    def __init__(self, body, query, path):
+        self.body = body
+        self.query = query
+        self.path = path
+
+
+def _compile(fields):
+    # (name, names to look under, required, check), built once per schema
+    return tuple(
+        (name, (name,) + field.aliases, field.required, field.check)
+        for name, field in (fields or {}).items()
+    )
+
+
+def _check(compiled, values, problems):
+    checked = {}
+    for name, names, required, check in compiled:
+        value = None
+        for candidate in names:
+            value = values.get(candidate)
+            if value is not None and value != "":
+                break
+        if value is None or value == "":
+            if required:
+                problems[name] = REQUIRED
+            continue
+        try:
+            checked[name] = check(value)
+        except _Invalid as e:
+            # Blank after stripping counts as not sent
+            if e.args[0] != REQUIRED or required:
+                problems[name] = e.args[0]
+    return checked
+
+
+class Schema:
+    """The fields an endpoint accepts in its JSON body, query string and path"""
+
+    def __init__(self, body=None, query=None, path=None):
+        self._body = _compile(body)
+        self._query = _compile(query)
+        self._path = _compile(path)
+
+    def validate(self, event):
+        """The request's validated fields; raises ValidationError"""
+        body = {}
+        if self._body:
+            raw = (event or {}).get("body")
+            if not raw:
+                raise ValidationError({"body": REQUIRED}, "Missing request body")
+            try:
+                body = json.loads(raw)
+            except (TypeError, ValueError):
+                raise ValidationError(
+                    {"body": "must be JSON"}, "Invalid JSON in request body"
+                )
+            if not isinstance(body, dict):
+                raise ValidationError(
+                    {"body": "must be a JSON object"},
+                    "Request body must be a JSON object",
+                )
+
+        problems = {}
+        request = Request(
+            _check(self._body, body, problems),
+            _check(
+                self._query, (event or {}).get("queryStringParameters") or {}, problems
+            ),
+            _check(self._path, (event or {}).get("pathParameters") or {}, problems),
+        )
+        if problems:
+            raise ValidationError(problems)
+        return request
+
+
+_current = None
+
+
+def current():
+    """The validated request of the invocation in progress, or None"""
+    return _current
+
+
+def error_response(error, headers=None):
+    return responses.respond(400, error.body(), headers)
+
+
+def validated(schema, headers=None):
+    """Answer requests that do not match schema with a 400 before the handler
+
+    headers are added to the 400 (CORS headers, for instance).
+    """
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global _current
+            if isinstance(event, dict) and "Records" in event:
+                return handler(event, context)
+            try:
+                request = schema.validate(event)
+            except ValidationError as e:
+                metrics.increment_metric("InvalidRequests")
+                logger.info("Invalid request: %s", e.message, fields=e.fields)
+                return error_response(e, headers)
+            _current = request
+            try:
+                return handler(event, context)
+            finally:
+                _current = None
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,237 @@
+"""
+VerificationCodes Repository
+One item model and one codec for the VerificationCodes table, shared by
+every function that issues or checks a code
+
+Usage in a handler module:
+
+    from fresa_common import verification_codes
+
+    codes = verification_codes.VerificationCodeRepository(
+        get_dynamodb_client(), get_dynamodb_table_name()
+    )
+    item = codes.get(email, verification_codes.VALIDATION)
+    if item is None or item.is_expired():
+        ...
+    if item.attempts_exhausted():
+        ...  # refused, even the right code, until a new one is issued
+    if not item.matches(code):
+        codes.record_failed_attempt(email)
+
+Items are read with the low-level client and decoded straight into a
+__slots__ object, so there is no TypeDeserializer/Decimal pass and every
+function sees the same types: strings, ints and a list of ints. Each call
+site passes a projection naming only the attributes it uses.
+
+Expiry: a code is valid for CODE_EXPIRATION_MINUTES (default 10) after it
+was issued. The issuing function stores the resulting expiresAt on the
+item; items written before expiresAt existed fall back to lastRequestTime
+plus the same setting, and an item with neither counts as expired.
+
+TTL: DynamoDB deletes an item some time after its ttl attribute passes, so
+ttl must outlive everything the item is still needed for: the code itself
+and the request history the rate limit looks back over. Writers pass that
+look-back as retain_s; ttl is the later of the two. Expiry is still checked
+on read, since TTL deletion can lag by hours.
+
+Attempts: each wrong code adds one to the item's attempts, and issuing a
+code resets them. Once MAX_CODE_ATTEMPTS (default 5) wrong codes were
+entered, the code is refused like an expired one, so a 6-digit code cannot
+be guessed within its lifetime.
+"""
+
+import hmac
+import os
+import time
+
+DEFAULT_CODE_EXPIRATION_MINUTES = 10
+DEFAULT_MAX_CODE_ATTEMPTS = 5
+
+# DynamoDB attribute name -> (slot, type). "NL" is a list of numbers.
+ATTRIBUTES = {
+    "email": ("email", "S"),
+    "code": ("code", "S"),
+    "createdAt": ("created_at", "S"),
+    "lastRequestTime": ("last_request_time", "N"),
+    "expiresAt": ("expires_at", "N"),
+    "ttl": ("ttl", "N"),
+    "attempts": ("attempts", "N"),
+    "requestHistory": ("request_history", "NL"),
+    "postBurstCodeSent": ("post_burst_code_sent", "BOOL"),
+}
+
+# Projections for the call sites
+VALIDATION = ("code", "lastRequestTime", "expiresAt", "attempts")
+CHALLENGE = ("code",)
+RATE_LIMIT = ("requestHistory", "lastRequestTime", "postBurstCodeSent")
+ALL = tuple(ATTRIBUTES)
+
+
+def code_expiration_minutes():
+    """How long a newly issued code is valid"""
+    return int(
+        os.environ.get("CODE_EXPIRATION_MINUTES", DEFAULT_CODE_EXPIRATION_MINUTES)
+    )
+
+
+def max_code_attempts():
+    """Wrong codes accepted before a code is refused"""
+    return int(os.environ.get("MAX_CODE_ATTEMPTS", DEFAULT_MAX_CODE_ATTEMPTS))
+
+
+class VerificationCode:
+    """One VerificationCodes item; attributes not projected are None"""
+
+    __slots__ = tuple(slot for slot, _ in ATTRIBUTES.values())
+
+    def __init__(self, **values):
+        for slot in self.__slots__:
+            setattr(self, slot, values.get(slot))
+
+    def expiry_time(self):
+        """Epoch seconds after which the code is no longer accepted, or None"""
+        if self.expires_at is not None:
+            return self.expires_at
+        if self.last_request_time is not None:
+            return self.last_request_time + code_expiration_minutes() * 60
+        return None
+
+    def is_expired(self, now=None):
+        expiry = self.expiry_time()
+        if expiry is None:
+            return True
+        return (int(time.time()) if now is None else now) > expiry
+
+    def attempts_exhausted(self):
+        """Whether MAX_CODE_ATTEMPTS wrong codes were entered for this code"""
+        return (self.attempts or 0) >= max_code_attempts()
+
+    def matches(self, code):
+        """Constant-time comparison against the stored code"""
+        if not self.code or not code:
+            return False
+        return hmac.compare_digest(self.code.encode(), str(code).encode())
+
+    def __repr__(self):
+        # Never print the code itself
+        return (
+            f"VerificationCode(email={self.email!r}, expires_at={self.expiry_time()})"
+        )
+
+
+# Codec
+
+
+def _decode_number(value):
+    # Numbers were written both as "1700000000" and "1700000000.0"
+    text = value["N"]
+    return int(text) if text.isdigit() else int(float(text))
+
+
+def decode(item):
+    """A low-level DynamoDB item as a VerificationCode"""
+    values = {}
+    for name, value in item.items():
+        spec = ATTRIBUTES.get(name)
+        if spec is None:
+            continue
+        slot, kind = spec
+        if kind == "S":
+            values[slot] = value.get("S")
+        elif kind == "N":
+            values[slot] = _decode_number(value)
+        elif kind == "NL":
+            values[slot] = [_decode_number(entry) for entry in value.get("L", [])]
+        elif kind == "BOOL":
+            values[slot] = value.get("BOOL", False)
+    return VerificationCode(**values)
+
+
+def _encode_number(value):
+    return {"N": str(int(value))}
+
+
+_projections = {}
+
+
+def projection(attributes):
+    """(ProjectionExpression, ExpressionAttributeNames) for attribute names"""
+    cached = _projections.get(attributes)
+    if cached is None:
+        # Placeholders for every name; "code" and "ttl" are reserved words
+        names = {f"#p{i}": name for i, name in enumerate(attributes)}
+        cached = _projections[attributes] = (", ".join(names), names)
+    return cached
+
+
+class VerificationCodeRepository:
+    """Reads and writes VerificationCodes through a low-level client"""
+
+    def __init__(self, client, table_name):
+        self.client = client
+        self.table_name = table_name
+
+    def get(self, email, attributes=ALL):
+        """The item for email with only the given attributes, or None"""
+        expression, names = projection(attributes)
+        response = self.client.get_item(
+            TableName=self.table_name,
+            Key={"email": {"S": email}},
+            ProjectionExpression=expression,
+            ExpressionAttributeNames=names,
+        )
+        item = response.get("Item")
+        return decode(item) if item else None
+
+    def issue(self, email, code, now=None, post_burst=False, retain_s=0):
+        """Store a new code, reset its attempts and record the request
+
+        retain_s keeps the item (and its request history) at least that
+        long after this request, past the code's own expiry.
+        """
+        now = int(time.time()) if now is None else int(now)
+        expires_at = now + code_expiration_minutes() * 60
+        ttl = max(expires_at, now + retain_s)
+
+        update_expression = (
+            "SET #code = :code, #ttl = :ttl, expiresAt = :expiresAt, "
+            "createdAt = :createdAt, lastRequestTime = :lastRequestTime, "
+            "attempts = :zero, requestHistory = "
+            "list_append(if_not_exists(requestHistory, :emptyList), :newRequest)"
+        )
+        values = {
+            ":code": {"S": code},
+            ":ttl": _encode_number(ttl),
+            ":expiresAt": _encode_number(expires_at),
+            ":createdAt": {"S": _isoformat(now)},
+            ":lastRequestTime": _encode_number(now),
+            ":zero": {"N": "0"},
+            ":newRequest": {"L": [_encode_number(now)]},
+            ":emptyList": {"L": []},
+        }
+        if post_burst:
+            update_expression += ", postBurstCodeSent = :postBurstCodeSent"
+            values[":postBurstCodeSent"] = {"BOOL": True}
+
+        self.client.update_item(
+            TableName=self.table_name,
+            Key={"email": {"S": email}},
+            UpdateExpression=update_expression,
+            ExpressionAttributeNames={"#code": "code", "#ttl": "ttl"},
+            ExpressionAttributeValues=values,
+        )
+        return expires_at
+
+    def record_failed_attempt(self, email):
+        """Count a wrong code against the item, if it still exists"""
+        self.client.update_item(
+            TableName=self.table_name,
+            Key={"email": {"S": email}},
+            UpdateExpression="ADD attempts :one",
+            ConditionExpression="attribute_exists(email)",
+            ExpressionAttributeValues={":one": {"N": "1"}},
+        )
+
+
+def _isoformat(epoch_seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(epoch_seconds))
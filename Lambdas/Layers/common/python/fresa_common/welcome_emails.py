@@ -0,0 +1,108 @@
+"""
+Welcome Emails
+Hands welcome emails to a queue, so signup returns as soon as the tokens are
+minted instead of waiting on SES
+
+Usage in a handler module:
+
+    from fresa_common import welcome_emails
+
+    queued = welcome_emails.enqueue(email, {"name": first_name, ...})
+
+The sendWelcomeEmails function consumes the queue and sends in bulk. Each
+message is {"email": ..., "templateData": {...}}, the template data being
+whatever the welcome template should be rendered with for that user.
+
+On Lambda the queue is the SQS queue at WELCOME_EMAIL_QUEUE_URL. Anywhere
+else without that variable (local runs, benchmarks), messages go to an
+in-memory queue; drain_event() turns them into the SQS event the worker
+expects:
+
+    welcome_emails.get_queue().drain_event()
+
+Queuing never fails the signup: an error is logged and enqueue() returns
+False.
+
+- WELCOME_EMAIL_QUEUE_URL: the SQS queue sendWelcomeEmails reads
+"""
+
+import json
+import os
+import uuid
+from collections import deque
+
+from fresa_common import clients, log, metrics
+
+logger = log.get_logger(__name__)
+
+TEMPLATE_NAME = "fresa-welcome-template"
+# Messages an in-memory queue keeps before dropping the oldest
+IN_MEMORY_LIMIT = 10000
+
+
+class SqsQueue:
+    """The deployed welcome email queue"""
+
+    def __init__(self, url):
+        self.url = url
+
+    def send(self, body):
+        clients.get_client("sqs").send_message(QueueUrl=self.url, MessageBody=body)
+
+
+class InMemoryQueue:
+    """Stand-in for SQS when running outside Lambda"""
+
+    def __init__(self, limit=IN_MEMORY_LIMIT):
+        self.messages = deque(maxlen=limit)
+
+    def send(self, body):
+        self.messages.append(body)
+
+    def drain_event(self, max_messages=None):
+        """Take queued messages out as an SQS event for sendWelcomeEmails"""
+        records = []
+        while self.messages and (max_messages is None or len(records) < max_messages):
+            records.append(
+                {
+                    "messageId": str(uuid.uuid4()),
+                    "body": self.messages.popleft(),
+                    "eventSource": "aws:sqs",
+                }
+            )
+        return {"Records": records}
+
+
+_queues = {}
+
+
+def get_queue():
+    """The queue for this environment, or None if Lambda has none configured"""
+    url = os.environ.get("WELCOME_EMAIL_QUEUE_URL")
+    if not url and os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+        # Keeping messages in a container's memory would lose them
+        return None
+    queue = _queues.get(url)
+    if queue is None:
+        queue = SqsQueue(url) if url else InMemoryQueue()
+        _queues[url] = queue
+    return queue
+
+
+def message(email, template_data):
+    return json.dumps({"email": email, "templateData": template_data})
+
+
+def enqueue(email, template_data):
+    """Queue a welcome email; returns whether it was queued"""
+    queue = get_queue()
+    if queue is None:
+        logger.error("WELCOME_EMAIL_QUEUE_URL is not set", email=email)
+        return False
+    try:
+        queue.send(message(email, template_data))
+    except Exception as e:
+        logger.error("Could not queue welcome email: %s", e, email=email)
+        return False
+    metrics.put_metric("WelcomeEmailQueued", 1)
+    return True
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.cognito_quota module
+"""
+
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+from botocore.awsrequest import AWSResponse
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from fresa_common import clients, cognito_quota
+from fresa_common.cognito_quota import TokenBucket
+
+
+class FakeRawResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def cognito_response(status_code, body):
+    return AWSResponse(
+        "https://cognito-idp.us-east-1.amazonaws.com/",
+        status_code,
+        {"Content-Type": "application/x-amz-json-1.1"},
+        FakeRawResponse(body.encode()),
+    )
+
+
+class TestCognitoQuota(unittest.TestCase):
+    """Test cases for Cognito quota pacing"""
+
+    def setUp(self):
+        os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+        os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+        os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+        clients.clear_cache()
+        cognito_quota.reset()
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    def test_operations_classified(self):
+        """Test the handlers' operations map to their quota categories"""
+        self.assertEqual(cognito_quota.category("InitiateAuth"), "UserAuthentication")
+        self.assertEqual(cognito_quota.category("AdminCreateUser"), "UserCreation")
+        self.assertEqual(cognito_quota.category("AdminGetUser"), "UserRead")
+        self.assertEqual(cognito_quota.category("AdminSetUserPassword"), "UserUpdate")
+        self.assertIsNone(cognito_quota.category("DescribeUserPool"))
+
+    def test_quota_config(self):
+        """Test the share scales every category and overrides win"""
+        with patch.dict(
+            os.environ,
+            {"COGNITO_QUOTA_SHARE": "0.5", "COGNITO_QUOTA_USER_READ": "10"},
+        ):
+            config = cognito_quota.quota_config()
+
+        self.assertEqual(config["UserRead"], 10)
+        self.assertEqual(config["UserAuthentication"], 60)
+
+    def test_zero_rate_turns_pacing_off(self):
+        """Test a rate of 0 leaves a category unpaced and negatives are refused"""
+        with patch.dict(os.environ, {"COGNITO_QUOTA_USER_READ": "0"}):
+            self.assertIsNone(cognito_quota.bucket("UserRead"))
+            self.assertEqual(cognito_quota.acquire("UserRead"), 0.0)
+        cognito_quota.reset()
+        with patch.dict(os.environ, {"COGNITO_QUOTA_SHARE": "0"}):
+            self.assertIsNone(cognito_quota.bucket("UserCreation"))
+
+        with patch.dict(os.environ, {"COGNITO_QUOTA_USER_UPDATE": "-1"}):
+            with self.assertRaises(ValueError):
+                cognito_quota.quota_config()
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+    def test_bucket_paces_past_burst(self):
+        """Test calls past the burst wait their turn at the bucket's rate"""
+        paced = TokenBucket(10, burst=2, clock=self.clock)
+
+        waits = [paced.reserve() for _ in range(4)]
+
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.1)
+        self.assertAlmostEqual(waits[3], 0.2)
+        self.assertGreater(paced.saturation(), 1)
+
+        self.now += 1
+        self.assertEqual(paced.reserve(), 0.0)
+
+    def test_throttling_halves_rate_then_recovers(self):
+        """Test a throttled call slows the category down for a while"""
+        paced = TokenBucket(20, clock=self.clock)
+
+        paced.throttled()
+        paced.throttled()
+        self.assertEqual(paced.rate, 5)
+
+        self.now += cognito_quota.RECOVERY_S / 2
+        paced.reserve()
+        self.assertEqual(paced.rate, 15)
+        self.now += cognito_quota.RECOVERY_S
+        paced.reserve()
+        self.assertEqual(paced.rate, 20)
+
+    def test_throttled_call_retried_through_bucket(self):
+        """Test a TooManyRequestsException is retried and slows the bucket"""
+        responses = [
+            cognito_response(
+                400,
+                '{"__type": "TooManyRequestsException", "message": "Too many"}',
+            ),
+            cognito_response(200, '{"Username": "a@b.c"}'),
+        ]
+        sent = []
+
+        def respond(request, **kwargs):
+            sent.append(request)
+            return responses.pop(0)
+
+        client = clients.get_client("cognito-idp")
+        client.meta.events.register("before-send.cognito-identity-provider.*", respond)
+        try:
+            with patch("time.sleep"), patch.object(
+                TokenBucket, "reserve", autospec=True, return_value=0.0
+            ) as reserve:
+                user = client.admin_get_user(UserPoolId="pool", Username="a@b.c")
+        finally:
+            client.meta.events.unregister(
+                "before-send.cognito-identity-provider.*", respond
+            )
+
+        self.assertEqual(user["Username"], "a@b.c")
+        self.assertEqual(len(sent), 2)
+        user_read = cognito_quota.bucket("UserRead")
+        self.assertLess(user_read.rate, user_read.base_rate)
+        # Both attempts took a token
+        self.assertEqual(reserve.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.custom_auth module
+"""
+
+import unittest
+import sys
+import os
+import json
+from unittest.mock import MagicMock
+
+from botocore.exceptions import ClientError
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from fresa_common import custom_auth
+
+
+def cognito_error(code):
+    return ClientError(
+        {"Error": {"Code": code, "Message": f"{code} details"}},
+        "RespondToAuthChallenge",
+    )
+
+
+class TestCustomAuth(unittest.TestCase):
+    """Test cases for the shared CUSTOM_AUTH sign-in"""
+
+    def setUp(self):
+        self.cognito = MagicMock()
+        self.cognito.initiate_auth.return_value = {"Session": "session-1"}
+        self.cognito.respond_to_auth_challenge.return_value = {
+            "AuthenticationResult": {
+                "AccessToken": "access",
+                "IdToken": "id",
+                "ExpiresIn": 3600,
+            }
+        }
+
+    def test_answers_challenge_with_code(self):
+        """Test the code answers the challenge and the tokens come back"""
+        response = custom_auth.authenticate(self.cognito, "client-1", "a@b.c", "123456")
+
+        self.assertEqual(response["statusCode"], 200)
+        self.assertEqual(
+            json.loads(response["body"]),
+            {
+                "access_token": "access",
+                "id_token": "id",
+                "token_type": "Bearer",
+                "expires_in": 3600,
+            },
+        )
+        challenge = self.cognito.respond_to_auth_challenge.call_args.kwargs
+        self.assertEqual(challenge["Session"], "session-1")
+        self.assertEqual(
+            challenge["ChallengeResponses"], {"USERNAME": "a@b.c", "ANSWER": "123456"}
+        )
+        self.assertEqual(
+            self.cognito.initiate_auth.call_args.kwargs["AuthFlow"], "CUSTOM_AUTH"
+        )
+
+    def test_refresh_token_passed_on_when_issued(self):
+        """Test refresh_token appears only when Cognito issues one"""
+        result = self.cognito.respond_to_auth_challenge.return_value
+        result["AuthenticationResult"]["RefreshToken"] = "refresh"
+
+        response = custom_auth.authenticate(self.cognito, "client-1", "a@b.c", "1")
+
+        self.assertEqual(json.loads(response["body"])["refresh_token"], "refresh")
+
+    def test_cognito_errors_mapped_without_details(self):
+        """Test Cognito errors use AUTH_ERRORS and never repeat their text"""
+        for code, expected in [
+            ("CodeMismatchException", custom_auth.AUTH_ERRORS["CodeMismatchException"]),
+            (
+                "InvalidLambdaResponseException",
+                custom_auth.AUTH_ERRORS["InvalidLambdaResponseException"],
+            ),
+            ("InternalErrorException", custom_auth.DEFAULT_AUTH_ERROR),
+        ]:
+            self.cognito.respond_to_auth_challenge.side_effect = cognito_error(code)
+
+            response = custom_auth.authenticate(self.cognito, "client-1", "a@b.c", "1")
+
+            self.assertEqual(response["statusCode"], expected[0])
+            self.assertEqual(json.loads(response["body"]), {"error": expected[1]})
+            self.assertNotIn("details", response["body"])
+
+
+if __name__ == "__main__":
+    unittest.main()
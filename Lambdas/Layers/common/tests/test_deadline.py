@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.deadline and fresa_common.clients modules
+"""
+
+import unittest
+import sys
+import os
+import time
+from unittest.mock import MagicMock
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from fresa_common import clients, deadline
+from fresa_common.deadline import Deadline, DeadlineExceeded
+
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+class TestDeadline(unittest.TestCase):
+    """Test cases for invocation deadlines"""
+
+    def setUp(self):
+        os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+        os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+        os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+        clients.clear_cache()
+
+    def test_from_context_keeps_reserve(self):
+        """Test the deadline is the remaining time minus the reserve"""
+        dl = Deadline.from_context(FakeContext(10000), reserve_ms=500)
+        self.assertAlmostEqual(dl.remaining_ms(), 9500, delta=50)
+
+    def test_trigger_budget_caps_remaining_time(self):
+        """Test a Cognito trigger budget caps a longer function timeout"""
+        dl = Deadline.from_context(
+            FakeContext(30000), budget_ms=deadline.COGNITO_TRIGGER_BUDGET_MS
+        )
+        self.assertLessEqual(dl.remaining_ms(), deadline.COGNITO_TRIGGER_BUDGET_MS)
+
+    def test_no_clock_means_no_deadline(self):
+        """Test dict and Mock contexts leave the handler unbounded"""
+        self.assertIsNone(Deadline.from_context({}))
+        self.assertIsNone(Deadline.from_context(MagicMock()))
+
+        @deadline.with_deadline()
+        def handler(event, context):
+            return deadline.has_time_for(10**9)
+
+        self.assertTrue(handler({}, {}))
+
+    def test_plan_attempts(self):
+        """Test attempts and timeouts shrink with the time left"""
+        self.assertEqual(clients.plan_attempts(None), (3, 5))
+        self.assertEqual(clients.plan_attempts(29000), (3, 5))
+        self.assertEqual(clients.plan_attempts(4500), (3, 1))
+        self.assertEqual(clients.plan_attempts(1200), (2, 0.5))
+        self.assertEqual(clients.plan_attempts(100), (1, 0.5))
+
+    def test_clients_cached_per_plan(self):
+        """Test warm invocations with similar time left share a client"""
+        first = clients.get_client("dynamodb")
+        self.assertIs(clients.get_client("dynamodb"), first)
+
+        @deadline.with_deadline()
+        def handler(event, context):
+            return clients.get_client("dynamodb")
+
+        short = handler({}, FakeContext(2000))
+        self.assertIsNot(short, first)
+        self.assertEqual(short.meta.config.read_timeout, 0.5)
+
+    def test_call_refused_when_deadline_passed(self):
+        """Test a call that cannot fit fails fast instead of being sent"""
+
+        @deadline.with_deadline(reserve_ms=0)
+        def handler(event, context):
+            return clients.get_client("dynamodb").get_item(
+                TableName="t", Key={"email": {"S": "a@b.c"}}
+            )
+
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            handler({}, FakeContext(100))
+        self.assertLess(time.monotonic() - started, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
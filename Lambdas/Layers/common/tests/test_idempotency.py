@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.idempotency module
+"""
+
+import unittest
+import sys
+import os
+import json
+import time
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from fresa_common import idempotency
+from fresa_common.idempotency import IdempotencyStore
+
+
+class FakeTable:
+    """put_item (with the claim's condition), get_item and delete_item"""
+
+    def __init__(self):
+        self.items = {}
+
+    def put_item(self, TableName, Item, ConditionExpression=None, **kwargs):
+        key = Item["email"]["S"]
+        existing = self.items.get(key)
+        if ConditionExpression and existing is not None:
+            now = float(kwargs["ExpressionAttributeValues"][":now"]["N"])
+            if float(existing["expiresAt"]["N"]) >= now:
+                raise ClientError(
+                    {"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem"
+                )
+        self.items[key] = Item
+        return {}
+
+    def get_item(self, TableName, Key, **kwargs):
+        item = self.items.get(Key["email"]["S"])
+        return {"Item": item} if item else {}
+
+    def delete_item(self, TableName, Key):
+        self.items.pop(Key["email"]["S"], None)
+        return {}
+
+
+def event(body, key=None):
+    headers = {"Idempotency-Key": key} if key else None
+    return {"body": json.dumps(body), "headers": headers}
+
+
+class TestIdempotency(unittest.TestCase):
+    """Test cases for idempotent handlers"""
+
+    def setUp(self):
+        idempotency.clear_cache()
+        self.table = FakeTable()
+        self.store = IdempotencyStore(self.table, "VerificationCodes")
+        self.handler = MagicMock(
+            return_value={"statusCode": 200, "body": json.dumps({"ok": True})}
+        )
+        self.handler.__name__ = "lambda_handler"
+        self.handler.__module__ = "signUpCustomer"
+        self.wrapped = idempotency.idempotent(lambda: self.store)(self.handler)
+
+    def seed(self, request, status, response=None):
+        key, fingerprint, _ = idempotency.request_key("signUpCustomer", request)
+        self.table.items[key] = {
+            "email": {"S": key},
+            "status": {"S": status},
+            "fingerprint": {"S": fingerprint},
+            "expiresAt": {"N": str(time.time() + 30)},
+        }
+        if response:
+            self.table.items[key]["response"] = {"S": json.dumps(response)}
+        return key
+
+    def test_request_key(self):
+        """Test header keys win, body hashes are scoped and kept briefly"""
+        by_header = idempotency.request_key(
+            "f", {"headers": {"idempotency-KEY": "abc"}, "body": "{}"}
+        )
+        by_body = idempotency.request_key("f", {"body": "{}"})
+
+        self.assertEqual(by_header[1], by_body[1])
+        self.assertNotEqual(by_header[0], by_body[0])
+        self.assertEqual(by_header[2], idempotency.DEFAULT_TTL_SECONDS)
+        self.assertEqual(by_body[2], idempotency.DEFAULT_HASH_WINDOW_SECONDS)
+        self.assertNotEqual(by_body[0], idempotency.request_key("g", {"body": "{}"})[0])
+        self.assertIsNone(idempotency.request_key("f", {}))
+
+    def test_completed_response_replayed(self):
+        """Test a retry on another container gets the stored response"""
+        request = event({"email": "a@b.c"}, key="k1")
+
+        first = self.wrapped(request, None)
+        idempotency.clear_cache()
+        retry = self.wrapped(request, None)
+
+        self.handler.assert_called_once()
+        self.assertEqual(retry["body"], first["body"])
+        self.assertEqual(retry["headers"]["Idempotent-Replayed"], "true")
+        self.assertNotIn("headers", first)
+
+    def test_tokens_never_written_to_table(self):
+        """Test a response with tokens is replayed from the container only"""
+        self.handler.return_value = {
+            "statusCode": 200,
+            "body": json.dumps({"tokens": {"AccessToken": "secret-access"}}),
+        }
+        request = event({"email": "a@b.c"}, key="k1")
+
+        first = self.wrapped(request, None)
+        same_container = self.wrapped(request, None)
+        idempotency.clear_cache()
+        other_container = self.wrapped(request, None)
+
+        self.handler.assert_called_once()
+        self.assertNotIn("secret-access", json.dumps(self.table.items))
+        self.assertEqual(same_container["body"], first["body"])
+        self.assertEqual(other_container["statusCode"], 409)
+        self.assertNotIn("Retry-After", other_container.get("headers") or {})
+
+    def test_queued_events_pass_through(self):
+        """Test SQS batches never touch the store, whatever they carry"""
+        batch = {"Records": [{"body": "{}"}], "body": "{}", "headers": {}}
+
+        self.wrapped(batch, None)
+        self.wrapped(batch, None)
+
+        self.assertEqual(self.handler.call_count, 2)
+        self.assertEqual(self.table.items, {})
+
+    def test_failure_releases_key(self):
+        """Test errors and non-2xx responses let the retry run again"""
+        request = event({"email": "a@b.c"})
+        self.handler.side_effect = [
+            RuntimeError("boom"),
+            {"statusCode": 400, "body": "{}"},
+            {"statusCode": 200, "body": "{}"},
+        ]
+
+        with self.assertRaises(RuntimeError):
+            self.wrapped(request, None)
+        self.assertEqual(self.wrapped(request, None)["statusCode"], 400)
+        self.assertEqual(self.table.items, {})
+        self.assertEqual(self.wrapped(request, None)["statusCode"], 200)
+        self.assertEqual(self.handler.call_count, 3)
+
+    def test_key_reused_for_other_request(self):
+        """Test an Idempotency-Key sent with a different body is refused"""
+        self.wrapped(event({"email": "a@b.c"}, key="k1"), None)
+        response = self.wrapped(event({"email": "x@y.z"}, key="k1"), None)
+
+        self.assertEqual(response["statusCode"], 422)
+        self.handler.assert_called_once()
+
+    def test_duplicate_waits_for_first(self):
+        """Test a concurrent duplicate gets the first request's response"""
+        request = event({"email": "a@b.c"})
+        key = self.seed(request, idempotency.IN_PROGRESS)
+        completed = {"statusCode": 200, "body": "first"}
+
+        def finish(seconds):
+            self.table.items[key]["status"] = {"S": idempotency.COMPLETED}
+            self.table.items[key]["response"] = {"S": json.dumps(completed)}
+
+        with patch("fresa_common.idempotency.time.sleep", side_effect=finish):
+            response = self.wrapped(request, None)
+
+        self.handler.assert_not_called()
+        self.assertEqual(response["body"], "first")
+
+    def test_duplicate_still_in_progress(self):
+        """Test a duplicate that cannot wait any longer gets a 409"""
+        request = event({"email": "a@b.c"})
+        self.seed(request, idempotency.IN_PROGRESS)
+
+        with patch.dict(os.environ, {"IDEMPOTENCY_WAIT_MS": "0"}):
+            response = self.wrapped(request, None)
+
+        self.assertEqual(response["statusCode"], 409)
+        self.assertEqual(response["headers"]["Retry-After"], "1")
+        self.handler.assert_not_called()
+
+    def test_store_failure_runs_handler(self):
+        """Test the request still runs when the store is unavailable"""
+        self.table.put_item = MagicMock(
+            side_effect=ClientError(
+                {"Error": {"Code": "ProvisionedThroughputExceededException"}},
+                "PutItem",
+            )
+        )
+
+        response = self.wrapped(event({"email": "a@b.c"}), None)
+
+        self.assertEqual(response["statusCode"], 200)
+        self.handler.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
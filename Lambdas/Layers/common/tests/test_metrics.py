@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.metrics module
+"""
+
+import unittest
+import io
+import json
+import sys
+import os
+from contextlib import redirect_stdout
+from unittest.mock import MagicMock
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+import boto3
+from botocore.stub import Stubber
+
+from fresa_common import metrics
+
+
+def invoke(handler, event=None, context=None):
+    """Call an instrumented handler and return (result, EMF document)"""
+    output = io.StringIO()
+    with redirect_stdout(output):
+        result = handler(event or {}, context or {"function_name": "testFunction"})
+    return result, json.loads(output.getvalue().strip().splitlines()[-1])
+
+
+class TestMetrics(unittest.TestCase):
+    """Test cases for invocation metrics"""
+
+    def setUp(self):
+        os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+        os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+        os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+    def test_emf_document_structure(self):
+        """Test the EMF line declares every value it carries"""
+
+        @metrics.instrument_handler
+        def handler(event, context):
+            metrics.put_metric("RateLimited", 1)
+            metrics.set_property("rateLimitDecision", "cooldown")
+            return {"statusCode": 429}
+
+        _, document = invoke(handler)
+
+        directive = document["_aws"]["CloudWatchMetrics"][0]
+        self.assertEqual(directive["Namespace"], metrics.DEFAULT_NAMESPACE)
+        self.assertEqual(directive["Dimensions"], [["FunctionName"]])
+        for metric in directive["Metrics"]:
+            self.assertIn(metric["Name"], document)
+
+        self.assertEqual(document["FunctionName"], "testFunction")
+        self.assertEqual(document["statusCode"], 429)
+        self.assertEqual(document["Status4xx"], 1)
+        self.assertEqual(document["RateLimited"], 1)
+        self.assertEqual(document["rateLimitDecision"], "cooldown")
+
+    def test_cold_start_only_once(self):
+        """Test only the first invocation in the process is cold"""
+        metrics._cold_start = True
+
+        @metrics.instrument_handler
+        def handler(event, context):
+            return {"statusCode": 200}
+
+        _, first = invoke(handler)
+        _, second = invoke(handler)
+
+        self.assertEqual(first["ColdStart"], 1)
+        self.assertIn("InitDuration", first)
+        self.assertEqual(second["ColdStart"], 0)
+        self.assertNotIn("InitDuration", second)
+
+    def test_aws_calls_timed_per_service(self):
+        """Test botocore calls are recorded with service, operation and errors"""
+
+        @metrics.instrument_handler
+        def handler(event, context):
+            client = boto3.client("dynamodb")
+            with Stubber(client) as stubber:
+                stubber.add_response("get_item", {})
+                stubber.add_client_error(
+                    "update_item", service_error_code="ValidationException"
+                )
+                client.get_item(TableName="t", Key={"email": {"S": "a@b.c"}})
+                try:
+                    client.update_item(TableName="t", Key={"email": {"S": "a@b.c"}})
+                except client.exceptions.ClientError:
+                    pass
+            return {"statusCode": 200}
+
+        _, document = invoke(handler)
+
+        self.assertEqual(document["DynamoDBCalls"], 2)
+        self.assertEqual(document["DynamoDBErrors"], 1)
+        operations = [call["operation"] for call in document["downstreamCalls"]]
+        self.assertEqual(operations, ["GetItem", "UpdateItem"])
+        self.assertEqual(document["downstreamCalls"][1]["error"], "ValidationException")
+
+    def test_http_pool_instrumented(self):
+        """Test urllib3 pool requests are recorded by host"""
+
+        class FakePool:
+            def urlopen(self, method, url, *args, **kwargs):
+                return MagicMock(status=503)
+
+        pool = metrics.instrument_http(FakePool())
+
+        @metrics.instrument_handler
+        def handler(event, context):
+            pool.urlopen("GET", "https://graph.facebook.com/me?access_token=x")
+            return {"statusCode": 200}
+
+        _, document = invoke(handler)
+
+        self.assertEqual(document["HTTPCalls"], 1)
+        self.assertEqual(document["HTTPErrors"], 1)
+        self.assertEqual(
+            document["downstreamCalls"][0]["operation"], "graph.facebook.com"
+        )
+
+    def test_unhandled_exception_reports_500(self):
+        """Test an exception still emits a line with a 500 status"""
+
+        @metrics.instrument_handler
+        def handler(event, context):
+            raise RuntimeError("boom")
+
+        output = io.StringIO()
+        with redirect_stdout(output), self.assertRaises(RuntimeError):
+            handler({}, {})
+
+        document = json.loads(output.getvalue().strip())
+        self.assertEqual(document["Status5xx"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.middleware module
+"""
+
+import unittest
+import sys
+import os
+import json
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from fresa_common import middleware
+from fresa_common.deadline import DeadlineExceeded
+
+
+def raising(exception):
+    def handler(event, context):
+        raise exception
+
+    return handler
+
+
+class TestMapErrors(unittest.TestCase):
+    """Test cases for turning exceptions into responses"""
+
+    def test_mapped_exceptions_get_their_status(self):
+        """Test DeadlineExceeded, listed errors and HttpError become responses"""
+        busy = middleware.map_errors()(raising(DeadlineExceeded("0 ms left")))({}, None)
+        self.assertEqual(busy["statusCode"], 503)
+        self.assertEqual(busy["headers"]["Retry-After"], "1")
+
+        # Subclasses match along the MRO
+        listed = middleware.map_errors(
+            errors={LookupError: middleware.Error(404, "Not found")}
+        )(raising(KeyError("user")))({}, None)
+        self.assertEqual(listed["statusCode"], 404)
+        self.assertEqual(json.loads(listed["body"]), {"error": "Not found"})
+
+        raised = middleware.map_errors()(
+            raising(middleware.HttpError(409, "Taken", field="email"))
+        )({}, None)
+        self.assertEqual(raised["statusCode"], 409)
+        self.assertEqual(
+            json.loads(raised["body"]), {"error": "Taken", "field": "email"}
+        )
+
+    def test_unknown_exception_is_500_without_its_text(self):
+        """Test anything unmapped is a 500 that does not leak the exception"""
+        response = middleware.map_errors()(raising(RuntimeError("secret table name")))(
+            {}, None
+        )
+
+        self.assertEqual(response["statusCode"], 500)
+        self.assertNotIn("secret", response["body"])
+        self.assertEqual(response["headers"]["Content-Type"], "application/json")
+
+    def test_responses_get_headers_and_queued_events_pass_through(self):
+        """Test headers are added to bare responses, SQS batches are untouched"""
+        wrapped = middleware.map_errors(headers={"X-Test": "1"})(
+            lambda event, context: {"statusCode": 200, "body": "{}"}
+        )
+        self.assertEqual(wrapped({}, None)["headers"], {"X-Test": "1"})
+
+        batch = middleware.map_errors()(raising(DeadlineExceeded("0 ms left")))
+        with self.assertRaises(DeadlineExceeded):
+            batch({"Records": []}, None)
+
+
+if __name__ == "__main__":
+    unittest.main()
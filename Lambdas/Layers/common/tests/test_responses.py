@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.responses module
+"""
+
+import unittest
+import sys
+import os
+import json
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from fresa_common import responses
+
+
+class TestResponses(unittest.TestCase):
+    """Test cases for the shared response builder"""
+
+    def test_each_response_gets_its_own_headers(self):
+        """Test the shared header set is read-only and copied per response"""
+        first = responses.respond(200, {"message": "ok"})
+        first["headers"]["X-Replayed"] = "true"
+        second = responses.respond(200, {"message": "ok"})
+
+        self.assertNotIn("X-Replayed", second["headers"])
+        self.assertEqual(second["headers"]["Access-Control-Allow-Origin"], "*")
+        with self.assertRaises(TypeError):
+            responses.DEFAULT_HEADERS["X-Replayed"] = "true"
+        self.assertIs(responses.cors_headers(), responses.DEFAULT_HEADERS)
+        self.assertNotIn("headers", responses.respond(200, {}, headers=None))
+
+    def test_error_body_and_retry_after(self):
+        """Test errors are {"error": message, **fields} with Retry-After if given"""
+        response = responses.error(
+            503, "Service busy", retry_after=1, code="TooManyRequests"
+        )
+
+        self.assertEqual(response["statusCode"], 503)
+        self.assertEqual(
+            json.loads(response["body"]),
+            {"error": "Service busy", "code": "TooManyRequests"},
+        )
+        self.assertEqual(response["headers"]["Retry-After"], "1")
+        self.assertNotIn("Retry-After", responses.DEFAULT_HEADERS)
+
+
+if __name__ == "__main__":
+    unittest.main()
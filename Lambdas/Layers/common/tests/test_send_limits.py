@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.send_limits module
+"""
+
+import unittest
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from fresa_common import send_limits, verification_codes
+from fresa_common.send_limits import SendLimiter, Usage
+
+LIMITS = {"PER_IP_PER_HOUR": 10, "GLOBAL_PER_MINUTE": 100, "GLOBAL_SHARDS": 4}
+# 45 minutes into an hour and 30 seconds into a minute
+NOW = 1700000000 - 1700000000 % 3600 + 45 * 60 + 30
+
+
+class TestSendLimits(unittest.TestCase):
+    """Test cases for the per-IP and global send limits"""
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.limiter = SendLimiter(self.client, "VerificationCodes", dict(LIMITS))
+
+    def respond(self, counts, email_item=None):
+        """batch_get_item returning the given counter values"""
+
+        def batch_get_item(RequestItems):
+            keys = [
+                key["email"]["S"] for key in RequestItems["VerificationCodes"]["Keys"]
+            ]
+            items = [
+                {"email": {"S": key}, "count": {"N": str(count)}}
+                for key, count in counts.items()
+                if key in keys
+            ]
+            if email_item:
+                items.append(email_item)
+            return {"Responses": {"VerificationCodes": items}}
+
+        self.client.batch_get_item.side_effect = batch_get_item
+
+    def test_source_ip(self):
+        """Test REST and HTTP API events, IPv6 prefixes and bad input"""
+        self.assertEqual(
+            send_limits.source_ip(
+                {"requestContext": {"identity": {"sourceIp": "203.0.113.7"}}}
+            ),
+            "203.0.113.7",
+        )
+        self.assertEqual(
+            send_limits.source_ip(
+                {"requestContext": {"http": {"sourceIp": "2001:db8:1:2:3:4:5:6"}}}
+            ),
+            "2001:db8:1:2::/64",
+        )
+        self.assertIsNone(send_limits.source_ip({}))
+        self.assertIsNone(
+            send_limits.source_ip({"requestContext": {"identity": {"sourceIp": "x"}}})
+        )
+
+    def test_read_is_one_round_trip(self):
+        """Test the email item and every counter come from one BatchGetItem"""
+        self.respond(
+            {},
+            email_item={
+                "email": {"S": "a@b.c"},
+                "requestHistory": {"L": [{"N": str(NOW - 60)}]},
+            },
+        )
+
+        item, usage = self.limiter.read(
+            "a@b.c", "203.0.113.7", verification_codes.RATE_LIMIT, NOW
+        )
+
+        self.client.batch_get_item.assert_called_once()
+        request = self.client.batch_get_item.call_args.kwargs["RequestItems"]
+        # email + 2 IP windows + 2 windows of 4 global shards
+        self.assertEqual(len(request["VerificationCodes"]["Keys"]), 1 + 2 + 8)
+        self.assertEqual(item.request_history, [NOW - 60])
+        self.assertEqual((usage.ip, usage.global_), (0, 0))
+
+    def test_sliding_window_sums_shards(self):
+        """Test counts weight the previous window and add up the shards"""
+        hour = NOW - NOW % 3600
+        minute = NOW - NOW % 60
+        self.respond(
+            {
+                f"limit#ip#203.0.113.7#{hour}": 9,
+                f"limit#ip#203.0.113.7#{hour - 3600}": 8,
+                f"limit#global#{minute}#0": 10,
+                f"limit#global#{minute}#3": 20,
+                f"limit#global#{minute - 60}#1": 40,
+            }
+        )
+
+        _, usage = self.limiter.read("a@b.c", "203.0.113.7", now=NOW)
+
+        # The previous hour still overlaps by 14.5 minutes, the previous
+        # minute by 30 seconds
+        self.assertAlmostEqual(usage.ip, 9 + 8 * (14.5 / 60))
+        self.assertAlmostEqual(usage.global_, 30 + 40 * 0.5)
+        self.assertEqual(self.limiter.exceeded(usage), "ip")
+
+    def test_exceeded(self):
+        """Test each tier trips at its limit and 0 turns a tier off"""
+        self.assertIsNone(self.limiter.exceeded(Usage(9, 99)))
+        self.assertEqual(self.limiter.exceeded(Usage(0, 100)), "global")
+
+        self.limiter.limits["PER_IP_PER_HOUR"] = 0
+        self.assertIsNone(self.limiter.exceeded(Usage(1000, 0)))
+        self.assertEqual(self.limiter.retry_after("global", NOW), 30)
+
+    def test_record_adds_to_one_shard(self):
+        """Test a send is an atomic ADD on the IP and one global shard"""
+        self.limiter.record("203.0.113.7", NOW)
+
+        keys = [
+            call.kwargs["Key"]["email"]["S"]
+            for call in self.client.update_item.call_args_list
+        ]
+        self.assertEqual(len(keys), 2)
+        self.assertTrue(keys[0].startswith("limit#ip#203.0.113.7#"))
+        self.assertRegex(keys[1], r"^limit#global#\d+#[0-3]$")
+        kwargs = self.client.update_item.call_args.kwargs
+        self.assertIn("ADD #count :count", kwargs["UpdateExpression"])
+
+    def test_unprocessed_keys_retried(self):
+        """Test keys DynamoDB left unprocessed are read again"""
+        self.limiter.limits["GLOBAL_PER_MINUTE"] = 0
+        unprocessed = {"VerificationCodes": {"Keys": [{"email": {"S": "a@b.c"}}]}}
+        self.client.batch_get_item.side_effect = [
+            {"Responses": {}, "UnprocessedKeys": unprocessed},
+            {"Responses": {"VerificationCodes": [{"email": {"S": "a@b.c"}}]}},
+        ]
+
+        item, _ = self.limiter.read("a@b.c", None, now=NOW)
+
+        self.assertEqual(self.client.batch_get_item.call_count, 2)
+        self.assertEqual(item.email, "a@b.c")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.ses_quota module
+"""
+
+import unittest
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from fresa_common import ses_quota
+from fresa_common.ses_quota import SendRateExceeded, SendRateGovernor
+
+
+class FakeSlots:
+    """update_item with the slot's condition"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def update_item(self, TableName, Key, ExpressionAttributeValues, **kwargs):
+        key = Key["email"]["S"]
+        count = int(ExpressionAttributeValues[":count"]["N"])
+        left = int(ExpressionAttributeValues[":left"]["N"])
+        if key in self.counts and self.counts[key] > left:
+            raise ClientError(
+                {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"
+            )
+        self.counts[key] = self.counts.get(key, 0) + count
+        return {"Attributes": {"count": {"N": str(self.counts[key])}}}
+
+
+def ses_client(rate=4.0):
+    client = MagicMock()
+    client.get_send_quota.return_value = {
+        "MaxSendRate": rate,
+        "Max24HourSend": 1000.0,
+        "SentLast24Hours": 250.0,
+    }
+    return client
+
+
+class TestSesQuota(unittest.TestCase):
+    """Test cases for SES send rate shaping"""
+
+    def setUp(self):
+        ses_quota.reset()
+        os.environ.pop("SES_MAX_SEND_RATE", None)
+        self.now = 1000.25
+        self.table = FakeSlots()
+        self.ses = ses_client()
+        self.governor = SendRateGovernor(
+            self.table, "VerificationCodes", self.ses, clock=lambda: self.now
+        )
+
+    def test_quota_read_once(self):
+        """Test GetSendQuota is cached and the override skips it"""
+        self.assertEqual(self.governor.rate(), 4)
+        self.assertEqual(self.governor.slot_capacity(share=0.5), 2)
+        self.ses.get_send_quota.assert_called_once()
+        self.assertEqual(ses_quota.send_quota(self.ses).daily_utilization(), 0.25)
+
+        with patch.dict(os.environ, {"SES_MAX_SEND_RATE": "20"}):
+            self.assertEqual(self.governor.rate(), 20)
+        self.ses.get_send_quota.assert_called_once()
+
+    def test_full_second_moves_to_next(self):
+        """Test slots hand out the rate per second across governors"""
+        other = SendRateGovernor(
+            self.table, "VerificationCodes", self.ses, clock=lambda: self.now
+        )
+
+        self.assertEqual(self.governor.reserve(3), self.now)
+        self.assertEqual(other.reserve(1), self.now)
+        self.assertEqual(other.reserve(2, max_wait_s=2), 1001.0)
+        with self.assertRaises(SendRateExceeded):
+            self.governor.reserve(1, max_wait_s=0)
+
+    def test_share_leaves_room(self):
+        """Test a partial share stops short of the full rate"""
+        self.assertEqual(self.governor.reserve(2, share=0.5), self.now)
+        with self.assertRaises(SendRateExceeded):
+            self.governor.reserve(1, share=0.5)
+        self.assertEqual(self.governor.reserve(2), self.now)
+
+    def test_acquire_waits_for_slot(self):
+        """Test acquire sleeps until the slot it got"""
+        self.governor.reserve(4)
+
+        with patch("fresa_common.ses_quota.time.sleep") as sleep:
+            waited = self.governor.acquire(max_wait_s=1)
+
+        self.assertAlmostEqual(waited, 0.75)
+        sleep.assert_called_once()
+
+    def test_table_unavailable_paces_locally(self):
+        """Test slots are counted in the container when the table fails"""
+        self.table.update_item = MagicMock(
+            side_effect=EndpointConnectionError(endpoint_url="https://dynamodb")
+        )
+
+        self.governor.reserve(4)
+        with self.assertRaises(SendRateExceeded):
+            self.governor.reserve(1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.tracing module
+"""
+
+import unittest
+import json
+import sys
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+import boto3
+from botocore.stub import Stubber
+
+from fresa_common import tracing
+from fresa_common.tracing import SpanContext, XRayExporter
+
+
+class TestTracing(unittest.TestCase):
+    """Test cases for trace propagation and export"""
+
+    def setUp(self):
+        self.trace_file = tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False)
+        self.trace_file.close()
+        self.env = patch.dict(
+            os.environ,
+            {
+                "TRACE_EXPORTER": "file",
+                "TRACE_FILE": self.trace_file.name,
+                "AWS_ACCESS_KEY_ID": "testing",
+                "AWS_SECRET_ACCESS_KEY": "testing",
+                "AWS_DEFAULT_REGION": "us-east-1",
+            },
+        )
+        self.env.start()
+        os.environ.pop("_X_AMZN_TRACE_ID", None)
+        tracing._exporter_name = None
+
+    def tearDown(self):
+        self.env.stop()
+        tracing._exporter_name = None
+        os.unlink(self.trace_file.name)
+
+    def exported(self):
+        with open(self.trace_file.name) as f:
+            return [json.loads(line) for line in f]
+
+    def test_traceparent_round_trip(self):
+        """Test span contexts survive the traceparent and X-Ray formats"""
+        context = SpanContext(tracing._new_trace_id(), tracing._new_span_id())
+        parsed = SpanContext.from_traceparent(context.to_traceparent())
+        self.assertEqual(
+            (parsed.trace_id, parsed.span_id), (context.trace_id, context.span_id)
+        )
+
+        header = f"Root={context.xray_trace_id};Parent={context.span_id};Sampled=0"
+        parsed = SpanContext.from_xray_header(header)
+        self.assertEqual(parsed.trace_id, context.trace_id)
+        self.assertFalse(parsed.sampled)
+        self.assertIsNone(SpanContext.from_traceparent("garbage"))
+
+    def test_trigger_continues_trace_from_client_metadata(self):
+        """Test a handler passes its trace to a trigger through ClientMetadata"""
+
+        @tracing.trace_handler
+        def trigger(event, context):
+            return event
+
+        @tracing.trace_handler
+        def api_handler(event, context):
+            sent.append(tracing.client_metadata())
+            return {"statusCode": 200}
+
+        # Cognito invokes the trigger in its own process with the metadata
+        sent = []
+        api_handler({"headers": {}}, {"function_name": "api"})
+        trigger({"request": {"clientMetadata": sent[0]}}, {"function_name": "trigger"})
+
+        spans = {span["name"]: span for span in self.exported()}
+        self.assertEqual(spans["trigger"]["traceId"], spans["api"]["traceId"])
+        self.assertEqual(spans["trigger"]["parentId"], spans["api"]["spanId"])
+        self.assertEqual(spans["trigger"]["parentSource"], "remote")
+        self.assertEqual(spans["api"]["attributes"]["http.status_code"], 200)
+
+    def test_aws_call_gets_child_span(self):
+        """Test botocore calls inside a handler are recorded as client spans"""
+
+        @tracing.trace_handler
+        def handler(event, context):
+            client = boto3.client("dynamodb", region_name="us-east-1")
+            with Stubber(client) as stubber:
+                stubber.add_client_error("get_item", "ResourceNotFoundException")
+                with self.assertRaises(Exception):
+                    client.get_item(TableName="t", Key={"email": {"S": "a@b.c"}})
+
+        handler({}, {"function_name": "fn"})
+
+        spans = {span["name"]: span for span in self.exported()}
+        call = spans["dynamodb.GetItem"]
+        self.assertEqual(call["kind"], "client")
+        self.assertEqual(call["parentId"], spans["fn"]["spanId"])
+        self.assertEqual(call["error"], "ResourceNotFoundException")
+
+    def test_http_pool_gets_child_span(self):
+        """Test requests through an instrumented pool are recorded"""
+        pool = MagicMock()
+        pool.urlopen.return_value = MagicMock(status=503)
+        tracing.instrument_http(pool)
+
+        @tracing.trace_handler
+        def handler(event, context):
+            pool.urlopen("GET", "https://oauth2.googleapis.com/tokeninfo")
+
+        handler({}, {"function_name": "fn"})
+
+        call = [s for s in self.exported() if s["kind"] == "client"][0]
+        self.assertEqual(call["name"], "oauth2.googleapis.com")
+        self.assertTrue(call["fault"])
+
+    def test_unsampled_trace_not_exported(self):
+        """Test an upstream decision not to sample is honoured"""
+        context = SpanContext(tracing._new_trace_id(), tracing._new_span_id(), False)
+
+        @tracing.trace_handler
+        def handler(event, context):
+            return tracing.client_metadata()
+
+        metadata = handler({"headers": {"traceparent": context.to_traceparent()}}, {})
+
+        self.assertEqual(self.exported(), [])
+        self.assertTrue(metadata["traceparent"].endswith("-00"))
+
+    def test_xray_documents(self):
+        """Test spans become X-Ray segments or subsegments by parent"""
+        parent = SpanContext(tracing._new_trace_id(), tracing._new_span_id())
+        remote = tracing.Span(
+            "trigger", parent.trace_id, parent.span_id, "server", "remote"
+        )
+        local = tracing.Span(
+            "dynamodb.GetItem", parent.trace_id, remote.span_id, "client"
+        )
+        local.set_attribute("aws.operation", "GetItem")
+        local.record_error("Throttling", fault=True)
+
+        segment = XRayExporter.to_document(remote)
+        self.assertNotIn("type", segment)
+        self.assertEqual(segment["parent_id"], parent.span_id)
+        self.assertEqual(segment["trace_id"], parent.xray_trace_id)
+
+        subsegment = XRayExporter.to_document(local)
+        self.assertEqual(subsegment["type"], "subsegment")
+        self.assertEqual(subsegment["namespace"], "aws")
+        self.assertTrue(subsegment["fault"])
+
+
+if __name__ == "__main__":
+    unittest.main()
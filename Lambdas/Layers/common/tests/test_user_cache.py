@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.user_cache module
+"""
+
+import unittest
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from fresa_common.user_cache import UserCache
+
+
+def not_found():
+    return ClientError(
+        {"Error": {"Code": "UserNotFoundException", "Message": "User does not exist."}},
+        "AdminGetUser",
+    )
+
+
+class TestUserCache(unittest.TestCase):
+    """Test cases for the AdminGetUser cache"""
+
+    def setUp(self):
+        self.now = 1000.0
+        self.client = MagicMock()
+        self.client.admin_get_user.return_value = {
+            "Username": "a@b.c",
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+        }
+        self.cache = UserCache(
+            found_ttl_s=60, not_found_ttl_s=5, max_entries=2, clock=lambda: self.now
+        )
+        self.metrics = patch("fresa_common.user_cache.metrics")
+        self.mock_metrics = self.metrics.start()
+
+    def tearDown(self):
+        self.metrics.stop()
+
+    def counted(self, name):
+        return [
+            call.args[0] for call in self.mock_metrics.increment_metric.call_args_list
+        ].count(name)
+
+    def test_found_user_is_cached(self):
+        """Test a found user is served from the cache until its TTL"""
+        user = self.cache.get_user(self.client, "pool", "a@b.c")
+        self.assertEqual(user, {"Username": "a@b.c"})
+
+        self.now += 59
+        self.cache.get_user(self.client, "pool", "a@b.c")
+        self.assertEqual(self.client.admin_get_user.call_count, 1)
+        self.assertEqual(self.counted("UserCacheHits"), 1)
+        self.assertEqual(self.counted("UserCacheMisses"), 1)
+
+        self.now += 1
+        self.cache.get_user(self.client, "pool", "a@b.c")
+        self.assertEqual(self.client.admin_get_user.call_count, 2)
+
+    def test_not_found_expires_sooner(self):
+        """Test "not found" is cached for the shorter TTL"""
+        self.client.admin_get_user.side_effect = not_found()
+
+        self.assertIsNone(self.cache.get_user(self.client, "pool", "a@b.c"))
+        self.now += 4
+        self.assertIsNone(self.cache.get_user(self.client, "pool", "a@b.c"))
+        self.assertEqual(self.client.admin_get_user.call_count, 1)
+
+        self.now += 1
+        self.cache.get_user(self.client, "pool", "a@b.c")
+        self.assertEqual(self.client.admin_get_user.call_count, 2)
+
+    def test_other_errors_are_not_cached(self):
+        """Test throttling and other errors propagate and are retried"""
+        self.client.admin_get_user.side_effect = ClientError(
+            {"Error": {"Code": "TooManyRequestsException", "Message": "Slow down"}},
+            "AdminGetUser",
+        )
+
+        for _ in range(2):
+            with self.assertRaises(ClientError):
+                self.cache.get_user(self.client, "pool", "a@b.c")
+        self.assertEqual(self.client.admin_get_user.call_count, 2)
+
+    def test_least_recently_used_is_evicted(self):
+        """Test the oldest unused entry goes once the cache is full"""
+        for username in ("a", "b", "a", "c"):
+            self.cache.get_user(self.client, "pool", username)
+
+        self.client.admin_get_user.reset_mock()
+        self.cache.get_user(self.client, "pool", "a")
+        self.client.admin_get_user.assert_not_called()
+        self.cache.get_user(self.client, "pool", "b")
+        self.client.admin_get_user.assert_called_once()
+
+    def test_invalidate(self):
+        """Test an invalidated user is looked up again"""
+        self.client.admin_get_user.side_effect = [not_found(), {"Username": "a@b.c"}]
+
+        self.assertIsNone(self.cache.get_user(self.client, "pool", "a@b.c"))
+        self.cache.invalidate("pool", "a@b.c")
+        self.assertIsNotNone(self.cache.get_user(self.client, "pool", "a@b.c"))
+
+
+if __name__ == "__main__":
+    unittest.main()
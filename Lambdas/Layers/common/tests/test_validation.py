@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.validation module
+"""
+
+import unittest
+import sys
+import os
+import json
+from unittest.mock import MagicMock
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from fresa_common import validation
+
+SCHEMA = validation.Schema(
+    path={"provider": validation.one_of("google", "facebook")},
+    body={
+        "email": validation.email(),
+        "birthdate": validation.date(aliases=("dateOfBirth",)),
+        "firstName": validation.string(required=False),
+    },
+)
+
+
+def event(body, provider="google"):
+    return {"pathParameters": {"provider": provider}, "body": json.dumps(body)}
+
+
+class TestValidation(unittest.TestCase):
+    """Test cases for request schemas"""
+
+    def test_valid_request_is_normalized(self):
+        """Test declared fields come back normalized, aliases under their name"""
+        request = SCHEMA.validate(
+            event(
+                {"email": " Ana@Example.COM ", "dateOfBirth": "1990-02-28", "x": 1},
+                provider="Google",
+            )
+        )
+
+        self.assertEqual(request.path, {"provider": "google"})
+        self.assertEqual(
+            request.body, {"email": "ana@example.com", "birthdate": "1990-02-28"}
+        )
+
+    def test_every_invalid_field_is_reported(self):
+        """Test one entry per invalid field, the first one described"""
+        with self.assertRaises(validation.ValidationError) as raised:
+            SCHEMA.validate(
+                event({"email": "not-an-email", "birthdate": "1990-02-31"}, "apple")
+            )
+
+        self.assertEqual(
+            raised.exception.body(),
+            {
+                "error": "Invalid email: must be an email address",
+                "fields": {
+                    "email": "must be an email address",
+                    "birthdate": "must be a date as YYYY-MM-DD",
+                    "provider": "must be one of google, facebook",
+                },
+            },
+        )
+
+    def test_invalid_request_never_reaches_handler(self):
+        """Test the decorator answers 400 with the headers and skips the handler"""
+        handler = MagicMock()
+        wrapped = validation.validated(SCHEMA, headers={"X-Test": "1"})(handler)
+
+        response = wrapped({"body": "{not json"}, None)
+
+        self.assertEqual(response["statusCode"], 400)
+        self.assertEqual(response["headers"], {"X-Test": "1"})
+        self.assertEqual(
+            json.loads(response["body"])["error"], "Invalid JSON in request body"
+        )
+        handler.assert_not_called()
+
+    def test_valid_request_is_current_during_handler(self):
+        """Test the handler sees the validated request, and only while it runs"""
+        seen = []
+        wrapped = validation.validated(SCHEMA)(
+            lambda event, context: seen.append(validation.current())
+        )
+
+        wrapped(event({"email": "a@b.co", "birthdate": "2000-01-01"}), None)
+        # Queued events are not API requests
+        wrapped({"Records": []}, None)
+
+        self.assertEqual(seen[0].body["email"], "a@b.co")
+        self.assertIsNone(seen[1])
+        self.assertIsNone(validation.current())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.verification_codes module
+"""
+
+import unittest
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from fresa_common import verification_codes
+from fresa_common.verification_codes import VerificationCodeRepository, decode
+
+
+class TestVerificationCodes(unittest.TestCase):
+    """Test cases for the VerificationCodes item model and repository"""
+
+    def setUp(self):
+        self.env = patch.dict(os.environ, {"CODE_EXPIRATION_MINUTES": "10"})
+        self.env.start()
+        self.client = MagicMock()
+        self.codes = VerificationCodeRepository(self.client, "VerificationCodes")
+
+    def tearDown(self):
+        self.env.stop()
+
+    def test_decode_item(self):
+        """Test low-level items decode to plain Python types"""
+        item = decode(
+            {
+                "email": {"S": "a@b.c"},
+                "code": {"S": "123456"},
+                "lastRequestTime": {"N": "1700000000.0"},
+                "requestHistory": {"L": [{"N": "1699999000"}, {"N": "1700000000"}]},
+                "postBurstCodeSent": {"BOOL": True},
+                "unknownAttribute": {"S": "ignored"},
+            }
+        )
+
+        self.assertEqual(item.code, "123456")
+        self.assertEqual(item.last_request_time, 1700000000)
+        self.assertEqual(item.request_history, [1699999000, 1700000000])
+        self.assertTrue(item.post_burst_code_sent)
+        self.assertIsNone(item.attempts)
+        self.assertNotIn("123456", repr(item))
+
+    def test_expiry(self):
+        """Test the stored expiresAt wins over lastRequestTime"""
+        now = 1700000000
+        legacy = decode({"lastRequestTime": {"N": str(now - 601)}})
+        self.assertTrue(legacy.is_expired(now))
+
+        issued = decode(
+            {"lastRequestTime": {"N": str(now - 601)}, "expiresAt": {"N": str(now)}}
+        )
+        self.assertFalse(issued.is_expired(now))
+        self.assertTrue(decode({"code": {"S": "1"}}).is_expired(now))
+
+    def test_matches(self):
+        """Test code comparison, including empty values"""
+        item = decode({"code": {"S": "123456"}})
+        self.assertTrue(item.matches("123456"))
+        self.assertFalse(item.matches("654321"))
+        self.assertFalse(item.matches(""))
+        self.assertFalse(decode({}).matches("123456"))
+
+    def test_attempts_exhausted(self):
+        """Test a code is refused once MAX_CODE_ATTEMPTS wrong codes were entered"""
+        self.assertFalse(decode({"code": {"S": "1"}}).attempts_exhausted())
+        self.assertFalse(decode({"attempts": {"N": "4"}}).attempts_exhausted())
+        self.assertTrue(decode({"attempts": {"N": "5"}}).attempts_exhausted())
+        with patch.dict(os.environ, {"MAX_CODE_ATTEMPTS": "10"}):
+            self.assertFalse(decode({"attempts": {"N": "5"}}).attempts_exhausted())
+
+    def test_get_uses_projection(self):
+        """Test reads ask only for the call site's attributes"""
+        self.client.get_item.return_value = {}
+
+        self.assertIsNone(self.codes.get("a@b.c", verification_codes.VALIDATION))
+
+        kwargs = self.client.get_item.call_args.kwargs
+        self.assertEqual(kwargs["ProjectionExpression"], "#p0, #p1, #p2, #p3")
+        self.assertEqual(
+            sorted(kwargs["ExpressionAttributeNames"].values()),
+            sorted(verification_codes.VALIDATION),
+        )
+
+    def test_issue(self):
+        """Test issuing stores the code, its expiry and the request"""
+        expires_at = self.codes.issue(
+            "a@b.c", "123456", now=1700000000, post_burst=True
+        )
+
+        self.assertEqual(expires_at, 1700000000 + 600)
+        kwargs = self.client.update_item.call_args.kwargs
+        values = kwargs["ExpressionAttributeValues"]
+        self.assertEqual(values[":expiresAt"], {"N": "1700000600"})
+        self.assertEqual(values[":newRequest"], {"L": [{"N": "1700000000"}]})
+        self.assertEqual(values[":zero"], {"N": "0"})
+        # Without a look-back the item lives as long as the code
+        self.assertEqual(values[":ttl"], values[":expiresAt"])
+        self.assertIn(
+            "postBurstCodeSent = :postBurstCodeSent", kwargs["UpdateExpression"]
+        )
+
+    def test_ttl_outlives_rate_limit_history(self):
+        """Test ttl covers the rate limit look-back, not just the code"""
+        self.codes.issue("a@b.c", "123456", now=1700000000, retain_s=5 * 60 * 60)
+
+        values = self.client.update_item.call_args.kwargs["ExpressionAttributeValues"]
+        self.assertEqual(values[":ttl"], {"N": str(1700000000 + 5 * 60 * 60)})
+        self.assertEqual(values[":expiresAt"], {"N": "1700000600"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the fresa_common.welcome_emails module
+"""
+
+import unittest
+import sys
+import os
+import json
+from unittest.mock import patch
+
+# Add the layer's python directory to the path for imports
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"),
+)
+
+from fresa_common import welcome_emails
+
+
+class TestWelcomeEmails(unittest.TestCase):
+    """Test cases for queuing welcome emails"""
+
+    def setUp(self):
+        welcome_emails._queues.clear()
+
+    def test_in_memory_queue_drains_as_sqs_event(self):
+        """Test queued messages come back out as the worker's event"""
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertTrue(welcome_emails.enqueue("a@b.c", {"name": "Ana"}))
+            self.assertTrue(welcome_emails.enqueue("d@e.f", {"name": "Eva"}))
+            queue = welcome_emails.get_queue()
+
+        first = queue.drain_event(max_messages=1)["Records"]
+        rest = queue.drain_event()["Records"]
+
+        self.assertEqual(len(first), 1)
+        self.assertEqual(
+            json.loads(first[0]["body"]),
+            {"email": "a@b.c", "templateData": {"name": "Ana"}},
+        )
+        self.assertEqual(len(rest), 1)
+        self.assertEqual(queue.drain_event(), {"Records": []})
+
+    def test_lambda_without_queue_url(self):
+        """Test a deployed function without a queue reports nothing queued"""
+        with patch.dict(
+            os.environ, {"AWS_LAMBDA_FUNCTION_NAME": "signUpCustomer"}, clear=True
+        ):
+            self.assertIsNone(welcome_emails.get_queue())
+            self.assertFalse(welcome_emails.enqueue("a@b.c", {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@ from aws_cdk import (
     Duration,
     Stack,
     aws_lambda as _lambda,
+    aws_lambda_event_sources as lambda_event_sources,
     aws_iam as iam,
     aws_sqs as sqs,
     aws_events as events,
@@ -42,6 +43,7 @@ class CdkStack(Stack):
                 effect=iam.Effect.ALLOW,
                 actions=[
                     "dynamodb:GetItem",
+                    "dynamodb:BatchGetItem",
                     "dynamodb:PutItem",
                     "dynamodb:UpdateItem",
                     "dynamodb:DeleteItem",
@@ -69,6 +71,30 @@ class CdkStack(Stack):
             )
         )
 
+        # Add SES permissions (verification codes and welcome emails)
+        lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "ses:SendTemplatedEmail",
+                    "ses:SendBulkTemplatedEmail",
+                    "ses:GetSendQuota",
+                ],
+                resources=["*"],
+            )
+        )
+
+        # Shared runtime code (fresa_common) used by every function
+        common_layer = _lambda.LayerVersion(
+            self,
+            "CommonLayer",
+            code=_lambda.Code.from_asset(
+                "Lambdas/Layers/common", exclude=["tests", "**/__pycache__"]
+            ),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_9],
+            description="Fresa shared runtime code",
+        )
+
         # Create Lambda functions from source code
         recieve_email_function = _lambda.Function(
             self,
@@ -78,11 +104,89 @@ class CdkStack(Stack):
             handler="recieveEmail.lambda_handler",
             code=_lambda.Code.from_asset("Lambdas/Authentication/recieveEmail"),
             role=lambda_role,
+            layers=[common_layer],
+            tracing=_lambda.Tracing.ACTIVE,
             timeout=Duration.seconds(30),
             memory_size=128,
             description="Fresa email processing function",
         )
 
+        # Queued send-code requests, absorbed by recieveEmail in batches.
+        # Failed records are retried on their own (batchItemFailures) and end
+        # up in the dead-letter queue after five receives.
+        send_code_dead_letter_queue = sqs.Queue(
+            self,
+            "SendCodeDeadLetterQueue",
+            retention_period=Duration.days(14),
+        )
+        send_code_queue = sqs.Queue(
+            self,
+            "SendCodeQueue",
+            # Six times the function timeout, as Lambda recommends
+            visibility_timeout=Duration.seconds(180),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=5, queue=send_code_dead_letter_queue
+            ),
+        )
+        recieve_email_function.add_event_source(
+            lambda_event_sources.SqsEventSource(
+                send_code_queue,
+                batch_size=10,
+                max_batching_window=Duration.seconds(1),
+                report_batch_item_failures=True,
+            )
+        )
+        # Sends the SES send rate has no room for are queued here for later
+        recieve_email_function.add_environment(
+            "SEND_CODE_QUEUE_URL", send_code_queue.queue_url
+        )
+        send_code_queue.grant_send_messages(lambda_role)
+
+        # Welcome emails queued by signUpCustomer and social_auth_user, sent in
+        # bulk by sendWelcomeEmails so signup never waits on SES
+        welcome_email_dead_letter_queue = sqs.Queue(
+            self,
+            "WelcomeEmailDeadLetterQueue",
+            retention_period=Duration.days(14),
+        )
+        welcome_email_queue = sqs.Queue(
+            self,
+            "WelcomeEmailQueue",
+            visibility_timeout=Duration.seconds(180),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=5, queue=welcome_email_dead_letter_queue
+            ),
+        )
+        welcome_email_queue.grant_send_messages(lambda_role)
+
+        send_welcome_emails_function = _lambda.Function(
+            self,
+            "SendWelcomeEmailsFunction",
+            function_name=LAMBDA_FUNCTION_NAMES["sendWelcomeEmails"],
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            handler="sendWelcomeEmails.lambda_handler",
+            code=_lambda.Code.from_asset("Lambdas/Authentication/sendWelcomeEmails"),
+            role=lambda_role,
+            layers=[common_layer],
+            tracing=_lambda.Tracing.ACTIVE,
+            timeout=Duration.seconds(30),
+            memory_size=128,
+            description="Fresa welcome email sender",
+            environment={
+                # SES send slots are shared with recieveEmail in this table
+                "DYNAMODB_TABLE_NAME": "VerificationCodes",
+            },
+        )
+        send_welcome_emails_function.add_event_source(
+            lambda_event_sources.SqsEventSource(
+                welcome_email_queue,
+                # Two bulk calls' worth of destinations per invocation
+                batch_size=100,
+                max_batching_window=Duration.seconds(5),
+                report_batch_item_failures=True,
+            )
+        )
+
         signup_customer_function = _lambda.Function(
             self,
             "SignUpCustomerFunction",
@@ -91,9 +195,14 @@ class CdkStack(Stack):
             handler="signUpCustomer.lambda_handler",
             code=_lambda.Code.from_asset("Lambdas/Authentication/signUpCustomer"),
             role=lambda_role,
+            layers=[common_layer],
+            tracing=_lambda.Tracing.ACTIVE,
             timeout=Duration.seconds(30),
             memory_size=128,
             description="Fresa customer signup function",
+            environment={
+                "WELCOME_EMAIL_QUEUE_URL": welcome_email_queue.queue_url,
+            },
         )
 
         verify_code_auth_function = _lambda.Function(
@@ -106,6 +215,8 @@ class CdkStack(Stack):
                 "Lambdas/Authentication/verifyCodeAndAuthHandler"
             ),
             role=lambda_role,
+            layers=[common_layer],
+            tracing=_lambda.Tracing.ACTIVE,
             timeout=Duration.seconds(60),  # Increased from 30s to 60s
             memory_size=256,  # Increased from 128MB to 256MB for better performance
             description="Fresa verification function",
@@ -127,6 +238,8 @@ class CdkStack(Stack):
                 "Lambdas/Authentication/identity_provider_auth"
             ),
             role=lambda_role,
+            layers=[common_layer],
+            tracing=_lambda.Tracing.ACTIVE,
             timeout=Duration.seconds(30),
             memory_size=128,
             description="Fresa auth provider function",
@@ -141,6 +254,8 @@ class CdkStack(Stack):
             handler="testFunction.lambda_handler",
             code=_lambda.Code.from_asset("Lambdas/Authentication/testFunction"),
             role=lambda_role,
+            layers=[common_layer],
+            tracing=_lambda.Tracing.ACTIVE,
             timeout=Duration.seconds(30),
             memory_size=128,
             description="Test function",
@@ -154,9 +269,14 @@ class CdkStack(Stack):
             handler="social_auth_user.lambda_handler",
             code=_lambda.Code.from_asset("Lambdas/Authentication/social_auth_user"),
             role=lambda_role,
+            layers=[common_layer],
+            tracing=_lambda.Tracing.ACTIVE,
             timeout=Duration.seconds(30),
             memory_size=128,
             description="Social auth user function",
+            environment={
+                "WELCOME_EMAIL_QUEUE_URL": welcome_email_queue.queue_url,
+            },
         )
 
         define_auth_challenge_function = _lambda.Function(
@@ -167,6 +287,8 @@ class CdkStack(Stack):
             handler="defineAuthChallenge.lambda_handler",
             code=_lambda.Code.from_asset("Lambdas/Authentication/defineAuthChallenge"),
             role=lambda_role,
+            layers=[common_layer],
+            tracing=_lambda.Tracing.ACTIVE,
             timeout=Duration.seconds(30),
             memory_size=128,
             description="Define auth challenge function",
@@ -180,6 +302,8 @@ class CdkStack(Stack):
             handler="verifyAuthChallenge.lambda_handler",
             code=_lambda.Code.from_asset("Lambdas/Authentication/verifyAuthChallenge"),
             role=lambda_role,
+            layers=[common_layer],
+            tracing=_lambda.Tracing.ACTIVE,
             timeout=Duration.seconds(30),
             memory_size=128,
             description="Verify auth challenge function",
@@ -193,6 +317,8 @@ class CdkStack(Stack):
             handler="createAuthChallenge.lambda_handler",
             code=_lambda.Code.from_asset("Lambdas/Authentication/createAuthChallenge"),
             role=lambda_role,
+            layers=[common_layer],
+            tracing=_lambda.Tracing.ACTIVE,
             timeout=Duration.seconds(30),
             memory_size=128,
             description="Create auth challenge function",
@@ -206,6 +332,27 @@ class CdkStack(Stack):
             description="ARN of the Fresa email processing Lambda function",
         )
 
+        CfnOutput(
+            self,
+            "SendCodeQueueUrl",
+            value=send_code_queue.queue_url,
+            description="Queue for send-code requests handled by recieveEmail",
+        )
+
+        CfnOutput(
+            self,
+            "WelcomeEmailQueueUrl",
+            value=welcome_email_queue.queue_url,
+            description="Queue for welcome emails sent by sendWelcomeEmails",
+        )
+
+        CfnOutput(
+            self,
+            "SendWelcomeEmailsArn",
+            value=send_welcome_emails_function.function_arn,
+            description="ARN of the Fresa welcome email Lambda function",
+        )
+
         CfnOutput(
             self,
             "SignUpCustomerArn",
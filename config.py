@@ -14,6 +14,7 @@ LAMBDA_FUNCTION_NAMES = {
     "defineAuthChallenge": "defineAuthChallenge",
     "verifyAuthChallenge": "verifyAuthChallenge",
     "createAuthChallenge": "createAuthChallenge",
+    "sendWelcomeEmails": "sendWelcomeEmails",
 }
 
 # Lambda Alias Configuration (only STAGING and PROD - DEV is local-only)
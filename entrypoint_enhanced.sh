@@ -226,12 +226,8 @@ handle_interactive_menu() {
                     
                     if [ "$function" = "all" ]; then
                         echo "🧪 Running unit tests for all functions..."
-                                                 # Get all functions dynamically
-                         while IFS= read -r func_name; do
-                             echo "🧪 Running unit tests for $func_name..."
-                             python3 scripts/local_test.py test-unit "$func_name"
-                             echo ""
-                         done < <(python3 utils/function_discovery.py list)
+                        # Each function's suite runs in its own process, in parallel
+                        python3 scripts/local_test.py test-all
                     else
                         echo "🧪 Running unit tests for $function..."
                         python3 scripts/local_test.py test-unit "$function"
@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+"""
+Cold Start Simulator
+Measures cold and warm invocations of a Lambda handler and models container reuse
+
+Local runs through LocalLambdaTester import a handler once, so every invocation
+after the first looks warm. This simulator:
+
+1. Starts a fresh Python process per simulated container, times the handler
+   module import (init), the first invocation (lazy client construction,
+   connection pools) and a configurable number of warm invocations.
+2. Replays those measurements through a container-reuse model. Requests
+   arrive at a given rate (Poisson, optionally with periodic bursts) or at
+   the times in a trace file. A request takes an idle container if there is
+   one and otherwise starts a new one, which stays busy for the whole cold
+   start. Containers are reclaimed after an idle keep-alive and retired
+   after a maximum lifetime, as Lambda recycles even busy environments.
+
+The model reports how often requests land on a cold container and how much of
+the latency tail (p99 and above) those cold starts account for. A trace is a
+text file with one arrival time in seconds per line (or a JSON list of them),
+e.g. exported from API Gateway access logs.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.fault_injection import load_injector, merge_stats, print_fault_summary
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_KEEP_ALIVE_SECONDS = 300
+# Lambda does not document it; environments are observed to be replaced
+# after a few hours however busy they are
+DEFAULT_MAX_LIFETIME_SECONDS = 2 * 60 * 60
+DEFAULT_MODEL_REQUESTS = 10000
+DEFAULT_WARMUP_FRACTION = 0.1
+
+# Below this mean warm duration the handler almost certainly skipped its AWS
+# calls, and the model needs --extra-latency-ms to be meaningful
+NO_NETWORK_THRESHOLD_MS = 1.0
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    # Linux keeps ru_maxrss across exec, so a spawned child would report its
+    # parent's peak; VmHWM belongs to the new address space
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KB on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+def run_container(
+    function_key: str,
+    event: Dict,
+    warm_invocations: int,
+    faults_path: Optional[str] = None,
+    seed: Optional[int] = None,
+) -> Dict:
+    """Simulate one container: import the handler, then invoke it repeatedly
+
+    Runs inside a freshly spawned interpreter, so the import includes every
+    third-party module the handler needs. Fault injection is installed after
+    the import so init times stay comparable with and without faults. The
+    process runs nothing else, so its peak RSS is what the container needs.
+    """
+    # Imports happen here so they count against this process, not the parent
+    os.chdir(REPO_ROOT)
+    from scripts.local_test import LocalLambdaTester
+
+    tester = LocalLambdaTester()
+    quiet = io.StringIO()
+
+    init_start = time.perf_counter()
+    with contextlib.redirect_stdout(quiet):
+        module = tester.load_function_module(function_key)
+        handler = tester.find_handler_function(module, function_key) if module else None
+    init_ms = (time.perf_counter() - init_start) * 1000
+
+    if handler is None:
+        return {"error": f"Could not load handler for {function_key}"}
+
+    injector = None
+    if faults_path:
+        from scripts.fault_injection import FaultInjector
+
+        injector = FaultInjector.from_file(faults_path)
+        # Give every container its own random stream
+        injector.rng.seed(seed)
+        injector.install()
+
+    durations = []
+    errors = 0
+    for _ in range(warm_invocations + 1):
+        context = tester.create_context(function_key)
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(quiet):
+                handler(event, context)
+        except Exception:
+            errors += 1
+        durations.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "init_ms": init_ms,
+        "first_invoke_ms": durations[0],
+        "warm_ms": durations[1:],
+        "errors": errors,
+        "peak_rss_mb": peak_rss_mb(),
+        "fault_stats": dict(injector.stats) if injector else {},
+    }
+
+
+def measure_containers(
+    function_key: str,
+    event: Dict,
+    cold_starts: int,
+    warm_invocations: int,
+    workers: int = 1,
+    faults_path: Optional[str] = None,
+) -> List[Dict]:
+    """Run each simulated container in its own spawned process
+
+    Workers default to 1 so containers do not compete for CPU and skew the
+    timings; raise it for faster, noisier measurements.
+    """
+    spawn = multiprocessing.get_context("spawn")
+    with spawn.Pool(processes=workers, maxtasksperchild=1) as pool:
+        results = pool.starmap(
+            run_container,
+            [
+                (function_key, event, warm_invocations, faults_path, index)
+                for index in range(cold_starts)
+            ],
+        )
+
+    failures = [r for r in results if "error" in r]
+    if failures:
+        raise RuntimeError(failures[0]["error"])
+    return results
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def distribution(values: List[float]) -> Dict[str, float]:
+    """p50/p90/p99/max summary of a list of milliseconds"""
+    return {
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+class Burst:
+    """The arrival rate multiplied by factor for seconds, every period seconds"""
+
+    def __init__(self, factor: float, seconds: float, period: float):
+        if factor < 1 or seconds <= 0 or period <= seconds:
+            raise ValueError("a burst needs factor >= 1 and 0 < seconds < period")
+        self.factor = factor
+        self.seconds = seconds
+        self.period = period
+
+    @classmethod
+    def parse(cls, spec: str) -> "Burst":
+        """FACTOR:SECONDS:PERIOD, e.g. 5:10:300"""
+        factor, seconds, period = (float(part) for part in spec.split(":"))
+        return cls(factor, seconds, period)
+
+    def multiplier(self, at: float) -> float:
+        return self.factor if at % self.period < self.seconds else 1.0
+
+
+def poisson_arrivals(
+    rate: float, requests: int, rng: random.Random, burst: Optional[Burst] = None
+) -> List[float]:
+    """Arrival times at rate per second, thinned from the burst peak rate"""
+    peak = rate * (burst.factor if burst else 1.0)
+    arrivals = []
+    now = 0.0
+    while len(arrivals) < requests:
+        now += rng.expovariate(peak)
+        if burst is None or rng.random() * burst.factor < burst.multiplier(now):
+            arrivals.append(now)
+    return arrivals
+
+
+def load_trace(path: str) -> List[float]:
+    """Arrival times in seconds from a trace file, starting at 0"""
+    with open(path) as f:
+        text = f.read()
+    try:
+        times = [float(t) for t in json.loads(text)]
+    except (TypeError, ValueError):
+        times = [float(line) for line in text.split() if line]
+    if not times:
+        raise ValueError(f"{path} holds no arrival times")
+    times.sort()
+    return [t - times[0] for t in times]
+
+
+def simulate_container_reuse(
+    containers: List[Dict],
+    arrivals: List[float],
+    keep_alive_seconds: float = DEFAULT_KEEP_ALIVE_SECONDS,
+    max_lifetime_seconds: float = DEFAULT_MAX_LIFETIME_SECONDS,
+    extra_latency_ms: float = 0.0,
+    warmup_fraction: float = DEFAULT_WARMUP_FRACTION,
+    seed: int = 42,
+) -> Dict:
+    """Replay measured latencies through a container pool for given arrivals
+
+    A request takes the most recently used idle container; otherwise it
+    starts a new one and pays a sampled init + first-invoke cost, during
+    which that container is busy like any other. Idle containers are
+    reclaimed after keep_alive_seconds, and every container is retired once
+    it is max_lifetime_seconds old (after finishing its request).
+
+    extra_latency_ms is added to every invocation to stand in for AWS calls a
+    local run does not make. The first warmup_fraction of requests covers the
+    initial scale-up from zero containers and is left out of the statistics.
+    """
+    rng = random.Random(seed)
+    cold_samples = [
+        c["init_ms"] + c["first_invoke_ms"] + extra_latency_ms for c in containers
+    ]
+    warm_samples = [
+        ms + extra_latency_ms for c in containers for ms in c["warm_ms"]
+    ] or cold_samples
+
+    # Containers as (time free, time started): busy ones until their request
+    # ends, idle ones since their last request ended
+    busy = []
+    idle = []
+    latencies = []
+    cold_flags = []
+    containers_created = 0
+    peak_containers = 0
+    busy_seconds = 0.0
+
+    for now in arrivals:
+        still_busy = []
+        for container in busy:
+            (idle if container[0] <= now else still_busy).append(container)
+        busy = still_busy
+        idle = [
+            (free_at, started)
+            for free_at, started in idle
+            if now - free_at < keep_alive_seconds
+            and free_at - started < max_lifetime_seconds
+        ]
+
+        if idle:
+            idle.sort()
+            _, started = idle.pop()  # most recently used
+            latency_ms = rng.choice(warm_samples)
+            cold = False
+        else:
+            containers_created += 1
+            started = now
+            latency_ms = rng.choice(cold_samples)
+            cold = True
+
+        busy.append((now + latency_ms / 1000, started))
+        peak_containers = max(peak_containers, len(busy) + len(idle))
+        busy_seconds += latency_ms / 1000
+        latencies.append(latency_ms)
+        cold_flags.append(cold)
+
+    skip = int(len(arrivals) * warmup_fraction)
+    latencies = latencies[skip:]
+    cold_flags = cold_flags[skip:]
+
+    p99 = percentile(latencies, 99)
+    tail = [cold for latency, cold in zip(latencies, cold_flags) if latency >= p99]
+    span = arrivals[-1] - arrivals[0] if len(arrivals) > 1 else 0.0
+
+    return {
+        "rate": (len(arrivals) - 1) / span if span else 0.0,
+        "requests": len(latencies),
+        "mean_concurrency": busy_seconds / span if span else 0.0,
+        "containers_created": containers_created,
+        "peak_containers": peak_containers,
+        "cold_fraction": sum(cold_flags) / len(cold_flags),
+        "latency_ms": distribution(latencies),
+        "warm_latency_ms": distribution(
+            [latency for latency, cold in zip(latencies, cold_flags) if not cold]
+        ),
+        "p999_ms": percentile(latencies, 99.9),
+        "cold_share_of_p99_tail": sum(tail) / len(tail) if tail else 0.0,
+    }
+
+
+def print_measurements(function_key: str, containers: List[Dict]) -> None:
+    """Print init, first-invoke and steady-state distributions"""
+    init = distribution([c["init_ms"] for c in containers])
+    first = distribution([c["first_invoke_ms"] for c in containers])
+    steady = distribution([ms for c in containers for ms in c["warm_ms"]])
+    errors = sum(c["errors"] for c in containers)
+
+    print("")
+    print(f"🧊 Measured {len(containers)} cold starts of {function_key}")
+    print("=" * 64)
+    print(f"{'Phase':<22} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    print("-" * 64)
+    for label, values in (
+        ("Init (module import)", init),
+        ("First invocation", first),
+        ("Steady state", steady),
+    ):
+        print(
+            f"{label:<22} {values['p50']:>7.1f}ms {values['p90']:>7.1f}ms "
+            f"{values['p99']:>7.1f}ms {values['max']:>7.1f}ms"
+        )
+    print(f"Peak RSS: {max(c['peak_rss_mb'] for c in containers):.1f} MB")
+    if errors:
+        print(f"⚠️  {errors} invocation(s) raised")
+
+
+def print_model(
+    results: List[Dict], keep_alive_seconds: float, max_lifetime_seconds: float
+) -> None:
+    """Print the container reuse model for each arrival rate or trace"""
+    print("")
+    print(
+        f"📈 Container reuse model (keep-alive {keep_alive_seconds:.0f}s, "
+        f"lifetime {max_lifetime_seconds:.0f}s, "
+        f"{results[0]['requests']} requests after scale-up)"
+    )
+    print("=" * 88)
+    print(
+        f"{'Rate/s':>8} {'In flight':>9} {'Created':>8} {'Cold %':>7} {'p50':>9} "
+        f"{'p99':>9} {'p99.9':>9} {'Warm p99':>9} {'Cold@p99':>9}"
+    )
+    print("-" * 88)
+    for result in results:
+        latency = result["latency_ms"]
+        print(
+            f"{result['rate']:>8.2f} {result['mean_concurrency']:>9.2f} "
+            f"{result['containers_created']:>8} "
+            f"{result['cold_fraction'] * 100:>6.2f}% {latency['p50']:>7.1f}ms "
+            f"{latency['p99']:>7.1f}ms {result['p999_ms']:>7.1f}ms "
+            f"{result['warm_latency_ms']['p99']:>7.1f}ms "
+            f"{result['cold_share_of_p99_tail'] * 100:>8.1f}%"
+        )
+    print("")
+    print("In flight: mean requests running at once, cold starts included")
+    print("Cold@p99: share of requests at or above p99 that were cold starts")
+
+
+def simulate_function(
+    function_key: str,
+    event_file: Optional[str] = None,
+    cold_starts: int = 5,
+    warm_invocations: int = 20,
+    rates: Optional[List[float]] = None,
+    requests: int = DEFAULT_MODEL_REQUESTS,
+    keep_alive_seconds: float = DEFAULT_KEEP_ALIVE_SECONDS,
+    max_lifetime_seconds: float = DEFAULT_MAX_LIFETIME_SECONDS,
+    extra_latency_ms: float = 0.0,
+    burst: Optional[Burst] = None,
+    trace_path: Optional[str] = None,
+    workers: int = 1,
+    faults_path: Optional[str] = None,
+) -> Optional[Dict]:
+    """Measure a function and run the reuse model at each rate, or for a trace"""
+    from scripts.local_test import LocalLambdaTester
+
+    tester = LocalLambdaTester()
+    event_file = event_file or tester.get_default_event_file(function_key)
+    event = tester.load_test_event(event_file) if event_file else None
+    if event is None:
+        return None
+
+    print(
+        f"🚀 Simulating {function_key}: {cold_starts} cold starts, "
+        f"{warm_invocations} warm invocations each"
+    )
+    print(f"📄 Event: {event_file}")
+
+    # Validate here; each container process installs its own injector
+    if faults_path and load_injector(faults_path, install=False) is None:
+        return None
+
+    try:
+        containers = measure_containers(
+            function_key, event, cold_starts, warm_invocations, workers, faults_path
+        )
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return None
+
+    print_measurements(function_key, containers)
+    if faults_path:
+        print_fault_summary(merge_stats([c["fault_stats"] for c in containers]))
+
+    warm = [ms for c in containers for ms in c["warm_ms"]]
+    if warm and not extra_latency_ms:
+        if sum(warm) / len(warm) < NO_NETWORK_THRESHOLD_MS:
+            print(
+                "⚠️  Warm invocations average under "
+                f"{NO_NETWORK_THRESHOLD_MS:.0f}ms, so no AWS calls were made; "
+                "pass --extra-latency-ms for a realistic model"
+            )
+
+    if trace_path:
+        arrival_sets = [load_trace(trace_path)]
+    else:
+        rng = random.Random(42)
+        arrival_sets = [
+            poisson_arrivals(rate, requests, rng, burst) for rate in rates or [1, 10]
+        ]
+    model = [
+        simulate_container_reuse(
+            containers,
+            arrivals,
+            keep_alive_seconds,
+            max_lifetime_seconds,
+            extra_latency_ms,
+        )
+        for arrivals in arrival_sets
+    ]
+    print_model(model, keep_alive_seconds, max_lifetime_seconds)
+
+    return {"containers": containers, "model": model}
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line interface"""
+    parser = argparse.ArgumentParser(
+        prog="local_test.py simulate",
+        description="Measure cold vs warm invocations and model container reuse",
+    )
+    parser.add_argument("function_key")
+    parser.add_argument("event_file", nargs="?")
+    parser.add_argument(
+        "--cold", type=int, default=5, help="cold starts (one process each)"
+    )
+    parser.add_argument(
+        "--warm", type=int, default=20, help="warm invocations per container"
+    )
+    parser.add_argument(
+        "--rate",
+        default="1,10",
+        help="comma-separated arrival rates (requests per second) to model",
+    )
+    parser.add_argument(
+        "--trace", help="arrival times to replay instead of --rate (see above)"
+    )
+    parser.add_argument(
+        "--burst",
+        type=Burst.parse,
+        help="FACTOR:SECONDS:PERIOD, e.g. 5:10:300 for 5x the rate for 10s "
+        "every 5 minutes",
+    )
+    parser.add_argument(
+        "--requests", type=int, default=DEFAULT_MODEL_REQUESTS, help="modelled requests"
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=float,
+        default=DEFAULT_KEEP_ALIVE_SECONDS,
+        help="seconds an idle container stays warm",
+    )
+    parser.add_argument(
+        "--max-lifetime",
+        type=float,
+        default=DEFAULT_MAX_LIFETIME_SECONDS,
+        help="seconds before a container is replaced",
+    )
+    parser.add_argument(
+        "--extra-latency-ms",
+        type=float,
+        default=0.0,
+        help="latency added to every modelled invocation for AWS calls",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="containers measured in parallel"
+    )
+    parser.add_argument("--faults", help="fault injection config (JSON)")
+    args = parser.parse_args(argv)
+
+    result = simulate_function(
+        args.function_key,
+        event_file=args.event_file,
+        cold_starts=args.cold,
+        warm_invocations=args.warm,
+        rates=[float(r) for r in args.rate.split(",")],
+        requests=args.requests,
+        keep_alive_seconds=args.keep_alive,
+        max_lifetime_seconds=args.max_lifetime,
+        extra_latency_ms=args.extra_latency_ms,
+        burst=args.burst,
+        trace_path=args.trace,
+        workers=args.workers,
+        faults_path=args.faults,
+    )
+    if result is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,15 @@ from scripts.lambda_alias_manager import LambdaAliasManager
 from utils.aws_utils import get_aws_account_info, get_lambda_execution_role_arn
 from utils.config_loader import setup_aws_environment
 
+COMMON_LAYER_PACKAGE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "Lambdas",
+    "Layers",
+    "common",
+    "python",
+    "fresa_common",
+)
+
 
 class LambdaDeployer:
     def __init__(self, region: str = None):
@@ -72,6 +81,19 @@ class LambdaDeployer:
                     zipf.write(file_path, arc_name)
                     print(f"  📄 Added: {arc_name}")
 
+            # Bundle the shared layer code so the function also runs without
+            # the CommonLayer attached (direct zip deployments)
+            for root, dirs, files in os.walk(COMMON_LAYER_PACKAGE):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    if "__pycache__" in file_path or file.endswith(".pyc"):
+                        continue
+                    arc_name = os.path.relpath(
+                        file_path, os.path.dirname(COMMON_LAYER_PACKAGE)
+                    )
+                    zipf.write(file_path, arc_name)
+                    print(f"  📄 Added: {arc_name}")
+
         print(f"✅ Deployment package created: {output_path}")
         return output_path
 
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Fault Injection
+Adds latency, throttling errors, failures and timeouts to AWS and HTTP calls
+
+Handlers talk to AWS through boto3 clients created from the default session and
+to Google/Facebook through a urllib3 PoolManager. The injector hooks both:
+
+- botocore: a `before-send` handler on the default boto3 session. It fires once
+  per HTTP attempt, after signing, so injected errors go through botocore's
+  normal retry logic and retry storms show up in the attempt counts.
+- urllib3: PoolManager.urlopen is wrapped, which covers `http.request(...)` in
+  identity_provider_auth without touching botocore's own connection pools.
+
+Rules live in a JSON file:
+
+    {
+      "seed": 7,
+      "rules": [
+        {
+          "service": "cognito-idp",
+          "operation": "AdminGetUser",
+          "latency_ms": {"distribution": "lognormal", "median": 40, "p99": 600},
+          "error_rate": 0.05,
+          "error_code": "TooManyRequestsException"
+        },
+        {
+          "service": "http",
+          "host": "graph.facebook.com",
+          "timeout_rate": 0.02,
+          "timeout_ms": 3000
+        }
+      ]
+    }
+
+The first rule that matches a call wins. "service", "operation" and "host" all
+accept "*". Clients must be created after install() to pick up the hook; the
+handlers create theirs lazily on first use, so installing before the first
+invocation is enough.
+"""
+
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Client names accepted in rules, mapped to botocore's hyphenized service id
+SERVICE_ALIASES = {
+    "cognito-idp": "cognito-identity-provider",
+    "cognito": "cognito-identity-provider",
+    "dynamo": "dynamodb",
+}
+
+DEFAULT_ERROR_CODE = "ThrottlingException"
+DEFAULT_AWS_ERROR_STATUS = 400
+DEFAULT_HTTP_ERROR_STATUS = 503
+DEFAULT_TIMEOUT_MS = 1000
+
+# z-score of the 99th percentile, used to derive lognormal sigma from p99
+Z_99 = 2.326
+
+
+def sample_latency_ms(spec: Optional[Dict], rng: random.Random) -> float:
+    """Draw one latency sample from a rule's latency_ms spec
+
+    Supported distributions:
+      fixed        {"value": 50}
+      uniform      {"min": 10, "max": 200}
+      exponential  {"mean": 80}
+      lognormal    {"median": 40, "p99": 600}
+    """
+    if not spec:
+        return 0.0
+
+    distribution = spec.get("distribution", "fixed")
+    if distribution == "fixed":
+        return float(spec.get("value", 0))
+    if distribution == "uniform":
+        return rng.uniform(spec.get("min", 0), spec["max"])
+    if distribution == "exponential":
+        return rng.expovariate(1 / spec["mean"])
+    if distribution == "lognormal":
+        median = spec["median"]
+        sigma = math.log(spec.get("p99", median) / median) / Z_99
+        return rng.lognormvariate(math.log(median), sigma)
+
+    raise ValueError(f"Unknown latency distribution: {distribution}")
+
+
+class FaultRule:
+    """One injection rule from the fault config"""
+
+    def __init__(self, spec: Dict):
+        service = spec.get("service", "*")
+        self.service = SERVICE_ALIASES.get(service, service)
+        self.operation = spec.get("operation", "*")
+        self.host = spec.get("host", "*")
+        self.latency_ms = spec.get("latency_ms")
+        self.error_rate = float(spec.get("error_rate", 0))
+        self.error_code = spec.get("error_code", DEFAULT_ERROR_CODE)
+        self.error_message = spec.get("error_message", "Injected fault")
+        self.status_code = spec.get("status_code")
+        self.timeout_rate = float(spec.get("timeout_rate", 0))
+        self.timeout_ms = float(spec.get("timeout_ms", DEFAULT_TIMEOUT_MS))
+
+        # Validate the latency spec up front rather than on the first call
+        sample_latency_ms(self.latency_ms, random.Random(0))
+
+    def matches_aws(self, service_id: str, operation: str) -> bool:
+        return self.service in ("*", service_id) and self.operation in (
+            "*",
+            operation,
+        )
+
+    def matches_http(self, host: str) -> bool:
+        return self.service in ("*", "http") and self.host in ("*", host)
+
+
+class FaultInjector:
+    """Installs fault rules into boto3 and urllib3 and counts what happened"""
+
+    def __init__(self, rules: List[Dict], seed: Optional[int] = None):
+        self.rules = [FaultRule(rule) for rule in rules]
+        self.rng = random.Random(seed)
+        self.stats = defaultdict(
+            lambda: {
+                "calls": 0,
+                "attempts": 0,
+                "errors": 0,
+                "timeouts": 0,
+                "latency_ms": 0.0,
+            }
+        )
+        self._lock = threading.Lock()
+        self._session = None
+        self._original_urlopen = None
+
+    @classmethod
+    def from_file(cls, path: str) -> "FaultInjector":
+        """Load rules from a JSON fault config"""
+        with open(path, "r") as f:
+            config = json.load(f)
+        return cls(config.get("rules", []), seed=config.get("seed"))
+
+    def _find_aws_rule(self, service_id: str, operation: str) -> Optional[FaultRule]:
+        for rule in self.rules:
+            if rule.matches_aws(service_id, operation):
+                return rule
+        return None
+
+    def _find_http_rule(self, host: str) -> Optional[FaultRule]:
+        for rule in self.rules:
+            if rule.matches_http(host):
+                return rule
+        return None
+
+    def _decide(self, rule: FaultRule, key: str) -> str:
+        """Apply the rule's latency and pick an outcome: ok, error or timeout"""
+        with self._lock:
+            latency_ms = sample_latency_ms(rule.latency_ms, self.rng)
+            roll = self.rng.random()
+            stats = self.stats[key]
+            stats["attempts"] += 1
+            stats["latency_ms"] += latency_ms
+
+        if roll < rule.timeout_rate:
+            time.sleep((latency_ms + rule.timeout_ms) / 1000)
+            with self._lock:
+                stats["timeouts"] += 1
+            return "timeout"
+
+        time.sleep(latency_ms / 1000)
+        if roll < rule.timeout_rate + rule.error_rate:
+            with self._lock:
+                stats["errors"] += 1
+            return "error"
+        return "ok"
+
+    # botocore hooks
+
+    def _on_before_call(self, event_name: str, **kwargs) -> None:
+        _, service_id, operation = event_name.split(".", 2)
+        if self._find_aws_rule(service_id, operation):
+            with self._lock:
+                self.stats[f"{service_id}.{operation}"]["calls"] += 1
+
+    def _on_before_send(self, event_name: str, request, **kwargs):
+        from botocore.exceptions import ReadTimeoutError
+
+        _, service_id, operation = event_name.split(".", 2)
+        rule = self._find_aws_rule(service_id, operation)
+        if rule is None:
+            return None
+
+        outcome = self._decide(rule, f"{service_id}.{operation}")
+        if outcome == "timeout":
+            raise ReadTimeoutError(endpoint_url=request.url, error="injected")
+        if outcome == "error":
+            return self._aws_error_response(rule, request)
+        return None
+
+    @staticmethod
+    def _aws_error_response(rule: FaultRule, request):
+        """Build an error response in the protocol the service speaks"""
+        from botocore.awsrequest import AWSResponse
+
+        # JSON protocol services (DynamoDB, Cognito) send an X-Amz-Target header;
+        # query protocol services (SES) expect an XML error document
+        if "X-Amz-Target" in request.headers:
+            body = json.dumps(
+                {"__type": rule.error_code, "message": rule.error_message}
+            ).encode("utf-8")
+            content_type = "application/x-amz-json-1.1"
+        else:
+            body = (
+                "<ErrorResponse><Error><Type>Sender</Type>"
+                f"<Code>{rule.error_code}</Code>"
+                f"<Message>{rule.error_message}</Message>"
+                "</Error></ErrorResponse>"
+            ).encode("utf-8")
+            content_type = "text/xml"
+
+        return AWSResponse(
+            request.url,
+            rule.status_code or DEFAULT_AWS_ERROR_STATUS,
+            {"Content-Type": content_type, "x-amzn-RequestId": "injected-fault"},
+            _StaticBody(body),
+        )
+
+    # urllib3 hook
+
+    def _wrap_urlopen(self, original):
+        injector = self
+
+        def urlopen(pool_manager, method, url, *args, **kwargs):
+            from urllib3.exceptions import ReadTimeoutError
+            from urllib3.response import HTTPResponse
+            from urllib3.util import parse_url
+
+            host = parse_url(url).host or ""
+            rule = injector._find_http_rule(host)
+            if rule is None:
+                return original(pool_manager, method, url, *args, **kwargs)
+
+            key = f"http.{host}"
+            with injector._lock:
+                injector.stats[key]["calls"] += 1
+
+            outcome = injector._decide(rule, key)
+            if outcome == "timeout":
+                raise ReadTimeoutError(None, url, "Read timed out. (injected)")
+            if outcome == "error":
+                body = json.dumps(
+                    {"error": {"code": rule.error_code, "message": rule.error_message}}
+                ).encode("utf-8")
+                return HTTPResponse(
+                    body=body,
+                    status=rule.status_code or DEFAULT_HTTP_ERROR_STATUS,
+                    headers={"Content-Type": "application/json"},
+                    preload_content=True,
+                )
+            return original(pool_manager, method, url, *args, **kwargs)
+
+        return urlopen
+
+    # lifecycle
+
+    def install(self) -> "FaultInjector":
+        """Hook the default boto3 session and urllib3.PoolManager"""
+        import boto3
+        import urllib3
+
+        if boto3.DEFAULT_SESSION is None:
+            boto3.setup_default_session()
+        if self._session is not boto3.DEFAULT_SESSION:
+            self._session = boto3.DEFAULT_SESSION
+            self._session.events.register("before-call", self._on_before_call)
+            self._session.events.register("before-send", self._on_before_send)
+
+        if self._original_urlopen is None:
+            self._original_urlopen = urllib3.PoolManager.urlopen
+            urllib3.PoolManager.urlopen = self._wrap_urlopen(self._original_urlopen)
+
+        return self
+
+    def uninstall(self) -> None:
+        """Remove the hooks installed by install()"""
+        import urllib3
+
+        if self._session is not None:
+            self._session.events.unregister("before-call", self._on_before_call)
+            self._session.events.unregister("before-send", self._on_before_send)
+            self._session = None
+
+        if self._original_urlopen is not None:
+            urllib3.PoolManager.urlopen = self._original_urlopen
+            self._original_urlopen = None
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+
+    def print_summary(self) -> None:
+        """Print per-operation call, attempt, error and latency counts"""
+        print_fault_summary(self.stats)
+
+
+class _StaticBody:
+    """Minimal raw body for AWSResponse"""
+
+    def __init__(self, body: bytes):
+        self._body = body
+
+    def stream(self, **kwargs):
+        yield self._body
+
+
+def merge_stats(all_stats: List[Dict]) -> Dict:
+    """Combine stats collected in several processes"""
+    merged = defaultdict(
+        lambda: {
+            "calls": 0,
+            "attempts": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "latency_ms": 0.0,
+        }
+    )
+    for stats in all_stats:
+        for key, counts in stats.items():
+            for field, value in counts.items():
+                merged[key][field] += value
+    return merged
+
+
+def print_fault_summary(stats: Dict) -> None:
+    """Print what the injector did; attempts/calls above 1.0 means retries"""
+    print("")
+    print("💥 Fault injection summary")
+    print("=" * 80)
+    if not stats:
+        print("No calls matched a fault rule")
+        print("=" * 80)
+        return
+
+    print(
+        f"{'Operation':<40} {'Calls':>6} {'Tries':>6} {'Retry x':>7} "
+        f"{'Err':>5} {'T/O':>5} {'Avg +ms':>8}"
+    )
+    print("-" * 80)
+    for key in sorted(stats):
+        counts = stats[key]
+        calls = counts["calls"] or counts["attempts"]
+        amplification = counts["attempts"] / calls if calls else 0.0
+        avg_latency = (
+            counts["latency_ms"] / counts["attempts"] if counts["attempts"] else 0.0
+        )
+        print(
+            f"{key:<40} {counts['calls']:>6} {counts['attempts']:>6} "
+            f"{amplification:>6.2f}x {counts['errors']:>5} {counts['timeouts']:>5} "
+            f"{avg_latency:>8.1f}"
+        )
+    print("=" * 80)
+
+
+def load_injector(path: Optional[str], install: bool = True) -> Optional[FaultInjector]:
+    """Load (and by default install) a fault config, reporting problems"""
+    if not path:
+        return None
+
+    try:
+        injector = FaultInjector.from_file(path)
+    except FileNotFoundError:
+        print(f"❌ Fault config not found: {path}")
+        return None
+    except (json.JSONDecodeError, KeyError, ValueError) as e:
+        print(f"❌ Invalid fault config {path}: {e}")
+        return None
+
+    print(f"💥 Fault injection enabled: {len(injector.rules)} rule(s) from {path}")
+    return injector.install() if install else injector
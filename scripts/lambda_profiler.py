@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Lambda Profiler
+Runs a handler repeatedly under cProfile and tracemalloc, cold and warm
+
+A cold run re-imports the handler module and every third-party module it pulled
+in (boto3, botocore, urllib3, ...), so the profile includes module init and
+first-call lazy client construction. Warm runs reuse the loaded module.
+
+Outputs (in the output directory):
+  <function>_cold.pstats / <function>_warm.pstats   cProfile data (pstats, snakeviz)
+  <function>_cold.collapsed / <function>_warm.collapsed
+      Collapsed stacks weighted by microseconds; open in speedscope or feed
+      to flamegraph.pl
+  <function>_profile.json   Per-invocation timings and memory, plus a
+      memory_size recommendation for cdk/cdk_stack.py
+
+The recommendation comes from the peak RSS of a separate clean process
+(spawned as by cold_start_simulator, without cProfile or tracemalloc) that
+imports the handler and runs the same invocations; this process' own RSS
+includes the profilers and the harness.
+"""
+
+import argparse
+import contextlib
+import cProfile
+import gc
+import io
+import json
+import math
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.cold_start_simulator import measure_containers
+from scripts.fault_injection import load_injector
+from scripts.local_test import LocalLambdaTester
+from utils.function_discovery import get_function_deployment_settings
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_OUTPUT_DIR = REPO_ROOT / "profiles"
+
+# Lambda memory is configurable in 1 MB steps from 128 MB; recommend in
+# 64 MB steps so the suggestion lines up with common settings
+LAMBDA_MIN_MEMORY_MB = 128
+MEMORY_STEP_MB = 64
+MEMORY_HEADROOM = 1.3
+
+
+class StackRecorder:
+    """Records call stacks with sys.setprofile and aggregates self time per stack
+
+    The result is in the collapsed stack format ("frame;frame;frame weight"),
+    which both speedscope and flamegraph.pl import directly.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(float)
+        self._stack = []
+
+    @staticmethod
+    def _frame_name(frame, event, arg) -> str:
+        if event.startswith("c_"):
+            module = getattr(arg, "__module__", None) or "builtins"
+            name = f"{module}.{getattr(arg, '__qualname__', repr(arg))}"
+        else:
+            code = frame.f_code
+            filename = code.co_filename
+            if filename.startswith(str(REPO_ROOT)):
+                filename = os.path.relpath(filename, REPO_ROOT)
+            else:
+                filename = os.path.basename(filename)
+            name = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+        # ';' separates frames in the collapsed format
+        return name.replace(";", ",")
+
+    def _profile(self, frame, event, arg):
+        now = time.perf_counter()
+        if event in ("call", "c_call"):
+            self._stack.append([self._frame_name(frame, event, arg), now, 0.0])
+        elif event in ("return", "c_return", "c_exception") and self._stack:
+            name, started, child_time = self._stack.pop()
+            elapsed = now - started
+            path = ";".join([entry[0] for entry in self._stack] + [name])
+            self.samples[path] += elapsed - child_time
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    def __enter__(self):
+        sys.setprofile(self._profile)
+        return self
+
+    def __exit__(self, *exc_info):
+        sys.setprofile(None)
+        self._stack.clear()
+
+    def write_collapsed(self, path: Path) -> None:
+        """Write stacks with integer microsecond weights"""
+        with open(path, "w") as f:
+            for stack, seconds in sorted(self.samples.items()):
+                weight = int(seconds * 1_000_000)
+                if weight > 0:
+                    f.write(f"{stack} {weight}\n")
+
+
+class HandlerProfiler:
+    """Profiles cold and warm invocations of one Lambda handler"""
+
+    def __init__(self, function_key: str, event: Dict, verbose: bool = False):
+        self.function_key = function_key
+        self.event = event
+        self.verbose = verbose
+        self.tester = LocalLambdaTester()
+        self.handler = None
+        # Everything imported before the first load survives a cold reset
+        self._baseline_modules = set(sys.modules)
+
+    def _quiet(self):
+        """Silence handler output unless running verbose"""
+        if self.verbose:
+            return contextlib.nullcontext()
+        return contextlib.redirect_stdout(io.StringIO())
+
+    def reset_modules(self) -> None:
+        """Forget the handler module and everything it imported"""
+        for name in list(sys.modules):
+            if name not in self._baseline_modules:
+                del sys.modules[name]
+        self.handler = None
+        gc.collect()
+
+    def load_handler(self) -> Callable:
+        """Import the handler module and resolve the handler function"""
+        with self._quiet():
+            module = self.tester.load_function_module(self.function_key)
+            if not module:
+                raise RuntimeError(f"Could not load module for {self.function_key}")
+            handler = self.tester.find_handler_function(module, self.function_key)
+        if not handler:
+            raise RuntimeError(f"No handler found for {self.function_key}")
+        self.handler = handler
+        return handler
+
+    def invoke(self, cold: bool, profiler: Optional[cProfile.Profile] = None) -> Dict:
+        """Run one invocation and measure time and memory
+
+        For cold invocations, the module import is included and reported
+        separately as init time.
+        """
+        context = self.tester.create_context(self.function_key)
+        gc.collect()
+        memory_before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        if profiler:
+            profiler.enable()
+
+        init_seconds = 0.0
+        if cold:
+            init_start = time.perf_counter()
+            self.load_handler()
+            init_seconds = time.perf_counter() - init_start
+
+        error = None
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            with self._quiet():
+                result = self.handler(self.event, context)
+        except Exception as e:
+            error = str(e)
+            result = None
+        cpu_seconds = time.process_time() - cpu_start
+        wall_seconds = time.perf_counter() - wall_start
+
+        if profiler:
+            profiler.disable()
+
+        _, memory_peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        memory_after, _ = tracemalloc.get_traced_memory()
+
+        status_code = result.get("statusCode") if isinstance(result, dict) else None
+        return {
+            "cold": cold,
+            "init_ms": init_seconds * 1000,
+            "duration_ms": wall_seconds * 1000,
+            "cpu_ms": cpu_seconds * 1000,
+            "peak_kb": (memory_peak - memory_before) / 1024,
+            "retained_kb": (memory_after - memory_before) / 1024,
+            "status_code": status_code,
+            "error": error,
+        }
+
+    def run(
+        self, cold_runs: int, warm_runs: int, output_dir: Path
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """Profile the cold and warm phases and write pstats and flame output"""
+        if output_dir.exists() and not output_dir.is_dir():
+            raise RuntimeError(
+                f"Output path {output_dir} exists and is not a directory"
+            )
+        output_dir.mkdir(parents=True, exist_ok=True)
+        tracemalloc.start()
+
+        cold_profile = cProfile.Profile()
+        cold_results = []
+        for _ in range(cold_runs):
+            self.reset_modules()
+            cold_results.append(self.invoke(cold=True, profiler=cold_profile))
+
+        if self.handler is None:
+            self.load_handler()
+
+        warm_profile = cProfile.Profile()
+        warm_results = [
+            self.invoke(cold=False, profiler=warm_profile) for _ in range(warm_runs)
+        ]
+
+        tracemalloc.stop()
+
+        cold_profile.dump_stats(output_dir / f"{self.function_key}_cold.pstats")
+        warm_profile.dump_stats(output_dir / f"{self.function_key}_warm.pstats")
+
+        # setprofile cannot be shared with cProfile, so the flame graphs come
+        # from one extra cold and one extra warm invocation
+        self.reset_modules()
+        self.record_flame(
+            cold=True, path=output_dir / f"{self.function_key}_cold.collapsed"
+        )
+        self.record_flame(
+            cold=False, path=output_dir / f"{self.function_key}_warm.collapsed"
+        )
+
+        return cold_results, warm_results
+
+    def record_flame(self, cold: bool, path: Path) -> None:
+        """Record one invocation's call stacks (and module import if cold)"""
+        context = self.tester.create_context(self.function_key)
+        with self._quiet():
+            with StackRecorder() as recorder:
+                if cold:
+                    self.load_handler()
+                try:
+                    self.handler(self.event, context)
+                except Exception:
+                    pass
+        recorder.write_collapsed(path)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_phase(results: List[Dict]) -> Dict:
+    """Aggregate invocations of one phase"""
+    if not results:
+        return {}
+
+    durations = [r["duration_ms"] for r in results]
+    summary = {
+        "invocations": len(results),
+        "errors": sum(1 for r in results if r["error"]),
+        "duration_ms": {
+            "p50": percentile(durations, 50),
+            "p90": percentile(durations, 90),
+            "p99": percentile(durations, 99),
+            "max": max(durations),
+        },
+        "cpu_ms_avg": sum(r["cpu_ms"] for r in results) / len(results),
+        "peak_kb_max": max(r["peak_kb"] for r in results),
+        "retained_kb_avg": sum(r["retained_kb"] for r in results) / len(results),
+    }
+    if results[0]["cold"]:
+        summary["init_ms_avg"] = sum(r["init_ms"] for r in results) / len(results)
+    return summary
+
+
+def recommend_memory_mb(peak_rss_mb: float) -> int:
+    """Suggest a memory_size with headroom over the observed peak"""
+    needed = peak_rss_mb * MEMORY_HEADROOM
+    steps = math.ceil(needed / MEMORY_STEP_MB)
+    return max(LAMBDA_MIN_MEMORY_MB, steps * MEMORY_STEP_MB)
+
+
+def print_report(
+    function_key: str,
+    cold_results: List[Dict],
+    warm_results: List[Dict],
+    report: Dict,
+    output_dir: Path,
+    top: int,
+) -> None:
+    """Print per-invocation memory, phase summaries and top functions"""
+    print("")
+    print(f"📊 Profile for {function_key}")
+    print("=" * 72)
+    print(
+        f"{'#':>3} {'Phase':<5} {'Init':>9} {'Duration':>10} {'CPU':>9} "
+        f"{'Peak KB':>10} {'Retained KB':>12}"
+    )
+    print("-" * 72)
+    for index, result in enumerate(cold_results + warm_results, 1):
+        phase = "cold" if result["cold"] else "warm"
+        init = f"{result['init_ms']:.1f}ms" if result["cold"] else "-"
+        flag = " ❌" if result["error"] else ""
+        print(
+            f"{index:>3} {phase:<5} {init:>9} {result['duration_ms']:>8.1f}ms "
+            f"{result['cpu_ms']:>7.1f}ms {result['peak_kb']:>10.1f} "
+            f"{result['retained_kb']:>12.1f}{flag}"
+        )
+
+    for phase in ("cold", "warm"):
+        summary = report[phase]
+        if not summary:
+            continue
+        print("")
+        print(f"🧊 {phase.title()} phase ({summary['invocations']} invocations)")
+        if "init_ms_avg" in summary:
+            print(f"   Init (module import): {summary['init_ms_avg']:.1f} ms avg")
+        duration = summary["duration_ms"]
+        print(
+            f"   Duration p50/p90/p99: {duration['p50']:.1f} / {duration['p90']:.1f} "
+            f"/ {duration['p99']:.1f} ms (max {duration['max']:.1f} ms)"
+        )
+        print(f"   CPU: {summary['cpu_ms_avg']:.1f} ms avg")
+        print(
+            f"   Memory: peak {summary['peak_kb_max']:.1f} KB, "
+            f"retained {summary['retained_kb_avg']:.1f} KB avg per invocation"
+        )
+        if summary["errors"]:
+            print(f"   ⚠️  {summary['errors']} invocation(s) raised")
+
+    memory = report["memory"]
+    print("")
+    print("💾 Memory sizing")
+    print(f"   Peak RSS (clean process): {memory['peak_rss_mb']:.1f} MB")
+    configured = memory.get("configured_mb")
+    if configured:
+        print(f"   Configured memory_size: {configured} MB")
+    print(f"   Recommended memory_size: {memory['recommended_mb']} MB")
+
+    print("")
+    print(f"🔥 Top {top} functions by cumulative time (warm)")
+    stats_file = output_dir / f"{function_key}_warm.pstats"
+    stream = io.StringIO()
+    pstats.Stats(str(stats_file), stream=stream).sort_stats("cumulative").print_stats(
+        top
+    )
+    print(stream.getvalue().rstrip())
+
+    print("")
+    print(f"📁 Output written to {output_dir}")
+    print("   *.pstats     → python -m pstats / snakeviz")
+    print("   *.collapsed  → https://www.speedscope.app or flamegraph.pl")
+
+
+def profile_function(
+    function_key: str,
+    event_file: Optional[str] = None,
+    cold_runs: int = 3,
+    warm_runs: int = 20,
+    output_dir: Optional[Path] = None,
+    top: int = 15,
+    verbose: bool = False,
+    faults_path: Optional[str] = None,
+) -> Optional[Dict]:
+    """Profile a function and return the report written to <function>_profile.json"""
+    tester = LocalLambdaTester()
+    event_file = event_file or tester.get_default_event_file(function_key)
+    event = tester.load_test_event(event_file) if event_file else None
+    if event is None:
+        return None
+
+    output_dir = Path(output_dir or DEFAULT_OUTPUT_DIR / function_key)
+    print(f"🔬 Profiling {function_key}: {cold_runs} cold, {warm_runs} warm")
+    print(f"📄 Event: {event_file}")
+
+    profiler = HandlerProfiler(function_key, event, verbose=verbose)
+    try:
+        cold_results, warm_results = profiler.run(cold_runs, warm_runs, output_dir)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return None
+
+    # Measured in a clean process: this one carries cProfile and tracemalloc
+    try:
+        (container,) = measure_containers(
+            function_key, event, 1, warm_runs, faults_path=faults_path
+        )
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return None
+    peak_rss_mb = container["peak_rss_mb"]
+
+    settings = get_function_deployment_settings().get(function_key, {})
+    report = {
+        "function": function_key,
+        "event_file": event_file,
+        "cold": summarize_phase(cold_results),
+        "warm": summarize_phase(warm_results),
+        "invocations": cold_results + warm_results,
+        "memory": {
+            "peak_rss_mb": peak_rss_mb,
+            "configured_mb": settings.get("memory_size"),
+            "recommended_mb": recommend_memory_mb(peak_rss_mb),
+        },
+    }
+
+    with open(output_dir / f"{function_key}_profile.json", "w") as f:
+        json.dump(report, f, indent=2)
+
+    print_report(function_key, cold_results, warm_results, report, output_dir, top)
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line interface"""
+    parser = argparse.ArgumentParser(
+        prog="local_test.py profile",
+        description="Profile a Lambda handler locally with cProfile and tracemalloc",
+    )
+    parser.add_argument("function_key")
+    parser.add_argument("event_file", nargs="?")
+    parser.add_argument("--cold", type=int, default=3, help="cold invocations")
+    parser.add_argument("--warm", type=int, default=20, help="warm invocations")
+    parser.add_argument("--output", help="output directory")
+    parser.add_argument("--top", type=int, default=15, help="functions to list")
+    parser.add_argument(
+        "--verbose", action="store_true", help="show handler output while profiling"
+    )
+    parser.add_argument("--faults", help="fault injection config (JSON)")
+    args = parser.parse_args(argv)
+
+    # Installed before profiling starts so boto3 stays imported across cold
+    # resets; cold init times then exclude the boto3 import
+    injector = load_injector(args.faults)
+    if args.faults and injector is None:
+        sys.exit(1)
+
+    report = profile_function(
+        args.function_key,
+        event_file=args.event_file,
+        cold_runs=args.cold,
+        warm_runs=args.warm,
+        output_dir=args.output,
+        top=args.top,
+        verbose=args.verbose,
+        faults_path=args.faults,
+    )
+    if injector:
+        injector.print_summary()
+    if report is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,17 +9,54 @@ import sys
 import os
 import importlib.util
 import tempfile
+import time
+import uuid
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import LAMBDA_FUNCTION_NAMES
+from utils.function_discovery import get_function_deployment_settings
+
+# Shared layer code, mounted under /opt/python in Lambda
+COMMON_LAYER_PATH = str(
+    Path(__file__).resolve().parent.parent / "Lambdas" / "Layers" / "common" / "python"
+)
+if COMMON_LAYER_PATH not in sys.path:
+    sys.path.insert(0, COMMON_LAYER_PATH)
+
+
+class LocalLambdaContext:
+    """Stand-in for the Lambda context object passed to handlers"""
+
+    def __init__(
+        self,
+        function_name: str,
+        memory_limit_in_mb: int = 128,
+        timeout_seconds: int = 30,
+        aws_request_id: str = None,
+    ):
+        self.function_name = function_name
+        self.function_version = "$LATEST"
+        self.invoked_function_arn = (
+            f"arn:aws:lambda:us-east-1:123456789012:function:{function_name}:$LATEST"
+        )
+        self.memory_limit_in_mb = str(memory_limit_in_mb)
+        self.aws_request_id = aws_request_id or str(uuid.uuid4())
+        self.log_group_name = f"/aws/lambda/{function_name}"
+        self.log_stream_name = "local-log-stream"
+        self._deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        """Milliseconds left before the configured function timeout"""
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
 
 
 class LocalLambdaTester:
     def __init__(self):
         """Initialize the local tester"""
         self.functions = LAMBDA_FUNCTION_NAMES
+        self._deployment_settings = None
 
     def get_function_directory(self, function_key: str) -> Optional[str]:
         """Get the directory path for a specific function"""
@@ -140,9 +177,8 @@ class LocalLambdaTester:
                             "receiptHandle": "test-receipt-handle",
                             "body": json.dumps(
                                 {
-                                    "trace_id": "test-trace-id-456",
-                                    "action": "process",
-                                    "test": True,
+                                    "email": "test@example.com",
+                                    "sourceIp": "127.0.0.1",
                                 }
                             ),
                             "attributes": {
@@ -187,6 +223,33 @@ class LocalLambdaTester:
         print(f"✅ Created test event file: {event_file}")
         return event_file
 
+    def create_context(
+        self, function_key: str, aws_request_id: str = None
+    ) -> LocalLambdaContext:
+        """Create a context object using the function's deployed memory and timeout"""
+        if self._deployment_settings is None:
+            self._deployment_settings = get_function_deployment_settings()
+
+        settings = self._deployment_settings.get(function_key, {})
+        return LocalLambdaContext(
+            self.functions.get(function_key, function_key),
+            memory_limit_in_mb=settings.get("memory_size", 128),
+            timeout_seconds=settings.get("timeout", 30),
+            aws_request_id=aws_request_id,
+        )
+
+    def get_default_event_file(self, function_key: str) -> Optional[str]:
+        """Return the function's default test event file, creating it if missing"""
+        test_events_dir = self.get_test_events_directory(function_key)
+        if not test_events_dir:
+            return None
+
+        event_file = os.path.join(test_events_dir, f"{function_key}_test_event.json")
+        if os.path.exists(event_file):
+            return event_file
+
+        return self.create_test_event(function_key)
+
     def load_test_event(self, event_file: str) -> Optional[Dict[str, Any]]:
         """Load a test event from file"""
         try:
@@ -221,18 +284,10 @@ class LocalLambdaTester:
         if not event:
             return False
 
-        # Create context if not provided
+        # Create context if not provided; a real context object so handlers
+        # see the deployed timeout through get_remaining_time_in_millis()
         if not context:
-            context = {
-                "function_name": self.functions[function_key],
-                "function_version": "$LATEST",
-                "invoked_function_arn": f"arn:aws:lambda:us-east-1:123456789012:function:{self.functions[function_key]}:$LATEST",
-                "memory_limit_in_mb": "128",
-                "aws_request_id": "test-request-id",
-                "log_group_name": f"/aws/lambda/{self.functions[function_key]}",
-                "log_stream_name": "test-log-stream",
-                "remaining_time_in_millis": 30000,
-            }
+            context = self.create_context(function_key)
 
         try:
             print(f"🚀 Invoking function with test event...")
@@ -319,6 +374,13 @@ class LocalLambdaTester:
             print(f"❌ Error running tests: {e}")
             return False
 
+    def run_all_function_tests(self, max_workers: int = None) -> bool:
+        """Run unit tests for every function, each in its own process, in parallel"""
+        from scripts.parallel_test_runner import run_all_tests
+
+        summary = run_all_tests(max_workers=max_workers)
+        return summary["passed"]
+
     def create_custom_test_event(self, function_key: str) -> str:
         """Create a custom test event interactively"""
         print(f"📝 Creating custom test event for {function_key}")
@@ -348,8 +410,17 @@ def main():
         print("🧪 Local Lambda Tester")
         print("")
         print("Usage:")
-        print("  python scripts/local_test.py test <function_key> [event_file]")
+        print(
+            "  python scripts/local_test.py test <function_key> [event_file] [--faults config.json]"
+        )
         print("  python scripts/local_test.py test-unit <function_key>")
+        print("  python scripts/local_test.py test-all [workers]")
+        print(
+            "  python scripts/local_test.py profile <function_key> [event_file] [--warm N] [--cold N]"
+        )
+        print(
+            "  python scripts/local_test.py simulate <function_key> [event_file] [--cold N] [--warm N] [--rate 1,10 | --trace FILE] [--burst F:S:P]"
+        )
         print("  python scripts/local_test.py create-event <function_key>")
         print("  python scripts/local_test.py list-events [function_key]")
         print("")
@@ -361,6 +432,15 @@ def main():
             "  python scripts/local_test.py test recieveEmail recieveEmail/test_events/custom_event.json"
         )
         print("  python scripts/local_test.py test-unit recieveEmail")
+        print("  python scripts/local_test.py test-all")
+        print("  python scripts/local_test.py test-all 4")
+        print("  python scripts/local_test.py profile recieveEmail --warm 50")
+        print(
+            "  python scripts/local_test.py test identity_provider_auth --faults scripts/fault_profiles/degraded_aws.json"
+        )
+        print(
+            "  python scripts/local_test.py simulate identity_provider_auth --cold 10 --rate 5,100 --extra-latency-ms 80"
+        )
         print("  python scripts/local_test.py create-event recieveEmail")
         print("  python scripts/local_test.py list-events")
         print("  python scripts/local_test.py list-events recieveEmail")
@@ -374,10 +454,26 @@ def main():
             print("❌ test command requires: function_key [event_file]")
             return
 
-        function_key = sys.argv[2]
-        event_file = sys.argv[3] if len(sys.argv) > 3 else None
+        args = sys.argv[2:]
+        injector = None
+        if "--faults" in args:
+            index = args.index("--faults")
+            if index + 1 >= len(args):
+                print("❌ --faults requires a fault config file")
+                return
+            from scripts.fault_injection import load_injector
+
+            injector = load_injector(args[index + 1])
+            if injector is None:
+                return
+            del args[index : index + 2]
+
+        function_key = args[0]
+        event_file = args[1] if len(args) > 1 else None
 
         tester.test_function(function_key, event_file)
+        if injector:
+            injector.print_summary()
 
     elif command == "test-unit":
         if len(sys.argv) != 3:
@@ -387,6 +483,29 @@ def main():
         function_key = sys.argv[2]
         tester.run_function_tests(function_key)
 
+    elif command == "profile":
+        if len(sys.argv) < 3:
+            print("❌ profile command requires: function_key [event_file] [options]")
+            return
+
+        from scripts.lambda_profiler import main as profile_main
+
+        profile_main(sys.argv[2:])
+
+    elif command == "simulate":
+        if len(sys.argv) < 3:
+            print("❌ simulate command requires: function_key [event_file] [options]")
+            return
+
+        from scripts.cold_start_simulator import main as simulate_main
+
+        simulate_main(sys.argv[2:])
+
+    elif command == "test-all":
+        max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        if not tester.run_all_function_tests(max_workers):
+            sys.exit(1)
+
     elif command == "create-event":
         if len(sys.argv) != 3:
             print("❌ create-event command requires: function_key")
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Log Overhead Benchmark
+Measures what logging costs on the happy path of the hot handlers
+
+Each handler runs against in-process fakes of DynamoDB, Cognito and SES, so
+the only I/O left is what the handler writes to stdout (CloudWatch Logs in
+production). For every function the report shows the time per invocation
+and the lines and bytes logged per invocation; bytes are what CloudWatch
+Logs bills for on ingestion.
+
+Metrics instrumentation is disabled so only logging is measured. Run it
+with different LOG_LEVEL / LOG_DEBUG_SAMPLE_RATE settings to compare.
+
+Usage:
+    python scripts/log_overhead_benchmark.py
+    python scripts/log_overhead_benchmark.py verifyCodeAndAuthHandler -n 5000
+    LOG_LEVEL=DEBUG python scripts/log_overhead_benchmark.py
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Must be set before the handler modules (and their decorators) are imported
+os.environ["METRICS_DISABLED"] = "true"
+
+from scripts.local_test import LocalLambdaTester
+
+ENVIRONMENT = {
+    "AWS_REGION": "us-east-1",
+    "COGNITO_CLIENT_ID": "benchmark-client",
+    "COGNITO_USER_POOL_ID": "us-east-1_benchmark",
+    "DYNAMODB_TABLE_NAME": "VerificationCodes",
+    "SES_FROM_EMAIL_ADDRESS": "noreply@example.com",
+    "SES_VERIFICATION_TEMPLATE_NAME": "benchmark-template",
+}
+
+CODE = "123456"
+# Realistically sized JWTs, so logging a token costs what it does in production
+TOKEN = "eyJraWQiOiJrZXkiLCJhbGciOiJSUzI1NiJ9." + "x" * 700 + "." + "s" * 342
+
+
+class _CountingSink(io.TextIOBase):
+    """A stdout replacement that counts what is written
+
+    Writes go on to a line-buffered /dev/null, so every line still costs a
+    write syscall as it does on the Lambda runtime's stdout.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+        self.lines = 0
+        self.devnull = open(os.devnull, "w", buffering=1)
+
+    def write(self, text):
+        self.bytes += len(text.encode("utf-8"))
+        self.lines += text.count("\n")
+        return self.devnull.write(text)
+
+
+class _FakeAws:
+    """Happy-path answers for every AWS call the hot handlers make"""
+
+    def __init__(self):
+        self.items = {}
+
+    # DynamoDB client
+    def get_item(self, TableName=None, Key=None, **kwargs):
+        # recieveEmail keeps its own items, while the validating handlers
+        # expect a fresh code
+        key = Key["email"]
+        if key["S"] in self.items:
+            return {"Item": self.items[key["S"]]}
+        if TableName == "recieveEmail":
+            return {}
+        return {
+            "Item": {
+                "email": key,
+                "code": {"S": CODE},
+                "lastRequestTime": {"N": str(int(time.time()))},
+            }
+        }
+
+    def batch_get_item(self, RequestItems=None):
+        # recieveEmail's rate limit read: its own items and send counters
+        ((table_name, request),) = RequestItems.items()
+        found = [
+            self.items[key["email"]["S"]]
+            for key in request["Keys"]
+            if key["email"]["S"] in self.items
+        ]
+        return {"Responses": {table_name: found}}
+
+    def update_item(self, Key=None, ExpressionAttributeValues=None, **kwargs):
+        if ":newRequest" not in ExpressionAttributeValues:
+            return {}  # send limit counters and SES send slots
+        self.items[Key["email"]["S"]] = {
+            "requestHistory": ExpressionAttributeValues[":newRequest"]
+        }
+        return {}
+
+    def put_item(self, **kwargs):
+        return {}  # idempotency records; every request is new
+
+    def delete_item(self, **kwargs):
+        return {}
+
+    # Cognito
+    def admin_get_user(self, **kwargs):
+        return {"Username": kwargs.get("Username")}
+
+    def admin_create_user(self, **kwargs):
+        return {"User": {"Username": kwargs.get("Username")}}
+
+    def admin_set_user_password(self, **kwargs):
+        return {}
+
+    def initiate_auth(self, **kwargs):
+        return {"ChallengeName": "CUSTOM_CHALLENGE", "Session": "S" * 900}
+
+    def respond_to_auth_challenge(self, **kwargs):
+        return {
+            "AuthenticationResult": {
+                "AccessToken": TOKEN,
+                "IdToken": TOKEN,
+                "RefreshToken": TOKEN,
+                "TokenType": "Bearer",
+                "ExpiresIn": 3600,
+            }
+        }
+
+    # SES
+    def get_send_quota(self):
+        return {"MaxSendRate": 1e6, "Max24HourSend": 1e9, "SentLast24Hours": 0}
+
+    def send_templated_email(self, **kwargs):
+        return {"MessageId": "benchmark"}
+
+
+def _verify_code_scenario(module, fake: _FakeAws):
+    patches = [
+        mock.patch.object(module, "get_cognito_client", return_value=fake),
+        mock.patch.object(module, "get_dynamodb_client", return_value=fake),
+    ]
+
+    def event(i):
+        return {"body": json.dumps({"email": f"user{i}@example.com", "code": CODE})}
+
+    return patches, event
+
+
+def _sign_up_scenario(module, fake: _FakeAws):
+    patches = [
+        mock.patch.object(module, "get_dynamodb_client", return_value=fake),
+        mock.patch.object(module, "get_cognito_client", return_value=fake),
+    ]
+
+    def event(i):
+        return {
+            "body": json.dumps(
+                {
+                    "email": f"user{i}@example.com",
+                    "code": CODE,
+                    "firstName": "Ana",
+                    "lastName": "Lopez",
+                    "dateOfBirth": "1990-01-01",
+                    "gender": "female",
+                }
+            )
+        }
+
+    return patches, event
+
+
+def _recieve_email_scenario(module, fake: _FakeAws):
+    patches = [
+        mock.patch.object(module, "get_dynamodb_client", return_value=fake),
+        mock.patch.object(module, "get_ses_client", return_value=fake),
+        mock.patch.object(
+            module, "get_dynamodb_table_name", return_value="recieveEmail"
+        ),
+    ]
+
+    def event(i):
+        return {"queryStringParameters": {"email": f"user{i}@example.com"}}
+
+    return patches, event
+
+
+SCENARIOS = {
+    "verifyCodeAndAuthHandler": _verify_code_scenario,
+    "signUpCustomer": _sign_up_scenario,
+    "recieveEmail": _recieve_email_scenario,
+}
+
+
+def benchmark_function(function_key: str, invocations: int, warmup: int) -> Dict:
+    """Invoke one handler repeatedly and measure time and log volume"""
+    tester = LocalLambdaTester()
+    with contextlib.redirect_stdout(io.StringIO()):
+        module = tester.load_function_module(function_key)
+    if module is None:
+        raise RuntimeError(f"Could not load {function_key}")
+
+    fake = _FakeAws()
+    patches, make_event = SCENARIOS[function_key](module, fake)
+    sink = _CountingSink()
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.dict(os.environ, ENVIRONMENT))
+        for patch in patches:
+            stack.enter_context(patch)
+        stack.enter_context(contextlib.redirect_stdout(sink))
+
+        status_codes = set()
+        for i in range(warmup):
+            context = tester.create_context(function_key)
+            status_codes.add(
+                module.lambda_handler(make_event(i), context)["statusCode"]
+            )
+
+        sink.bytes = sink.lines = 0
+        started = time.perf_counter()
+        for i in range(warmup, warmup + invocations):
+            context = tester.create_context(function_key)
+            status_codes.add(
+                module.lambda_handler(make_event(i), context)["statusCode"]
+            )
+        elapsed = time.perf_counter() - started
+
+    return {
+        "function": function_key,
+        "invocations": invocations,
+        "us_per_invocation": elapsed / invocations * 1e6,
+        "lines_per_invocation": sink.lines / invocations,
+        "bytes_per_invocation": sink.bytes / invocations,
+        "status_codes": sorted(status_codes),
+    }
+
+
+def print_results(results: List[Dict]) -> None:
+    level = os.environ.get("LOG_LEVEL", "default")
+    print(f"📊 Log overhead (LOG_LEVEL={level})")
+    print("=" * 72)
+    print(
+        f"{'Function':<28} {'µs/inv':>9} {'lines/inv':>10} {'bytes/inv':>10} {'status':>10}"
+    )
+    print("-" * 72)
+    for result in results:
+        status = ",".join(str(code) for code in result["status_codes"])
+        print(
+            f"{result['function']:<28} {result['us_per_invocation']:>9.1f} "
+            f"{result['lines_per_invocation']:>10.1f} "
+            f"{result['bytes_per_invocation']:>10.0f} {status:>10}"
+        )
+        if result["status_codes"] != [200]:
+            print(f"⚠️  {result['function']} left the happy path; check the fakes")
+    print("=" * 72)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Measure logging time and volume on the hot handlers"
+    )
+    parser.add_argument("functions", nargs="*", help=f"default: {', '.join(SCENARIOS)}")
+    parser.add_argument("-n", "--invocations", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.functions if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"no benchmark scenario for: {', '.join(unknown)}")
+
+    results = [
+        benchmark_function(function_key, args.invocations, args.warmup)
+        for function_key in args.functions or SCENARIOS
+    ]
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
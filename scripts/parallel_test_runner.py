@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Parallel Lambda Test Runner
+Runs every Lambda function's unit tests in an isolated Python process, in parallel
+
+Each function's tests put their own directory on sys.path and import the handler
+by module name, so running several suites in one interpreter lets modules and
+mocks leak between functions. Here every suite gets a fresh interpreter (the
+same `cd <function> && python -m pytest tests/` the CI pipeline runs), and the
+suites are spread across all available cores.
+"""
+
+import os
+import sys
+import time
+import subprocess
+import tempfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.function_discovery import get_functions_from_directory, get_function_info
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Shared layers carry their own tests alongside the functions'
+LAYERS_DIR = REPO_ROOT / "Lambdas" / "Layers"
+
+# Generous per-suite ceiling so a hung test cannot stall the whole run
+DEFAULT_SUITE_TIMEOUT = 600
+
+
+def discover_test_suites(function_names: Optional[List[str]] = None) -> List[Dict]:
+    """Find every Lambda function (and shared layer) with tests/test_*.py files"""
+    suites = []
+
+    for function_name in function_names or get_functions_from_directory():
+        info = get_function_info(function_name)
+        if not info["in_directory"]:
+            print(f"⚠️  Function directory not found for {function_name}")
+            continue
+
+        function_dir = REPO_ROOT / info["path"]
+        tests_dir = function_dir / "tests"
+        if not tests_dir.is_dir():
+            continue
+
+        if not any(tests_dir.glob("test_*.py")):
+            continue
+
+        suites.append(
+            {
+                "name": function_name,
+                "category": info["category"],
+                "function_dir": str(function_dir),
+            }
+        )
+
+    if function_names is None and LAYERS_DIR.is_dir():
+        for layer_dir in sorted(LAYERS_DIR.iterdir()):
+            if any((layer_dir / "tests").glob("test_*.py")):
+                suites.append(
+                    {
+                        "name": f"layer:{layer_dir.name}",
+                        "category": "Layers",
+                        "function_dir": str(layer_dir),
+                    }
+                )
+
+    return suites
+
+
+def parse_junit_report(report_path: str) -> Dict[str, int]:
+    """Read test counts from a pytest JUnit XML report"""
+    counts = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0}
+
+    try:
+        root = ET.parse(report_path).getroot()
+    except (ET.ParseError, OSError):
+        return counts
+
+    # pytest wraps a single <testsuite> in <testsuites>
+    suites = [root] if root.tag == "testsuite" else root.findall("testsuite")
+    for suite in suites:
+        for key in counts:
+            counts[key] += int(suite.get(key, 0))
+
+    return counts
+
+
+def run_test_suite(suite: Dict, timeout: int = DEFAULT_SUITE_TIMEOUT) -> Dict:
+    """Run one function's tests in a fresh interpreter and collect the outcome"""
+    fd, report_path = tempfile.mkstemp(prefix=f"{suite['name']}_", suffix=".xml")
+    os.close(fd)
+
+    command = [
+        sys.executable,
+        "-m",
+        "pytest",
+        "tests",
+        "-q",
+        "-p",
+        "no:cacheprovider",
+        f"--junitxml={report_path}",
+    ]
+
+    start_time = time.perf_counter()
+    try:
+        completed = subprocess.run(
+            command,
+            cwd=suite["function_dir"],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+        exit_code = completed.returncode
+        output = completed.stdout + completed.stderr
+    except subprocess.TimeoutExpired as e:
+        exit_code = -1
+        output = f"Timed out after {timeout}s\n{e.stdout or ''}"
+    duration = time.perf_counter() - start_time
+
+    counts = parse_junit_report(report_path)
+    os.unlink(report_path)
+
+    return {
+        **suite,
+        **counts,
+        "passed": exit_code == 0,
+        "exit_code": exit_code,
+        "duration": duration,
+        "output": output,
+    }
+
+
+def run_all_tests(
+    function_names: Optional[List[str]] = None,
+    max_workers: Optional[int] = None,
+    timeout: int = DEFAULT_SUITE_TIMEOUT,
+) -> Dict:
+    """Run every discovered test suite in parallel and aggregate the results"""
+    suites = discover_test_suites(function_names)
+    if not suites:
+        print("❌ No test suites found")
+        return {"passed": False, "results": []}
+
+    # Each worker thread only waits on its pytest subprocess, so the real
+    # parallelism is one interpreter per core
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(suites)))
+    print(f"🧪 Running {len(suites)} test suites across {workers} worker processes...")
+
+    results = []
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_test_suite, suite, timeout) for suite in suites]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            status = "✅" if result["passed"] else "❌"
+            print(
+                f"{status} {result['name']}: {result['tests']} tests "
+                f"in {result['duration']:.2f}s"
+            )
+    wall_time = time.perf_counter() - wall_start
+
+    results.sort(key=lambda r: r["name"])
+    summary = summarize_results(results, wall_time)
+    print_summary(summary)
+
+    return summary
+
+
+def summarize_results(results: List[Dict], wall_time: float) -> Dict:
+    """Aggregate per-suite results into totals"""
+    totals = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0}
+    for result in results:
+        for key in totals:
+            totals[key] += result[key]
+
+    serial_time = sum(result["duration"] for result in results)
+
+    return {
+        "passed": all(result["passed"] for result in results),
+        "results": results,
+        "totals": totals,
+        "wall_time": wall_time,
+        "serial_time": serial_time,
+        "speedup": serial_time / wall_time if wall_time else 0.0,
+    }
+
+
+def print_summary(summary: Dict) -> None:
+    """Print a per-function timing table, failure output and overall totals"""
+    results = summary["results"]
+
+    print("")
+    print("=" * 60)
+    print(f"{'Function':<30} {'Tests':>6} {'Fail':>5} {'Err':>5} {'Time':>9}")
+    print("-" * 60)
+    for result in results:
+        print(
+            f"{result['name']:<30} {result['tests']:>6} {result['failures']:>5} "
+            f"{result['errors']:>5} {result['duration']:>8.2f}s"
+        )
+    print("-" * 60)
+
+    totals = summary["totals"]
+    print(
+        f"{'Total':<30} {totals['tests']:>6} {totals['failures']:>5} "
+        f"{totals['errors']:>5} {summary['wall_time']:>8.2f}s"
+    )
+    print(
+        f"⏱️  Serial time {summary['serial_time']:.2f}s, wall time "
+        f"{summary['wall_time']:.2f}s ({summary['speedup']:.1f}x)"
+    )
+
+    for result in results:
+        if not result["passed"]:
+            print("")
+            print(f"❌ Output for {result['name']} (exit code {result['exit_code']}):")
+            print(result["output"].rstrip())
+
+    print("=" * 60)
+    if summary["passed"]:
+        print(f"✅ All {len(results)} test suites passed")
+    else:
+        failed = [r["name"] for r in results if not r["passed"]]
+        print(f"❌ {len(failed)} test suite(s) failed: {', '.join(failed)}")
+
+
+def main():
+    """Command line interface"""
+    args = sys.argv[1:]
+    max_workers = None
+
+    if "--workers" in args:
+        index = args.index("--workers")
+        if index + 1 >= len(args):
+            print("❌ --workers requires a number")
+            sys.exit(1)
+        max_workers = int(args[index + 1])
+        del args[index : index + 2]
+
+    summary = run_all_tests(function_names=args or None, max_workers=max_workers)
+    sys.exit(0 if summary["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,712 @@
+#!/usr/bin/env python3
+"""
+Rate Limit Policy Simulator
+Replays large request timelines through recieveEmail's rate limiting decisions
+
+recieveEmail decides each request from two pieces of per-email state: the
+request history (timestamps of every request that got a code), and the
+postBurstCodeSent flag. Only the most recent INITIAL_BURST_COUNT timestamps
+ever influence a decision, so the simulator keeps exactly those in a NumPy
+ring buffer per user and evaluates handle_rate_limiting /
+determine_if_post_burst_code for every user at once, one request "round" at a
+time (round k is each user's k-th request).
+
+For every policy it reports codes sent and requests denied, SES sends per
+user, how the DynamoDB item grows (requestHistory is appended to and never
+trimmed) and the read/write capacity the handler consumes: besides the code
+record, every request reads the send limit counters and writes an
+idempotency claim, and every send writes the per-IP and global counters and
+an SES send slot (production settings, every request from an IP).
+
+Workloads are either synthetic (normal users, impatient "resend" users and
+abusive scripts) or replayed from a CSV/JSONL file with email and timestamp
+columns. --verify runs a sample through the real lambda_handler against an
+in-memory table to confirm the vectorized decisions match.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from unittest import mock
+
+try:
+    import numpy as np
+except ImportError:
+    print("❌ numpy not available. Install with: pip install numpy")
+    sys.exit(1)
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RECEIVE_EMAIL_DIR = REPO_ROOT / "Lambdas" / "Authentication" / "recieveEmail"
+# The handler imports fresa_common from the shared layer (/opt/python on Lambda)
+COMMON_LAYER_DIR = REPO_ROOT / "Lambdas" / "Layers" / "common" / "python"
+if str(COMMON_LAYER_DIR) not in sys.path:
+    sys.path.insert(0, str(COMMON_LAYER_DIR))
+
+# --verify replays requests through the handler; one EMF and one log line
+# per request would bury the report. Set before the handler is decorated.
+os.environ.setdefault("METRICS_DISABLED", "true")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from fresa_common import send_limits
+
+# Decision codes
+ALLOWED = 0
+DENIED_BURST_WINDOW = 1
+DENIED_COOLDOWN = 2
+FAILED_ITEM_TOO_LARGE = 3
+
+# Short names accepted by --policy
+POLICY_KEYS = {
+    "burst": "INITIAL_BURST_COUNT",
+    "window": "INITIAL_BURST_WINDOW",
+    "cooldown": "SUBSEQUENT_COOLDOWN",
+    "reset": "RESET_THRESHOLD",
+}
+
+# DynamoDB item sizing (attribute name bytes + value bytes). A 10-digit epoch
+# number is stored in 6 bytes; list elements carry 1 byte of overhead each.
+NUMBER_BYTES = 6
+ITEM_FIXED_BYTES = (
+    len("email")
+    + len("code")
+    + 6
+    + len("ttl")
+    + NUMBER_BYTES
+    + len("createdAt")
+    + len("2025-01-01T00:00:00.000000+00:00")
+    + len("lastRequestTime")
+    + NUMBER_BYTES
+    + len("requestHistory")
+    + 3
+)
+HISTORY_ENTRY_BYTES = 1 + NUMBER_BYTES
+POST_BURST_FLAG_BYTES = len("postBurstCodeSent") + 1
+MAX_ITEM_BYTES = 400 * 1024
+
+# Capacity recieveEmail spends besides the code record, all on small items
+# (one read or write unit each); see lambda_handler and fresa_common
+# Per-IP current and previous window, and each global shard's two windows,
+# read with the email's item in one BatchGetItem
+COUNTER_READ_KEYS = 2 + 2 * send_limits.DEFAULT_SEND_LIMITS["GLOBAL_SHARDS"]
+# The idempotency claim, then the stored response or its release
+IDEMPOTENCY_WRITES = 2
+# Per-IP window, a global shard and the SES send slot, counted before the
+# code is stored (so a failed update still pays them)
+SEND_WRITES = 3
+
+# On-demand pricing (us-east-1) used for rough cost comparisons
+READ_REQUEST_UNIT_PRICE = 0.25 / 1_000_000
+WRITE_REQUEST_UNIT_PRICE = 1.25 / 1_000_000
+SES_EMAIL_PRICE = 0.10 / 1000
+
+# Synthetic workload classes
+USER_CLASSES = ("normal", "resend", "abuser")
+
+
+def load_production_policy() -> Dict[str, int]:
+    """Read RATE_LIMIT_CONFIG straight from the recieveEmail handler"""
+    sys.path.insert(0, str(RECEIVE_EMAIL_DIR))
+    import recieveEmail
+
+    return dict(recieveEmail.RATE_LIMIT_CONFIG)
+
+
+def parse_policy(spec: str, base: Dict[str, int]) -> Tuple[str, Dict[str, int]]:
+    """Parse 'name:burst=3,cooldown=600' into a policy based on production"""
+    name, _, overrides = spec.partition(":")
+    policy = dict(base)
+    for override in filter(None, overrides.split(",")):
+        key, _, value = override.partition("=")
+        key = POLICY_KEYS.get(key.strip(), key.strip())
+        if key not in policy:
+            raise ValueError(f"Unknown policy setting: {key}")
+        policy[key] = int(value)
+    return name, policy
+
+
+# Workloads
+
+
+def generate_workload(
+    users: int,
+    hours: float,
+    resend_fraction: float = 0.1,
+    abuser_fraction: float = 0.01,
+    seed: int = 42,
+) -> Dict:
+    """Build a synthetic timeline of (user, timestamp) requests
+
+    normal  - one or two sign-in sessions, occasionally asking for a resend
+    resend  - impatient users hammering "resend code" every ~20s for a while
+    abuser  - scripts requesting every few seconds for up to a few hours
+    """
+    rng = np.random.default_rng(seed)
+    duration = int(hours * 3600)
+    start = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp())
+
+    user_class = rng.choice(
+        len(USER_CLASSES),
+        size=users,
+        p=[1 - resend_fraction - abuser_fraction, resend_fraction, abuser_fraction],
+    )
+
+    def sessions(user_ids, retries_per_session, retry_gap_mean):
+        """Sessions start uniformly; retries follow at exponential gaps"""
+        if len(user_ids) == 0:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        session_count = rng.poisson(0.5, size=len(user_ids)) + 1
+        session_users = np.repeat(user_ids, session_count)
+        session_start = rng.integers(0, duration, size=len(session_users))
+
+        per_session = retries_per_session(len(session_users))
+        request_users = np.repeat(session_users, per_session)
+        request_start = np.repeat(session_start, per_session)
+
+        gaps = rng.exponential(retry_gap_mean, size=len(request_users))
+        # First request of each session happens at the session start
+        first = np.concatenate(([0], np.cumsum(per_session)[:-1]))
+        gaps[first] = 0
+        offsets = _segment_cumsum(gaps, per_session)
+        return request_users, request_start + offsets.astype(np.int64)
+
+    user_ids = np.arange(users)
+    normal_users, normal_times = sessions(
+        user_ids[user_class == 0], lambda n: rng.geometric(0.7, size=n), 90
+    )
+    resend_users, resend_times = sessions(
+        user_ids[user_class == 1], lambda n: rng.integers(3, 12, size=n), 20
+    )
+
+    abusers = user_ids[user_class == 2]
+    run_seconds = np.minimum(rng.exponential(3600, size=len(abusers)), duration)
+    counts = np.maximum(1, (run_seconds / 5).astype(np.int64))
+    abuser_users = np.repeat(abusers, counts)
+    abuser_start = np.repeat(rng.integers(0, duration, size=len(abusers)), counts)
+    abuser_times = abuser_start + _segment_cumsum(
+        rng.exponential(5, size=counts.sum()), counts
+    ).astype(np.int64)
+
+    request_users = np.concatenate([normal_users, resend_users, abuser_users])
+    request_times = np.concatenate([normal_times, resend_times, abuser_times])
+
+    return {
+        "user": request_users.astype(np.int64),
+        "time": start + request_times,
+        "user_class": user_class,
+        "email_bytes": np.full(users, 24, dtype=np.int64),
+        "emails": None,
+    }
+
+
+def _segment_cumsum(values: "np.ndarray", lengths: "np.ndarray") -> "np.ndarray":
+    """Cumulative sum that restarts at the start of every segment"""
+    totals = np.cumsum(values)
+    ends = np.cumsum(lengths)
+    offsets = np.concatenate(([0.0], totals[ends[:-1] - 1])) if len(ends) else []
+    return totals - np.repeat(offsets, lengths)
+
+
+def _parse_timestamp(value: str) -> int:
+    value = value.strip()
+    try:
+        return int(float(value))
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp())
+
+
+def load_replay(path: str) -> Dict:
+    """Load a request timeline from CSV or JSONL with email and timestamp"""
+    if path.endswith(".jsonl"):
+        with open(path, "r") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, "r", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+    # Same normalization as the handler
+    emails = [str(row["email"]).lower().strip() for row in rows]
+    unique_emails, user = np.unique(np.array(emails), return_inverse=True)
+    times = np.array([_parse_timestamp(str(row["timestamp"])) for row in rows])
+
+    return {
+        "user": user.astype(np.int64),
+        "time": times.astype(np.int64),
+        "user_class": None,
+        "email_bytes": np.array(
+            [len(email.encode("utf-8")) for email in unique_emails], dtype=np.int64
+        ),
+        "emails": unique_emails,
+    }
+
+
+# Simulation
+
+
+def item_bytes(history_length, post_burst, email_bytes):
+    """Approximate DynamoDB item size for the verification code record"""
+    return (
+        ITEM_FIXED_BYTES
+        + email_bytes
+        + history_length * HISTORY_ENTRY_BYTES
+        + np.where(post_burst, POST_BURST_FLAG_BYTES, 0)
+    )
+
+
+def simulate_policy(
+    workload: Dict,
+    policy: Dict[str, int],
+    ttl_seconds: Optional[int] = None,
+) -> Dict:
+    """Run every request in the workload through the policy
+
+    Mirrors recieveEmail for each request at time t:
+      recent = history entries newer than RESET_THRESHOLD
+      fewer than INITIAL_BURST_COUNT recent       -> allow
+      oldest of the last burst within the window  -> deny (burst window)
+      post-burst code not yet sent                -> allow, mark it sent
+      last request within SUBSEQUENT_COOLDOWN     -> deny (cooldown)
+      otherwise                                   -> allow
+
+    ttl_seconds, when set, deletes a user's item that long after their last
+    code (the record's ttl attribute), resetting history and the flag.
+    """
+    burst = policy["INITIAL_BURST_COUNT"]
+    window = policy["INITIAL_BURST_WINDOW"]
+    cooldown = policy["SUBSEQUENT_COOLDOWN"]
+    reset = policy["RESET_THRESHOLD"]
+
+    users = workload["user"]
+    times = workload["time"]
+    email_bytes = workload["email_bytes"]
+    user_count = len(email_bytes)
+
+    # Order by user then time, and number each user's requests 0, 1, 2, ...
+    order = np.lexsort((times, users))
+    sorted_users = users[order]
+    sorted_times = times[order]
+    first_index = np.searchsorted(sorted_users, np.arange(user_count))
+    rank = np.arange(len(order)) - first_index[sorted_users]
+    by_round = np.argsort(rank, kind="stable")
+    round_sizes = np.bincount(rank)
+
+    # Per-user state: the last `burst` code timestamps (oldest first), the
+    # full history length (for item size) and the post-burst flag
+    recent = np.full((user_count, burst), np.iinfo(np.int64).min // 2, np.int64)
+    history_length = np.zeros(user_count, dtype=np.int64)
+    post_burst_sent = np.zeros(user_count, dtype=bool)
+    exists = np.zeros(user_count, dtype=bool)
+
+    decision = np.empty(len(order), dtype=np.int8)
+    read_units = np.empty(len(order), dtype=np.float64)
+    write_units = np.zeros(len(order), dtype=np.float64)
+
+    offset = 0
+    for size in round_sizes:
+        index = by_round[offset : offset + size]
+        offset += size
+        u = sorted_users[index]
+        t = sorted_times[index]
+
+        if ttl_seconds is not None:
+            expired = exists[u] & (t >= recent[u, -1] + ttl_seconds)
+            if expired.any():
+                gone = u[expired]
+                recent[gone] = np.iinfo(np.int64).min // 2
+                history_length[gone] = 0
+                post_burst_sent[gone] = False
+                exists[gone] = False
+
+        oldest = recent[u, 0]
+        last = recent[u, -1]
+        has_burst = (history_length[u] >= burst) & (t - oldest < reset)
+        in_window = has_burst & (t - oldest < window)
+        flagged = post_burst_sent[u]
+        in_cooldown = has_burst & ~in_window & flagged & (t - last < cooldown)
+        allowed = ~(in_window | in_cooldown)
+        post_burst = allowed & has_burst & ~flagged
+
+        size_before = np.where(
+            exists[u], item_bytes(history_length[u], flagged, email_bytes[u]), 0
+        )
+        size_after = item_bytes(
+            history_length[u] + 1, flagged | post_burst, email_bytes[u]
+        )
+        too_large = allowed & (size_after > MAX_ITEM_BYTES)
+        allowed &= ~too_large
+
+        # Eventually consistent reads: 0.5 RCU per started 4 KB per key, even
+        # when the item does not exist
+        read_units[index] = (
+            np.maximum(1, np.ceil(size_before / 4096)) + COUNTER_READ_KEYS
+        ) * 0.5
+        # UpdateItem bills the larger of the before and after images
+        write_units[index] = (
+            IDEMPOTENCY_WRITES
+            + np.where(allowed | too_large, SEND_WRITES, 0)
+            + np.where(allowed, np.ceil(np.maximum(size_before, size_after) / 1024), 0)
+        )
+
+        decision[index] = np.select(
+            [in_window, in_cooldown, too_large],
+            [DENIED_BURST_WINDOW, DENIED_COOLDOWN, FAILED_ITEM_TOO_LARGE],
+            ALLOWED,
+        )
+
+        sent = u[allowed]
+        recent[sent] = np.column_stack([recent[sent, 1:], t[allowed]])
+        history_length[sent] += 1
+        post_burst_sent[sent] |= post_burst[allowed]
+        exists[sent] = True
+
+    # Back to the workload's original request order
+    result_decision = np.empty_like(decision)
+    result_decision[order] = decision
+    result_reads = np.empty_like(read_units)
+    result_reads[order] = read_units
+    result_writes = np.empty_like(write_units)
+    result_writes[order] = write_units
+
+    return {
+        "decision": result_decision,
+        "read_units": result_reads,
+        "write_units": result_writes,
+        "final_item_bytes": np.where(
+            exists, item_bytes(history_length, post_burst_sent, email_bytes), 0
+        ),
+        "rounds": len(round_sizes),
+    }
+
+
+def summarize(workload: Dict, result: Dict) -> Dict:
+    """Turn per-request decisions into per-policy totals"""
+    decision = result["decision"]
+    allowed = decision == ALLOWED
+    users = workload["user"]
+    user_count = len(workload["email_bytes"])
+    sends_per_user = np.bincount(users[allowed], minlength=user_count)
+    requesting = np.bincount(users, minlength=user_count) > 0
+    item_sizes = result["final_item_bytes"][result["final_item_bytes"] > 0]
+
+    read_units = float(result["read_units"].sum())
+    write_units = float(result["write_units"].sum())
+    emails_sent = int(allowed.sum())
+
+    summary = {
+        "requests": int(len(decision)),
+        "allowed": emails_sent,
+        "denied_burst_window": int((decision == DENIED_BURST_WINDOW).sum()),
+        "denied_cooldown": int((decision == DENIED_COOLDOWN).sum()),
+        "failed_item_too_large": int((decision == FAILED_ITEM_TOO_LARGE).sum()),
+        "sends_per_user": {
+            "mean": float(sends_per_user[requesting].mean()),
+            "p99": float(np.percentile(sends_per_user[requesting], 99)),
+            "max": int(sends_per_user.max()),
+        },
+        "item_bytes": {
+            "p50": float(np.percentile(item_sizes, 50)) if len(item_sizes) else 0.0,
+            "p99": float(np.percentile(item_sizes, 99)) if len(item_sizes) else 0.0,
+            "max": int(item_sizes.max()) if len(item_sizes) else 0,
+            "over_4kb": int((item_sizes > 4096).sum()),
+        },
+        "read_units": read_units,
+        "write_units": write_units,
+        "estimated_cost": {
+            "dynamodb": read_units * READ_REQUEST_UNIT_PRICE
+            + write_units * WRITE_REQUEST_UNIT_PRICE,
+            "ses": emails_sent * SES_EMAIL_PRICE,
+        },
+    }
+
+    if workload["user_class"] is not None:
+        request_class = workload["user_class"][users]
+        summary["by_class"] = {
+            name: {
+                "requests": int((request_class == index).sum()),
+                "allowed": int((allowed & (request_class == index)).sum()),
+            }
+            for index, name in enumerate(USER_CLASSES)
+        }
+
+    return summary
+
+
+def print_comparison(results: List[Tuple[str, Dict, Dict, float]]) -> None:
+    """Print one row per policy, then per-class allow rates"""
+    print("")
+    print("📊 Policy comparison")
+    print("=" * 104)
+    print(
+        f"{'Policy':<14} {'Burst':>5} {'Window':>7} {'Cool':>6} {'Reset':>6} "
+        f"{'Sent':>10} {'Denied':>10} {'Sends p99':>9} {'Item p99':>9} "
+        f"{'RCU':>10} {'WCU':>10}"
+    )
+    print("-" * 104)
+    for name, policy, summary, _ in results:
+        denied = summary["denied_burst_window"] + summary["denied_cooldown"]
+        print(
+            f"{name:<14} {policy['INITIAL_BURST_COUNT']:>5} "
+            f"{policy['INITIAL_BURST_WINDOW']:>6}s {policy['SUBSEQUENT_COOLDOWN']:>5}s "
+            f"{policy['RESET_THRESHOLD'] // 3600:>5}h {summary['allowed']:>10,} "
+            f"{denied:>10,} {summary['sends_per_user']['p99']:>9.0f} "
+            f"{summary['item_bytes']['p99']:>8.0f}B "
+            f"{summary['read_units']:>10,.0f} {summary['write_units']:>10,.0f}"
+        )
+    print("-" * 104)
+
+    for name, _, summary, elapsed in results:
+        cost = summary["estimated_cost"]
+        line = (
+            f"{name:<14} DynamoDB ${cost['dynamodb']:.2f}, SES ${cost['ses']:.2f}, "
+            f"max item {summary['item_bytes']['max']:,}B "
+            f"({summary['item_bytes']['over_4kb']} items > 4KB), "
+            f"simulated in {elapsed:.2f}s"
+        )
+        print(line)
+        if summary["failed_item_too_large"]:
+            print(
+                f"{'':<14} ⚠️  {summary['failed_item_too_large']:,} requests failed: "
+                "item would exceed DynamoDB's 400KB limit"
+            )
+
+    if "by_class" in results[0][2]:
+        print("")
+        print(
+            f"{'Policy':<14} " + " ".join(f"{c + ' allowed':>18}" for c in USER_CLASSES)
+        )
+        for name, _, summary, _ in results:
+            cells = []
+            for user_class in USER_CLASSES:
+                counts = summary["by_class"][user_class]
+                rate = (
+                    counts["allowed"] / counts["requests"] if counts["requests"] else 0
+                )
+                cells.append(f"{rate * 100:>17.1f}%")
+            print(f"{name:<14} " + " ".join(cells))
+    print("=" * 104)
+
+
+# Verification against the real handler
+
+
+class _InMemoryVerificationTable:
+    """Just enough of the DynamoDB client for recieveEmail's calls"""
+
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, TableName, Key, **kwargs):
+        item = self.items.get(Key["email"]["S"])
+        return {"Item": item} if item else {}
+
+    def batch_get_item(self, RequestItems):
+        ((table_name, request),) = RequestItems.items()
+        found = [
+            self.items[key["email"]["S"]]
+            for key in request["Keys"]
+            if key["email"]["S"] in self.items
+        ]
+        return {"Responses": {table_name: found}}
+
+    def update_item(self, TableName, Key, ExpressionAttributeValues, **kwargs):
+        values = ExpressionAttributeValues
+        if ":code" not in values:
+            return {}  # SES send slots; the simulation never fills one
+        item = self.items.setdefault(
+            Key["email"]["S"], {"email": Key["email"], "requestHistory": {"L": []}}
+        )
+        item["code"] = values[":code"]
+        item["ttl"] = values[":ttl"]
+        item["createdAt"] = values[":createdAt"]
+        item["lastRequestTime"] = values[":lastRequestTime"]
+        item["requestHistory"]["L"].extend(values[":newRequest"]["L"])
+        if ":postBurstCodeSent" in values:
+            item["postBurstCodeSent"] = values[":postBurstCodeSent"]
+        return {}
+
+
+class _NullSes:
+    def get_send_quota(self):
+        # Far above the replay's pace, so no send waits for a slot
+        return {"MaxSendRate": 1e6, "Max24HourSend": 1e9, "SentLast24Hours": 0}
+
+    def send_templated_email(self, **kwargs):
+        return {"MessageId": "simulated"}
+
+
+def verify_against_handler(
+    workload: Dict, policy: Dict[str, int], result: Dict, sample_users: int
+) -> Tuple[int, int]:
+    """Replay the first sample_users users through lambda_handler
+
+    Returns how many requests the handler and the vectorized simulation
+    disagree on, and how many were checked.
+    """
+    sys.path.insert(0, str(RECEIVE_EMAIL_DIR))
+    import recieveEmail
+
+    selected = np.flatnonzero(workload["user"] < sample_users)
+    selected = selected[np.argsort(workload["time"][selected], kind="stable")]
+
+    clock = {"now": 0}
+
+    class SimulatedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromtimestamp(clock["now"], tz)
+
+    table = _InMemoryVerificationTable()
+    environment = {
+        "DYNAMODB_TABLE_NAME": "simulated",
+        "SES_FROM_EMAIL_ADDRESS": "noreply@example.com",
+        "SES_VERIFICATION_TEMPLATE_NAME": "simulated",
+        # Only the per-email policy is simulated; requests carry no source IP
+        "SEND_LIMIT_GLOBAL_PER_MINUTE": "0",
+        # Simulated users repeat identical requests on purpose
+        "IDEMPOTENCY_DISABLED": "true",
+    }
+
+    mismatches = 0
+    with mock.patch.dict(os.environ, environment), mock.patch.dict(
+        recieveEmail.RATE_LIMIT_CONFIG, policy
+    ), mock.patch.object(
+        recieveEmail, "datetime", SimulatedDatetime
+    ), mock.patch.object(
+        recieveEmail, "get_dynamodb_client", return_value=table
+    ), mock.patch.object(
+        recieveEmail, "get_ses_client", return_value=_NullSes()
+    ), mock.patch(
+        "builtins.print"
+    ):
+        for request in selected:
+            clock["now"] = int(workload["time"][request])
+            email = f"user{workload['user'][request]}@example.com"
+            response = recieveEmail.lambda_handler(
+                {"queryStringParameters": {"email": email}}, None
+            )
+            expected = 200 if result["decision"][request] == ALLOWED else 429
+            if response["statusCode"] != expected:
+                mismatches += 1
+
+    return mismatches, len(selected)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Simulate recieveEmail rate limiting policies over large timelines"
+    )
+    parser.add_argument("--users", type=int, default=100_000, help="synthetic users")
+    parser.add_argument("--hours", type=float, default=24, help="synthetic duration")
+    parser.add_argument(
+        "--resend-fraction", type=float, default=0.1, help="impatient users"
+    )
+    parser.add_argument(
+        "--abuser-fraction", type=float, default=0.01, help="scripted abusers"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--replay", help="CSV or JSONL timeline (email, timestamp)")
+    parser.add_argument(
+        "--policy",
+        action="append",
+        default=[],
+        help="extra policy, e.g. strict:burst=1,cooldown=1800 (repeatable)",
+    )
+    parser.add_argument(
+        "--ttl",
+        type=int,
+        help="model TTL deletion this many seconds after the last code",
+    )
+    parser.add_argument(
+        "--verify",
+        type=int,
+        default=0,
+        metavar="USERS",
+        help="check decisions for this many users against lambda_handler",
+    )
+    parser.add_argument("--output", help="write the comparison as JSON")
+    args = parser.parse_args(argv)
+
+    production = load_production_policy()
+    try:
+        policies = [("production", production)] + [
+            parse_policy(spec, production) for spec in args.policy
+        ]
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    if args.replay:
+        workload = load_replay(args.replay)
+        print(f"📄 Replaying {len(workload['user']):,} requests from {args.replay}")
+        if args.verify:
+            print("⚠️  --verify only applies to synthetic workloads")
+            args.verify = 0
+    else:
+        workload = generate_workload(
+            args.users,
+            args.hours,
+            args.resend_fraction,
+            args.abuser_fraction,
+            args.seed,
+        )
+        print(
+            f"🧪 Generated {len(workload['user']):,} requests from "
+            f"{args.users:,} users over {args.hours:g}h"
+        )
+    if args.verify and args.ttl is not None:
+        print("⚠️  --verify ignores --ttl: the handler does not delete items itself")
+
+    results = []
+    failed = False
+    for name, policy in policies:
+        start = time.perf_counter()
+        result = simulate_policy(workload, policy, args.ttl)
+        elapsed = time.perf_counter() - start
+        results.append((name, policy, summarize(workload, result), elapsed))
+
+        if args.verify:
+            if args.ttl is not None:
+                result = simulate_policy(workload, policy)
+            mismatches, checked = verify_against_handler(
+                workload, policy, result, args.verify
+            )
+            if mismatches:
+                failed = True
+                print(
+                    f"❌ {name}: {mismatches}/{checked} decisions differ from handler"
+                )
+            else:
+                print(f"✅ {name}: {checked} decisions match lambda_handler")
+
+    print_comparison(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                [
+                    {"policy": name, "settings": policy, **summary}
+                    for name, policy, summary, _ in results
+                ],
+                f,
+                indent=2,
+            )
+        print(f"📁 Results written to {args.output}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
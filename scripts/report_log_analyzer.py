@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+"""
+REPORT Log Analyzer
+Streams Lambda REPORT lines out of exported CloudWatch logs, builds per
+function and per alias distributions of duration, billed duration, init
+duration and max memory used, and recommends a memory size from them
+
+Input can be any mix of:
+  - CloudWatch Logs exports to S3 (gzipped "<timestamp> <message>" lines,
+    one directory per log stream)
+  - JSON lines with a "message" field, e.g. from
+    aws logs filter-log-events ... --query 'events[]' --output json | jq -c '.[]'
+  - plain log text, or "-" for stdin
+
+Files are read line by line and every distribution is a fixed-size
+histogram, so multi-GB exports are analysed in constant memory.
+
+The function comes from logGroupName (JSON lines), the file path, or
+--function. The version comes from the log stream name ("[7]" or
+"[$LATEST]"), and --resolve-aliases maps versions to their aliases.
+
+Memory recommendations: Lambda allocates CPU in proportion to memory, one
+full vCPU at 1769 MB. Each invocation is split into CPU time, which scales
+with the allocated CPU, and waiting time (DynamoDB, Cognito, SES, HTTP),
+which does not. The CPU time comes from, in order:
+  --cpu-ms function=ms      measured elsewhere, at one full vCPU
+  --benchmark               the handler run locally against in-process AWS
+                            fakes (log_overhead_benchmark scenarios), scaled
+                            by --cpu-factor for Lambda's slower cores
+  the fresa_common.metrics  EMF lines in the same logs (Duration minus the
+                            downstream latency)
+The predicted durations are then priced with the Lambda price model.
+
+Usage:
+    python scripts/report_log_analyzer.py exported-logs/
+    python scripts/report_log_analyzer.py logs.jsonl.gz --benchmark
+    python scripts/report_log_analyzer.py - --function recieveEmail < report.log
+    python scripts/report_log_analyzer.py exports/ --resolve-aliases --json
+"""
+
+import argparse
+import gzip
+import io
+import json
+import math
+import os
+import re
+import sys
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LAMBDA_FUNCTION_NAMES
+
+# Lambda price model (us-east-1)
+PRICE_PER_GB_SECOND = {"x86_64": 0.0000166667, "arm64": 0.0000133334}
+PRICE_PER_REQUEST = 0.20 / 1_000_000
+FULL_VCPU_MB = 1769
+MEMORY_OPTIONS_MB = (128, 192, 256, 384, 512, 768, 1024, 1536, 1769, 2048, 3008)
+MEMORY_HEADROOM = 0.2
+
+REPORT_LINE = re.compile(
+    r"REPORT RequestId: \S+\s+Duration: ([\d.]+) ms\s+Billed Duration: (\d+) ms"
+    r"\s+Memory Size: (\d+) MB\s+Max Memory Used: (\d+) MB"
+    r"(?:\s+Init Duration: ([\d.]+) ms)?"
+)
+VERSION_IN_STREAM = re.compile(r"\[(\$LATEST|\d+)\]")
+LOG_GROUP_PREFIX = "/aws/lambda/"
+
+
+class Histogram:
+    """Log-bucketed histogram: fixed memory, percentiles within ~1%"""
+
+    RATIO = 1.02
+    MIN_VALUE = 0.01
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        value = max(value, self.MIN_VALUE)
+        index = int(math.log(value / self.MIN_VALUE) / math.log(self.RATIO))
+        self.buckets[index] += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                # Geometric middle of the bucket, clamped to what was seen
+                value = self.MIN_VALUE * self.RATIO ** (index + 0.5)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def shifted_mean(self, offset: float) -> float:
+        """Mean of max(v + offset, 0) over the recorded values"""
+        if not self.count:
+            return 0.0
+        total = 0
+        for index, count in self.buckets.items():
+            value = min(
+                max(self.MIN_VALUE * self.RATIO ** (index + 0.5), self.min), self.max
+            )
+            total += max(value + offset, 0.0) * count
+        return total / self.count
+
+
+class GroupStats:
+    """Distributions for one (function, version, memory size)"""
+
+    def __init__(self):
+        self.duration = Histogram()
+        self.billed = Histogram()
+        self.init = Histogram()
+        self.memory_used = Counter()
+
+    def add_report(self, report: Dict):
+        self.duration.add(report["duration"])
+        self.billed.add(report["billed"])
+        if report["init"] is not None:
+            self.init.add(report["init"])
+        self.memory_used[report["memory_used"]] += 1
+
+    def memory_percentile(self, p: float) -> int:
+        total = sum(self.memory_used.values())
+        seen = 0
+        for value in sorted(self.memory_used):
+            seen += self.memory_used[value]
+            if seen >= p / 100 * total:
+                return value
+        return 0
+
+
+class DownstreamStats:
+    """Running sums from fresa_common.metrics EMF lines for one function"""
+
+    def __init__(self):
+        self.invocations = 0
+        self.handler_ms = 0.0
+        self.downstream_ms = 0.0
+
+    @property
+    def cpu_fraction(self) -> Optional[float]:
+        if not self.invocations or self.handler_ms <= 0:
+            return None
+        return max(1 - self.downstream_ms / self.handler_ms, 0.0)
+
+
+# Streaming input
+
+
+def _open(path: str):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path), encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def iter_files(paths: List[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in sorted(os.walk(path)):
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def function_from_path(path: str) -> Optional[str]:
+    parts = re.split(r"[\\/]", path)
+    for part in reversed(parts):
+        if part in LAMBDA_FUNCTION_NAMES.values():
+            return part
+    return None
+
+
+def iter_records(
+    paths: List[str], default_function: Optional[str]
+) -> Iterator[Tuple[str, str, str]]:
+    """(function, version, message) for every log line, streamed"""
+    for path in iter_files(paths):
+        path_function = function_from_path(path) or default_function or "unknown"
+        match = VERSION_IN_STREAM.search(path)
+        path_version = match.group(1) if match else "$LATEST"
+        handle = _open(path)
+        try:
+            for line in handle:
+                function, version, message = path_function, path_version, line
+                if line.startswith("{"):
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        record = None
+                    if isinstance(record, dict) and "message" in record:
+                        message = record["message"]
+                        group = record.get("logGroupName") or record.get("logGroup")
+                        if group and group.startswith(LOG_GROUP_PREFIX):
+                            function = group[len(LOG_GROUP_PREFIX) :]
+                        stream = record.get("logStreamName") or record.get("logStream")
+                        match = VERSION_IN_STREAM.search(stream or "")
+                        if match:
+                            version = match.group(1)
+                yield function, version, message
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+
+
+def parse_report(message: str) -> Optional[Dict]:
+    """Fields of a REPORT line, or None if the message is not one"""
+    if "REPORT RequestId:" not in message:
+        return None
+    match = REPORT_LINE.search(message)
+    if match is None:
+        return None
+    duration, billed, memory_size, memory_used, init = match.groups()
+    return {
+        "duration": float(duration),
+        "billed": float(billed),
+        "memory_size": int(memory_size),
+        "memory_used": int(memory_used),
+        "init": float(init) if init else None,
+    }
+
+
+def parse_emf(message: str) -> Optional[Dict]:
+    """A fresa_common.metrics EMF document, or None"""
+    if '"_aws"' not in message:
+        return None
+    try:
+        document = json.loads(message[message.index("{") :])
+    except (ValueError, json.JSONDecodeError):
+        return None
+    return document if isinstance(document, dict) else None
+
+
+def analyze(paths: List[str], default_function: Optional[str] = None):
+    groups: Dict[Tuple[str, str, int], GroupStats] = {}
+    downstream: Dict[str, DownstreamStats] = {}
+    lines = 0
+
+    for function, version, message in iter_records(paths, default_function):
+        lines += 1
+        report = parse_report(message)
+        if report is not None:
+            key = (function, version, report["memory_size"])
+            stats = groups.get(key)
+            if stats is None:
+                stats = groups[key] = GroupStats()
+            stats.add_report(report)
+            continue
+
+        document = parse_emf(message)
+        if document is not None and "Duration" in document:
+            name = document.get("FunctionName") or function
+            stats = downstream.get(name)
+            if stats is None:
+                stats = downstream[name] = DownstreamStats()
+            stats.invocations += 1
+            stats.handler_ms += document["Duration"]
+            stats.downstream_ms += sum(
+                value
+                for key, value in document.items()
+                if key.endswith("Latency") and isinstance(value, (int, float))
+            )
+
+    return groups, downstream, lines
+
+
+# Recommendations
+
+
+def cpu_share(memory_mb: int) -> float:
+    """Fraction of a vCPU Lambda allocates at memory_mb"""
+    return min(memory_mb, FULL_VCPU_MB) / FULL_VCPU_MB
+
+
+def recommend(
+    stats: GroupStats,
+    memory_mb: int,
+    cpu_ms_full_vcpu: Optional[float],
+    cpu_fraction: Optional[float],
+    arch: str,
+    cost_tolerance: float,
+) -> Optional[Dict]:
+    """Predict duration and cost for each memory option"""
+    if not memory_mb or not stats.duration.count:
+        return None
+
+    # CPU time per invocation at the current memory size
+    if cpu_ms_full_vcpu is not None:
+        cpu_now = min(cpu_ms_full_vcpu / cpu_share(memory_mb), stats.duration.mean)
+    elif cpu_fraction is not None:
+        cpu_now = stats.duration.mean * cpu_fraction
+    else:
+        return None
+
+    needed_mb = max(
+        stats.memory_percentile(99) * (1 + MEMORY_HEADROOM),
+        max(stats.memory_used) if stats.memory_used else 0,
+    )
+    price = PRICE_PER_GB_SECOND[arch]
+    options = []
+    for option_mb in MEMORY_OPTIONS_MB:
+        if option_mb < needed_mb:
+            continue
+        cpu_then = cpu_now * cpu_share(memory_mb) / cpu_share(option_mb)
+        offset = cpu_then - cpu_now
+        mean_ms = stats.duration.shifted_mean(offset)
+        # Billing rounds every invocation up to the next millisecond
+        billed_ms = mean_ms + 0.5
+        options.append(
+            {
+                "memory_mb": option_mb,
+                "p50_ms": max(stats.duration.percentile(50) + offset, 0.0),
+                "p99_ms": max(stats.duration.percentile(99) + offset, 0.0),
+                "mean_ms": mean_ms,
+                "init_p50_ms": stats.init.percentile(50)
+                * cpu_share(memory_mb)
+                / cpu_share(option_mb),
+                "cost_per_million": (
+                    billed_ms / 1000 * option_mb / 1024 * price + PRICE_PER_REQUEST
+                )
+                * 1_000_000,
+            }
+        )
+    if not options:
+        return None
+
+    cheapest = min(options, key=lambda option: option["cost_per_million"])
+    affordable = [
+        option
+        for option in options
+        if option["cost_per_million"]
+        <= cheapest["cost_per_million"] * (1 + cost_tolerance)
+    ]
+    best = min(affordable, key=lambda option: (option["p99_ms"], option["memory_mb"]))
+    return {
+        "cpu_ms_now": cpu_now,
+        "needed_mb": needed_mb,
+        "options": options,
+        "cheapest_mb": cheapest["memory_mb"],
+        "recommended_mb": best["memory_mb"],
+    }
+
+
+def run_benchmarks(functions: List[str], invocations: int) -> Dict[str, float]:
+    """Local CPU time per invocation (ms) for functions with a scenario"""
+    from scripts.log_overhead_benchmark import SCENARIOS, benchmark_function
+
+    results = {}
+    for function in functions:
+        if function not in SCENARIOS:
+            continue
+        print(f"⏱️  Benchmarking {function} locally ({invocations} invocations)...")
+        result = benchmark_function(function, invocations, warmup=50)
+        results[function] = result["us_per_invocation"] / 1000
+    return results
+
+
+def resolve_aliases(functions: List[str], region: Optional[str]) -> Dict:
+    """{(function, version): "alias,alias"} from the deployed aliases"""
+    from scripts.lambda_alias_manager import LambdaAliasManager
+
+    manager = LambdaAliasManager(region)
+    resolved = {}
+    for function in functions:
+        for alias in manager.get_function_aliases(function):
+            key = (function, alias["FunctionVersion"])
+            names = resolved.get(key)
+            resolved[key] = f"{names},{alias['Name']}" if names else alias["Name"]
+    return resolved
+
+
+def print_report(results: List[Dict], lines: int, arch: str):
+    print(f"\n📊 Lambda REPORT analysis ({lines:,} log lines, {arch})")
+    print("=" * 100)
+    for result in results:
+        stats = result["stats"]
+        label = f"{result['function']} @ {result['alias']}"
+        print(
+            f"\n{label}  ({result['memory_mb']} MB, {stats.duration.count:,} invocations)"
+        )
+        print("-" * 100)
+        cold = stats.init.count / stats.duration.count * 100
+        print(
+            f"  Duration        p50 {stats.duration.percentile(50):8.1f}  "
+            f"p90 {stats.duration.percentile(90):8.1f}  "
+            f"p99 {stats.duration.percentile(99):8.1f}  max {stats.duration.max:8.1f} ms"
+        )
+        print(
+            f"  Billed duration mean {stats.billed.mean:7.1f}  "
+            f"p99 {stats.billed.percentile(99):8.1f} ms"
+        )
+        if stats.init.count:
+            print(
+                f"  Init duration   p50 {stats.init.percentile(50):8.1f}  "
+                f"p99 {stats.init.percentile(99):8.1f} ms  ({cold:.1f}% cold starts)"
+            )
+        print(
+            f"  Max memory used p50 {stats.memory_percentile(50):5d}  "
+            f"p99 {stats.memory_percentile(99):5d}  "
+            f"max {max(stats.memory_used):5d} MB of {result['memory_mb']} MB"
+        )
+
+        recommendation = result["recommendation"]
+        if recommendation is None:
+            print(
+                "  ⚠️  No CPU estimate: pass --benchmark or --cpu-ms, "
+                "or include the metrics EMF lines"
+            )
+            continue
+
+        print(
+            f"  CPU time now ~{recommendation['cpu_ms_now']:.1f} ms per invocation "
+            f"({result['cpu_source']})"
+        )
+        print(
+            f"\n  {'Memory':>8} {'p50 ms':>9} {'p99 ms':>9} {'init p50':>9} "
+            f"{'$/1M inv':>10}"
+        )
+        for option in recommendation["options"]:
+            marks = []
+            if option["memory_mb"] == result["memory_mb"]:
+                marks.append("current")
+            if option["memory_mb"] == recommendation["cheapest_mb"]:
+                marks.append("💰 cheapest")
+            if option["memory_mb"] == recommendation["recommended_mb"]:
+                marks.append("✅ recommended")
+            print(
+                f"  {option['memory_mb']:>6}MB {option['p50_ms']:>9.1f} "
+                f"{option['p99_ms']:>9.1f} {option['init_p50_ms']:>9.1f} "
+                f"{option['cost_per_million']:>10.4f}  {', '.join(marks)}"
+            )
+    print("\n" + "=" * 100)
+    print(
+        "Predictions scale CPU time with allocated memory and keep waiting time "
+        "fixed; verify with a canary before changing cdk_stack.py."
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Analyze Lambda REPORT lines and recommend memory sizes"
+    )
+    parser.add_argument("paths", nargs="+", help="log files/directories, - for stdin")
+    parser.add_argument("--function", help="function name for unlabelled input")
+    parser.add_argument("--arch", choices=sorted(PRICE_PER_GB_SECOND), default="x86_64")
+    parser.add_argument(
+        "--benchmark", action="store_true", help="measure CPU time locally"
+    )
+    parser.add_argument("--benchmark-invocations", type=int, default=1000)
+    parser.add_argument(
+        "--cpu-factor",
+        type=float,
+        default=1.0,
+        help="Lambda vCPU time per local CPU second (default 1.0)",
+    )
+    parser.add_argument(
+        "--cpu-ms",
+        action="append",
+        default=[],
+        metavar="FUNCTION=MS",
+        help="CPU ms per invocation at one full vCPU",
+    )
+    parser.add_argument(
+        "--cost-tolerance",
+        type=float,
+        default=0.1,
+        help="extra cost accepted for lower p99 (default 0.1 = 10%%)",
+    )
+    parser.add_argument("--resolve-aliases", action="store_true")
+    parser.add_argument("--region")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args(argv)
+
+    cpu_ms = {}
+    for value in args.cpu_ms:
+        name, _, ms = value.partition("=")
+        try:
+            cpu_ms[name] = float(ms)
+        except ValueError:
+            parser.error(f"--cpu-ms expects FUNCTION=MS, got {value}")
+
+    for path in args.paths:
+        if path != "-" and not os.path.exists(path):
+            print(f"❌ No such file or directory: {path}")
+            sys.exit(1)
+
+    groups, downstream, lines = analyze(args.paths, args.function)
+    if not groups:
+        print(f"❌ No REPORT lines found in {lines:,} log lines")
+        sys.exit(1)
+
+    functions = sorted({function for function, _, _ in groups})
+    if args.benchmark:
+        for function, local_ms in run_benchmarks(
+            functions, args.benchmark_invocations
+        ).items():
+            cpu_ms.setdefault(function, local_ms * args.cpu_factor)
+
+    aliases = {}
+    if args.resolve_aliases:
+        try:
+            aliases = resolve_aliases(functions, args.region)
+        except Exception as e:
+            print(f"⚠️  Could not resolve aliases: {e}")
+
+    results = []
+    for (function, version, memory_mb), stats in sorted(groups.items()):
+        fraction = downstream[function].cpu_fraction if function in downstream else None
+        if function in cpu_ms:
+            source = "benchmark" if args.benchmark else "--cpu-ms"
+        elif fraction is not None:
+            source = f"metrics: {fraction:.0%} of handler time is CPU"
+        else:
+            source = None
+        alias = aliases.get((function, version))
+        results.append(
+            {
+                "function": function,
+                "version": version,
+                "alias": f"{alias} (v{version})" if alias else version,
+                "memory_mb": memory_mb,
+                "stats": stats,
+                "cpu_source": source,
+                "recommendation": recommend(
+                    stats,
+                    memory_mb,
+                    cpu_ms.get(function),
+                    fraction,
+                    args.arch,
+                    args.cost_tolerance,
+                ),
+            }
+        )
+
+    if args.json:
+        print(
+            json.dumps(
+                [
+                    {
+                        "function": result["function"],
+                        "version": result["version"],
+                        "alias": result["alias"],
+                        "memory_mb": result["memory_mb"],
+                        "invocations": result["stats"].duration.count,
+                        "duration_ms": {
+                            "p50": result["stats"].duration.percentile(50),
+                            "p99": result["stats"].duration.percentile(99),
+                            "max": result["stats"].duration.max,
+                        },
+                        "billed_ms_mean": result["stats"].billed.mean,
+                        "init_ms_p50": result["stats"].init.percentile(50),
+                        "cold_starts": result["stats"].init.count,
+                        "max_memory_used_mb_p99": result["stats"].memory_percentile(99),
+                        "recommendation": result["recommendation"],
+                    }
+                    for result in results
+                ],
+                indent=2,
+            )
+        )
+        return
+
+    print_report(results, lines, args.arch)
+
+
+if __name__ == "__main__":
+    main()
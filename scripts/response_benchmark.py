@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Response Benchmark
+Compares building API responses through fresa_common.responses and
+fresa_common.middleware with the per-handler code they replaced
+
+Each case builds the same response both ways, in process, with no I/O:
+
+- the old way: a header dict literal and json.dumps in every return
+  statement, and a try/except around the handler body
+- the new way: responses.respond() / responses.error() with the
+  precomputed header set, and middleware.map_errors() for exceptions
+
+The new way is timed with the standard library encoder and, when orjson
+can be imported, with orjson too. The report shows microseconds per
+response and the body size, which the compact encoding also changes.
+
+Usage:
+    python scripts/response_benchmark.py
+    python scripts/response_benchmark.py -n 200000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "Lambdas", "Layers", "common", "python"))
+
+os.environ.setdefault("METRICS_DISABLED", "true")
+# Logging is measured by log_overhead_benchmark.py; both ways log alike here
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from fresa_common import log, responses
+from fresa_common.deadline import DeadlineExceeded
+from fresa_common.middleware import map_errors
+
+logger = log.get_logger(__name__)
+
+# Realistically sized JWTs, as signUpCustomer returns three of them
+TOKEN = "eyJraWQiOiJrZXkiLCJhbGciOiJSUzI1NiJ9." + "x" * 700 + "." + "s" * 342
+
+SIGN_UP_BODY = {
+    "message": "Authentication successful",
+    "tokens": {
+        "AccessToken": TOKEN,
+        "IdToken": TOKEN,
+        "RefreshToken": TOKEN,
+        "TokenType": "Bearer",
+        "ExpiresIn": 3600,
+    },
+    "userInfo": {
+        "email": "ana@example.com",
+        "firstName": "Ana",
+        "lastName": "López",
+        "dateOfBirth": "1990-01-01",
+        "gender": "female",
+    },
+    "welcomeEmailSent": True,
+}
+
+
+# The old way, as signUpCustomer wrote it
+
+
+def legacy_success():
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type",
+            "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
+        },
+        "body": json.dumps(SIGN_UP_BODY),
+    }
+
+
+def legacy_error():
+    return {
+        "statusCode": 401,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type",
+            "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
+        },
+        "body": json.dumps(
+            {
+                "error": "Authentication failed: Invalid credentials",
+                "code": "NotAuthorizedException",
+            }
+        ),
+    }
+
+
+def legacy_deadline():
+    try:
+        raise DeadlineExceeded("0 ms left")
+    except DeadlineExceeded as e:
+        logger.warning("Deadline exceeded: %s", e)
+        return {
+            "statusCode": 503,
+            "headers": {
+                "Content-Type": "application/json",
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type",
+                "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
+            },
+            "body": json.dumps({"error": "Service busy, please try again"}),
+        }
+
+
+# The new way
+
+
+def shared_success():
+    return responses.respond(200, SIGN_UP_BODY)
+
+
+def shared_error():
+    return responses.error(
+        401, "Authentication failed: Invalid credentials", code="NotAuthorizedException"
+    )
+
+
+@map_errors()
+def _raises_deadline(event, context):
+    raise DeadlineExceeded("0 ms left")
+
+
+def shared_deadline():
+    return _raises_deadline({}, None)
+
+
+CASES: List[Tuple[str, Callable, Callable]] = [
+    ("200 with tokens", legacy_success, shared_success),
+    ("401 error", legacy_error, shared_error),
+    ("503 from an exception", legacy_deadline, shared_deadline),
+]
+
+
+def time_per_call(build: Callable, iterations: int) -> float:
+    """Microseconds per call, best of three runs"""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            build()
+        best = min(best, time.perf_counter() - start)
+    return best / iterations * 1e6
+
+
+def run(iterations: int) -> List[Dict]:
+    backends = ["json"] + (["orjson"] if responses.orjson is not None else [])
+    results = []
+    for name, legacy, shared in CASES:
+        row = {
+            "case": name,
+            "legacy_us": time_per_call(legacy, iterations),
+            "legacy_bytes": len(legacy()["body"].encode("utf-8")),
+        }
+        for backend in backends:
+            os.environ["RESPONSE_JSON_BACKEND"] = backend
+            responses.configure()
+            row[f"{backend}_us"] = time_per_call(shared, iterations)
+            row[f"{backend}_bytes"] = len(shared()["body"].encode("utf-8"))
+        os.environ.pop("RESPONSE_JSON_BACKEND", None)
+        responses.configure()
+        results.append(row)
+    return results
+
+
+def print_report(results: List[Dict]):
+    has_orjson = "orjson_us" in results[0]
+    header = f"{'Response':<24} {'Per handler':>14} {'Shared (json)':>16}"
+    if has_orjson:
+        header += f" {'Shared (orjson)':>18}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        line = (
+            f"{row['case']:<24} "
+            f"{row['legacy_us']:>7.2f} µs {row['legacy_bytes']:>4}B "
+            f"{row['json_us']:>8.2f} µs {row['json_bytes']:>4}B"
+        )
+        if has_orjson:
+            line += f" {row['orjson_us']:>10.2f} µs {row['orjson_bytes']:>4}B"
+        print(line)
+    if not has_orjson:
+        print("\nℹ️  orjson is not installed; only the standard library was timed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time shared response building against the per-handler code"
+    )
+    parser.add_argument(
+        "-n", "--iterations", type=int, default=50000, help="responses per run"
+    )
+    args = parser.parse_args(argv)
+
+    print("🍓 Response Benchmark")
+    print("=" * 40)
+    print_report(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
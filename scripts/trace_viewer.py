@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Trace Viewer
+Prints traces written by the fresa_common.tracing file exporter as trees
+with a timing waterfall, so a whole login (API handler, Cognito triggers and
+every DynamoDB, Cognito, SES and HTTP call) can be read offline
+
+Record traces by running handlers with the file exporter, e.g.:
+    TRACE_EXPORTER=file python scripts/local_test.py test verifyCodeAndAuthHandler
+
+Usage:
+    python scripts/trace_viewer.py                   # most recent trace
+    python scripts/trace_viewer.py --last 5
+    python scripts/trace_viewer.py --trace <trace id>
+    python scripts/trace_viewer.py path/to/traces.jsonl --list
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional
+
+DEFAULT_TRACE_FILE = os.environ.get("TRACE_FILE", "/tmp/fresa-traces.jsonl")
+BAR_WIDTH = 40
+
+
+def load_traces(path: str) -> "OrderedDict[str, List[Dict]]":
+    """Spans grouped by trace id, traces in the order they were first seen"""
+    traces = OrderedDict()
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                span = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"⚠️  Skipping malformed line {line_number}")
+                continue
+            traces.setdefault(span["traceId"], []).append(span)
+    return traces
+
+
+def print_trace(trace_id: str, spans: List[Dict]):
+    spans = sorted(spans, key=lambda span: span["startTime"])
+    span_ids = {span["spanId"] for span in spans}
+    children = defaultdict(list)
+    roots = []
+    for span in spans:
+        # A parent that was not exported (e.g. Lambda's own segment) makes
+        # the span a root of what we have
+        if span.get("parentId") in span_ids:
+            children[span["parentId"]].append(span)
+        else:
+            roots.append(span)
+
+    start = spans[0]["startTime"]
+    end = max(span["endTime"] or span["startTime"] for span in spans)
+    total_ms = max((end - start) * 1000, 0.001)
+
+    print(f"\n📊 Trace {trace_id}  ({len(spans)} spans, {total_ms:.1f} ms)")
+    print("=" * 100)
+
+    def walk(span, depth):
+        offset_ms = (span["startTime"] - start) * 1000
+        duration_ms = span.get("durationMs") or 0
+        bar_start = int(offset_ms / total_ms * BAR_WIDTH)
+        bar_length = max(int(duration_ms / total_ms * BAR_WIDTH), 1)
+        bar = " " * bar_start + "█" * bar_length
+        status = "❌" if span.get("fault") else "⚠️ " if span.get("error") else "  "
+        label = ("  " * depth + span["name"])[:38]
+        print(
+            f"{status} {label:<38} {offset_ms:>8.1f} {duration_ms:>8.1f} ms "
+            f"|{bar:<{BAR_WIDTH}}|"
+        )
+        for child in children[span["spanId"]]:
+            walk(child, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+
+    errors = [span for span in spans if span.get("error")]
+    for span in errors:
+        print(f"   {span['name']}: {span['error']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Print traces from a trace file")
+    parser.add_argument("path", nargs="?", default=DEFAULT_TRACE_FILE)
+    parser.add_argument("--trace", help="trace id (prefix) to print")
+    parser.add_argument("--last", type=int, default=1, help="print the N latest")
+    parser.add_argument("--list", action="store_true", help="list trace ids only")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"❌ No trace file at {args.path}")
+        print("   Run handlers with TRACE_EXPORTER=file to record traces")
+        sys.exit(1)
+
+    traces = load_traces(args.path)
+    if not traces:
+        print(f"⚠️  {args.path} contains no spans")
+        return
+
+    if args.list:
+        for trace_id, spans in traces.items():
+            names = sorted({span["name"] for span in spans if span["kind"] == "server"})
+            print(f"{trace_id}  {len(spans):>4} spans  {', '.join(names)}")
+        return
+
+    if args.trace:
+        selected = [
+            trace_id for trace_id in traces if trace_id.startswith(args.trace.lower())
+        ]
+        if not selected:
+            print(f"❌ No trace matching {args.trace}")
+            sys.exit(1)
+    else:
+        selected = list(traces)[-args.last :]
+
+    for trace_id in selected:
+        print_trace(trace_id, traces[trace_id])
+
+
+if __name__ == "__main__":
+    main()
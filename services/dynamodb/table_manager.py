@@ -4,10 +4,19 @@ DynamoDB Table Manager
 Handles creation, configuration, and management of DynamoDB tables
 """
 
+import base64
 import boto3
+import gzip
 import json
+import queue
+import random
 import sys
 import os
+import threading
+import time
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from typing import Dict, List, Optional
 from pathlib import Path
 
@@ -18,6 +27,80 @@ sys.path.append(
 
 from utils.aws_utils import get_aws_account_info, print_aws_info
 
+TTL_ATTRIBUTE = "ttl"
+
+# Desired state of every table. reconcile compares each spec with
+# describe_table and applies only the differences; a key left out of a spec
+# (stream, point_in_time_recovery, ttl) is not managed.
+#
+#   key       [(name, type)] - partition key, then optional sort key
+#   billing   {"mode": "PAY_PER_REQUEST"} or
+#             {"mode": "PROVISIONED", "read": 5, "write": 5,
+#              "autoscaling": {"read": (5, 100), "write": (5, 100),
+#                              "target": 70.0}}
+#   indexes   {name: {"key": [(name, type)], "projection": "KEYS_ONLY" |
+#              "ALL" | [non-key attributes], "read": n, "write": n}};
+#             indexes use the table's capacity unless they set their own.
+#             e.g. codes by requesting IP or by creation day:
+#               "byIp": {"key": [("ip", "S"), ("lastRequestTime", "N")]},
+#               "byCreatedDate": {"key": [("createdDate", "S")]},
+#             Items without the index key attributes are simply not indexed.
+#   stream    None (disabled) or a StreamViewType such as "NEW_IMAGE"
+#   ttl       attribute, plus how long an item without a ttl is kept after
+#             its newest timestamp when backfilling. VerificationCodes must
+#             outlive recieveEmail's rate limit look-back
+#             (RATE_LIMIT_CONFIG["RESET_THRESHOLD"], 5 hours).
+TABLE_SPECS = {
+    "VerificationCodes": {
+        "key": [("email", "S")],
+        "billing": {"mode": "PAY_PER_REQUEST"},
+        "indexes": {},
+        "stream": None,
+        # Codes live for minutes; nothing worth restoring
+        "point_in_time_recovery": False,
+        "ttl": {
+            "attribute": TTL_ATTRIBUTE,
+            "timestamp_attributes": ["lastRequestTime", "createdAt"],
+            "retention_seconds": 5 * 60 * 60,
+        },
+    },
+    "UserSessions": {
+        "key": [("session_id", "S")],
+        "billing": {"mode": "PAY_PER_REQUEST"},
+        "indexes": {},
+        "stream": None,
+        "point_in_time_recovery": True,
+        "ttl": {
+            "attribute": TTL_ATTRIBUTE,
+            "timestamp_attributes": ["expiresAt", "lastActivity", "createdAt"],
+            "retention_seconds": 30 * 24 * 60 * 60,
+        },
+    },
+}
+
+# Seconds between describe_table polls while a table or index is changing
+POLL_INTERVAL = 2
+
+CAPACITY = {
+    "read": ("ReadCapacityUnits", "DynamoDBReadCapacityUtilization"),
+    "write": ("WriteCapacityUnits", "DynamoDBWriteCapacityUtilization"),
+}
+
+# Export / import
+SCAN_PAGE_ITEMS = 1000
+BATCH_WRITE_ITEMS = 25  # BatchWriteItem maximum
+PARQUET_ROW_GROUP = 10000
+# Share of a provisioned table's capacity an export or import may use, so
+# the auth functions keep theirs. On-demand tables have no fixed capacity.
+TRANSFER_CAPACITY_SHARE = 0.5
+ON_DEMAND_TRANSFER_UNITS = 1000
+THROTTLING_ERRORS = (
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+)
+MAX_TRANSFER_RETRIES = 10
+
 
 class DynamoDBTableManager:
     """Manages DynamoDB tables"""
@@ -27,7 +110,14 @@ class DynamoDBTableManager:
         if region is None:
             region = os.environ.get("AWS_REGION") or "us-east-1"
 
-        self.dynamodb = boto3.client("dynamodb", region_name=region)
+        # DYNAMODB_ENDPOINT_URL points the manager at DynamoDB Local, e.g. to
+        # seed it from an export
+        self.dynamodb = boto3.client(
+            "dynamodb",
+            region_name=region,
+            endpoint_url=os.environ.get("DYNAMODB_ENDPOINT_URL"),
+        )
+        self.autoscaling = boto3.client("application-autoscaling", region_name=region)
         self.region = region
 
     def create_table(
@@ -90,6 +180,744 @@ class DynamoDBTableManager:
             print(f"❌ Error deleting table {table_name}: {e}")
             return False
 
+    def get_ttl_status(self, table_name: str) -> Dict:
+        """TTL status and attribute of a table"""
+        response = self.dynamodb.describe_time_to_live(TableName=table_name)
+        description = response.get("TimeToLiveDescription", {})
+        return {
+            "status": description.get("TimeToLiveStatus", "DISABLED"),
+            "attribute": description.get("AttributeName"),
+        }
+
+    def enable_ttl(self, table_name: str, attribute: str = TTL_ATTRIBUTE) -> bool:
+        """Enable TTL on attribute, doing nothing if it already is"""
+        try:
+            status = self.get_ttl_status(table_name)
+            if status["status"] in ("ENABLED", "ENABLING"):
+                if status["attribute"] == attribute:
+                    print(f"✅ TTL on {table_name}.{attribute}: {status['status']}")
+                    return True
+                # DynamoDB allows one TTL attribute per table
+                print(
+                    f"❌ TTL on {table_name} uses '{status['attribute']}', "
+                    f"expected '{attribute}'; disable it first"
+                )
+                return False
+            if status["status"] == "DISABLING":
+                print(f"⚠️  TTL on {table_name} is being disabled; retry in an hour")
+                return False
+
+            self.dynamodb.update_time_to_live(
+                TableName=table_name,
+                TimeToLiveSpecification={"Enabled": True, "AttributeName": attribute},
+            )
+            print(f"✅ Enabled TTL on {table_name}.{attribute}")
+            return True
+        except Exception as e:
+            print(f"❌ Error enabling TTL on {table_name}: {e}")
+            return False
+
+    def verify_ttl(self, table_name: str, attribute: str = TTL_ATTRIBUTE) -> bool:
+        """True if TTL is enabled (or enabling) on the expected attribute"""
+        try:
+            status = self.get_ttl_status(table_name)
+        except Exception as e:
+            print(f"❌ Error reading TTL for {table_name}: {e}")
+            return False
+        ok = (
+            status["status"] in ("ENABLED", "ENABLING")
+            and status["attribute"] == attribute
+        )
+        icon = "✅" if ok else "❌"
+        print(
+            f"{icon} {table_name}: TTL {status['status']}"
+            + (f" on '{status['attribute']}'" if status["attribute"] else "")
+        )
+        return ok
+
+    def _scan_segment(
+        self, table_name: str, segment: int, total_segments: int, projection: List[str]
+    ):
+        names = {f"#a{i}": name for i, name in enumerate(projection)}
+        paginator = self.dynamodb.get_paginator("scan")
+        for page in paginator.paginate(
+            TableName=table_name,
+            Segment=segment,
+            TotalSegments=total_segments,
+            ProjectionExpression=", ".join(names),
+            ExpressionAttributeNames=names,
+        ):
+            yield from page.get("Items", [])
+
+    def backfill_ttl(
+        self,
+        table_name: str,
+        dry_run: bool = True,
+        segments: int = 4,
+        attribute: str = TTL_ATTRIBUTE,
+    ) -> Dict:
+        """Report items without a ttl and, unless dry_run, give them one
+
+        Each item gets its newest timestamp plus the table's retention, or
+        now plus the retention if it has none. The scan is split into
+        parallel segments and only reads the key and timestamp attributes.
+        """
+        spec = TABLE_SPECS.get(table_name, {})
+        policy = spec.get("ttl")
+        if policy is None:
+            raise ValueError(f"No TTL policy for {table_name}")
+        key = spec["key"][0][0]
+        projection = [key, attribute] + policy["timestamp_attributes"]
+        now = int(time.time())
+
+        def process(segment: int) -> Dict:
+            counts = {"scanned": 0, "missing": 0, "expired": 0, "updated": 0}
+            for item in self._scan_segment(table_name, segment, segments, projection):
+                counts["scanned"] += 1
+                if attribute in item:
+                    continue
+                counts["missing"] += 1
+                newest = max(
+                    (
+                        _epoch_seconds(item[name])
+                        for name in policy["timestamp_attributes"]
+                        if name in item
+                    ),
+                    default=None,
+                )
+                expires = (newest or now) + policy["retention_seconds"]
+                if expires <= now:
+                    counts["expired"] += 1
+                if dry_run:
+                    continue
+                try:
+                    self.dynamodb.update_item(
+                        TableName=table_name,
+                        Key={key: item[key]},
+                        UpdateExpression="SET #ttl = :ttl",
+                        # A writer may have set it since the scan read the item
+                        ConditionExpression="attribute_not_exists(#ttl)",
+                        ExpressionAttributeNames={"#ttl": attribute},
+                        ExpressionAttributeValues={":ttl": {"N": str(expires)}},
+                    )
+                    counts["updated"] += 1
+                except self.dynamodb.exceptions.ConditionalCheckFailedException:
+                    pass
+            return counts
+
+        totals = {"scanned": 0, "missing": 0, "expired": 0, "updated": 0}
+        with ThreadPoolExecutor(max_workers=segments) as pool:
+            for counts in pool.map(process, range(segments)):
+                for key, value in counts.items():
+                    totals[key] += value
+        return totals
+
+    def describe_table(self, table_name: str) -> Optional[Dict]:
+        """describe_table's Table, or None if the table does not exist"""
+        try:
+            return self.dynamodb.describe_table(TableName=table_name)["Table"]
+        except self.dynamodb.exceptions.ResourceNotFoundException:
+            return None
+
+    def plan_table(self, table_name: str, spec: Dict) -> List[Dict]:
+        """Changes that bring table_name in line with spec, in apply order
+
+        Each change has a description and an apply callable; changes that
+        cannot be applied (e.g. a different key schema) have error=True.
+        """
+        description = self.describe_table(table_name)
+        if description is None:
+            changes = [self._create_change(table_name, spec)]
+            # What a freshly created table looks like
+            state = {
+                "ttl": {"status": "DISABLED", "attribute": None},
+                "point_in_time_recovery": False,
+                "scaling": {},
+                "policies": {},
+            }
+        else:
+            changes = self._plan_table_updates(table_name, spec, description)
+            index_names = {
+                index["IndexName"]
+                for index in description.get("GlobalSecondaryIndexes", [])
+            }
+            state = self._read_settings(
+                table_name, spec, index_names | set(spec.get("indexes", {}))
+            )
+        return changes + self._plan_settings(table_name, spec, state)
+
+    def _create_change(self, table_name: str, spec: Dict) -> Dict:
+        billing = spec["billing"]
+        config = {
+            "TableName": table_name,
+            "KeySchema": _key_schema(spec["key"]),
+            "AttributeDefinitions": _attribute_definitions(spec),
+            "BillingMode": billing["mode"],
+        }
+        if billing["mode"] == "PROVISIONED":
+            config["ProvisionedThroughput"] = _throughput(billing)
+        indexes = spec.get("indexes", {})
+        if indexes:
+            config["GlobalSecondaryIndexes"] = [
+                _index_definition(name, index, billing)
+                for name, index in indexes.items()
+            ]
+        if spec.get("stream"):
+            config["StreamSpecification"] = _stream_specification(spec["stream"])
+
+        summary = billing["mode"] + (f", {len(indexes)} indexes" if indexes else "")
+        return {
+            "description": f"create table ({summary})",
+            "apply": lambda: self.dynamodb.create_table(**config),
+            "wait": True,
+        }
+
+    def _update_change(self, table_name: str, description: str, **updates) -> Dict:
+        return {
+            "description": description,
+            "apply": lambda: self.dynamodb.update_table(
+                TableName=table_name, **updates
+            ),
+            "wait": True,
+        }
+
+    def _plan_table_updates(
+        self, table_name: str, spec: Dict, description: Dict
+    ) -> List[Dict]:
+        current_key = [key["AttributeName"] for key in description["KeySchema"]]
+        wanted_key = [name for name, _ in spec["key"]]
+        if current_key != wanted_key:
+            return [
+                _error(
+                    f"key is {current_key}, spec wants {wanted_key}; "
+                    "a key change needs a new table"
+                )
+            ]
+
+        changes = []
+        billing = spec["billing"]
+        wanted_indexes = spec.get("indexes", {})
+        current_indexes = {
+            index["IndexName"]: index
+            for index in description.get("GlobalSecondaryIndexes", [])
+        }
+
+        current_mode = _billing_mode(description)
+        if current_mode != billing["mode"]:
+            updates = {"BillingMode": billing["mode"]}
+            if billing["mode"] == "PROVISIONED":
+                # Every existing index needs capacity in the same call
+                updates["ProvisionedThroughput"] = _throughput(billing)
+                if current_indexes:
+                    updates["GlobalSecondaryIndexUpdates"] = [
+                        {
+                            "Update": {
+                                "IndexName": name,
+                                "ProvisionedThroughput": _throughput(
+                                    billing, wanted_indexes.get(name)
+                                ),
+                            }
+                        }
+                        for name in current_indexes
+                    ]
+            changes.append(
+                self._update_change(
+                    table_name,
+                    f"switch billing {current_mode} -> {billing['mode']}",
+                    **updates,
+                )
+            )
+        elif billing["mode"] == "PROVISIONED" and not billing.get("autoscaling"):
+            # Autoscaled capacity is the scaler's to change, not ours
+            updates = {}
+            if _current_throughput(description) != _throughput(billing):
+                updates["ProvisionedThroughput"] = _throughput(billing)
+            index_updates = [
+                {
+                    "Update": {
+                        "IndexName": name,
+                        "ProvisionedThroughput": _throughput(
+                            billing, wanted_indexes[name]
+                        ),
+                    }
+                }
+                for name, index in current_indexes.items()
+                if name in wanted_indexes
+                and _current_throughput(index)
+                != _throughput(billing, wanted_indexes[name])
+            ]
+            if index_updates:
+                updates["GlobalSecondaryIndexUpdates"] = index_updates
+            if updates:
+                changes.append(
+                    self._update_change(table_name, "update capacity", **updates)
+                )
+
+        # One index may be created or deleted per update_table call
+        for name in current_indexes:
+            if name not in wanted_indexes:
+                changes.append(
+                    self._update_change(
+                        table_name,
+                        f"delete index {name}",
+                        GlobalSecondaryIndexUpdates=[{"Delete": {"IndexName": name}}],
+                    )
+                )
+        for name, index in wanted_indexes.items():
+            if name in current_indexes:
+                current = current_indexes[name]
+                if current["KeySchema"] != _key_schema(index["key"]) or current[
+                    "Projection"
+                ] != _projection(index.get("projection", "KEYS_ONLY")):
+                    changes.append(
+                        _error(
+                            f"index {name} differs from the spec; indexes "
+                            "cannot be altered, add one under a new name"
+                        )
+                    )
+                continue
+            changes.append(
+                self._update_change(
+                    table_name,
+                    f"create index {name}",
+                    AttributeDefinitions=_attribute_definitions(spec),
+                    GlobalSecondaryIndexUpdates=[
+                        {"Create": _index_definition(name, index, billing)}
+                    ],
+                )
+            )
+
+        if "stream" in spec:
+            current = description.get("StreamSpecification", {})
+            current_view = (
+                current.get("StreamViewType") if current.get("StreamEnabled") else None
+            )
+            wanted_view = spec["stream"]
+            if current_view != wanted_view:
+                # A stream's view type cannot change in place
+                if current_view:
+                    changes.append(
+                        self._update_change(
+                            table_name,
+                            "disable stream",
+                            StreamSpecification={"StreamEnabled": False},
+                        )
+                    )
+                if wanted_view:
+                    changes.append(
+                        self._update_change(
+                            table_name,
+                            f"enable {wanted_view} stream",
+                            StreamSpecification=_stream_specification(wanted_view),
+                        )
+                    )
+        return changes
+
+    def _read_settings(self, table_name: str, spec: Dict, index_names) -> Dict:
+        state = {"ttl": self.get_ttl_status(table_name)}
+        if "point_in_time_recovery" in spec:
+            backups = self.dynamodb.describe_continuous_backups(TableName=table_name)
+            recovery = backups["ContinuousBackupsDescription"].get(
+                "PointInTimeRecoveryDescription", {}
+            )
+            state["point_in_time_recovery"] = (
+                recovery.get("PointInTimeRecoveryStatus") == "ENABLED"
+            )
+
+        resource_ids = [_resource_id(table_name)] + [
+            _resource_id(table_name, name) for name in sorted(index_names)
+        ]
+        targets = self.autoscaling.describe_scalable_targets(
+            ServiceNamespace="dynamodb", ResourceIds=resource_ids
+        )["ScalableTargets"]
+        state["scaling"] = {
+            (target["ResourceId"], target["ScalableDimension"]): (
+                target["MinCapacity"],
+                target["MaxCapacity"],
+            )
+            for target in targets
+        }
+        state["policies"] = {}
+        for resource_id in {target["ResourceId"] for target in targets}:
+            policies = self.autoscaling.describe_scaling_policies(
+                ServiceNamespace="dynamodb", ResourceId=resource_id
+            )["ScalingPolicies"]
+            for policy in policies:
+                configuration = policy.get(
+                    "TargetTrackingScalingPolicyConfiguration", {}
+                )
+                state["policies"][
+                    (policy["ResourceId"], policy["ScalableDimension"])
+                ] = configuration.get("TargetValue")
+        return state
+
+    def _plan_settings(self, table_name: str, spec: Dict, state: Dict) -> List[Dict]:
+        changes = []
+
+        ttl = spec.get("ttl")
+        if ttl:
+            status = state["ttl"]
+            if status["status"] in ("ENABLED", "ENABLING"):
+                if status["attribute"] != ttl["attribute"]:
+                    changes.append(
+                        _error(
+                            f"TTL uses '{status['attribute']}', spec wants "
+                            f"'{ttl['attribute']}'; disable it first"
+                        )
+                    )
+            elif status["status"] == "DISABLING":
+                changes.append(_error("TTL is being disabled; retry in an hour"))
+            else:
+                changes.append(
+                    {
+                        "description": f"enable TTL on '{ttl['attribute']}'",
+                        "apply": lambda: self.enable_ttl(table_name, ttl["attribute"]),
+                    }
+                )
+
+        if "point_in_time_recovery" in spec:
+            wanted = spec["point_in_time_recovery"]
+            if state["point_in_time_recovery"] != wanted:
+                changes.append(
+                    {
+                        "description": (
+                            f"{'enable' if wanted else 'disable'} "
+                            "point-in-time recovery"
+                        ),
+                        "apply": lambda: self.dynamodb.update_continuous_backups(
+                            TableName=table_name,
+                            PointInTimeRecoverySpecification={
+                                "PointInTimeRecoveryEnabled": wanted
+                            },
+                        ),
+                    }
+                )
+
+        wanted_targets = _scaling_targets(table_name, spec)
+        for (resource_id, dimension), (low, high, target) in wanted_targets.items():
+            current = state["scaling"].get((resource_id, dimension))
+            current_target = state["policies"].get((resource_id, dimension))
+            if current == (low, high) and current_target == target:
+                continue
+            changes.append(
+                {
+                    "description": (
+                        f"autoscale {_describe_resource(resource_id, dimension)} "
+                        f"{low}-{high} at {target:g}% utilization"
+                    ),
+                    "apply": self._scaling_applier(
+                        resource_id, dimension, low, high, target
+                    ),
+                }
+            )
+        for resource_id, dimension in state["scaling"]:
+            if (resource_id, dimension) not in wanted_targets:
+                changes.append(
+                    {
+                        "description": (
+                            "stop autoscaling "
+                            f"{_describe_resource(resource_id, dimension)}"
+                        ),
+                        "apply": self._deregister_applier(resource_id, dimension),
+                    }
+                )
+        return changes
+
+    def _scaling_applier(
+        self, resource_id: str, dimension: str, low: int, high: int, target: float
+    ):
+        def apply():
+            self.autoscaling.register_scalable_target(
+                ServiceNamespace="dynamodb",
+                ResourceId=resource_id,
+                ScalableDimension=dimension,
+                MinCapacity=low,
+                MaxCapacity=high,
+            )
+            metric = CAPACITY["read" if "Read" in dimension else "write"][1]
+            self.autoscaling.put_scaling_policy(
+                PolicyName=f"{resource_id.replace('/', '-')}-{metric}",
+                ServiceNamespace="dynamodb",
+                ResourceId=resource_id,
+                ScalableDimension=dimension,
+                PolicyType="TargetTrackingScaling",
+                TargetTrackingScalingPolicyConfiguration={
+                    "TargetValue": target,
+                    "PredefinedMetricSpecification": {"PredefinedMetricType": metric},
+                },
+            )
+
+        return apply
+
+    def _deregister_applier(self, resource_id: str, dimension: str):
+        def apply():
+            try:
+                self.autoscaling.deregister_scalable_target(
+                    ServiceNamespace="dynamodb",
+                    ResourceId=resource_id,
+                    ScalableDimension=dimension,
+                )
+            except self.autoscaling.exceptions.ObjectNotFoundException:
+                # Deleting an index can take its targets with it
+                pass
+
+        return apply
+
+    def apply_changes(self, table_name: str, changes: List[Dict]) -> bool:
+        """Apply planned changes in order, stopping at the first failure"""
+        for change in changes:
+            print(f"🔧 [{table_name}] {change['description']}")
+            try:
+                if change["apply"]() is False:
+                    return False
+            except Exception as e:
+                print(f"❌ [{table_name}] {change['description']} failed: {e}")
+                return False
+            # Tables accept one structural change at a time
+            if change.get("wait") and not self.wait_for_table_ready(table_name):
+                return False
+        return True
+
+    def reconcile_table(
+        self, table_name: str, spec: Dict, dry_run: bool = False
+    ) -> bool:
+        """Create or update table_name to match spec"""
+        try:
+            changes = self.plan_table(table_name, spec)
+        except Exception as e:
+            print(f"❌ [{table_name}] Error planning changes: {e}")
+            return False
+
+        errors = [change for change in changes if change.get("error")]
+        for change in errors:
+            print(f"❌ [{table_name}] {change['description']}")
+        if not changes:
+            print(f"✅ [{table_name}] Up to date")
+            return True
+        if dry_run:
+            for change in changes:
+                if not change.get("error"):
+                    print(f"📝 [{table_name}] Would {change['description']}")
+            return not errors
+        if errors:
+            return False
+
+        success = self.apply_changes(table_name, changes)
+        if success:
+            print(f"✅ [{table_name}] Reconciled ({len(changes)} changes)")
+        return success
+
+    def reconcile_tables(self, specs: Dict[str, Dict], dry_run: bool = False) -> bool:
+        """Reconcile independent tables concurrently"""
+        if not specs:
+            return True
+        with ThreadPoolExecutor(max_workers=len(specs)) as pool:
+            results = list(
+                pool.map(
+                    lambda name: self.reconcile_table(name, specs[name], dry_run),
+                    specs,
+                )
+            )
+        return all(results)
+
+    def wait_for_table_ready(
+        self, table_name: str, timeout: int = 1800, delay: int = POLL_INTERVAL
+    ) -> bool:
+        """Wait until the table and all its indexes are ACTIVE
+
+        Index backfills can take much longer than creating a table, hence
+        the long default timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            description = self.describe_table(table_name)
+            if description and description["TableStatus"] == "ACTIVE":
+                indexes = description.get("GlobalSecondaryIndexes", [])
+                if all(index["IndexStatus"] == "ACTIVE" for index in indexes):
+                    return True
+            if time.monotonic() > deadline:
+                print(f"❌ [{table_name}] Not ready after {timeout}s")
+                return False
+            time.sleep(delay)
+
+    def _throttle(
+        self, table_name: str, capacity: str, max_units: Optional[float]
+    ) -> "CapacityThrottle":
+        if max_units:
+            return CapacityThrottle(max_units)
+        description = self.describe_table(table_name)
+        if description is None:
+            raise ValueError(f"Table {table_name} does not exist")
+        if _billing_mode(description) == "PROVISIONED":
+            provisioned = description["ProvisionedThroughput"][capacity]
+            return CapacityThrottle(max(provisioned * TRANSFER_CAPACITY_SHARE, 1))
+        # Ramp up rather than hit a cold on-demand table at full rate
+        return CapacityThrottle(
+            ON_DEMAND_TRANSFER_UNITS, start=ON_DEMAND_TRANSFER_UNITS / 4
+        )
+
+    def _call(self, throttle: "CapacityThrottle", operation, **kwargs) -> Dict:
+        """operation(**kwargs), backing the throttle off while DynamoDB throttles"""
+        for attempt in range(MAX_TRANSFER_RETRIES):
+            try:
+                return operation(**kwargs)
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in THROTTLING_ERRORS:
+                    raise
+                throttle.backoff()
+                time.sleep(_backoff_delay(attempt))
+        return operation(**kwargs)
+
+    def export_table(
+        self,
+        table_name: str,
+        path: str,
+        segments: int = 4,
+        max_units: Optional[float] = None,
+    ) -> Dict:
+        """Stream every item of table_name to path with a parallel scan
+
+        path ending in .jsonl writes one DynamoDB JSON item per line (.gz
+        compresses it); .parquet writes columns (requires pyarrow). Pages
+        pass through a bounded queue to a single writer, so memory use does
+        not grow with the table.
+        """
+        throttle = self._throttle(table_name, "ReadCapacityUnits", max_units)
+        pages = queue.Queue(maxsize=segments * 2)
+        stop = threading.Event()
+        done = object()
+        started = time.monotonic()
+
+        def scan(segment: int):
+            try:
+                kwargs = {
+                    "TableName": table_name,
+                    "Segment": segment,
+                    "TotalSegments": segments,
+                    "Limit": SCAN_PAGE_ITEMS,
+                    "ReturnConsumedCapacity": "TOTAL",
+                }
+                while not stop.is_set():
+                    response = self._call(throttle, self.dynamodb.scan, **kwargs)
+                    throttle.consume(
+                        response.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+                    )
+                    pages.put(response.get("Items", []))
+                    if "LastEvaluatedKey" not in response:
+                        break
+                    kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+            except Exception as e:
+                pages.put(e)
+            finally:
+                pages.put(done)
+
+        items = 0
+        error = None
+        writer = _item_writer(path)
+        try:
+            with ThreadPoolExecutor(max_workers=segments) as pool:
+                for segment in range(segments):
+                    pool.submit(scan, segment)
+                finished = 0
+                # Keep draining after an error so no worker blocks on put
+                while finished < segments:
+                    page = pages.get()
+                    if page is done:
+                        finished += 1
+                    elif isinstance(page, Exception):
+                        error = error or page
+                        stop.set()
+                    elif error is None:
+                        writer.write(page)
+                        items += len(page)
+        finally:
+            writer.close()
+        if error:
+            raise error
+        return throttle.stats(items, time.monotonic() - started)
+
+    def import_table(
+        self,
+        table_name: str,
+        path: str,
+        workers: int = 4,
+        max_units: Optional[float] = None,
+    ) -> Dict:
+        """Write every item in an export file to table_name
+
+        Items are read as a stream and written by a pool of BatchWriteItem
+        workers; unprocessed items are retried with backoff. Existing items
+        with the same key are overwritten.
+        """
+        throttle = self._throttle(table_name, "WriteCapacityUnits", max_units)
+        batches = queue.Queue(maxsize=workers * 2)
+        errors = []
+        started = time.monotonic()
+
+        def write() -> int:
+            written = 0
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    return written
+                if errors:
+                    continue  # drain so the reader never blocks
+                try:
+                    written += self._write_batch(table_name, batch, throttle)
+                except Exception as e:
+                    errors.append(e)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(write) for _ in range(workers)]
+            try:
+                batch = []
+                for item in _read_items(path):
+                    batch.append({"PutRequest": {"Item": item}})
+                    if len(batch) == BATCH_WRITE_ITEMS:
+                        batches.put(batch)
+                        batch = []
+                        if errors:
+                            break
+                if batch and not errors:
+                    batches.put(batch)
+            finally:
+                for _ in futures:
+                    batches.put(None)
+            items = sum(future.result() for future in futures)
+        if errors:
+            raise errors[0]
+        return throttle.stats(items, time.monotonic() - started)
+
+    def _write_batch(
+        self, table_name: str, requests: List[Dict], throttle: "CapacityThrottle"
+    ) -> int:
+        written = 0
+        for attempt in range(MAX_TRANSFER_RETRIES):
+            response = self._call(
+                throttle,
+                self.dynamodb.batch_write_item,
+                RequestItems={table_name: requests},
+                ReturnConsumedCapacity="TOTAL",
+            )
+            throttle.consume(
+                sum(
+                    consumed.get("CapacityUnits", 0)
+                    for consumed in response.get("ConsumedCapacity", [])
+                )
+            )
+            unprocessed = response.get("UnprocessedItems", {}).get(table_name, [])
+            written += len(requests) - len(unprocessed)
+            if not unprocessed:
+                return written
+            # Unprocessed items are DynamoDB throttling part of the batch
+            throttle.backoff()
+            time.sleep(_backoff_delay(attempt))
+            requests = unprocessed
+        raise RuntimeError(
+            f"{len(requests)} items still unprocessed after "
+            f"{MAX_TRANSFER_RETRIES} attempts"
+        )
+
     def wait_for_table_active(self, table_name: str, timeout: int = 300) -> bool:
         """Wait for table to become active"""
         try:
@@ -105,94 +933,383 @@ class DynamoDBTableManager:
             return False
 
 
-def create_verification_codes_table() -> bool:
-    """Create the VerificationCodes table for email verification"""
-    manager = DynamoDBTableManager()
+def _epoch_seconds(value: Dict) -> Optional[int]:
+    """Epoch seconds from a number or ISO 8601 string attribute"""
+    try:
+        if "N" in value:
+            return int(float(value["N"]))
+        if "S" in value:
+            return int(datetime.fromisoformat(value["S"]).timestamp())
+    except ValueError:
+        pass
+    return None
 
-    table_name = "VerificationCodes"
 
-    # Check if table already exists
-    if manager.table_exists(table_name):
-        print(f"✅ Table {table_name} already exists")
-        return True
+# Spec -> DynamoDB API shapes
 
-    # Define table schema
-    key_schema = [{"AttributeName": "email", "KeyType": "HASH"}]  # Partition key
 
-    attribute_definitions = [{"AttributeName": "email", "AttributeType": "S"}]  # String
+def _error(description: str) -> Dict:
+    return {"description": description, "error": True}
 
-    # Create table
-    success = manager.create_table(
-        table_name=table_name,
-        key_schema=key_schema,
-        attribute_definitions=attribute_definitions,
-        billing_mode="PAY_PER_REQUEST",
-    )
 
-    if success:
-        # Wait for table to be active
-        manager.wait_for_table_active(table_name)
-        print(f"✅ VerificationCodes table created and ready")
+def _key_schema(key: List) -> List[Dict]:
+    return [
+        {"AttributeName": name, "KeyType": key_type}
+        for (name, _), key_type in zip(key, ("HASH", "RANGE"))
+    ]
 
-    return success
 
+def _attribute_definitions(spec: Dict) -> List[Dict]:
+    """Every key attribute of the table and its indexes, once"""
+    types = dict(spec["key"])
+    for index in spec.get("indexes", {}).values():
+        types.update(dict(index["key"]))
+    return [
+        {"AttributeName": name, "AttributeType": attribute_type}
+        for name, attribute_type in types.items()
+    ]
 
-def create_user_sessions_table() -> bool:
-    """Create the UserSessions table for user session management"""
-    manager = DynamoDBTableManager()
 
-    table_name = "UserSessions"
+def _projection(projection) -> Dict:
+    if isinstance(projection, str):
+        return {"ProjectionType": projection}
+    return {"ProjectionType": "INCLUDE", "NonKeyAttributes": list(projection)}
 
-    # Check if table already exists
-    if manager.table_exists(table_name):
-        print(f"✅ Table {table_name} already exists")
-        return True
 
-    # Define table schema
-    key_schema = [{"AttributeName": "session_id", "KeyType": "HASH"}]  # Partition key
+def _throughput(billing: Dict, index: Optional[Dict] = None) -> Dict:
+    source = index if index and "read" in index else billing
+    return {
+        "ReadCapacityUnits": source["read"],
+        "WriteCapacityUnits": source["write"],
+    }
+
+
+def _current_throughput(description: Dict) -> Dict:
+    throughput = description.get("ProvisionedThroughput", {})
+    return {
+        "ReadCapacityUnits": throughput.get("ReadCapacityUnits"),
+        "WriteCapacityUnits": throughput.get("WriteCapacityUnits"),
+    }
+
+
+def _index_definition(name: str, index: Dict, billing: Dict) -> Dict:
+    definition = {
+        "IndexName": name,
+        "KeySchema": _key_schema(index["key"]),
+        "Projection": _projection(index.get("projection", "KEYS_ONLY")),
+    }
+    if billing["mode"] == "PROVISIONED":
+        definition["ProvisionedThroughput"] = _throughput(billing, index)
+    return definition
+
+
+def _stream_specification(view_type: str) -> Dict:
+    return {"StreamEnabled": True, "StreamViewType": view_type}
+
+
+def _billing_mode(description: Dict) -> str:
+    # Tables created before on-demand existed have no BillingModeSummary
+    return description.get("BillingModeSummary", {}).get("BillingMode", "PROVISIONED")
+
+
+def _resource_id(table_name: str, index_name: Optional[str] = None) -> str:
+    """Application Auto Scaling's id for a table or one of its indexes"""
+    if index_name:
+        return f"table/{table_name}/index/{index_name}"
+    return f"table/{table_name}"
+
+
+def _describe_resource(resource_id: str, dimension: str) -> str:
+    name = resource_id.split("/", 1)[1].replace("/index/", " index ")
+    return f"{name} {dimension.rsplit(':', 1)[1]}"
+
 
-    attribute_definitions = [
-        {"AttributeName": "session_id", "AttributeType": "S"}  # String
+def _scaling_targets(table_name: str, spec: Dict) -> Dict:
+    """{(resource id, dimension): (min, max, target %)} the spec asks for"""
+    billing = spec["billing"]
+    autoscaling = billing.get("autoscaling")
+    if billing["mode"] != "PROVISIONED" or not autoscaling:
+        return {}
+    resources = [("table", _resource_id(table_name))] + [
+        ("index", _resource_id(table_name, name)) for name in spec.get("indexes", {})
     ]
+    targets = {}
+    for kind, resource_id in resources:
+        for capacity, (units, _) in CAPACITY.items():
+            low, high = autoscaling[capacity]
+            dimension = f"dynamodb:{kind}:{units}"
+            targets[(resource_id, dimension)] = (low, high, autoscaling["target"])
+    return targets
 
-    # Create table
-    success = manager.create_table(
-        table_name=table_name,
-        key_schema=key_schema,
-        attribute_definitions=attribute_definitions,
-        billing_mode="PAY_PER_REQUEST",
-    )
 
-    if success:
-        # Wait for table to be active
-        manager.wait_for_table_active(table_name)
-        print(f"✅ UserSessions table created and ready")
+# Export / import
 
-    return success
+
+class CapacityThrottle:
+    """Paces workers to an adaptive consumed-capacity rate
+
+    Shared by the workers of one export or import. Every call books the
+    units it consumed and sleeps until the aggregate rate is back under
+    the limit. The limit creeps back up by a twentieth of the maximum per
+    second while calls succeed and halves when DynamoDB throttles - once per
+    second at most, since every worker sees the same throttling.
+    """
+
+    def __init__(self, max_per_second: float, start: Optional[float] = None):
+        self.max_per_second = max_per_second
+        self.limit = start or max_per_second
+        self.step = max_per_second / 20
+        self.lock = threading.Lock()
+        self.next_free = self.last_adjusted = time.monotonic()
+        self.last_backoff = 0.0
+        self.consumed = 0.0
+        self.throttled = 0
+
+    def consume(self, units: float):
+        with self.lock:
+            now = time.monotonic()
+            self.limit = min(
+                self.max_per_second,
+                self.limit + self.step * (now - self.last_adjusted),
+            )
+            self.last_adjusted = now
+            self.consumed += units
+            self.next_free = max(self.next_free, now) + units / self.limit
+            delay = self.next_free - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def backoff(self):
+        with self.lock:
+            self.throttled += 1
+            now = time.monotonic()
+            if now - self.last_backoff < 1:
+                return
+            self.limit = max(self.limit / 2, self.step)
+            self.last_adjusted = self.last_backoff = now
+
+    def stats(self, items: int, seconds: float) -> Dict:
+        return {
+            "items": items,
+            "seconds": seconds,
+            "capacity_units": self.consumed,
+            "throttled": self.throttled,
+        }
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff, capped at 20 seconds"""
+    return random.uniform(0, min(20.0, 0.1 * 2**attempt))
+
+
+def _to_json(value):
+    # Binary attributes come back from boto3 as bytes
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _from_json(value: Dict) -> Dict:
+    """A typed attribute value from JSON, with binary values decoded"""
+    if "B" in value:
+        return {"B": base64.b64decode(value["B"])}
+    if "BS" in value:
+        return {"BS": [base64.b64decode(entry) for entry in value["BS"]]}
+    if "L" in value:
+        return {"L": [_from_json(entry) for entry in value["L"]]}
+    if "M" in value:
+        return {"M": {name: _from_json(entry) for name, entry in value["M"].items()}}
+    return value
+
+
+def _open_text(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("pyarrow not available. Install with: pip install pyarrow")
+    return pyarrow
+
+
+class _JsonLinesWriter:
+    def __init__(self, path: str):
+        self.file = _open_text(path, "w")
+
+    def write(self, items: List[Dict]):
+        for item in items:
+            self.file.write(json.dumps(item, default=_to_json) + "\n")
+
+    def close(self):
+        self.file.close()
 
 
-def create_all_tables() -> bool:
-    """Create all required tables for the application"""
-    print("🚀 Creating all DynamoDB tables...")
+class _ParquetWriter:
+    """One column per attribute, typed from the first row group
 
-    success = True
+    Strings, numbers and booleans get native columns; other types, and
+    values whose type differs from their column's, are kept as DynamoDB
+    JSON in the _extra column. Numbers become doubles, so use JSON lines
+    for an exact backup.
+    """
 
-    # Create verification codes table
-    if not create_verification_codes_table():
-        success = False
+    NATIVE = ("S", "N", "BOOL")
 
-    # Create user sessions table
-    if not create_user_sessions_table():
-        success = False
+    def __init__(self, path: str):
+        self.pa = _import_pyarrow()
+        self.path = path
+        self.rows = []
+        self.types = None
+        self.writer = None
+
+    def write(self, items: List[Dict]):
+        self.rows.extend(items)
+        if len(self.rows) >= PARQUET_ROW_GROUP:
+            self._flush()
+
+    def _open(self):
+        seen = {}
+        for item in self.rows:
+            for name, value in item.items():
+                seen.setdefault(name, set()).update(value)
+        self.types = {
+            name: (
+                kinds.pop() if len(kinds) == 1 and kinds <= set(self.NATIVE) else "JSON"
+            )
+            for name, kinds in seen.items()
+        }
+        arrow_types = {
+            "S": self.pa.string(),
+            "N": self.pa.float64(),
+            "BOOL": self.pa.bool_(),
+            "JSON": self.pa.string(),
+        }
+        fields = [
+            self.pa.field(name, arrow_types[kind]) for name, kind in self.types.items()
+        ] + [self.pa.field("_extra", self.pa.string())]
+        schema = self.pa.schema(
+            fields, metadata={"dynamodb_types": json.dumps(self.types)}
+        )
+        self.writer = self.pa.parquet.ParquetWriter(
+            self.path, schema, compression="zstd"
+        )
+
+    def _flush(self):
+        if self.writer is None:
+            self._open()
+        columns = {name: [] for name in self.types}
+        extra = []
+        for item in self.rows:
+            leftover = {
+                name: value for name, value in item.items() if name not in self.types
+            }
+            for name, kind in self.types.items():
+                value = item.get(name)
+                if value is not None and kind == "JSON":
+                    value = json.dumps(value, default=_to_json)
+                elif value is not None and kind in value:
+                    value = float(value["N"]) if kind == "N" else value[kind]
+                elif value is not None:
+                    leftover[name] = value
+                    value = None
+                columns[name].append(value)
+            extra.append(json.dumps(leftover, default=_to_json) if leftover else None)
+        columns["_extra"] = extra
+        self.writer.write_table(
+            self.pa.Table.from_pydict(columns, schema=self.writer.schema)
+        )
+        self.rows = []
+
+    def close(self):
+        if self.rows or self.writer is None:
+            self._flush()
+        self.writer.close()
+
+
+def _item_writer(path: str):
+    if path.endswith(".parquet"):
+        return _ParquetWriter(path)
+    return _JsonLinesWriter(path)
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _read_parquet(path: str):
+    parquet = _import_pyarrow().parquet.ParquetFile(path)
+    types = json.loads(parquet.schema_arrow.metadata[b"dynamodb_types"])
+    for batch in parquet.iter_batches(batch_size=PARQUET_ROW_GROUP):
+        for row in batch.to_pylist():
+            item = {}
+            for name, kind in types.items():
+                value = row.get(name)
+                if value is None:
+                    continue
+                if kind == "JSON":
+                    item[name] = _from_json(json.loads(value))
+                elif kind == "N":
+                    item[name] = {"N": _format_number(value)}
+                else:
+                    item[name] = {kind: value}
+            for name, value in json.loads(row.get("_extra") or "{}").items():
+                item[name] = _from_json(value)
+            yield item
+
+
+def _read_items(path: str):
+    """Yield the items of an export file one at a time"""
+    if path.endswith(".parquet"):
+        yield from _read_parquet(path)
+        return
+    with _open_text(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield {
+                    name: _from_json(value) for name, value in json.loads(line).items()
+                }
+
+
+def create_verification_codes_table() -> bool:
+    """Create (or bring up to date) the VerificationCodes table"""
+    manager = DynamoDBTableManager()
+    return manager.reconcile_table(
+        "VerificationCodes", TABLE_SPECS["VerificationCodes"]
+    )
+
+
+def create_user_sessions_table() -> bool:
+    """Create (or bring up to date) the UserSessions table"""
+    manager = DynamoDBTableManager()
+    return manager.reconcile_table("UserSessions", TABLE_SPECS["UserSessions"])
+
+
+def create_all_tables(dry_run: bool = False) -> bool:
+    """Create or update all required tables, concurrently"""
+    print("🚀 Reconciling all DynamoDB tables...")
+
+    success = DynamoDBTableManager().reconcile_tables(TABLE_SPECS, dry_run=dry_run)
 
     if success:
-        print("✅ All DynamoDB tables created successfully")
+        print("✅ All DynamoDB tables match their specs")
     else:
-        print("❌ Some tables failed to create")
+        print("❌ Some tables failed to reconcile")
 
     return success
 
 
+def _option(name: str, cast, default=None):
+    """Value following name on the command line, or default"""
+    if name in sys.argv[:-1]:
+        return cast(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+
 def main():
     """Command line interface"""
     if len(sys.argv) < 2:
@@ -201,8 +1318,25 @@ def main():
         print("  python services/dynamodb/table_manager.py create-verification")
         print("  python services/dynamodb/table_manager.py create-sessions")
         print("  python services/dynamodb/table_manager.py create-all")
+        print("  python services/dynamodb/table_manager.py plan [table_name]")
+        print("  python services/dynamodb/table_manager.py reconcile [table_name]")
         print("  python services/dynamodb/table_manager.py info <table_name>")
         print("  python services/dynamodb/table_manager.py delete <table_name>")
+        print("  python services/dynamodb/table_manager.py enable-ttl [table_name]")
+        print("  python services/dynamodb/table_manager.py verify-ttl [table_name]")
+        print("  python services/dynamodb/table_manager.py ttl-report <table_name>")
+        print(
+            "  python services/dynamodb/table_manager.py ttl-backfill <table_name> [--yes]"
+        )
+        print(
+            "  python services/dynamodb/table_manager.py export <table_name> <file> "
+            "[--segments N] [--max-units N]"
+        )
+        print(
+            "  python services/dynamodb/table_manager.py import <file> <table_name> "
+            "[--workers N] [--max-units N]"
+        )
+        print("    <file>: .jsonl, .jsonl.gz or .parquet (needs pyarrow)")
         sys.exit(1)
 
     command = sys.argv[1]
@@ -231,6 +1365,16 @@ def main():
     elif command == "create-all":
         create_all_tables()
 
+    elif command in ("plan", "reconcile"):
+        names = sys.argv[2:3] or list(TABLE_SPECS)
+        unknown = [name for name in names if name not in TABLE_SPECS]
+        if unknown:
+            print(f"❌ No spec for {unknown[0]}; known: {', '.join(TABLE_SPECS)}")
+            sys.exit(1)
+        specs = {name: TABLE_SPECS[name] for name in names}
+        if not manager.reconcile_tables(specs, dry_run=command == "plan"):
+            sys.exit(1)
+
     elif command == "info":
         if len(sys.argv) < 3:
             print("❌ Table name required")
@@ -249,6 +1393,68 @@ def main():
         else:
             print(f"❌ Table {table_name} not found")
 
+    elif command in ("enable-ttl", "verify-ttl"):
+        tables = sys.argv[2:3] or list(TABLE_SPECS)
+        action = manager.enable_ttl if command == "enable-ttl" else manager.verify_ttl
+        results = [action(table_name) for table_name in tables]
+        if not all(results):
+            sys.exit(1)
+
+    elif command in ("ttl-report", "ttl-backfill"):
+        if len(sys.argv) < 3:
+            print("❌ Table name required")
+            sys.exit(1)
+
+        table_name = sys.argv[2]
+        dry_run = command == "ttl-report" or "--yes" not in sys.argv
+        manager.verify_ttl(table_name)
+        totals = manager.backfill_ttl(table_name, dry_run=dry_run)
+        print(f"📊 {table_name}: scanned {totals['scanned']} items")
+        print(f"   Without {TTL_ATTRIBUTE}: {totals['missing']}")
+        print(f"   Already past retention: {totals['expired']}")
+        if dry_run:
+            if command == "ttl-backfill" and totals["missing"]:
+                print("⚠️  Dry run; pass --yes to write the ttl values")
+        else:
+            print(f"✅ Backfilled {totals['updated']} items")
+
+    elif command in ("export", "import"):
+        if len(sys.argv) < 4:
+            print("❌ Table name and file required")
+            sys.exit(1)
+
+        if command == "export":
+            table_name, path = sys.argv[2], sys.argv[3]
+        else:
+            path, table_name = sys.argv[2], sys.argv[3]
+        max_units = _option("--max-units", float)
+        try:
+            if command == "export":
+                stats = manager.export_table(
+                    table_name,
+                    path,
+                    segments=_option("--segments", int, 4),
+                    max_units=max_units,
+                )
+            else:
+                stats = manager.import_table(
+                    table_name,
+                    path,
+                    workers=_option("--workers", int, 4),
+                    max_units=max_units,
+                )
+        except Exception as e:
+            print(f"❌ Error during {command} of {table_name}: {e}")
+            sys.exit(1)
+
+        rate = stats["items"] / max(stats["seconds"], 0.001)
+        verb = "Exported" if command == "export" else "Imported"
+        print(f"✅ {verb} {stats['items']} items in {stats['seconds']:.1f}s")
+        print(f"   Throughput: {rate:.0f} items/s")
+        print(f"   Capacity consumed: {stats['capacity_units']:.1f} units")
+        if stats["throttled"]:
+            print(f"⚠️  Throttled {stats['throttled']} times; rate was backed off")
+
     elif command == "delete":
         if len(sys.argv) < 3:
             print("❌ Table name required")
@@ -17,9 +17,9 @@ sys.path.append(
 from utils.aws_utils import get_aws_account_info, print_aws_info
 
 
-def create_welcome_template_with_logo(template_name, logo_url):
+def build_welcome_template(template_name, logo_url):
     """
-    Create or update a welcome email template with a logo
+    Render the welcome email template with a logo, without sending it to SES
     """
     subject = "Fresa: ¡{{greeting}} {{name}}! 🎉"
 
@@ -180,32 +180,32 @@ support@fresa.live
 © 2025 Fresa. Todos los derechos reservados.
 """
 
+    return {
+        "TemplateName": template_name,
+        "SubjectPart": subject,
+        "HtmlPart": html_body,
+        "TextPart": text_body,
+    }
+
+
+def create_welcome_template_with_logo(template_name, logo_url):
+    """
+    Create or update a welcome email template with a logo
+    """
+    template = build_welcome_template(template_name, logo_url)
+
     ses_client = boto3.client(
         "ses", region_name=os.environ.get("AWS_REGION", "us-east-1")
     )
 
     try:
-        response = ses_client.update_template(
-            Template={
-                "TemplateName": template_name,
-                "SubjectPart": subject,
-                "HtmlPart": html_body,
-                "TextPart": text_body,
-            }
-        )
+        response = ses_client.update_template(Template=template)
         print(f"✅ Welcome template actualizado con éxito: {template_name}")
         return response
     except ses_client.exceptions.TemplateDoesNotExistException:
         print(f"📝 Template '{template_name}' no existe. Creándolo...")
         try:
-            response = ses_client.create_template(
-                Template={
-                    "TemplateName": template_name,
-                    "SubjectPart": subject,
-                    "HtmlPart": html_body,
-                    "TextPart": text_body,
-                }
-            )
+            response = ses_client.create_template(Template=template)
             print(f"✅ Welcome template creado con éxito: {template_name}")
             return response
         except Exception as e:
@@ -19,12 +19,14 @@ sys.path.append(
 from utils.aws_utils import get_aws_account_info, print_aws_info
 
 # Import the user's original scripts
-from services.ses.create_verification_template import create_ses_template_with_logo
-from services.ses.create_welcome_template import (
-    create_welcome_template_with_logo,
-    get_gendered_template_data,
-)
+from services.ses.create_welcome_template import get_gendered_template_data
 from services.ses.remove_template import delete_ses_template
+from services.ses.template_sync import (
+    DEFAULT_LOGO_URL,
+    DEFAULT_TEMPLATES,
+    content_hash,
+    sync_templates,
+)
 from services.ses.test_aws_credentials import test_aws_credentials
 
 
@@ -135,15 +137,21 @@ class SESTemplateManager:
         html_content: str,
         text_content: str = None,
     ) -> bool:
-        """Create template if it doesn't exist, otherwise update it"""
-        if self.template_exists(template_name):
-            return self.update_template(
-                template_name, subject, html_content, text_content
-            )
-        else:
+        """Create template if it doesn't exist, update it only if it changed"""
+        current = self.get_template(template_name)
+        if not current:
             return self.create_template(
                 template_name, subject, html_content, text_content
             )
+        wanted = {
+            "SubjectPart": subject,
+            "HtmlPart": html_content,
+            "TextPart": text_content,
+        }
+        if content_hash(current) == content_hash(wanted):
+            print(f"⏭️  SES template unchanged: {template_name}")
+            return True
+        return self.update_template(template_name, subject, html_content, text_content)
 
 
 def load_template_from_file(template_path: str) -> Dict:
@@ -156,50 +164,29 @@ def load_template_from_file(template_path: str) -> Dict:
         return {}
 
 
-def create_default_templates():
-    """Create default SES templates using the user's original scripts"""
-    print("🍓 Creating Fresa SES Templates")
+def create_default_templates(force: bool = False):
+    """Create or update the default SES templates that changed"""
+    print("🍓 Syncing Fresa SES Templates")
     print("=" * 40)
 
     # Print AWS info
     print_aws_info()
 
-    success = True
-
-    # Create verification template using user's script
-    print("\n📧 Creating verification template...")
-    verification_result = create_ses_template_with_logo(
-        template_name="fresa-verificacion-template",
-        logo_url="https://fresaassets.s3.us-east-1.amazonaws.com/fresaicon.png",
-    )
-
-    if verification_result:
-        print("✅ Verification template created successfully")
-    else:
-        print("❌ Failed to create verification template")
-        success = False
-
-    # Create welcome template using user's script
-    print("\n📧 Creating welcome template...")
-    welcome_result = create_welcome_template_with_logo(
-        template_name="fresa-welcome-template",
-        logo_url="https://fresaassets.s3.us-east-1.amazonaws.com/fresaicon.png",
-    )
-
-    if welcome_result:
-        print("✅ Welcome template created successfully")
-    else:
-        print("❌ Failed to create welcome template")
-        success = False
-
+    success = sync_templates(force=force)
     if success:
-        print("\n🎉 All Fresa SES templates created successfully!")
+        print("\n🎉 All Fresa SES templates are up to date!")
     else:
-        print("\n❌ Some templates failed to create")
+        print("\n❌ Some templates failed to sync")
 
     return success
 
 
+def sync_default_template(template_name: str) -> bool:
+    """Sync one of the default templates"""
+    build = DEFAULT_TEMPLATES[template_name]
+    return sync_templates([build(template_name, DEFAULT_LOGO_URL)])
+
+
 def main():
     """Command line interface"""
     if len(sys.argv) < 2:
@@ -216,6 +203,7 @@ def main():
         )
         print("  python services/ses/template_manager.py delete <template_name>")
         print("  python services/ses/template_manager.py create-defaults")
+        print("  python services/ses/template_manager.py sync [--force] [--dry-run]")
         print("  python services/ses/template_manager.py create-verification")
         print("  python services/ses/template_manager.py create-welcome")
         print("  python services/ses/template_manager.py test-credentials")
@@ -292,12 +280,15 @@ def main():
     elif command == "create-defaults":
         create_default_templates()
 
+    elif command == "sync":
+        if not sync_templates(
+            force="--force" in sys.argv[2:], dry_run="--dry-run" in sys.argv[2:]
+        ):
+            sys.exit(1)
+
     elif command == "create-verification":
         print("📧 Creating verification template...")
-        result = create_ses_template_with_logo(
-            template_name="fresa-verificacion-template",
-            logo_url="https://fresaassets.s3.us-east-1.amazonaws.com/fresaicon.png",
-        )
+        result = sync_default_template("fresa-verificacion-template")
         if result:
             print("✅ Verification template created successfully!")
         else:
@@ -305,10 +296,7 @@ def main():
 
     elif command == "create-welcome":
         print("📧 Creating welcome template...")
-        result = create_welcome_template_with_logo(
-            template_name="fresa-welcome-template",
-            logo_url="https://fresaassets.s3.us-east-1.amazonaws.com/fresaicon.png",
-        )
+        result = sync_default_template("fresa-welcome-template")
         if result:
             print("✅ Welcome template created successfully!")
         else:
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Fresa SES Template Renderer
+Renders the SES templates locally, the way SES fills them in, so changes can
+be checked without sending email
+
+SES templates are Handlebars. Ours only use plain placeholders, which SES
+fills in like this:
+
+- {{name}} is replaced by the value of "name" in the template data,
+  HTML-escaped in the HTML part and as is in the subject and text parts
+- {{{name}}} is replaced without escaping, {{a.b}} looks up nested data
+- a placeholder without data makes SES drop the email (a Rendering Failure
+  event), so here it is an error
+
+Block helpers ({{#if}}, {{#each}}, ...) are not supported and are reported.
+
+The data comes from the functions the Lambdas use (recieveEmail's
+verification_template_data, signUpCustomer's get_gendered_template_data,
+social_auth_user's welcome_template_data, completed by sendWelcomeEmails'
+replacement_template_data), one variant per case they cover.
+
+Usage:
+    python services/ses/template_renderer.py check
+    python services/ses/template_renderer.py preview [--out DIR]
+    python services/ses/template_renderer.py benchmark [--iterations N]
+
+check renders every variant and fails on missing data or oversized
+templates, noting data no placeholder uses; preview writes each variant's
+subject, HTML and text to DIR (default services/ses/.previews) to open in
+a browser; benchmark times the renders.
+"""
+
+import argparse
+import html
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Add parent directory to path for imports
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(ROOT)
+
+from services.ses.template_sync import (
+    GMAIL_CLIP_BYTES,
+    PARTS,
+    render_default_templates,
+    rendered_size,
+)
+
+# SES' limit on a template's total size
+TEMPLATE_MAX_BYTES = 500 * 1024
+# Longest subject most clients show in full
+SUBJECT_MAX_CHARS = 78
+
+PREVIEW_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".previews")
+
+# {{name}}, {{{name}}} and {{a.b}}; anything else inside braces is a helper
+PLACEHOLDER = re.compile(r"\{\{(\{?)\s*([^{}]*?)\s*\}?\}\}")
+NAME = re.compile(r"^[A-Za-z_][\w-]*(\.[A-Za-z_][\w-]*)*$")
+
+
+class RenderError(Exception):
+    """Raised when SES could not render a template with the given data"""
+
+
+def placeholders(text: str) -> List[str]:
+    """Names of the placeholders in text, in order, without duplicates"""
+    names = []
+    for _, name in PLACEHOLDER.findall(text or ""):
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def _lookup(data: Dict, name: str):
+    value = data
+    for key in name.split("."):
+        if not isinstance(value, dict) or key not in value:
+            raise KeyError(name)
+        value = value[key]
+    return value
+
+
+def render_text(text: str, data: Dict, escape: bool) -> str:
+    """Fill in text's placeholders; raises RenderError listing what is missing"""
+    missing = []
+    unsupported = []
+
+    def substitute(match):
+        raw, name = match.group(1), match.group(2)
+        if not NAME.match(name):
+            unsupported.append(match.group(0))
+            return match.group(0)
+        try:
+            value = _lookup(data, name)
+        except KeyError:
+            missing.append(name)
+            return ""
+        value = "" if value is None else str(value)
+        return html.escape(value) if escape and not raw else value
+
+    rendered = PLACEHOLDER.sub(substitute, text or "")
+    problems = []
+    if missing:
+        problems.append(f"no data for {', '.join(sorted(set(missing)))}")
+    if unsupported:
+        problems.append(f"unsupported syntax {', '.join(unsupported)}")
+    if problems:
+        raise RenderError("; ".join(problems))
+    return rendered
+
+
+def render(template: Dict, data: Dict) -> Dict[str, str]:
+    """The subject, HTML and text parts of template rendered with data"""
+    rendered = {}
+    problems = []
+    for part in PARTS:
+        try:
+            rendered[part] = render_text(template.get(part), data, part == "HtmlPart")
+        except RenderError as e:
+            problems.append(f"{part}: {e}")
+    if problems:
+        raise RenderError(f"{template['TemplateName']}: {'; '.join(problems)}")
+    return rendered
+
+
+def check(template: Dict, data: Dict) -> Tuple[Optional[Dict[str, str]], List[str]]:
+    """(rendered parts or None, problems) for one variant"""
+    problems = []
+    rendered = None
+    try:
+        rendered = render(template, data)
+    except RenderError as e:
+        problems.append(str(e))
+
+    if rendered_size(template)["Total"] > TEMPLATE_MAX_BYTES:
+        problems.append(
+            f"template is over SES' {TEMPLATE_MAX_BYTES // 1024}KB template limit"
+        )
+    if rendered is not None:
+        if len(rendered["HtmlPart"].encode("utf-8")) > GMAIL_CLIP_BYTES:
+            problems.append(
+                f"HTML is over {GMAIL_CLIP_BYTES // 1024}KB, Gmail clips it"
+            )
+        if len(rendered["SubjectPart"]) > SUBJECT_MAX_CHARS:
+            problems.append(
+                f"subject is over {SUBJECT_MAX_CHARS} characters, clients cut it"
+            )
+    return rendered, problems
+
+
+def unused_data(template: Dict, data: Dict) -> List[str]:
+    """Top-level data keys no placeholder uses (harmless, but worth a look)"""
+    used = {
+        name.split(".")[0]
+        for part in PARTS
+        for name in placeholders(template.get(part))
+    }
+    return sorted(set(data) - used)
+
+
+# Template data variants, from the Lambdas that send each template
+
+
+def _import_lambdas():
+    layer = os.path.join(ROOT, "Lambdas", "Layers", "common", "python")
+    functions = os.path.join(ROOT, "Lambdas", "Authentication")
+    for path in (
+        layer,
+        os.path.join(functions, "recieveEmail"),
+        os.path.join(functions, "signUpCustomer"),
+        os.path.join(functions, "social_auth_user"),
+        os.path.join(functions, "sendWelcomeEmails"),
+    ):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    import recieveEmail
+    import sendWelcomeEmails
+    import signUpCustomer
+    import social_auth_user
+
+    return recieveEmail, signUpCustomer, social_auth_user, sendWelcomeEmails
+
+
+def template_variants() -> Dict[str, List[Tuple[str, Dict]]]:
+    """{template name: [(variant, template data)]} as the Lambdas send them"""
+    (
+        recieve_email,
+        sign_up_customer,
+        social_auth_user,
+        send_welcome_emails,
+    ) = _import_lambdas()
+
+    def welcome(template_data):
+        # What sendWelcomeEmails sends for a queued message
+        return send_welcome_emails.replacement_template_data(template_data)
+
+    return {
+        "fresa-verificacion-template": [
+            ("code", recieve_email.verification_template_data("123456")),
+        ],
+        "fresa-welcome-template": [
+            (
+                "signup-female",
+                welcome(sign_up_customer.get_gendered_template_data("Ana", "female")),
+            ),
+            (
+                "signup-male",
+                welcome(sign_up_customer.get_gendered_template_data("Luis", "male")),
+            ),
+            (
+                "signup-escaped-name",
+                welcome(
+                    sign_up_customer.get_gendered_template_data("<Ana & Co>", "other")
+                ),
+            ),
+            (
+                "social-female",
+                welcome(social_auth_user.welcome_template_data("Ana", "female")),
+            ),
+            (
+                "social-no-name",
+                welcome(social_auth_user.welcome_template_data(None)),
+            ),
+        ],
+    }
+
+
+def _variants():
+    templates = {t["TemplateName"]: t for t in render_default_templates()}
+    for name, variants in template_variants().items():
+        for variant, data in variants:
+            yield templates[name], variant, data
+
+
+def check_all() -> bool:
+    """Render every variant; True if none has a problem"""
+    ok = True
+    print(f"{'Template':<30} {'Variant':<22} {'HTML':>9} {'Text':>7}  Result")
+    print("-" * 84)
+    for template, variant, data in _variants():
+        rendered, problems = check(template, data)
+        sizes = rendered_size(rendered) if rendered else {}
+        print(
+            f"{template['TemplateName']:<30} {variant:<22} "
+            f"{sizes.get('HtmlPart', 0):>8,}B {sizes.get('TextPart', 0):>6,}B  "
+            f"{'❌' if problems else '✅'}"
+        )
+        for problem in problems:
+            print(f"{'':<30} ⚠️  {problem}")
+        unused = unused_data(template, data)
+        if unused:
+            print(f"{'':<30} ℹ️  data no placeholder uses: {', '.join(unused)}")
+        ok = ok and not problems
+    return ok
+
+
+def preview_all(out_dir: str = PREVIEW_DIR) -> List[str]:
+    """Write every variant's rendered parts under out_dir; returns the files"""
+    written = []
+    for template, variant, data in _variants():
+        rendered, problems = check(template, data)
+        if rendered is None:
+            print(f"❌ {template['TemplateName']} ({variant}): {problems[0]}")
+            continue
+        directory = os.path.join(out_dir, template["TemplateName"])
+        os.makedirs(directory, exist_ok=True)
+        for suffix, part in (
+            ("subject.txt", "SubjectPart"),
+            ("html", "HtmlPart"),
+            ("txt", "TextPart"),
+        ):
+            path = os.path.join(directory, f"{variant}.{suffix}")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(rendered[part])
+            written.append(path)
+    return written
+
+
+def benchmark(iterations: int = 10000) -> Dict[Tuple[str, str], float]:
+    """Microseconds per render of each variant"""
+    results = {}
+    for template, variant, data in _variants():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            render(template, data)
+        elapsed = time.perf_counter() - start
+        results[(template["TemplateName"], variant)] = elapsed / iterations * 1e6
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Render the Fresa SES templates locally"
+    )
+    parser.add_argument(
+        "command", nargs="?", default="check", choices=["check", "preview", "benchmark"]
+    )
+    parser.add_argument("--out", default=PREVIEW_DIR, help="preview directory")
+    parser.add_argument(
+        "--iterations", type=int, default=10000, help="renders per variant"
+    )
+    args = parser.parse_args(argv)
+
+    print("🍓 Fresa SES Template Renderer")
+    print("=" * 40)
+    if args.command == "check":
+        if not check_all():
+            sys.exit(1)
+    elif args.command == "preview":
+        written = preview_all(args.out)
+        print(f"📄 Wrote {len(written)} files to {args.out}")
+    else:
+        print(f"{'Template':<30} {'Variant':<22} {'µs/render':>10}")
+        print("-" * 64)
+        for (name, variant), us in benchmark(args.iterations).items():
+            print(f"{name:<30} {variant:<22} {us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
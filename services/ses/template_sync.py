@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Fresa SES Template Sync
+Pushes only the SES templates whose content changed since they were last pushed
+
+Every template is rendered locally and hashed (subject, HTML and text):
+
+- a template whose hash matches the local manifest for the account and
+  region is skipped without calling SES
+- the others are fetched from SES once, in parallel, and compared
+- only the ones that differ are created or updated, concurrently
+
+The manifest (services/ses/.template_manifest.json, not committed) records
+the hash SES holds after each sync. --force ignores it and compares every
+template with SES. The rendered size of each template is reported too: every
+send carries it, so it adds to SES data transfer and send latency, and
+Gmail clips HTML over 102KB.
+
+Usage:
+    python services/ses/template_sync.py [--force] [--dry-run] [--workers N]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import boto3
+from botocore.config import Config
+
+# Add parent directory to path for imports
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from utils.aws_utils import get_aws_account_info, get_aws_region
+from services.ses.create_verification_template import build_verification_template
+from services.ses.create_welcome_template import build_welcome_template
+
+DEFAULT_LOGO_URL = "https://fresaassets.s3.us-east-1.amazonaws.com/fresaicon.png"
+MANIFEST_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".template_manifest.json"
+)
+
+# Template name -> builder(template_name, logo_url)
+DEFAULT_TEMPLATES: Dict[str, Callable[[str, str], Dict]] = {
+    "fresa-verificacion-template": build_verification_template,
+    "fresa-welcome-template": build_welcome_template,
+}
+
+# The template API allows about one call per second, so keep the pool small
+# and let adaptive retries absorb throttling
+DEFAULT_WORKERS = 4
+# Gmail clips messages whose HTML is larger than this
+GMAIL_CLIP_BYTES = 102 * 1024
+
+PARTS = ("SubjectPart", "HtmlPart", "TextPart")
+
+# fetch_remote's value for a template SES could not be asked about
+FETCH_FAILED = object()
+
+
+def render_default_templates(logo_url: str = DEFAULT_LOGO_URL) -> List[Dict]:
+    """Render every default template locally"""
+    return [build(name, logo_url) for name, build in DEFAULT_TEMPLATES.items()]
+
+
+def content_hash(template: Dict) -> str:
+    """Hash of a template's subject, HTML and text"""
+    content = json.dumps([template.get(part) or "" for part in PARTS])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def rendered_size(template: Dict) -> Dict[str, int]:
+    """Bytes per part (UTF-8) and in total"""
+    sizes = {part: len((template.get(part) or "").encode("utf-8")) for part in PARTS}
+    sizes["Total"] = sum(sizes.values())
+    return sizes
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> Dict[str, Dict[str, str]]:
+    """{account/region: {template name: hash}}, empty if there is none yet"""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest: Dict[str, Dict[str, str]], path: str = MANIFEST_PATH):
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+class TemplateSync:
+    """Syncs rendered templates to SES, skipping unchanged ones"""
+
+    def __init__(
+        self,
+        region: str = None,
+        workers: int = DEFAULT_WORKERS,
+        manifest_path: str = MANIFEST_PATH,
+        ses_client=None,
+        scope: str = None,
+    ):
+        self.region = region or get_aws_region()
+        self.workers = workers
+        self.manifest_path = manifest_path
+        self.ses_client = ses_client or boto3.client(
+            "ses",
+            region_name=self.region,
+            config=Config(retries={"max_attempts": 10, "mode": "adaptive"}),
+        )
+        self._scope = scope
+
+    @property
+    def scope(self) -> str:
+        """Manifest key: hashes only hold for one account and region"""
+        if self._scope is None:
+            try:
+                account_id = get_aws_account_info()["account_id"]
+            except Exception:
+                account_id = "unknown"
+            self._scope = f"{account_id}/{self.region}"
+        return self._scope
+
+    def fetch_remote(self, names: List[str]) -> Dict[str, Optional[Dict]]:
+        """Every named template as SES holds it, in parallel
+
+        None means SES has no such template, FETCH_FAILED that it could not
+        be read.
+        """
+
+        def fetch(name):
+            try:
+                return self.ses_client.get_template(TemplateName=name)["Template"]
+            except self.ses_client.exceptions.TemplateDoesNotExistException:
+                return None
+            except Exception as e:
+                print(f"❌ Error getting template {name}: {e}")
+                return FETCH_FAILED
+
+        if not names:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return dict(zip(names, pool.map(fetch, names)))
+
+    def push(self, template: Dict, exists: bool) -> bool:
+        name = template["TemplateName"]
+        try:
+            if exists:
+                self.ses_client.update_template(Template=template)
+            else:
+                self.ses_client.create_template(Template=template)
+            return True
+        except Exception as e:
+            print(f"❌ Error pushing template {name}: {e}")
+            return False
+
+    def sync(
+        self, templates: List[Dict], force: bool = False, dry_run: bool = False
+    ) -> Dict[str, str]:
+        """Push the templates that differ from SES; returns {name: status}
+
+        Statuses: unchanged, created, updated, failed (or "would create" and
+        "would update" on a dry run).
+        """
+        manifest = load_manifest(self.manifest_path)
+        known = manifest.get(self.scope, {})
+        hashes = {t["TemplateName"]: content_hash(t) for t in templates}
+
+        statuses = {}
+        to_check = []
+        for template in templates:
+            name = template["TemplateName"]
+            if not force and known.get(name) == hashes[name]:
+                statuses[name] = "unchanged"
+            else:
+                to_check.append(template)
+
+        remote = self.fetch_remote([t["TemplateName"] for t in to_check])
+        to_push = []
+        for template in to_check:
+            name = template["TemplateName"]
+            current = remote[name]
+            if current is FETCH_FAILED:
+                statuses[name] = "failed"
+            elif current is not None and content_hash(current) == hashes[name]:
+                statuses[name] = "unchanged"
+            else:
+                to_push.append((template, current is not None))
+
+        if dry_run:
+            for template, exists in to_push:
+                statuses[template["TemplateName"]] = (
+                    "would update" if exists else "would create"
+                )
+            return statuses
+
+        if to_push:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = pool.map(lambda args: self.push(*args), to_push)
+                for (template, exists), ok in zip(to_push, results):
+                    if ok:
+                        status = "updated" if exists else "created"
+                    else:
+                        status = "failed"
+                    statuses[template["TemplateName"]] = status
+
+        # Remember what SES now holds; failed pushes are checked again next time
+        for name, status in statuses.items():
+            if status == "failed":
+                known.pop(name, None)
+            else:
+                known[name] = hashes[name]
+        manifest[self.scope] = known
+        save_manifest(manifest, self.manifest_path)
+        return statuses
+
+
+def print_report(templates: List[Dict], statuses: Dict[str, str]):
+    """Status and rendered size of every template"""
+    icons = {"unchanged": "⏭️ ", "created": "✅", "updated": "✅", "failed": "❌"}
+    print(
+        f"{'Template':<32} {'Status':<15} {'Subject':>8} {'HTML':>9} "
+        f"{'Text':>8} {'Total':>9}"
+    )
+    print("-" * 86)
+    for template in templates:
+        name = template["TemplateName"]
+        status = statuses.get(name, "")
+        sizes = rendered_size(template)
+        print(
+            f"{name:<32} {icons.get(status, '📝')} {status:<12} "
+            f"{sizes['SubjectPart']:>7,}B {sizes['HtmlPart']:>8,}B "
+            f"{sizes['TextPart']:>7,}B {sizes['Total']:>8,}B"
+        )
+        if sizes["HtmlPart"] > GMAIL_CLIP_BYTES:
+            print(
+                f"{'':<32} ⚠️  HTML over {GMAIL_CLIP_BYTES // 1024}KB, Gmail clips it"
+            )
+
+
+def sync_templates(
+    templates: List[Dict] = None,
+    force: bool = False,
+    dry_run: bool = False,
+    workers: int = DEFAULT_WORKERS,
+) -> bool:
+    """Sync templates (the defaults if none are given); True if none failed"""
+    templates = templates if templates is not None else render_default_templates()
+    syncer = TemplateSync(workers=workers)
+    statuses = syncer.sync(templates, force=force, dry_run=dry_run)
+    print_report(templates, statuses)
+    return "failed" not in statuses.values()
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Push the Fresa SES templates that changed"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="compare with SES, ignoring the manifest"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="report what would be pushed"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS, help="concurrent SES calls"
+    )
+    args = parser.parse_args(argv)
+
+    print("🍓 Fresa SES Template Sync")
+    print("=" * 40)
+    if not sync_templates(force=args.force, dry_run=args.dry_run, workers=args.workers):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
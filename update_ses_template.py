@@ -11,13 +11,11 @@ from pathlib import Path
 # Add services to path
 sys.path.append(os.path.join(os.path.dirname(__file__), "services"))
 
-from services.ses.template_manager import SESTemplateManager
+from services.ses.template_sync import sync_templates
 
 
-def update_verification_template():
-    """Update the verification template with new content"""
-    manager = SESTemplateManager()
-
+def verification_template():
+    """The verification template's custom content"""
     # Your custom template content
     new_subject = "🍓 Fresa: Verificación de Email"
 
@@ -81,23 +79,16 @@ def update_verification_template():
     © 2025 Fresa. Todos los derechos reservados.
     """
 
-    # Update the template
-    success = manager.update_template(
-        "fresa-verificacion-template", new_subject, new_html_content, new_text_content
-    )
-
-    if success:
-        print("✅ Verification template updated successfully!")
-    else:
-        print("❌ Failed to update verification template")
-
-    return success
-
+    return {
+        "TemplateName": "fresa-verificacion-template",
+        "SubjectPart": new_subject,
+        "HtmlPart": new_html_content,
+        "TextPart": new_text_content,
+    }
 
-def update_welcome_template():
-    """Update the welcome template with new content"""
-    manager = SESTemplateManager()
 
+def welcome_template():
+    """The welcome template's custom content"""
     # Your custom welcome template content
     new_subject = "🍓 ¡Bienvenido a Fresa!"
 
@@ -169,19 +160,36 @@ def update_welcome_template():
     © 2025 Fresa. Todos los derechos reservados.
     """
 
-    # Update the template
-    success = manager.update_template(
-        "fresa-welcome-template", new_subject, new_html_content, new_text_content
-    )
+    return {
+        "TemplateName": "fresa-welcome-template",
+        "SubjectPart": new_subject,
+        "HtmlPart": new_html_content,
+        "TextPart": new_text_content,
+    }
+
+
+def update_templates(templates):
+    """Push the templates whose content changed, concurrently"""
+    success = sync_templates(templates)
 
     if success:
-        print("✅ Welcome template updated successfully!")
+        print("✅ Templates are up to date!")
     else:
-        print("❌ Failed to update welcome template")
+        print("❌ Failed to update some templates")
 
     return success
 
 
+def update_verification_template():
+    """Update the verification template with new content"""
+    return update_templates([verification_template()])
+
+
+def update_welcome_template():
+    """Update the welcome template with new content"""
+    return update_templates([welcome_template()])
+
+
 def main():
     """Main function to update templates"""
     print("🍓 Fresa SES Template Updater")
@@ -202,8 +210,7 @@ def main():
         update_welcome_template()
     elif command == "all":
         print("Updating all templates...")
-        update_verification_template()
-        update_welcome_template()
+        update_templates([verification_template(), welcome_template()])
     else:
         print(f"❌ Unknown command: {command}")
         sys.exit(1)
@@ -6,6 +6,7 @@ Dynamically discovers Lambda functions from config.py and directory structure
 
 import sys
 import os
+import ast
 import json
 from pathlib import Path
 
@@ -89,6 +90,55 @@ def get_function_info(function_name):
     return info
 
 
+def get_function_deployment_settings():
+    """Read memory_size and timeout for each function from cdk/cdk_stack.py
+
+    The stack is parsed rather than imported so this works without aws-cdk
+    installed. Returns {function_key: {"memory_size": MB, "timeout": seconds}}.
+    """
+    settings = {}
+    stack_file = Path(__file__).parent.parent / "cdk" / "cdk_stack.py"
+
+    try:
+        tree = ast.parse(stack_file.read_text())
+    except (OSError, SyntaxError):
+        return settings
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        if getattr(node.func, "attr", None) != "Function":
+            continue
+
+        keywords = {kw.arg: kw.value for kw in node.keywords}
+        name_node = keywords.get("function_name")
+        # function_name=LAMBDA_FUNCTION_NAMES["<key>"]
+        if not isinstance(name_node, ast.Subscript):
+            continue
+        key_node = name_node.slice
+        if not isinstance(key_node, ast.Constant):
+            continue
+
+        function_settings = {}
+        memory_node = keywords.get("memory_size")
+        if isinstance(memory_node, ast.Constant):
+            function_settings["memory_size"] = memory_node.value
+
+        # timeout=Duration.seconds(<n>)
+        timeout_node = keywords.get("timeout")
+        if (
+            isinstance(timeout_node, ast.Call)
+            and getattr(timeout_node.func, "attr", None) == "seconds"
+            and timeout_node.args
+            and isinstance(timeout_node.args[0], ast.Constant)
+        ):
+            function_settings["timeout"] = timeout_node.args[0].value
+
+        settings[key_node.value] = function_settings
+
+    return settings
+
+
 def main():
     """Command line interface"""
     if len(sys.argv) < 2:
@@ -97,6 +147,7 @@ def main():
         print("  python utils/function_discovery.py info <function_name>")
         print("  python utils/function_discovery.py config")
         print("  python utils/function_discovery.py directory")
+        print("  python utils/function_discovery.py settings")
         sys.exit(1)
 
     command = sys.argv[1]
@@ -116,6 +167,9 @@ def main():
         for func in functions:
             print(func)
 
+    elif command == "settings":
+        print(json.dumps(get_function_deployment_settings(), indent=2))
+
     elif command == "info":
         if len(sys.argv) < 3:
             print("Error: Function name required")